@@ -60,6 +60,7 @@ from pydantic import BaseModel, ValidationError
 from sqlalchemy.orm import Session
 
 from core.cache.decorators import cache
+from core.db.utils.keyset import OffsetPage, TotalMode
 from db.metrics.pagination import PageResponse
 from dependencies import sync_db
 from schemas.base.response import Response
@@ -159,12 +160,23 @@ class CRUDRouter(Generic[ModelType, CreateSchemaType, UpdateSchemaType, FilterSc
             summary="获取列表",
             description="获取分页列表数据，支持搜索、排序和过滤",
         )
-        @cache(key_prefix="student-get-list:", ttl=300, key_builder=lambda q, p, s, f: f"list:{q}:{p}:{s}:{f}")
+        @cache(
+            key_prefix="student-get-list:",
+            ttl=300,
+            key_builder=lambda **kw: (
+                f"list:{kw.get('query')}:{kw.get('page')}:{kw.get('size')}:{kw.get('sort')}:"
+                f"{kw.get('filter_data')}:{kw.get('cursor')}:{kw.get('total')}"
+            ),
+        )
         async def list_items(
             query: Optional[str] = Query(None, description="搜索关键词"),
             page: int = Query(1, ge=1, description="页码"),
             size: int = Query(20, ge=1, le=100, description="每页数量"),
-            sort: Optional[str] = Query(None, description="排序字段"),
+            sort: Optional[str] = Query(None, description="排序字段, 多个字段用逗号分隔, 如 -created_at,name"),
+            cursor: Optional[str] = Query(
+                None, description="游标; 传入(首页传空值)时使用键集分页并忽略 page, 后续传响应中的 next_cursor/prev_cursor"
+            ),
+            total: TotalMode = Query(TotalMode.EXACT, description="总数统计方式: exact 精确, estimate 估算, none 不统计"),
             filter_data: Optional[FilterSchemaType] = None,
             db: Session = Depends(self.get_db),
         ) -> PageResponse[ResponseSchemaType]:
@@ -172,21 +184,41 @@ class CRUDRouter(Generic[ModelType, CreateSchemaType, UpdateSchemaType, FilterSc
 
             支持:
             1. 关键词搜索
-            2. 分页查询
+            2. 分页查询(页码分页 / 键集游标分页)
             3. 字段排序
             4. 条件过滤
             5. 缓存支持
+            6. 跳过或估算总数
             """
             try:
-                total, items = await self.service.get_list(
+                if cursor is not None:
+                    keyset_page = await self.service.get_list(
+                        db=db,
+                        query=query,
+                        size=size,
+                        sort=sort,
+                        filter_data=filter_data,
+                        cursor=cursor,
+                        total_mode=total,
+                    )
+                    return PageResponse.from_keyset(keyset_page)
+
+                # 仅在需要跳过或估算总数时传递 total_mode, 兼容未支持该参数的服务
+                options = {} if total is TotalMode.EXACT else {"total_mode": total}
+                result = await self.service.get_list(
                     db=db,
                     query=query,
                     page=page,
                     size=size,
                     sort=sort,
                     filter_data=filter_data,
+                    **options,
                 )
-                return PageResponse(total=total, items=items, page=page, size=size)
+                if isinstance(result, OffsetPage):
+                    return PageResponse.from_offset(result)
+                # 旧服务返回 (总数, 数据列表)
+                count, items = result
+                return PageResponse.create(items=items, total=count, page=page, size=size)
             except Exception as e:
                 raise HTTPException(status_code=400, detail=str(e))
 
@@ -437,6 +469,9 @@ class CRUDRouter(Generic[ModelType, CreateSchemaType, UpdateSchemaType, FilterSc
         async def export_data(
             query: Optional[str] = Query(None, description="搜索关键词"),
             filter_data: Optional[FilterSchemaType] = None,
+            file_type: Optional[str] = Query(None, pattern="^(xlsx|csv|json)$", description="导出格式"),
+            stream: bool = Query(False, description="是否边查询边下载"),
+            background: bool = Query(False, description="是否作为后台任务导出"),
             db: Session = Depends(self.get_db),
         ) -> ExportResponse:
             """导出数据
@@ -445,11 +480,18 @@ class CRUDRouter(Generic[ModelType, CreateSchemaType, UpdateSchemaType, FilterSc
             1. 多种文件格式
             2. 数据过滤
             3. 自定义字段
-            4. 大数据处理
-            5. 异步导出
+            4. 大数据处理(服务端游标分块读取, 流式写出)
+            5. 异步导出(后台任务)
             """
             try:
-                return await self.service.export_data(db=db, query=query, filter_data=filter_data)
+                options = {}
+                if file_type:
+                    options["file_type"] = file_type
+                if stream:
+                    options["stream"] = True
+                if background:
+                    options["background"] = True
+                return await self.service.export_data(db=db, query=query, filter_data=filter_data, **options)
             except Exception as e:
                 raise HTTPException(status_code=400, detail=str(e))
 
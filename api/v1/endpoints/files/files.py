@@ -9,19 +9,39 @@
 提供文件上传、下载、管理等功能
 支持文件夹管理、文件搜索和权限控制
 """
-from pathlib import Path
 from typing import List, Optional, Dict, Any
 
 from core.dependencies.permissions import requires_permissions
 from core.dependencies.rate_limit import rate_limiter
-from fastapi import Body, Depends, File, Path as PathParam, Query, UploadFile, HTTPException, status
-from fastapi.responses import FileResponse
+from fastapi import (
+    Body,
+    Depends,
+    File,
+    Header,
+    HTTPException,
+    Path as PathParam,
+    Query,
+    Request,
+    UploadFile,
+    status,
+)
+from fastapi.responses import Response as HTTPResponse
 from services.file.file_service import FileService
 from sqlalchemy.orm import Session
 
 from api.base.crud import CRUDRouter
 from core.cache.config.config import CacheConfig
 from core.dependencies import async_db
+from core.dependencies.auth import get_current_active_user
+from core.third.oss.ranges import range_response
+from core.third.oss.storage import (
+    FileTooLargeError,
+    StorageError,
+    UploadNotFoundError,
+    UploadOffsetError,
+    storage_manager,
+)
+from models.user import User
 from models.file import (
     FileModel,
     FileCreate,
@@ -34,6 +54,9 @@ from models.file import (
 )
 from schemas.base.response import Response
 
+# 单个文件大小上限
+MAX_UPLOAD_SIZE = 100 * 1024 * 1024
+
 # 缓存配置
 FILE_CACHE_CONFIG = {
     "strategy": "redis",
@@ -85,32 +108,36 @@ async def upload_file(
         HTTPException: 上传失败时抛出
     """
     try:
-        # 验证文件大小
-        file_size = await file.seek(0, 2)  # 获取文件大小
-        if file_size > 100 * 1024 * 1024:  # 100MB限制
+        # 验证文件大小(multipart 解析时已记录, 无需读取内容)
+        if file.size is not None and file.size > MAX_UPLOAD_SIZE:
             raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="文件大小超过限制")
 
         # 上传文件
         file_info = await FileService.upload_file(db, file, folder_id=folder_id, description=description, tags=tags)
 
         return Response(code=201, message="文件上传成功", data=file_info)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"文件上传失败: {str(e)}")
 
 
-@router.router.get("/download/{file_id}", response_class=FileResponse, summary="下载文件", description="下载指定的文件")
+@router.router.get(
+    "/download/{file_id}", summary="下载文件", description="下载指定的文件, 支持 Range 断点续传"
+)
 @requires_permissions(["download_file"])
 async def download_file(
-    file_id: int = PathParam(..., description="文件ID"), db: Session = Depends(async_db)
-) -> FileResponse:
+    request: Request, file_id: int = PathParam(..., description="文件ID"), db: Session = Depends(async_db)
+) -> HTTPResponse:
     """下载文件
 
     Args:
+        request: 请求对象, 读取 Range / If-Range 请求头
         file_id: 文件ID
         db: 数据库会话
 
     Returns:
-        文件响应对象
+        流式文件响应, 范围请求时返回 206
 
     Raises:
         HTTPException: 下载失败时抛出
@@ -122,18 +149,192 @@ async def download_file(
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="文件不存在")
 
         # 检查文件是否存在
-        file_path = Path(file_info.path)
-        if not file_path.exists():
+        if not await storage_manager.exists(file_info.path):
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="文件不存在")
 
-        # 更新下载次数
-        await FileService.increment_download_count(db, file_id)
+        # 更新下载次数(续传的后续分段不重复计数)
+        if not request.headers.get("range"):
+            await FileService.increment_download_count(db, file_id)
 
-        return FileResponse(path=str(file_path), filename=file_info.name, media_type=file_info.mime_type)
+        return await range_response(
+            request, storage_manager.backend, file_info.path, filename=file_info.name, media_type=file_info.mime_type
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"文件下载失败: {str(e)}")
 
 
+@router.router.post(
+    "/uploads", response_model=Response[Dict[str, Any]], summary="创建分块上传", description="创建断点续传会话"
+)
+@requires_permissions(["upload_file"])
+async def create_upload(
+    filename: str = Body(..., embed=True, description="文件名"),
+    size: int = Body(..., embed=True, ge=0, le=MAX_UPLOAD_SIZE, description="文件总大小"),
+    content_type: Optional[str] = Body(None, embed=True, description="内容类型"),
+    folder_id: Optional[int] = Body(None, embed=True, description="文件夹ID"),
+    description: Optional[str] = Body(None, embed=True, description="文件描述"),
+    current_user: User = Depends(get_current_active_user),
+) -> Response[Dict[str, Any]]:
+    """创建分块上传
+
+    会话记录创建者, 之后的查询、追加、完成和取消只允许同一用户操作
+
+    Args:
+        filename: 文件名
+        size: 文件总大小(字节)
+        content_type: 可选的内容类型
+        folder_id: 可选的目标文件夹ID
+        description: 可选的文件描述
+        current_user: 当前用户
+
+    Returns:
+        包含上传ID和存储路径的响应对象
+    """
+    try:
+        path = storage_manager.generate_path(filename, category="uploads")
+        upload_id = await storage_manager.create_upload(
+            path,
+            content_type=content_type,
+            total_size=size,
+            owner=current_user.id,
+            metadata={"name": filename, "folder_id": folder_id, "description": description},
+        )
+        return Response(code=201, message="上传会话已创建", data={"upload_id": upload_id, "path": path, "offset": 0})
+    except StorageError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"创建上传失败: {str(e)}")
+
+
+@router.router.head(
+    "/uploads/{upload_id}", summary="查询上传进度", description="通过 Upload-Offset 响应头返回已接收字节数"
+)
+@requires_permissions(["upload_file"])
+async def get_upload_offset(
+    upload_id: str = PathParam(..., description="上传ID"), current_user: User = Depends(get_current_active_user)
+) -> HTTPResponse:
+    """查询上传进度
+
+    Args:
+        upload_id: 上传ID
+        current_user: 当前用户
+
+    Returns:
+        带 Upload-Offset 响应头的空响应
+    """
+    try:
+        offset = await storage_manager.get_upload_offset(upload_id, owner=current_user.id)
+    except StorageError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="上传不存在")
+    return HTTPResponse(status_code=status.HTTP_204_NO_CONTENT, headers={"Upload-Offset": str(offset)})
+
+
+@router.router.patch(
+    "/uploads/{upload_id}", summary="上传分块", description="请求体为原始字节, 流式追加到已接收数据之后"
+)
+@requires_permissions(["upload_file"])
+async def upload_chunk(
+    request: Request,
+    upload_id: str = PathParam(..., description="上传ID"),
+    upload_offset: int = Header(..., ge=0, description="分块起始偏移, 必须等于已接收的字节数"),
+    current_user: User = Depends(get_current_active_user),
+) -> HTTPResponse:
+    """上传分块
+
+    请求体不经缓冲直接按块写入磁盘, 偏移不匹配时返回 409 和当前偏移, 客户端据此重试
+
+    Args:
+        request: 请求对象
+        upload_id: 上传ID
+        upload_offset: 分块起始偏移
+        current_user: 当前用户, 必须是会话的创建者
+
+    Returns:
+        带 Upload-Offset 响应头的空响应
+    """
+    try:
+        offset = await storage_manager.upload_chunk(upload_id, request.stream(), upload_offset, owner=current_user.id)
+    except UploadOffsetError as e:
+        return HTTPResponse(status_code=status.HTTP_409_CONFLICT, headers={"Upload-Offset": str(e.expected)})
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except StorageError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    return HTTPResponse(status_code=status.HTTP_204_NO_CONTENT, headers={"Upload-Offset": str(offset)})
+
+
+@router.router.post(
+    "/uploads/{upload_id}/complete",
+    response_model=Response[Dict[str, Any]],
+    summary="完成分块上传",
+    description="校验大小和哈希后生成最终文件并创建文件记录",
+)
+@requires_permissions(["upload_file"])
+async def complete_upload(
+    upload_id: str = PathParam(..., description="上传ID"),
+    checksum: Optional[str] = Body(None, embed=True, description="文件MD5, 提供时校验"),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(async_db),
+) -> Response[FileResponse]:
+    """完成分块上传
+
+    文件移动到最终路径后创建文件记录, 之后可通过 /download/{file_id} 下载; 创建记录失败时删除文件
+
+    Args:
+        upload_id: 上传ID
+        checksum: 可选的文件MD5
+        current_user: 当前用户, 必须是会话的创建者
+        db: 数据库会话
+
+    Returns:
+        包含文件记录的响应对象
+    """
+    try:
+        file_info = await storage_manager.complete_upload(upload_id, checksum=checksum, owner=current_user.id)
+    except UploadOffsetError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"文件不完整: {str(e)}")
+    except UploadNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="上传不存在")
+    except StorageError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"完成上传失败: {str(e)}")
+
+    try:
+        file = await FileService.create_file_record(
+            db,
+            file_info,
+            name=file_info.metadata.get("name") or file_info.filename,
+            folder_id=file_info.metadata.get("folder_id"),
+            description=file_info.metadata.get("description"),
+            owner_id=current_user.id,
+        )
+    except Exception as e:
+        await storage_manager.delete_file(file_info.path)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"文件上传失败: {str(e)}")
+    return Response(code=201, message="文件上传成功", data=file)
+
+
+@router.router.delete("/uploads/{upload_id}", response_model=Response, summary="取消分块上传")
+@requires_permissions(["upload_file"])
+async def abort_upload(
+    upload_id: str = PathParam(..., description="上传ID"), current_user: User = Depends(get_current_active_user)
+) -> Response:
+    """取消分块上传并清理已接收的数据
+
+    Args:
+        upload_id: 上传ID
+        current_user: 当前用户, 必须是会话的创建者
+
+    Returns:
+        操作结果响应对象
+    """
+    try:
+        if not await storage_manager.abort_upload(upload_id, owner=current_user.id):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="上传不存在")
+    except StorageError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return Response(code=200, message="上传已取消")
+
+
 @router.router.post(
     "/folders", response_model=Response[FolderResponse], summary="创建文件夹", description="创建新的文件夹"
 )
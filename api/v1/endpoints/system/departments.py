@@ -2,7 +2,7 @@ from datetime import datetime
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, UploadFile
-from sqlalchemy import func
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
 from api.v1.endpoints.files.tools import BusinessError, validate_regex
@@ -14,7 +14,7 @@ from core.exceptions.base.error_codes import ErrorCode
 from interceptor.response import ResponseSchema, success
 from core.cache.decorators import clear_cache, cache_decorator
 from core.utils.cache_warmer import warm_up_cache
-from core.utils.export import DataExporter, DataImporter
+from core.utils.export import DataImporter, StreamingExporter, stream_query_in_session
 from core.utils.query import QueryOptimizer
 from models.department import Department
 from schemas.department import DepartmentCreate, DepartmentResponse, DepartmentUpdate
@@ -365,38 +365,14 @@ async def import_departments(
         os.remove(filename)
 
 
-@router.get("/export", response_model=ResponseSchema)
+@router.get("/export")
 @require_permissions("department:export")
-async def export_departments(
-    file_type: str, db: Session = Depends(async_db), current_user: int = Depends(get_current_user)
-):
-    """导出部门数据"""
+async def export_departments(file_type: str, current_user: int = Depends(get_current_user)):
+    """导出部门数据(流式下载)"""
     # 检查文件类型
     if file_type not in ["csv", "xlsx", "json"]:
         raise HTTPException(status_code=400, detail="Unsupported file type")
 
-    # 查询数据
-    departments = db.query(Department).filter(Department.is_delete == False).all()
-    data = [
-        {
-            "name": department.name,
-            "code": department.code,
-            "description": department.description,
-            "parent_id": department.parent_id,
-            "sort": department.sort,
-            "status": department.status,
-            "leader": department.leader,
-            "phone": department.phone,
-            "email": department.email,
-            "address": department.address,
-            "is_system": department.is_system,
-            "remark": department.remark,
-        }
-        for department in departments
-    ]
-
-    # 导出文件
-    filename = f"temp/department_export_{datetime.now().strftime('%Y%m%d%H%M%S')}.{file_type}"
     fields = [
         "name",
         "code",
@@ -411,26 +387,10 @@ async def export_departments(
         "is_system",
         "remark",
     ]
-
-    try:
-        if file_type == "csv":
-            DataExporter.export_to_csv(data, fields, filename)
-        elif file_type == "xlsx":
-            DataExporter.export_to_excel(data, fields, filename)
-        else:
-            DataExporter.export_to_json(data, filename)
-
-        # 读取文件内容
-        with open(filename, "rb") as f:
-            content = f.read()
-
-        return success(data={"filename": f"departments.{file_type}", "content": content})
-
-    finally:
-        # 删除临时文件
-        import os
-
-        os.remove(filename)
+    exporter = StreamingExporter([(field, field) for field in fields], file_type=file_type)
+    stmt = select(Department).where(Department.is_delete == False).order_by(Department.id)
+    # 响应体在接口返回后才发送, 在数据源内部创建会话
+    return exporter.response(stream_query_in_session(stmt), "departments")
 
 
 @router.post("/cache/warm-up", response_model=ResponseSchema)
@@ -2,7 +2,7 @@ from datetime import datetime
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, UploadFile
-from sqlalchemy import func
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
 from api.v1.endpoints.files.tools import BusinessError, validate_regex
@@ -14,7 +14,7 @@ from core.exceptions.base.error_codes import ErrorCode
 from models import Role
 from interceptor.response import ResponseSchema, success
 from core.cache.decorators import clear_cache, cache_decorator
-from core.utils.export import DataExporter, DataImporter
+from core.utils.export import DataImporter, StreamingExporter, stream_query_in_session
 from core.utils.logging import operation_log
 from core.utils.query import QueryOptimizer
 from models.menu import Menu
@@ -364,39 +364,14 @@ async def import_menus(
         os.remove(filename)
 
 
-@router.get("/export", response_model=ResponseSchema)
+@router.get("/export")
 @require_permissions("menu:export")
-async def export_menus(file_type: str, db: Session = Depends(async_db), current_user: int = Depends(get_current_user)):
-    """导出菜单数据"""
+async def export_menus(file_type: str, current_user: int = Depends(get_current_user)):
+    """导出菜单数据(流式下载)"""
     # 检查文件类型
     if file_type not in ["csv", "xlsx", "json"]:
         raise HTTPException(status_code=400, detail="Unsupported file type")
 
-    # 查询数据
-    menus = db.query(Menu).filter(Menu.is_delete == False).all()
-    data = [
-        {
-            "name": menu.name,
-            "path": menu.path,
-            "component": menu.component,
-            "redirect": menu.redirect,
-            "icon": menu.icon,
-            "title": menu.title,
-            "parent_id": menu.parent_id,
-            "sort": menu.sort,
-            "permission": menu.permission,
-            "status": menu.status,
-            "is_visible": menu.is_visible,
-            "is_cache": menu.is_cache,
-            "is_frame": menu.is_frame,
-            "is_system": menu.is_system,
-            "remark": menu.remark,
-        }
-        for menu in menus
-    ]
-
-    # 导出文件
-    filename = f"temp/menu_export_{datetime.now().strftime('%Y%m%d%H%M%S')}.{file_type}"
     fields = [
         "name",
         "path",
@@ -414,26 +389,10 @@ async def export_menus(file_type: str, db: Session = Depends(async_db), current_
         "is_system",
         "remark",
     ]
-
-    try:
-        if file_type == "csv":
-            DataExporter.export_to_csv(data, fields, filename)
-        elif file_type == "xlsx":
-            DataExporter.export_to_excel(data, fields, filename)
-        else:
-            DataExporter.export_to_json(data, filename)
-
-        # 读取文件内容
-        with open(filename, "rb") as f:
-            content = f.read()
-
-        return success(data={"filename": f"menus.{file_type}", "content": content})
-
-    finally:
-        # 删除临时文件
-        import os
-
-        os.remove(filename)
+    exporter = StreamingExporter([(field, field) for field in fields], file_type=file_type)
+    stmt = select(Menu).where(Menu.is_delete == False).order_by(Menu.id)
+    # 响应体在接口返回后才发送, 在数据源内部创建会话
+    return exporter.response(stream_query_in_session(stmt), "menus")
 
 
 @router.post("/cache/warm-up", response_model=ResponseSchema)
@@ -0,0 +1,134 @@
+"""
+预编译翻译目录
+加载时把嵌套的翻译展开为点分键, 按 区域 -> 回退区域 -> 默认区域 的顺序合并为每个区域一张扁平表,
+并预先区分静态文本和需要格式化的模板. 翻译时只需两次字典查找; 重新加载时整体替换目录对象
+"""
+
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def flatten(translations: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """
+    把嵌套的翻译展开为点分键
+    :param translations: 翻译, 值为文本或嵌套的翻译
+    :param prefix: 键前缀
+    :return: 扁平的翻译
+    """
+    flat: Dict[str, Any] = {}
+    for key, value in translations.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+class Template:
+    """翻译模板, 不含占位符的文本不做格式化"""
+
+    __slots__ = ("text", "format")
+
+    def __init__(self, text: Any):
+        self.text = text
+        # 含有花括号时绑定 str.format, 格式化沿用 str.format 的语义(包括转义的 {{ }})
+        self.format = text.format if isinstance(text, str) and ("{" in text or "}" in text) else None
+
+    def render(self, params: Dict[str, Any]) -> Any:
+        """
+        格式化模板
+        :param params: 替换参数
+        :return: 格式化后的文本, 参数缺失或格式错误时返回原文本
+        """
+        if self.format is None:
+            return self.text
+        try:
+            return self.format(**params)
+        except KeyError as e:
+            logger.warning(f"Missing translation parameter: {e}")
+            return self.text
+        except Exception as e:
+            logger.error(f"Error formatting translation: {e}")
+            return self.text
+
+
+class CompiledCatalog:
+    """
+    全部区域的翻译目录
+    locales 为 区域代码 -> 具有 fallback 和 translations 属性的对象(Locale)
+    """
+
+    def __init__(self, locales: Dict[str, Any], default_locale: str):
+        self.default_locale = default_locale
+        compiled = {code: self._compile(locale.translations) for code, locale in locales.items()}
+        self.entries: Dict[str, Dict[str, Template]] = {}
+        for code, locale in locales.items():
+            chain = [code]
+            if locale.fallback:
+                chain.append(locale.fallback)
+            if code != default_locale:
+                chain.append(default_locale)
+            merged: Dict[str, Template] = {}
+            # 优先级低的先写入, 高的覆盖
+            for source in reversed(chain):
+                merged.update(compiled.get(source, {}))
+            self.entries[code] = merged
+        # 请求的区域不存在时, 使用以它为回退语言的第一个区域
+        self._aliases: Dict[str, str] = {}
+        for code, locale in locales.items():
+            if locale.fallback and locale.fallback not in self._aliases:
+                self._aliases[locale.fallback] = code
+
+    @staticmethod
+    def _compile(translations: Dict[str, Any]) -> Dict[str, Template]:
+        # 空翻译视为缺失, 继续使用回退语言
+        return {key: Template(value) for key, value in flatten(translations).items() if value}
+
+    def locale_for(self, locale_code: Optional[str] = None) -> str:
+        """
+        解析实际使用的区域
+        :param locale_code: 请求的语言代码
+        :return: 区域代码
+        """
+        if locale_code:
+            if locale_code in self.entries:
+                return locale_code
+            alias = self._aliases.get(locale_code)
+            if alias is not None:
+                return alias
+        return self.default_locale
+
+    def get(self, key: str, locale_code: Optional[str] = None) -> Optional[Template]:
+        """查找翻译模板, 已包含回退语言和默认区域的翻译"""
+        entries = self.entries.get(locale_code) if locale_code else None
+        if entries is None:
+            entries = self.entries[self.locale_for(locale_code)]
+        return entries.get(key)
+
+    def translate(self, key: str, locale_code: Optional[str] = None, **params: Any) -> Any:
+        """
+        翻译文本, 没有翻译时返回翻译键
+        :param key: 翻译键
+        :param locale_code: 语言代码
+        :param params: 替换参数
+        :return: 翻译后的文本
+        """
+        template = self.get(key, locale_code)
+        if template is None:
+            return key
+        if params:
+            return template.render(params)
+        return template.text
+
+    def keys(self, locale_code: Optional[str] = None) -> Iterable[str]:
+        """区域可用的翻译键"""
+        return self.entries[self.locale_for(locale_code)].keys()
+
+
+__all__ = [
+    "CompiledCatalog",
+    "Template",
+    "flatten",
+]
@@ -1,6 +1,7 @@
 """
 国际化支持模块
 实现多语言翻译和本地化
+翻译从预编译的 CompiledCatalog 中查找, 加载、重新加载和修改翻译时整体替换目录
 """
 
 import asyncio
@@ -9,7 +10,7 @@ import logging
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
-from core.config.manager import config_manager
+from core.I18n.catalog import CompiledCatalog
 from core.strong.event_bus import Event, event_bus
 
 logger = logging.getLogger(__name__)
@@ -46,6 +47,7 @@ class I18nManager:
     def __init__(self):
         self._locales: Dict[str, Locale] = {}
         self._default_locale: Optional[str] = None
+        self._catalog: Optional[CompiledCatalog] = None
         self._lock = asyncio.Lock()
         self._initialized = False
 
@@ -60,12 +62,13 @@ class I18nManager:
 
             try:
                 # 加载区域设置
-                await self._load_locales()
+                locales = await self._load_locales()
 
-                # 设置默认区域
-                self._default_locale = config_manager.i18n.DEFAULT_LOCALE
-                if self._default_locale not in self._locales:
-                    raise TranslationError(f"Default locale not found: {self._default_locale}")
+                # 设置默认区域, 配置在初始化时才导入
+                from core.config.manager import config_manager
+
+                default_locale = config_manager.i18n.DEFAULT_LOCALE
+                self._install(locales, default_locale)
 
                 self._initialized = True
                 logger.info("I18n manager initialized successfully")
@@ -74,9 +77,41 @@ class I18nManager:
                 logger.error("Failed to initialize i18n manager", exc_info=e)
                 raise
 
-    async def _load_locales(self) -> None:
+    def _install(self, locales: Dict[str, Locale], default_locale: str) -> None:
+        """编译翻译目录并替换当前的区域设置和目录"""
+        if default_locale not in locales:
+            raise TranslationError(f"Default locale not found: {default_locale}")
+        catalog = CompiledCatalog(locales, default_locale)
+        self._locales = locales
+        self._default_locale = default_locale
+        self._catalog = catalog
+
+    def _replace_translations(self, locale_code: str, translations: Dict[str, Any]) -> Dict[str, Locale]:
+        """复制区域设置并替换其中一个区域的翻译, 当前的区域设置和目录保持不变"""
+        locale = self._locales[locale_code]
+        replaced = Locale(locale.code, locale.name, locale.fallback)
+        replaced.translations = translations
+        return {**self._locales, locale_code: replaced}
+
+    @staticmethod
+    def _locale_dir() -> Path:
+        from core.config.manager import config_manager
+
+        return Path(config_manager.i18n.LOCALE_DIR)
+
+    def _save_translations(self, locale_code: str, translations: Dict[str, Any]) -> None:
+        """保存区域的翻译文件"""
+        translation_file = self._locale_dir() / f"{locale_code}.json"
+        try:
+            with open(translation_file, "w", encoding="utf-8") as f:
+                json.dump(translations, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logger.error(f"Failed to save translation: {e}")
+            raise TranslationError(f"Failed to save translation: {str(e)}")
+
+    async def _load_locales(self) -> Dict[str, Locale]:
         """加载区域设置"""
-        locale_dir = Path(config_manager.i18n.LOCALE_DIR)
+        locale_dir = self._locale_dir()
         if not locale_dir.exists():
             raise TranslationError(f"Locale directory not found: {locale_dir}")
 
@@ -85,6 +120,7 @@ class I18nManager:
         if not config_file.exists():
             raise TranslationError(f"Locale config not found: {config_file}")
 
+        locales: Dict[str, Locale] = {}
         try:
             with open(config_file, "r", encoding="utf-8") as f:
                 config = json.load(f)
@@ -102,11 +138,13 @@ class I18nManager:
                     with open(translation_file, "r", encoding="utf-8") as f:
                         locale.translations = json.load(f)
 
-                self._locales[locale_code] = locale
+                locales[locale_code] = locale
 
         except Exception as e:
             raise TranslationError(f"Failed to load locales: {str(e)}")
 
+        return locales
+
     def get_locale(self, locale_code: Optional[str] = None) -> Locale:
         """
         获取区域设置
@@ -116,19 +154,7 @@ class I18nManager:
         if not self._initialized:
             raise TranslationError("I18n manager not initialized")
 
-        # 使用指定的区域设置
-        if locale_code:
-            locale = self._locales.get(locale_code)
-            if locale:
-                return locale
-
-            # 尝试使用回退语言
-            for code, l in self._locales.items():
-                if l.fallback == locale_code:
-                    return l
-
-        # 使用默认区域设置
-        return self._locales[self._default_locale]
+        return self._locales[self._catalog.locale_for(locale_code)]
 
     def translate(self, key: str, locale_code: Optional[str] = None, **params: Any) -> str:
         """
@@ -141,38 +167,7 @@ class I18nManager:
         if not self._initialized:
             raise TranslationError("I18n manager not initialized")
 
-        # 获取区域设置
-        locale = self.get_locale(locale_code)
-
-        # 查找翻译
-        translation = locale.translations.get(key)
-        if not translation and locale.fallback:
-            # 使用回退语言
-            fallback_locale = self._locales.get(locale.fallback)
-            if fallback_locale:
-                translation = fallback_locale.translations.get(key)
-
-        if not translation:
-            # 使用默认区域设置
-            if locale.code != self._default_locale:
-                translation = self._locales[self._default_locale].translations.get(key)
-
-        if not translation:
-            # 返回翻译键
-            return key
-
-        # 替换参数
-        if params:
-            try:
-                return translation.format(**params)
-            except KeyError as e:
-                logger.warning(f"Missing translation parameter: {e}")
-                return translation
-            except Exception as e:
-                logger.error(f"Error formatting translation: {e}")
-                return translation
-
-        return translation
+        return self._catalog.translate(key, locale_code, **params)
 
     async def reload(self) -> None:
         """重新加载翻译"""
@@ -181,8 +176,9 @@ class I18nManager:
 
         async with self._lock:
             try:
-                # 重新加载区域设置
-                await self._load_locales()
+                # 重新加载区域设置, 加载完成后才替换, 翻译不会看到加载了一半的目录
+                locales = await self._load_locales()
+                self._install(locales, self._default_locale)
 
                 # 发布重新加载事件
                 await event_bus.publish(
@@ -228,18 +224,11 @@ class I18nManager:
             raise TranslationError(f"Locale not found: {locale_code}")
 
         async with self._lock:
-            # 更新翻译
-            locale.translations[key] = value
-
+            # 在副本上更新翻译, 保存成功后再替换目录, 已取得的区域设置和目录不受影响
+            translations = {**self._locales[locale_code].translations, key: value}
             if persist:
-                # 保存到文件
-                translation_file = Path(config_manager.i18n.LOCALE_DIR) / f"{locale_code}.json"
-                try:
-                    with open(translation_file, "w", encoding="utf-8") as f:
-                        json.dump(locale.translations, f, ensure_ascii=False, indent=2)
-                except Exception as e:
-                    logger.error(f"Failed to save translation: {e}")
-                    raise TranslationError(f"Failed to save translation: {str(e)}")
+                self._save_translations(locale_code, translations)
+            self._install(self._replace_translations(locale_code, translations), self._default_locale)
 
             # 发布翻译更新事件
             await event_bus.publish(
@@ -268,19 +257,13 @@ class I18nManager:
             raise TranslationError(f"Locale not found: {locale_code}")
 
         async with self._lock:
-            # 删除翻译
-            if key in locale.translations:
-                del locale.translations[key]
-
+            # 在副本上删除翻译, 保存成功后再替换目录
+            translations = dict(self._locales[locale_code].translations)
+            if key in translations:
+                del translations[key]
                 if persist:
-                    # 保存到文件
-                    translation_file = Path(config_manager.i18n.LOCALE_DIR) / f"{locale_code}.json"
-                    try:
-                        with open(translation_file, "w", encoding="utf-8") as f:
-                            json.dump(locale.translations, f, ensure_ascii=False, indent=2)
-                    except Exception as e:
-                        logger.error(f"Failed to save translation: {e}")
-                        raise TranslationError(f"Failed to save translation: {str(e)}")
+                    self._save_translations(locale_code, translations)
+                self._install(self._replace_translations(locale_code, translations), self._default_locale)
 
                 # 发布翻译删除事件
                 await event_bus.publish(
@@ -32,6 +32,7 @@ from core.cache.config.config import CacheConfig
 from core.config.load.base import BaseConfig
 from core.cache.lock.redis_fair_lock import RedisFairLock
 from core.cache.lock.redis_lock import RedisLock
+from core.cache.lock.redis_lock_core import get_lock_metrics
 from core.cache.lock.redis_lock_downgrade import RedisLockDowngrade
 from core.cache.lock.redis_optimistic_lock import RedisOptimisticLock
 from core.cache.lock.redis_pessimistic_lock import RedisPessimisticLock
@@ -571,6 +572,15 @@ class RedisCacheBackend(CacheBackend, Generic[T]):
         """
         return RedisTableLock(redis_client=self.redis, expire=30)
 
+    def get_lock_metrics(self) -> Dict[str, Dict]:
+        """
+        获取各类锁的争用与等待统计
+
+        Returns:
+            按锁类型汇总的统计
+        """
+        return get_lock_metrics()
+
     async def close(self) -> None:
         """
         关闭Redis连接
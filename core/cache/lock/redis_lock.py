@@ -2,8 +2,6 @@
 Redis分布式锁实现
 """
 
-import asyncio
-import time
 import uuid
 from datetime import timedelta
 from typing import Optional, Union
@@ -12,49 +10,65 @@ from redis.asyncio import Redis
 from redis.exceptions import RedisError
 
 from core.cache.base.interface import DistributedLock
+from core.cache.lock.redis_lock_core import RedisLockCore
 
 
 class RedisLock(DistributedLock):
     """
     Redis分布式锁实现
 
-    基于Redis的分布式锁实现，使用SET命令的NX和PX选项实现锁机制。
-    支持锁超时、自动续期、重入等特性。
+    基于 RedisLockCore: Lua 脚本原子获取/释放, 等待者阻塞在唤醒列表上而不是轮询,
+    每次获取得到单调递增的 fencing token, 持有期间自动续期。
     """
 
     def __init__(
         self,
-        redis: Redis,
+        redis_client: Redis,
         name: str,
         expire: int = 30,
         timeout: Optional[float] = None,
         retry_interval: float = 0.1,
         retry_times: int = 3,
         prefix: str = "lock:",
+        auto_renewal: bool = True,
+        fair: bool = False,
     ):
         """初始化Redis分布式锁
 
         Args:
-            redis: Redis客户端实例
+            redis_client: Redis客户端实例
             name: 锁名称
             expire: 锁的过期时间（秒）
             timeout: 获取锁的超时时间（秒），None表示一直等待
-            retry_interval: 重试间隔（秒）
-            retry_times: 重试次数
+            retry_interval: 保留以兼容旧调用, 等待改由释放时唤醒
+            retry_times: 保留以兼容旧调用
             prefix: 锁键前缀
+            auto_renewal: 持有期间是否自动续期
+            fair: 是否按请求顺序获取
         """
-        self._redis = redis
+        self._redis = redis_client
         self._name = name
         self._expire = expire
         self._timeout = timeout
         self._retry_interval = retry_interval
         self._retry_times = retry_times
         self._prefix = prefix
+        self._auto_renewal = auto_renewal
 
         self._lock_key = f"{self._prefix}{self._name}"
         self._lock_token = str(uuid.uuid4())
         self._locked = False
+        self._lease_lost = False
         self._auto_renewal_task = None
+        self._core = RedisLockCore(
+            redis_client, self._lock_key, expire=expire, fair=fair, kind=prefix.rstrip(":") or "lock"
+        )
+        self.fencing_token: Optional[int] = None
+
+    @property
+    def is_held(self) -> bool:
+        """当前实例是否仍持有有效租约"""
+        return self._locked and not self._lease_lost
 
     async def acquire(self, timeout: Optional[float] = None) -> bool:
         """获取锁
@@ -66,16 +80,19 @@ class RedisLock(DistributedLock):
             bool: 是否成功获取锁
         """
         timeout = timeout if timeout is not None else self._timeout
-        retry_until = time.time() + timeout if timeout is not None else None
-
-        while True:
-            if await self._acquire_lock():
-                return True
-
-            if retry_until is not None and time.time() > retry_until:
-                return False
+        try:
+            token = await self._core.acquire(self._lock_token, timeout)
+        except RedisError:
+            return False
+        if token is None:
+            return False
 
-            await asyncio.sleep(self._retry_interval)
+        self._locked = True
+        self._lease_lost = False
+        self.fencing_token = token
+        if self._auto_renewal:
+            self._start_auto_renewal()
+        return True
 
     async def release(self) -> bool:
         """释放锁
@@ -91,19 +108,9 @@ class RedisLock(DistributedLock):
             self._auto_renewal_task.cancel()
             self._auto_renewal_task = None
 
-        # 使用Lua脚本确保原子性操作
-        script = """
-        if redis.call('get', KEYS[1]) == ARGV[1] then
-            return redis.call('del', KEYS[1])
-        else
-            return 0
-        end
-        """
-
+        self._locked = False
         try:
-            result = await self._redis.eval(script, keys=[self._lock_key], args=[self._lock_token])
-            self._locked = False
-            return bool(result)
+            return await self._core.release(self._lock_token)
         except RedisError:
             return False
 
@@ -111,7 +118,7 @@ class RedisLock(DistributedLock):
         """延长锁的过期时间
 
         Args:
-            additional_time: 要增加的时间（秒或timedelta）
+            additional_time: 新的过期时间（秒或timedelta）
 
         Returns:
             bool: 是否成功延长
@@ -120,24 +127,10 @@ class RedisLock(DistributedLock):
             return False
 
         if isinstance(additional_time, timedelta):
-            additional_time = int(additional_time.total_seconds())
-
-        # 使用Lua脚本确保原子性操作
-        script = """
-        if redis.call('get', KEYS[1]) == ARGV[1] then
-            return redis.call('pexpire', KEYS[1], ARGV[2])
-        else
-            return 0
-        end
-        """
+            additional_time = additional_time.total_seconds()
 
         try:
-            result = await self._redis.eval(
-                script,
-                keys=[self._lock_key],
-                args=[self._lock_token, additional_time * 1000],
-            )
-            return bool(result)
+            return await self._core.extend(self._lock_token, additional_time)
         except RedisError:
             return False
 
@@ -148,40 +141,17 @@ class RedisLock(DistributedLock):
             bool: 锁是否被持有
         """
         try:
-            value = await self._redis.get(self._lock_key)
-            return bool(value)
+            return await self._core.is_locked()
         except RedisError:
             return False
 
-    async def _acquire_lock(self) -> bool:
-        """尝试获取锁的内部方法"""
-        try:
-            success = await self._redis.set(
-                self._lock_key,
-                self._lock_token,
-                nx=True,
-                px=int(self._expire * 1000),
-            )
-            if success:
-                self._locked = True
-                # 启动自动续期任务
-                self._start_auto_renewal()
-            return success
-        except RedisError:
-            return False
+    def _on_lease_lost(self) -> None:
+        self._lease_lost = True
+        self._auto_renewal_task = None
 
     def _start_auto_renewal(self) -> None:
         """启动自动续期任务"""
-
-        async def renew_lock():
-            while True:
-                # 在过期时间的2/3处续期
-                await asyncio.sleep(self._expire * 2 / 3)
-                if not self._locked:
-                    break
-                await self.extend(self._expire)
-
-        self._auto_renewal_task = asyncio.create_task(renew_lock())
+        self._auto_renewal_task = self._core.start_renewal(self._lock_token, on_lost=self._on_lease_lost)
 
     async def __aenter__(self) -> "RedisLock":
         """异步上下文管理器入口"""
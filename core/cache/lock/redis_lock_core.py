@@ -0,0 +1,449 @@
+"""
+Redis 锁核心
+各类 Redis 锁共用的获取/释放/续期逻辑:
+    - Lua 脚本保证获取、释放、续期的原子性(EVALSHA, 只传脚本摘要)
+    - 每次获取返回单调递增的 fencing token, 受保护资源据此拒绝过期持有者的写入
+    - 等待者阻塞在唤醒列表上(BLPOP), 释放时只唤醒一个等待者, 代替 sleep 轮询
+    - 持有期间后台自动续期, 续期失败时标记租约丢失
+    - 按锁类型汇总争用次数与等待时间
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# 锁已无过期时间或刚被释放时, 单次阻塞等待的时长(秒)
+MIN_WAIT_SLICE = 0.05
+# 公平锁等待者的心跳(秒), 心跳过期的队首视为已放弃等待
+FAIR_HEARTBEAT = 2.0
+
+# KEYS: lock, fence, shared, queue; ARGV: owner, ttl_ms, fair, heartbeat_ms
+ACQUIRE_SCRIPT = """
+local lock_key, fence_key, shared_key, queue_key = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local owner, ttl = ARGV[1], tonumber(ARGV[2])
+local fair = ARGV[3] == '1'
+local head = false
+
+if fair then
+    -- 清理心跳已过期(已放弃等待)的队首
+    while true do
+        head = redis.call('lindex', queue_key, 0)
+        if not head or head == owner or redis.call('exists', queue_key .. ':hb:' .. head) == 1 then
+            break
+        end
+        redis.call('lpop', queue_key)
+    end
+end
+
+if (not fair or not head or head == owner) and redis.call('exists', shared_key) == 0
+        and redis.call('set', lock_key, owner, 'NX', 'PX', ttl) then
+    if fair and head == owner then
+        redis.call('lpop', queue_key)
+        redis.call('del', queue_key .. ':hb:' .. owner)
+    end
+    return {redis.call('incr', fence_key), ttl}
+end
+
+if fair then
+    if not redis.call('lpos', queue_key, owner) then
+        redis.call('rpush', queue_key, owner)
+    end
+    redis.call('set', queue_key .. ':hb:' .. owner, 1, 'PX', tonumber(ARGV[4]))
+end
+local pttl = redis.call('pttl', lock_key)
+if pttl < 0 then
+    pttl = redis.call('pttl', shared_key)
+end
+return {0, pttl}
+"""
+
+# KEYS: lock, fence, shared; ARGV: owner, ttl_ms
+ACQUIRE_SHARED_SCRIPT = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return {0, redis.call('pttl', KEYS[1])}
+end
+redis.call('hset', KEYS[3], ARGV[1], 1)
+redis.call('pexpire', KEYS[3], ARGV[2])
+return {redis.call('incr', KEYS[2]), tonumber(ARGV[2])}
+"""
+
+# 唤醒一个等待者: 非公平锁推入共享唤醒列表(已有未消费的唤醒时不重复推入), 公平锁推入队首的唤醒列表
+WAKE_SNIPPET = """
+local function wake(wake_key, queue_key, fair, wake_ttl)
+    local target = wake_key
+    if fair then
+        local head = redis.call('lindex', queue_key, 0)
+        if not head then
+            return
+        end
+        target = wake_key .. ':' .. head
+    end
+    if redis.call('llen', target) == 0 then
+        redis.call('rpush', target, 1)
+    end
+    redis.call('pexpire', target, wake_ttl)
+end
+"""
+
+# KEYS: lock, wake, queue; ARGV: owner, fair, wake_ttl_ms
+RELEASE_SCRIPT = (
+    WAKE_SNIPPET
+    + """
+if redis.call('get', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('del', KEYS[1])
+wake(KEYS[2], KEYS[3], ARGV[2] == '1', ARGV[3])
+return 1
+"""
+)
+
+# KEYS: shared, wake, queue; ARGV: owner, wake_ttl_ms
+RELEASE_SHARED_SCRIPT = (
+    WAKE_SNIPPET
+    + """
+if redis.call('hdel', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+if redis.call('hlen', KEYS[1]) == 0 then
+    wake(KEYS[2], KEYS[3], false, ARGV[2])
+end
+return 1
+"""
+)
+
+# KEYS: lock, shared, wake, queue; ARGV: owner, ttl_ms, wake_ttl_ms
+DOWNGRADE_SCRIPT = (
+    WAKE_SNIPPET
+    + """
+if redis.call('get', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('hset', KEYS[2], ARGV[1], 1)
+redis.call('pexpire', KEYS[2], ARGV[2])
+redis.call('del', KEYS[1])
+wake(KEYS[3], KEYS[4], false, ARGV[3])
+return 1
+"""
+)
+
+# KEYS: lock, shared; ARGV: owner, ttl_ms
+EXTEND_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+if redis.call('hexists', KEYS[2], ARGV[1]) == 1 then
+    return redis.call('pexpire', KEYS[2], ARGV[2])
+end
+return 0
+"""
+
+# KEYS: queue, lock, wake; ARGV: owner, wake_ttl_ms
+LEAVE_QUEUE_SCRIPT = (
+    WAKE_SNIPPET
+    + """
+local head = redis.call('lindex', KEYS[1], 0)
+redis.call('lrem', KEYS[1], 0, ARGV[1])
+redis.call('del', KEYS[1] .. ':hb:' .. ARGV[1])
+if head == ARGV[1] and redis.call('exists', KEYS[2]) == 0 then
+    wake(KEYS[3], KEYS[1], true, ARGV[2])
+end
+return 1
+"""
+)
+
+# KEYS: key, fence_seen; ARGV: value, token
+FENCED_SET_SCRIPT = """
+local token = tonumber(ARGV[2])
+if token < tonumber(redis.call('get', KEYS[2]) or '0') then
+    return 0
+end
+redis.call('set', KEYS[2], token)
+redis.call('set', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+@dataclass
+class LockMetrics:
+    """一类锁的争用与等待统计"""
+
+    acquired: int = 0
+    contended: int = 0  # 需要等待才获得(或超时)的次数
+    timeouts: int = 0
+    released: int = 0
+    renewals: int = 0
+    leases_lost: int = 0
+    wakeups: int = 0  # 被唤醒列表唤醒的次数
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+    recent_waits: Deque[float] = field(default_factory=lambda: deque(maxlen=1024), repr=False)
+
+    def record_wait(self, wait: float) -> None:
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.recent_waits.append(wait)
+
+    def snapshot(self) -> Dict:
+        waits = sorted(self.recent_waits)
+        p95 = waits[min(len(waits) - 1, math.ceil(0.95 * len(waits)) - 1)] if waits else 0.0
+        return {
+            "acquired": self.acquired,
+            "contended": self.contended,
+            "contention_rate": self.contended / self.acquired if self.acquired else 0.0,
+            "timeouts": self.timeouts,
+            "released": self.released,
+            "renewals": self.renewals,
+            "leases_lost": self.leases_lost,
+            "wakeups": self.wakeups,
+            "wait_avg": self.wait_total / self.contended if self.contended else 0.0,
+            "wait_p95": p95,
+            "wait_max": self.wait_max,
+        }
+
+
+_metrics: Dict[str, LockMetrics] = {}
+
+
+def lock_metrics(kind: str) -> LockMetrics:
+    """获取某类锁的统计对象"""
+    return _metrics.setdefault(kind, LockMetrics())
+
+
+def get_lock_metrics() -> Dict[str, Dict]:
+    """所有锁类型的统计快照"""
+    return {kind: metrics.snapshot() for kind, metrics in _metrics.items()}
+
+
+class RedisLockCore:
+    """
+    单个锁键的获取、等待、释放与续期
+    锁键保存持有者标识; 同名的 :fence 计数器提供 fencing token, :shared 哈希保存共享持有者,
+    :wake 列表用于唤醒等待者, :queue 列表为公平锁的等待队列
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        key: str,
+        expire: float = 30,
+        fair: bool = False,
+        kind: str = "lock",
+    ):
+        """
+        :param redis_client: Redis 客户端
+        :param key: 锁键
+        :param expire: 租约时长(秒)
+        :param fair: 是否按到达顺序获取
+        :param kind: 统计用的锁类型名
+        """
+        self.redis = redis_client
+        self.key = key
+        self.fence_key = f"{key}:fence"
+        self.shared_key = f"{key}:shared"
+        self.wake_key = f"{key}:wake"
+        self.queue_key = f"{key}:queue"
+        self.expire = expire
+        self.fair = fair
+        self.metrics = lock_metrics(kind)
+        self._acquire = redis_client.register_script(ACQUIRE_SCRIPT)
+        self._acquire_shared = redis_client.register_script(ACQUIRE_SHARED_SCRIPT)
+        self._release = redis_client.register_script(RELEASE_SCRIPT)
+        self._release_shared = redis_client.register_script(RELEASE_SHARED_SCRIPT)
+        self._downgrade = redis_client.register_script(DOWNGRADE_SCRIPT)
+        self._extend = redis_client.register_script(EXTEND_SCRIPT)
+        self._leave_queue = redis_client.register_script(LEAVE_QUEUE_SCRIPT)
+
+    @property
+    def _ttl_ms(self) -> int:
+        return int(self.expire * 1000)
+
+    def _wake_ttl_ms(self) -> int:
+        return self._ttl_ms
+
+    def _wait_key(self, owner: str) -> str:
+        return f"{self.wake_key}:{owner}" if self.fair else self.wake_key
+
+    async def try_acquire(self, owner: str, shared: bool = False) -> Tuple[Optional[int], int]:
+        """
+        尝试获取一次
+        :param owner: 持有者标识
+        :param shared: 是否获取共享锁
+        :return: (fencing token, 未获得时当前持有者的剩余租约毫秒数)
+        """
+        if shared:
+            token, pttl = await self._acquire_shared(
+                keys=[self.key, self.fence_key, self.shared_key], args=[owner, self._ttl_ms]
+            )
+        else:
+            token, pttl = await self._acquire(
+                keys=[self.key, self.fence_key, self.shared_key, self.queue_key],
+                args=[owner, self._ttl_ms, int(self.fair), int(FAIR_HEARTBEAT * 1000)],
+            )
+        token = int(token)
+        return (token or None), int(pttl)
+
+    async def acquire(self, owner: str, timeout: Optional[float] = None, shared: bool = False) -> Optional[int]:
+        """
+        获取锁, 未获得时阻塞在唤醒列表上, 直到被释放唤醒、持有者租约到期或超时
+        :param owner: 持有者标识
+        :param timeout: 最长等待时间(秒), None 表示一直等待
+        :param shared: 是否获取共享锁
+        :return: fencing token, 超时返回 None
+        """
+        token, pttl = await self.try_acquire(owner, shared)
+        if token is not None:
+            self.metrics.acquired += 1
+            return token
+
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        self.metrics.contended += 1
+        wait_key = self._wait_key(owner)
+        try:
+            while True:
+                # 等到持有者租约到期为止, 公平锁还要按心跳刷新自己在队列中的位置
+                wait = pttl / 1000 if pttl > 0 else MIN_WAIT_SLICE
+                if self.fair:
+                    wait = min(wait, FAIR_HEARTBEAT / 2)
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.metrics.timeouts += 1
+                        self.metrics.record_wait(time.monotonic() - start)
+                        return None
+                    wait = min(wait, remaining)
+                if await self.redis.blpop([wait_key], timeout=max(wait, 0.001)):
+                    self.metrics.wakeups += 1
+
+                token, pttl = await self.try_acquire(owner, shared)
+                if token is not None:
+                    self.metrics.acquired += 1
+                    self.metrics.record_wait(time.monotonic() - start)
+                    if shared:
+                        # 共享锁可以同时持有, 把唤醒传给下一个等待者
+                        await self.notify()
+                    return token
+        finally:
+            if self.fair and token is None:
+                await self.leave_queue(owner)
+
+    async def release(self, owner: str) -> bool:
+        """释放排他锁并唤醒一个等待者"""
+        released = await self._release(
+            keys=[self.key, self.wake_key, self.queue_key], args=[owner, int(self.fair), self._wake_ttl_ms()]
+        )
+        if released:
+            self.metrics.released += 1
+        return bool(released)
+
+    async def release_shared(self, owner: str) -> bool:
+        """释放共享锁, 最后一个共享持有者释放时唤醒等待者"""
+        released = await self._release_shared(
+            keys=[self.shared_key, self.wake_key, self.queue_key], args=[owner, self._wake_ttl_ms()]
+        )
+        if released:
+            self.metrics.released += 1
+        return bool(released)
+
+    async def downgrade(self, owner: str) -> bool:
+        """把排他锁原子地降级为共享锁"""
+        return bool(
+            await self._downgrade(
+                keys=[self.key, self.shared_key, self.wake_key, self.queue_key],
+                args=[owner, self._ttl_ms, self._wake_ttl_ms()],
+            )
+        )
+
+    async def extend(self, owner: str, expire: Optional[float] = None) -> bool:
+        """
+        续期, 仅当仍由 owner 持有时生效
+        :param owner: 持有者标识
+        :param expire: 新的租约时长(秒), 默认为初始租约时长
+        """
+        ttl_ms = int((expire if expire is not None else self.expire) * 1000)
+        return bool(await self._extend(keys=[self.key, self.shared_key], args=[owner, ttl_ms]))
+
+    async def leave_queue(self, owner: str) -> None:
+        """公平锁等待者放弃等待, 若其在队首则唤醒下一位"""
+        try:
+            await self._leave_queue(
+                keys=[self.queue_key, self.key, self.wake_key], args=[owner, self._wake_ttl_ms()]
+            )
+        except RedisError as e:
+            logger.warning(f"Failed to leave lock queue {self.queue_key}: {e}")
+
+    async def notify(self) -> None:
+        """唤醒一个等待者(强制解锁等绕过 release 的场景使用)"""
+        await self.redis.rpush(self.wake_key, 1)
+        await self.redis.pexpire(self.wake_key, self._wake_ttl_ms())
+
+    async def is_locked(self) -> bool:
+        """锁是否被(排他或共享)持有"""
+        return bool(await self.redis.exists(self.key, self.shared_key))
+
+    async def queue(self) -> List[str]:
+        """公平锁等待队列"""
+        items = await self.redis.lrange(self.queue_key, 0, -1)
+        return [item.decode() if isinstance(item, bytes) else item for item in items]
+
+    def start_renewal(
+        self, owner: str, on_lost: Optional[Callable[[], None]] = None, interval: Optional[float] = None
+    ) -> asyncio.Task:
+        """
+        启动后台续期, 每隔租约的 1/3 续期一次; 续期被拒绝(租约已过期被他人获得)时调用 on_lost 并停止
+        :param owner: 持有者标识
+        :param on_lost: 租约丢失回调
+        :param interval: 续期间隔(秒)
+        :return: 续期任务, 释放锁时取消
+        """
+        interval = interval if interval is not None else self.expire / 3
+
+        async def renew():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    extended = await self.extend(owner)
+                except RedisError as e:
+                    # 网络抖动时继续尝试, 租约真正过期后 extend 会返回 0
+                    logger.warning(f"Failed to renew lock {self.key}: {e}")
+                    continue
+                if not extended:
+                    self.metrics.leases_lost += 1
+                    logger.warning(f"Lease lost for lock {self.key}")
+                    if on_lost is not None:
+                        on_lost()
+                    return
+                self.metrics.renewals += 1
+
+        return asyncio.create_task(renew())
+
+
+async def fenced_set(redis_client, key: str, value, token: int) -> bool:
+    """
+    带 fencing token 的写入: token 小于该键见过的最大 token 时拒绝写入,
+    用于防止租约过期后仍在运行的旧持有者覆盖新持有者的数据
+    :param redis_client: Redis 客户端
+    :param key: 写入的键
+    :param value: 值
+    :param token: 写入者持有的 fencing token
+    :return: 是否写入
+    """
+    return bool(await redis_client.eval(FENCED_SET_SCRIPT, 2, key, f"{key}:fence_seen", value, token))
+
+
+__all__ = [
+    "LockMetrics",
+    "RedisLockCore",
+    "fenced_set",
+    "get_lock_metrics",
+    "lock_metrics",
+]
@@ -2,16 +2,17 @@
 Redis-based distributed lock with downgrade support
 """
 
-import asyncio
-import time
 import uuid
+from typing import Optional
 
 from core.cache.base.interface import DistributedLock
+from core.cache.lock.redis_lock_core import RedisLockCore
 
 
 class RedisLockDowngrade(DistributedLock):
     """
     支持锁降级的Redis分布式锁实现
+    排他锁与共享锁共用 RedisLockCore: 排他锁需等待共享持有者全部释放, 等待者由释放唤醒
     """
 
     LOCK_TYPES = {"exclusive": 2, "shared": 1, "none": 0}  # 排他锁  # 共享锁  # 无锁
@@ -23,6 +24,7 @@ class RedisLockDowngrade(DistributedLock):
         timeout: int = None,
         retry_interval: float = 0.1,
         expire: int = 30,
+        auto_renewal: bool = True,
     ):
         """
         初始化可降级的Redis锁
@@ -31,16 +33,21 @@ class RedisLockDowngrade(DistributedLock):
             redis_client: Redis客户端实例
             name: 锁名称
             timeout: 获取锁的超时时间
-            retry_interval: 重试间隔
+            retry_interval: 保留以兼容旧调用, 等待改由释放时唤醒
             expire: 锁的过期时间
+            auto_renewal: 持有期间是否自动续期
         """
         self.redis = redis_client
         self.name = f"lock:{name}"
         self.timeout = timeout
         self.retry_interval = retry_interval
         self.expire = expire
+        self.auto_renewal = auto_renewal
         self._owner = str(uuid.uuid4())
         self._current_lock_type = "none"
+        self._core = RedisLockCore(redis_client, self.name, expire=expire, kind="downgradable_lock")
+        self._renewal_task = None
+        self.fencing_token: Optional[int] = None
 
     async def acquire_exclusive(self) -> bool:
         """
@@ -76,25 +83,8 @@ class RedisLockDowngrade(DistributedLock):
         if self._current_lock_type != "exclusive":
             return False
 
-        lua_script = """
-        local lock_key = KEYS[1]
-        local owner = ARGV[1]
-        local expire = tonumber(ARGV[2])
-        
-        if redis.call('get', lock_key) == owner then
-            redis.call('hset', lock_key .. ':shared', owner, 1)
-            redis.call('expire', lock_key .. ':shared', expire)
-            redis.call('del', lock_key)
-            return 1
-        end
-        return 0
-        """
-
-        success = await self.redis.eval(
-            lua_script,
-            keys=[self.name],
-            args=[self._owner, self.expire],
-        )
+        # 原子地转为共享锁, 并唤醒等待的共享锁请求
+        success = await self._core.downgrade(self._owner)
 
         if success:
             self._current_lock_type = "shared"
@@ -111,87 +101,32 @@ class RedisLockDowngrade(DistributedLock):
         Returns:
             bool: 是否成功获取锁
         """
-        start_time = time.time()
-
-        while True:
-            if lock_type == "exclusive":
-                success = await self._try_acquire_exclusive()
-            else:
-                success = await self._try_acquire_shared()
-
-            if success:
-                return True
-
-            if self.timeout is not None:
-                if time.time() - start_time >= self.timeout:
-                    return False
-
-            await asyncio.sleep(self.retry_interval)
-
-    async def _try_acquire_exclusive(self) -> bool:
-        """尝试获取排他锁"""
-        return await self.redis.set(self.name, self._owner, ex=self.expire, nx=True)
-
-    async def _try_acquire_shared(self) -> bool:
-        """尝试获取共享锁"""
-        lua_script = """
-        local lock_key = KEYS[1]
-        local shared_key = lock_key .. ':shared'
-        local owner = ARGV[1]
-        local expire = tonumber(ARGV[2])
-        
-        if redis.call('exists', lock_key) == 0 then
-            redis.call('hset', shared_key, owner, 1)
-            redis.call('expire', shared_key, expire)
-            return 1
-        end
-        return 0
-        """
+        token = await self._core.acquire(self._owner, self.timeout, shared=lock_type == "shared")
+        if token is None:
+            return False
+
+        self.fencing_token = token
+        if self.auto_renewal and self._renewal_task is None:
+            self._renewal_task = self._core.start_renewal(self._owner, on_lost=self._on_lease_lost)
+        return True
 
-        return await self.redis.eval(
-            lua_script,
-            keys=[self.name],
-            args=[self._owner, self.expire],
-        )
+    def _on_lease_lost(self) -> None:
+        self._current_lock_type = "none"
+        self._renewal_task = None
 
     async def release(self) -> None:
         """释放锁"""
+        if self._renewal_task:
+            self._renewal_task.cancel()
+            self._renewal_task = None
+
         if self._current_lock_type == "exclusive":
-            await self._release_exclusive()
+            await self._core.release(self._owner)
         elif self._current_lock_type == "shared":
-            await self._release_shared()
+            await self._core.release_shared(self._owner)
 
         self._current_lock_type = "none"
 
-    async def _release_exclusive(self) -> None:
-        """释放排他锁"""
-        lua_script = """
-        local lock_key = KEYS[1]
-        local owner = ARGV[1]
-        
-        if redis.call('get', lock_key) == owner then
-            return redis.call('del', lock_key)
-        end
-        return 0
-        """
-
-        await self.redis.eval(lua_script, keys=[self.name], args=[self._owner])
-
-    async def _release_shared(self) -> None:
-        """释放共享锁"""
-        lua_script = """
-        local lock_key = KEYS[1]
-        local shared_key = lock_key .. ':shared'
-        local owner = ARGV[1]
-        
-        redis.call('hdel', shared_key, owner)
-        if redis.call('hlen', shared_key) == 0 then
-            redis.call('del', shared_key)
-        end
-        """
-
-        await self.redis.eval(lua_script, keys=[self.name], args=[self._owner])
-
     async def is_locked(self) -> bool:
         """
         检查锁是否被持有
@@ -199,9 +134,7 @@ class RedisLockDowngrade(DistributedLock):
         Returns:
             bool: 锁是否被持有
         """
-        exclusive_exists = await self.redis.exists(self.name)
-        shared_exists = await self.redis.exists(f"{self.name}:shared")
-        return bool(exclusive_exists or shared_exists)
+        return await self._core.is_locked()
 
     async def get_lock_type(self) -> str:
         """
@@ -2,12 +2,12 @@
 Redis-based pessimistic lock implementation
 """
 
-import asyncio
 import time
 import uuid
 from typing import Optional
 
 from core.cache.base.interface import PessimisticLock
+from core.cache.lock.redis_lock_core import RedisLockCore
 
 
 class RedisPessimisticLock(PessimisticLock):
@@ -22,6 +22,7 @@ class RedisPessimisticLock(PessimisticLock):
         timeout: Optional[int] = None,
         retry_interval: float = 0.1,
         expire: int = 30,
+        auto_renewal: bool = True,
     ):
         """
         初始化悲观锁
@@ -30,16 +31,21 @@ class RedisPessimisticLock(PessimisticLock):
             redis_client: Redis客户端实例
             name: 锁名称
             timeout: 获取锁的超时时间
-            retry_interval: 重试间隔
+            retry_interval: 保留以兼容旧调用, 等待改由释放时唤醒
             expire: 锁的过期时间
+            auto_renewal: 持有期间是否自动续期
         """
         self.redis = redis_client
         self.name = f"pessimistic_lock:{name}"
         self.timeout = timeout
         self.retry_interval = retry_interval
         self.expire = expire
+        self.auto_renewal = auto_renewal
         self._owner = str(uuid.uuid4())
         self._lock_time = None
+        self._core = RedisLockCore(redis_client, self.name, expire=expire, kind="pessimistic_lock")
+        self._renewal_task = None
+        self.fencing_token: Optional[int] = None
 
     async def acquire(self) -> bool:
         """获取锁"""
@@ -55,20 +61,16 @@ class RedisPessimisticLock(PessimisticLock):
         Returns:
             bool: 是否成功获取锁
         """
-        start_time = time.time()
         timeout = timeout or self.timeout
+        token = await self._core.acquire(self._owner, timeout)
+        if token is None:
+            return False
 
-        while True:
-            success = await self._try_acquire()
-            if success:
-                self._lock_time = time.time()
-                return True
-
-            if timeout is not None:
-                if time.time() - start_time >= timeout:
-                    return False
-
-            await asyncio.sleep(self.retry_interval)
+        self.fencing_token = token
+        self._lock_time = time.time()
+        if self.auto_renewal:
+            self._renewal_task = self._core.start_renewal(self._owner, on_lost=self._on_lease_lost)
+        return True
 
     async def _try_acquire(self) -> bool:
         """
@@ -77,34 +79,24 @@ class RedisPessimisticLock(PessimisticLock):
         Returns:
             bool: 是否成功获取锁
         """
-        lua_script = """
-        local lock_key = KEYS[1]
-        local owner = ARGV[1]
-        local expire = tonumber(ARGV[2])
-        
-        if redis.call('exists', lock_key) == 0 then
-            redis.call('set', lock_key, owner)
-            redis.call('expire', lock_key, expire)
-            return 1
-        end
-        return 0
-        """
+        token, _ = await self._core.try_acquire(self._owner)
+        if token is not None:
+            self.fencing_token = token
+        return token is not None
+
+    def _on_lease_lost(self) -> None:
+        self._lock_time = None
+        self._renewal_task = None
 
-        return bool(await self.redis.eval(lua_script, keys=[self.name], args=[self._owner, self.expire]))
+    def _stop_renewal(self) -> None:
+        if self._renewal_task:
+            self._renewal_task.cancel()
+            self._renewal_task = None
 
     async def release(self) -> None:
         """释放锁"""
-        lua_script = """
-        local lock_key = KEYS[1]
-        local owner = ARGV[1]
-        
-        if redis.call('get', lock_key) == owner then
-            return redis.call('del', lock_key)
-        end
-        return 0
-        """
-
-        await self.redis.eval(lua_script, keys=[self.name], args=[self._owner])
+        self._stop_renewal()
+        await self._core.release(self._owner)
         self._lock_time = None
 
     async def force_unlock(self) -> bool:
@@ -114,7 +106,10 @@ class RedisPessimisticLock(PessimisticLock):
         Returns:
             bool: 是否成功解锁
         """
-        return bool(await self.redis.delete(self.name))
+        unlocked = bool(await self.redis.delete(self.name))
+        if unlocked:
+            await self._core.notify()
+        return unlocked
 
     async def get_hold_time(self) -> Optional[float]:
         """
@@ -134,36 +129,19 @@ class RedisPessimisticLock(PessimisticLock):
         Returns:
             bool: 锁是否被持有
         """
-        return await self.redis.exists(self.name)
+        return await self._core.is_locked()
 
     async def extend(self, additional_time: int) -> bool:
         """
         延长锁的过期时间
 
         Args:
-            additional_time: 要增加的时间（秒）
+            additional_time: 新的过期时间（秒）
 
         Returns:
             bool: 是否成功延长
         """
-        lua_script = """
-        local lock_key = KEYS[1]
-        local owner = ARGV[1]
-        local additional_time = tonumber(ARGV[2])
-        
-        if redis.call('get', lock_key) == owner then
-            return redis.call('expire', lock_key, additional_time)
-        end
-        return 0
-        """
-
-        return bool(
-            await self.redis.eval(
-                lua_script,
-                keys=[self.name],
-                args=[self._owner, additional_time],
-            )
-        )
+        return await self._core.extend(self._owner, additional_time)
 
     async def __aenter__(self):
         """异步上下文管理器入口"""
@@ -25,6 +25,8 @@ class AppConfig(BaseConfig):
     port: int = Field(default=8000, description="服务器端口")
     workers: int = Field(default=1, description="工作进程数")
     reload: bool = Field(default=False, description="是否自动重载")
+    startup_budget: float = Field(default=10.0, description="启动耗时预算(秒), 超出时告警")
+    preload_tasks: bool = Field(default=False, description="启动后是否在后台初始化任务管理器(需要可用的消息代理)")
 
     # API配置
     api_v1_str: str = Field(default="/api/v1", description="API前缀")
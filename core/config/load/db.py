@@ -13,7 +13,7 @@ class DatabaseConfig(BaseConfig):
     # 数据库连接配置
     driver: str = Field(default="mysql+asyncmy", description="数据库驱动")
     host: str = Field(default="localhost", description="数据库主机")
-    port: int = Field(default=your_port, description="数据库端口")
+    port: int = Field(default=3306, description="数据库端口")
     username: str = Field(default="project_name", description="数据库用户名")
     password: str = Field(default="bSCKN64kJjXT5f5J", description="数据库密码")
     database: str = Field(default="project_name", description="数据库名")
@@ -33,7 +33,7 @@ class DatabaseConfig(BaseConfig):
 
     # 读写分离配置
     read_hosts: List[str] = Field(default=["localhost"], description="只读数据库主机列表")
-    read_ports: List[int] = Field(default=[your_port], description="只读数据库端口列表")
+    read_ports: List[int] = Field(default=[3306], description="只读数据库端口列表")
     read_usernames: List[str] = Field(default=["project_name"], description="只读数据库用户名列表")
     read_passwords: List[str] = Field(default=["bSCKN64kJjXT5f5J"], description="只读数据库密码列表")
     read_databases: List[str] = Field(default=["project_name"], description="只读数据库名列表")
@@ -24,6 +24,9 @@ class ServiceConfig(BaseConfig):
     SERVICE_CHECK_INTERVAL: str = "10s"
     SERVICE_CHECK_TIMEOUT: str = "5s"
     SERVICE_CHECK_DEREGISTER_AFTER: str = "1m"
+    SERVICE_DISCOVERY_CACHE_TTL: int = 30  # 实例缓存有效期(秒)
+    SERVICE_OUTLIER_CONSECUTIVE_FAILURES: int = 5  # 连续失败多少次后摘除实例
+    SERVICE_OUTLIER_EJECTION_TIME: int = 30  # 首次摘除的时长(秒), 随摘除次数增长
 
 
 class AliYunConfig:
@@ -150,7 +153,10 @@ class UtilsConfig:
     BACKUP_RETENTION_DAYS: int = 30
     BACKUP_COMPRESSION: bool = True
     BACKUP_SCHEDULE: str = "0 0 * * *"  # 每天凌晨
-    BACKUP_MAX_SIZE: int = 1024 * 1024 * 1024  # 1GB
+    BACKUP_MAX_SIZE: int = 1024 * 1024 * 1024  # 1GB, 单次备份写入存储的上限
+    BACKUP_MODE: str = "incremental"  # full/incremental/differential
+    BACKUP_WORKERS: int = 0  # 压缩线程数, 0 表示 CPU 数
+    BACKUP_BANDWIDTH_LIMIT: int = 0  # 写入存储的限速(字节/秒), 0 表示不限速
 
     # 灾难恢复配置
     DR_ENABLED: bool = False
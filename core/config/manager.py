@@ -11,7 +11,7 @@ import logging
 from typing import Dict
 
 from cache.config.config import RedisConfig
-from core.config.setting import settings
+from core.config.setting import settings, settings_store
 
 
 class ConfigManager:
@@ -19,6 +19,9 @@ class ConfigManager:
 
     _instance = None
 
+    # 管理器名称 -> 配置快照中的配置节
+    _SETTINGS_SECTIONS = {"database": "db", "logger": "log"}
+
     def __new__(cls):
         """
         使用单例模式确保全局只有一个配置管理实例
@@ -183,9 +186,14 @@ class ConfigManager:
     async def reload(self):
         """重新加载配置"""
         try:
-            # 更新各个管理器
+            # 先完整加载并校验新配置, 校验失败时保留旧配置
+            current = settings_store.reload().model()
+
+            # 更新各个管理器, 传入校验过的配置对象; 没有对应配置节的管理器不需要重新加载
             for name, manager in self._managers.items():
-                config = settings.get_config(name)
+                config = getattr(current, self._SETTINGS_SECTIONS.get(name, name), None)
+                if config is None:
+                    continue
                 await manager.reload(config)
 
             self._logger.info("Configuration reloaded successfully")
@@ -14,6 +14,7 @@ from core.config import *  # noqa
 from core.config.load.configMeta import ConfigMeta
 from core.config.load.i18n import I18NConfig
 from core.config.load.log import LogConfig
+from core.config.settings.snapshot import SettingsStore
 from core.middlewares.base import MiddlewareConfig
 from security.audit.config import AuditConfig
 from tasks.config import TaskConfig
@@ -53,3 +54,20 @@ def get_settings() -> Settings:
 
 
 settings = get_settings()
+
+
+def _resolve_settings() -> Settings:
+    """重新读取 .env 和环境变量, 返回校验后的配置"""
+    return Settings()
+
+
+# 只读配置快照, 热路径上使用 settings_store.current.<节>.<字段>; 重新加载时整体替换
+settings_store = SettingsStore(_resolve_settings, initial=settings)
+
+
+def current_settings() -> Settings:
+    """
+    当前生效的配置, 热加载后返回新的配置对象
+    模块级的 settings 是启动时的配置, 请求路径上需要跟随热加载的配置应调用本函数, 同一请求内只调用一次
+    """
+    return settings_store.current.model()
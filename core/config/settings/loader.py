@@ -9,6 +9,7 @@ from typing import Any, Dict, Type
 import yaml
 
 from core.config.load.base import BaseConfig, BaseSettings
+from core.config.settings.snapshot import SettingsSnapshot, SettingsStore
 
 logger = logging.getLogger(__name__)
 
@@ -240,6 +241,10 @@ class SettingsLoader:
 
     def load_all(self, config_dir: Path, env: str = "development") -> None:
         """加载所有配置"""
+        self._settings_instances = self._build_instances(config_dir, env)
+
+    def _build_instances(self, config_dir: Path, env: str) -> Dict[str, BaseSettings]:
+        """加载、合并并校验所有配置"""
         # 加载配置文件
         config_data = self._load_config_files(config_dir, env)
 
@@ -250,12 +255,30 @@ class SettingsLoader:
         merged_config = self._merge_configs(config_data, env_config)
 
         # 创建配置实例
-        self._create_settings_instances(merged_config, env)
+        return self._create_settings_instances(merged_config, env)
 
     def get(self, key: str) -> BaseSettings:
         """获取配置实例"""
         return self._settings_instances.get(key)
 
+    def snapshot(self) -> SettingsSnapshot:
+        """当前配置实例的只读快照"""
+        return SettingsSnapshot({key: instance.model_dump() for key, instance in self._settings_instances.items()})
+
+    def create_store(self, config_dir: Path, env: str = "development") -> SettingsStore:
+        """
+        创建配置快照存储, 每次重新加载时重新读取文件和环境变量并校验, 校验通过后才替换快照
+        :param config_dir: 配置目录
+        :param env: 运行环境
+        :return: 配置快照存储
+        """
+
+        def resolve() -> Dict[str, Any]:
+            self._settings_instances = self._build_instances(config_dir, env)
+            return {key: instance.model_dump() for key, instance in self._settings_instances.items()}
+
+        return SettingsStore(resolve)
+
     def _load_config_files(self, config_dir: Path, env: str) -> Dict[str, Any]:
         """加载配置文件"""
         config_data = {}
@@ -311,9 +334,11 @@ class SettingsLoader:
                 result[key] = value
         return result
 
-    def _create_settings_instances(self, config: Dict[str, Any], env: str) -> None:
+    def _create_settings_instances(self, config: Dict[str, Any], env: str) -> Dict[str, BaseSettings]:
         """创建配置实例"""
+        instances = {}
         for key, settings_class in self._settings_classes.items():
             settings_data = config.get(key, {})
             settings_data["metadata"] = {"environment": env, "name": key}
-            self._settings_instances[key] = settings_class(**settings_data)
+            instances[key] = settings_class(**settings_data)
+        return instances
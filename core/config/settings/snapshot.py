@@ -0,0 +1,256 @@
+"""
+不可变的配置快照
+加载时把合并、校验后的配置编译为只读对象: 属性访问就是普通的实例属性查找, 不再合并字典或校验;
+SettingsStore 持有当前快照, 重新加载时先完整构建并校验新快照, 再一次性替换并通知订阅者.
+同一请求内应只读取一次 store.current, 之后的访问都在同一个快照上, 不会混用新旧配置
+"""
+
+import logging
+import threading
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class FrozenSettingsError(AttributeError):
+    """修改只读配置"""
+
+    pass
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        return FrozenSection(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
+def _thaw(value: Any) -> Any:
+    if isinstance(value, FrozenSection):
+        return value.to_dict()
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+
+class FrozenSection:
+    """
+    只读的配置节点, 子节点同样只读(字典转为 FrozenSection, 列表转为元组)
+    键与方法名(get、to_dict)相同时属性访问返回配置值, 方法仍可通过 FrozenSection.get(section, ...) 调用
+    """
+
+    def __init__(self, data: Mapping[str, Any]):
+        values = {str(key): _freeze(value) for key, value in data.items()}
+        object.__setattr__(self, "_values", MappingProxyType(values))
+        for key, value in values.items():
+            if key.isidentifier() and not key.startswith("_"):
+                object.__setattr__(self, key, value)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise FrozenSettingsError(f"Settings are read-only: cannot set {name}")
+
+    def __delattr__(self, name: str) -> None:
+        raise FrozenSettingsError(f"Settings are read-only: cannot delete {name}")
+
+    def __getattr__(self, name: str) -> Any:
+        # 只有实例属性中不存在时才会调用
+        raise AttributeError(f"Unknown setting: {name}")
+
+    def __getitem__(self, key: str) -> Any:
+        return self._values[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._values
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, FrozenSection):
+            return NotImplemented
+        return self._values == other._values
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({dict(self._values)!r})"
+
+    def items(self):
+        return self._values.items()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """按键获取, 支持点分路径"""
+        node: Any = self
+        for part in key.split("."):
+            if not isinstance(node, FrozenSection) or part not in node._values:
+                return default
+            node = node._values[part]
+        return node
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为普通字典(可修改的副本)"""
+        return {key: _thaw(value) for key, value in self._values.items()}
+
+
+class SettingsSnapshot(FrozenSection):
+    """
+    配置快照的根节点, 预先建立点分路径索引
+    由校验过的配置对象(如 pydantic Settings)生成时同时保留该对象, 通过 model() 获取
+    """
+
+    def __init__(self, data: Mapping[str, Any], version: int = 0, model: Any = None):
+        super().__init__(data)
+        index: Dict[str, Any] = {}
+        leaves: Dict[str, Any] = {}
+        self._build_index(self, "", index, leaves)
+        object.__setattr__(self, "_version", version)
+        object.__setattr__(self, "_index", index)
+        object.__setattr__(self, "_leaves", leaves)
+        object.__setattr__(self, "_model", model)
+
+    @classmethod
+    def from_model(cls, model: Any, version: int = 0) -> "SettingsSnapshot":
+        """由校验过的配置对象生成快照"""
+        return cls(model.model_dump(), version=version, model=model)
+
+    def model(self) -> Any:
+        """生成快照的配置对象, 包含配置类的属性和方法(如 db.url); 由字典生成时为 None"""
+        return self._model
+
+    @staticmethod
+    def _build_index(section: FrozenSection, prefix: str, index: Dict[str, Any], leaves: Dict[str, Any]) -> None:
+        for key, value in section._values.items():
+            path = f"{prefix}{key}"
+            index[path] = value
+            if isinstance(value, FrozenSection):
+                SettingsSnapshot._build_index(value, f"{path}.", index, leaves)
+            else:
+                leaves[path] = value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """按点分路径获取, 一次字典查找"""
+        return self._index.get(key, default)
+
+    def diff(self, other: "SettingsSnapshot") -> Set[str]:
+        """与另一个快照相比发生变化的叶子路径"""
+        mine, theirs = self._leaves, other._leaves
+        changed = {path for path, value in mine.items() if path not in theirs or theirs[path] != value}
+        changed.update(path for path in theirs if path not in mine)
+        return changed
+
+
+SettingsListener = Callable[[Optional[SettingsSnapshot], SettingsSnapshot, Set[str]], Any]
+
+
+class SettingsStore:
+    """
+    配置快照存储
+    读取 current 不加锁; 加载和重新加载串行执行, 新快照校验通过后才替换, 失败时保留旧快照
+    """
+
+    def __init__(
+        self,
+        source: Callable[[], Mapping[str, Any]],
+        validator: Optional[Callable[[Dict[str, Any]], Mapping[str, Any]]] = None,
+        initial: Optional[Mapping[str, Any]] = None,
+    ):
+        """
+        :param source: 返回合并后配置的函数(文件、环境变量等), 每次加载时调用; 可以返回字典或校验过的配置对象
+        :param validator: 校验并补全配置的函数, 校验失败时抛出异常
+        :param initial: 已经校验过的初始配置(字典或配置对象), 指定时不再调用 source
+        """
+        self._source = source
+        self._validator = validator
+        self._lock = threading.Lock()
+        self._listeners: List[Tuple[str, SettingsListener]] = []
+        self._snapshot: Optional[SettingsSnapshot] = None
+        self.reloads = 0
+        self.failed_reloads = 0
+        if initial is not None:
+            self._snapshot = self._snapshot_of(initial, version=1)
+
+    @property
+    def current(self) -> SettingsSnapshot:
+        """当前快照, 尚未加载时先加载"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.load()
+        return snapshot
+
+    @property
+    def version(self) -> int:
+        snapshot = self._snapshot
+        return snapshot._version if snapshot is not None else 0
+
+    @staticmethod
+    def _snapshot_of(value: Any, version: int) -> SettingsSnapshot:
+        if hasattr(value, "model_dump"):
+            return SettingsSnapshot.from_model(value, version=version)
+        return SettingsSnapshot(value, version=version)
+
+    def _build(self, version: int) -> SettingsSnapshot:
+        value = self._source()
+        if self._validator is not None:
+            data = value.model_dump() if hasattr(value, "model_dump") else dict(value)
+            value = dict(self._validator(data))
+        return self._snapshot_of(value, version)
+
+    def load(self) -> SettingsSnapshot:
+        """加载配置并替换当前快照, 校验失败时抛出异常且保留旧快照"""
+        with self._lock:
+            old = self._snapshot
+            try:
+                new = self._build(old._version + 1 if old is not None else 1)
+            except Exception as e:
+                self.failed_reloads += 1
+                logger.error(f"Failed to load settings, keeping version {old._version if old else 0}: {e}")
+                raise
+            changed = new.diff(old) if old is not None else set(new._leaves)
+            self._snapshot = new
+            self.reloads += 1
+        if changed:
+            self._notify(old, new, changed)
+        return new
+
+    reload = load
+
+    def subscribe(self, listener: SettingsListener, prefix: str = "") -> Callable[[], None]:
+        """
+        订阅配置变化, listener(old, new, changed) 在替换快照后调用
+        :param listener: 回调函数
+        :param prefix: 只在该前缀下的配置变化时通知, 例如 "db."
+        :return: 取消订阅的函数
+        """
+        entry = (prefix, listener)
+        self._listeners.append(entry)
+
+        def unsubscribe() -> None:
+            if entry in self._listeners:
+                self._listeners.remove(entry)
+
+        return unsubscribe
+
+    def _notify(self, old: Optional[SettingsSnapshot], new: SettingsSnapshot, changed: Set[str]) -> None:
+        for prefix, listener in list(self._listeners):
+            relevant = {path for path in changed if path.startswith(prefix)} if prefix else changed
+            if not relevant:
+                continue
+            try:
+                listener(old, new, relevant)
+            except Exception as e:
+                logger.error(f"Settings listener error: {e}")
+
+
+__all__ = [
+    "FrozenSection",
+    "FrozenSettingsError",
+    "SettingsSnapshot",
+    "SettingsStore",
+]
@@ -8,6 +8,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm.exc import StaleDataError
 
 from core.db.core.base import DBBase
+from core.db.core.loader import model_loader
+from core.db.utils.bulk import bulk_insert, bulk_update, bulk_upsert, to_row
+from core.db.utils.keyset import KeysetPage, KeysetPaginator, OffsetPage, TotalMode, fetch_offset_page, resolve_total
 from db.metrics.pagination import PaginationParams
 
 ModelType = TypeVar("ModelType", bound=DBBase)
@@ -34,6 +37,34 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         result = await db.execute(query)
         return result.scalar_one_or_none()
 
+    async def load(self, db: AsyncSession, id: Any) -> Optional[ModelType]:
+        """按ID加载单个对象
+        与同一事件循环轮次内的其他 load 调用合并为一次 IN 查询, 会话内按ID缓存,
+        用于在循环或并发任务中解析关联对象, 避免 N+1 查询
+        Args:
+            db: 数据库会话
+            id: 对象ID
+        """
+        if id is None:
+            return None
+        return await model_loader(db, self.model, only_active=True).load(id)
+
+    async def load_many(self, db: AsyncSession, ids: List[Any]) -> List[Optional[ModelType]]:
+        """按ID批量加载对象, 结果与ID顺序一致, 不存在的为 None
+        Args:
+            db: 数据库会话
+            ids: 对象ID列表(可重复)
+        """
+        return await model_loader(db, self.model, only_active=True).load_many(ids)
+
+    def _filtered_query(self, filters: Dict[str, Any] = None):
+        """未删除且满足等值过滤条件的基础查询"""
+        query = select(self.model).where(self.model.is_deleted == False)
+        for field, value in (filters or {}).items():
+            if value is not None:
+                query = query.where(getattr(self.model, field) == value)
+        return query
+
     async def get_multi(
         self,
         db: AsyncSession,
@@ -41,20 +72,18 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         pagination: PaginationParams,
         filters: Dict[str, Any] = None,
         order_by: List[str] = None,
-    ) -> tuple[List[ModelType], int]:
+        total_mode: TotalMode = TotalMode.EXACT,
+    ) -> OffsetPage[ModelType]:
         """获取多个对象
         Args:
             pagination: 分页参数
             filters: 过滤条件
             order_by: 排序字段
+            total_mode: 总数统计方式, NONE 时返回的总数为 None
+        Returns:
+            OffsetPage: 分页结果, 可按 (数据列表, 总数) 解包
         """
-        filters = filters or {}
-        query = select(self.model).where(self.model.is_deleted == False)
-
-        # 应用过滤条件
-        for field, value in filters.items():
-            if value is not None:
-                query = query.where(getattr(self.model, field) == value)
+        query = self._filtered_query(filters)
 
         # 应用排序
         if order_by:
@@ -64,14 +93,32 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
                 else:
                     query = query.order_by(getattr(self.model, field).asc())
 
-        # 获取总数
-        count_query = select(func.count()).select_from(query.subquery())
-        total = await db.scalar(count_query)
+        # 获取总数并分页, 多取一行判断是否有下一页
+        return await fetch_offset_page(db, query, pagination.page, pagination.size, total_mode)
 
-        # 分页
-        query = query.offset((pagination.page - 1) * pagination.size).limit(pagination.size)
-        result = await db.execute(query)
-        return result.scalars().all(), total
+    async def get_page(
+        self,
+        db: AsyncSession,
+        *,
+        size: int = 20,
+        cursor: Optional[str] = None,
+        filters: Dict[str, Any] = None,
+        order_by: List[str] = None,
+        total_mode: TotalMode = TotalMode.NONE,
+    ) -> KeysetPage[ModelType]:
+        """键集分页获取多个对象, 任意深度的翻页代价相同
+        Args:
+            size: 每页数量
+            cursor: 上一次返回的 next_cursor / prev_cursor, 为空表示第一页
+            filters: 过滤条件
+            order_by: 排序字段, 如 ["-created_at"], 自动以 id 作为决胜字段
+            total_mode: 总数统计方式
+        """
+        paginator = KeysetPaginator(self.model, sort=order_by, cursor=cursor, size=size)
+        query = self._filtered_query(filters)
+        total, estimated = await resolve_total(db, query, total_mode)
+        result = await db.execute(paginator.apply(query))
+        return paginator.build_page(result.scalars().all(), total=total, total_estimated=estimated)
 
     async def create(self, db: AsyncSession, *, obj_in: Union[CreateSchemaType, Dict[str, Any]]) -> ModelType:
         """创建对象"""
@@ -89,20 +136,34 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     async def bulk_create(
         self, db: AsyncSession, *, objs_in: List[Union[CreateSchemaType, Dict[str, Any]]]
     ) -> List[ModelType]:
-        """批量创建对象"""
-        db_objs = []
-        for obj_in in objs_in:
-            if isinstance(obj_in, dict):
-                obj_in_data = obj_in
-            else:
-                obj_in_data = jsonable_encoder(obj_in)
-            db_obj = self.model(**obj_in_data)
-            db_objs.append(db_obj)
+        """批量创建对象
+        多行 INSERT ... RETURNING 一次取回主键和默认值, 不再逐个 refresh
+        """
+        db_objs = await bulk_insert(db, self.model, [to_row(obj_in) for obj_in in objs_in])
+        await db.commit()
+        return db_objs
 
-        db.add_all(db_objs)
+    async def bulk_upsert(
+        self,
+        db: AsyncSession,
+        *,
+        objs_in: List[Union[CreateSchemaType, Dict[str, Any]]],
+        conflict_keys: List[str],
+        update_fields: Optional[List[str]] = None,
+    ) -> List[ModelType]:
+        """批量插入或更新对象
+        Args:
+            conflict_keys: 唯一约束列
+            update_fields: 冲突时更新的列, None 表示全部非冲突列, 空列表表示冲突时忽略
+        """
+        db_objs = await bulk_upsert(
+            db,
+            self.model,
+            [to_row(obj_in) for obj_in in objs_in],
+            conflict_keys=conflict_keys,
+            update_fields=update_fields,
+        )
         await db.commit()
-        for obj in db_objs:
-            await db.refresh(obj)
         return db_objs
 
     async def update(
@@ -135,11 +196,12 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     async def bulk_update(
         self, db: AsyncSession, *, objs: List[tuple[ModelType, Union[UpdateSchemaType, Dict[str, Any]]]]
     ) -> List[ModelType]:
-        """批量更新对象"""
-        updated_objs = []
-        for db_obj, obj_in in objs:
-            updated_obj = await self.update(db=db, db_obj=db_obj, obj_in=obj_in)
-            updated_objs.append(updated_obj)
+        """批量更新对象
+        按主键合并为一条 UPDATE ... CASE 语句, 会话中的对象随 RETURNING 结果刷新
+        """
+        rows = [{"id": db_obj.id, **to_row(obj_in, exclude_unset=True)} for db_obj, obj_in in objs]
+        updated_objs = await bulk_update(db, self.model, rows)
+        await db.commit()
         return updated_objs
 
     async def remove(self, db: AsyncSession, *, id: int, force: bool = False) -> ModelType:
@@ -154,6 +216,7 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
             else:
                 obj.soft_delete()
             await db.commit()
+            model_loader(db, self.model, only_active=True).clear(id)
         return obj
 
     async def bulk_remove(self, db: AsyncSession, *, ids: List[int], force: bool = False) -> List[ModelType]:
@@ -0,0 +1,246 @@
+"""
+批量加载器
+DataLoader 风格的按键合并查询: 同一事件循环轮次内发起的 load(key) 去重后合并为一次 IN 查询,
+加载器挂在会话上, 随请求会话的生命周期失效
+
+同一会话不支持并发执行查询(AsyncSession 会报错), 会话上所有加载器的批量查询通过会话级的锁依次执行
+"""
+
+import asyncio
+import inspect
+from collections import defaultdict
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+from sqlalchemy import select
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+BatchFunction = Callable[[List[K]], Awaitable[Union[Mapping[K, V], Sequence[V]]]]
+
+# 会话 info 中保存加载器的键
+_SESSION_KEY = "_batch_loaders"
+# 会话 info 中保存查询锁的键
+_SESSION_LOCK_KEY = "_batch_loader_lock"
+
+
+class DataLoader(Generic[K, V]):
+    """
+    批量加载器
+    借鉴 BatchProcessor 的待处理 Future 表, 但以事件循环轮次而非固定延迟为批次边界:
+    第一个 load 通过 call_soon 安排派发, 同一轮次内其余协程的 load 都会并入该批次
+    """
+
+    def __init__(self, batch_fn: BatchFunction, max_batch_size: int = 500, cache: bool = True):
+        """
+        :param batch_fn: 批量加载函数, 接收去重后的键列表,
+                         返回 {键: 值} 映射, 或与键列表一一对应的值序列
+        :param max_batch_size: 单次查询的最大键数, 超出时拆分
+        :param cache: 是否缓存已加载的键(在加载器生命周期内)
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.cache = cache
+        self._cache: Dict[K, asyncio.Future] = {}
+        self._queue: Dict[K, asyncio.Future] = {}
+        self._scheduled = False
+        self.stats = {"loads": 0, "cache_hits": 0, "batches": 0, "keys": 0}
+
+    def load(self, key: K) -> "asyncio.Future[V]":
+        """
+        加载单个键
+        :param key: 键
+        :return: 可等待的结果
+        """
+        self.stats["loads"] += 1
+        if self.cache and key in self._cache:
+            self.stats["cache_hits"] += 1
+            return self._cache[key]
+        future = self._queue.get(key)
+        if future is not None:
+            return future
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue[key] = future
+        if self.cache:
+            self._cache[key] = future
+        if len(self._queue) >= self.max_batch_size:
+            self._dispatch()
+        elif not self._scheduled:
+            self._scheduled = True
+            loop.call_soon(self._dispatch)
+        return future
+
+    async def load_many(self, keys: Sequence[K]) -> List[V]:
+        """
+        加载多个键
+        :param keys: 键列表
+        :return: 与键顺序一致的结果列表
+        """
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def prime(self, key: K, value: V) -> None:
+        """预置已知结果, 避免再次查询"""
+        if self.cache and key not in self._cache:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(value)
+            self._cache[key] = future
+
+    def clear(self, key: K) -> None:
+        """清除单个键的缓存(数据被修改后调用)"""
+        self._cache.pop(key, None)
+
+    def clear_all(self) -> None:
+        """清除全部缓存"""
+        self._cache.clear()
+
+    def _dispatch(self) -> None:
+        self._scheduled = False
+        if not self._queue:
+            return
+        queue, self._queue = self._queue, {}
+        items = list(queue.items())
+        for start in range(0, len(items), self.max_batch_size):
+            asyncio.ensure_future(self._run_batch(items[start : start + self.max_batch_size]))
+
+    async def _run_batch(self, items: List[Tuple[K, asyncio.Future]]) -> None:
+        keys = [key for key, _ in items]
+        self.stats["batches"] += 1
+        self.stats["keys"] += len(keys)
+        try:
+            results = await self.batch_fn(keys)
+            if isinstance(results, Mapping):
+                values = [results.get(key) for key in keys]
+            else:
+                values = list(results)
+                if len(values) != len(keys):
+                    raise ValueError(f"Batch function returned {len(values)} values for {len(keys)} keys")
+        except Exception as e:
+            for key, future in items:
+                # 失败的键不缓存, 下次重新加载
+                self._cache.pop(key, None)
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), value in zip(items, values):
+            if not future.done():
+                future.set_result(value)
+
+
+def session_lock(session: Any) -> asyncio.Lock:
+    """
+    获取会话级的查询锁
+    不同加载器(以及超过 max_batch_size 拆分出的批次)在同一轮次内同时派发, 经此锁在会话上依次执行
+    :param session: Session 或 AsyncSession
+    :return: 异步锁
+    """
+    lock = session.info.get(_SESSION_LOCK_KEY)
+    if lock is None:
+        lock = session.info[_SESSION_LOCK_KEY] = asyncio.Lock()
+    return lock
+
+
+async def _fetch_all(session: Any, statement) -> List[Any]:
+    """兼容同步 Session 和 AsyncSession 执行查询, 同一会话上的查询依次执行, 取完结果后才释放锁"""
+    async with session_lock(session):
+        result = session.execute(statement)
+        if inspect.isawaitable(result):
+            result = await result
+        return result.scalars().all()
+
+
+def model_loader(
+    session: Any,
+    model: Any,
+    column: str = "id",
+    many: bool = False,
+    only_active: bool = False,
+    max_batch_size: int = 500,
+) -> DataLoader:
+    """
+    获取会话级的模型加载器, 同一会话内相同参数返回同一个加载器
+    :param session: Session 或 AsyncSession
+    :param model: 模型类
+    :param column: 按哪一列加载, 默认主键 id
+    :param many: 为 True 时按外键加载一对多关系, 每个键返回列表
+    :param only_active: 是否排除软删除的记录
+    :param max_batch_size: 单次 IN 查询的最大键数
+    :return: 数据加载器
+    """
+    loaders = session.info.setdefault(_SESSION_KEY, {})
+    registry_key = (model, column, many, only_active)
+    loader = loaders.get(registry_key)
+    if loader is not None:
+        return loader
+
+    field = getattr(model, column)
+
+    async def batch_load(keys: List[Any]) -> Dict[Any, Any]:
+        statement = select(model).where(field.in_(keys))
+        if only_active and hasattr(model, "is_deleted"):
+            statement = statement.where(model.is_deleted == False)
+        rows = await _fetch_all(session, statement)
+        if not many:
+            return {getattr(row, column): row for row in rows}
+        grouped = defaultdict(list)
+        for row in rows:
+            grouped[getattr(row, column)].append(row)
+        return {key: grouped.get(key, []) for key in keys}
+
+    loader = loaders[registry_key] = DataLoader(batch_load, max_batch_size=max_batch_size)
+    return loader
+
+
+def clear_loaders(session: Any) -> None:
+    """清空会话上的全部加载器缓存(提交或回滚后调用)"""
+    session.info.pop(_SESSION_KEY, None)
+
+
+def loader_stats(session: Any) -> Dict[str, Dict[str, int]]:
+    """获取会话上各加载器的统计信息"""
+    loaders = session.info.get(_SESSION_KEY, {})
+    return {
+        f"{model.__name__}.{column}{'[]' if many else ''}": dict(loader.stats)
+        for (model, column, many, _), loader in loaders.items()
+    }
+
+
+async def load_one(session: Any, model: Any, key: Any, column: str = "id", only_active: bool = False) -> Optional[Any]:
+    """按键加载单个对象, 与同一轮次内的其他加载合并查询"""
+    if key is None:
+        return None
+    return await model_loader(session, model, column, only_active=only_active).load(key)
+
+
+async def load_many(
+    session: Any, model: Any, keys: Sequence[Any], column: str = "id", only_active: bool = False
+) -> List[Optional[Any]]:
+    """按键批量加载对象, 结果与键顺序一致, 不存在的为 None"""
+    return await model_loader(session, model, column, only_active=only_active).load_many(keys)
+
+
+__all__ = [
+    "DataLoader",
+    "session_lock",
+    "model_loader",
+    "clear_loaders",
+    "loader_stats",
+    "load_one",
+    "load_many",
+]
@@ -79,6 +79,7 @@ from sqlalchemy import Table, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.cache.manager import cache_manager
+from core.db.utils.waitgraph import Deadlock, WaitForGraph
 
 logger = logging.getLogger(__name__)
 
@@ -590,101 +591,104 @@ class DeadlockInfo:
     timeout: float  # 超时时间
 
 
+def _current_owner() -> str:
+    """默认的锁持有者: 当前协程任务"""
+    task = asyncio.current_task()
+    return f"task-{id(task)}" if task is not None else "main"
+
+
 class DeadlockDetector:
-    """死锁检测器"""
+    """
+    死锁检测器
+    基于增量式等待图: 只在新增等待关系时检测环, 发现死锁立即按代价选出牺牲者(持有锁最少、最年轻)
+    """
 
     def __init__(self):
-        self._wait_for_graph: Dict[str, Set[str]] = {}  # 等待图
+        self._graph = WaitForGraph()
+        self._waiting_for: Dict[str, str] = {}  # 等待者 -> 等待的资源
         self._resource_holders: Dict[str, str] = {}  # 资源持有者
         self._wait_start_times: Dict[str, float] = {}  # 等待开始时间
-        self._lock = asyncio.Lock()
+        self._victims: Set[str] = set()  # 已选为牺牲者、尚未退出等待的持有者
+        self._detected: List[List[DeadlockInfo]] = []  # 尚未被 check_deadlock 取走的死锁
 
-    async def add_wait(self, waiter: str, waiting_for: str, holder: str) -> None:
+    async def add_wait(self, waiter: str, waiting_for: str, holder: str) -> Optional[Deadlock]:
         """
-        添加等待关系
+        添加等待关系, 并检测这条新等待边是否形成环
         :param waiter: 等待者
         :param waiting_for: 等待的资源
         :param holder: 持有者
+        :return: 形成环时返回死锁(含牺牲者), 否则 None
         """
-        async with self._lock:
-            if waiter not in self._wait_for_graph:
-                self._wait_for_graph[waiter] = set()
-            self._wait_for_graph[waiter].add(waiting_for)
-            self._resource_holders[waiting_for] = holder
-            self._wait_start_times[waiter] = time.time()
+        self._waiting_for[waiter] = waiting_for
+        self._resource_holders[waiting_for] = holder
+        self._wait_start_times.setdefault(waiter, time.time())
+        deadlock = self._graph.add_wait(waiter, (holder,))
+        if deadlock is not None and deadlock.victim not in self._victims:
+            self._victims.add(deadlock.victim)
+            self._detected.append(self._describe(deadlock))
+        return deadlock
 
     async def remove_wait(self, waiter: str) -> None:
         """
         移除等待关系
         :param waiter: 等待者
         """
-        async with self._lock:
-            if waiter in self._wait_for_graph:
-                del self._wait_for_graph[waiter]
-            if waiter in self._wait_start_times:
-                del self._wait_start_times[waiter]
-
-    def _detect_cycle(self, start: str, visited: Set[str], path: Set[str]) -> Optional[List[str]]:
-        """
-        检测等待图中的环
-        :param start: 起始节点
-        :param visited: 已访问节点
-        :param path: 当前路径
-        :return: 环路径
-        """
-        if start in path:
-            return [start]
-
-        if start in visited:
-            return None
-
-        visited.add(start)
-        path.add(start)
-
-        if start in self._wait_for_graph:
-            for next_node in self._wait_for_graph[start]:
-                if next_node in self._resource_holders:
-                    next_holder = self._resource_holders[next_node]
-                    cycle = self._detect_cycle(next_holder, visited, path)
-                    if cycle:
-                        cycle.insert(0, start)
-                        return cycle
-
-        path.remove(start)
-        return None
+        self._graph.remove_wait(waiter)
+        self._waiting_for.pop(waiter, None)
+        self._wait_start_times.pop(waiter, None)
+        self._victims.discard(waiter)
+        self._discard_if_idle(waiter)
+
+    def acquired(self, owner: str, resource: str) -> None:
+        """记录持有者获得资源"""
+        self._graph.acquired(owner)
+        self._resource_holders[resource] = owner
+
+    def released(self, owner: str, resource: str) -> None:
+        """记录持有者释放资源"""
+        self._graph.released(owner)
+        if self._resource_holders.get(resource) == owner:
+            del self._resource_holders[resource]
+        self._discard_if_idle(owner)
+
+    def _discard_if_idle(self, owner: str) -> None:
+        if owner not in self._waiting_for and self._graph.held(owner) == 0:
+            self._graph.remove(owner)
+
+    def is_victim(self, owner: str) -> bool:
+        """持有者是否被选为死锁牺牲者"""
+        return owner in self._victims
+
+    def _describe(self, deadlock: Deadlock) -> List[DeadlockInfo]:
+        cycle = deadlock.cycle
+        infos = []
+        for i, current in enumerate(cycle):
+            resource = self._waiting_for.get(current, "")
+            infos.append(
+                DeadlockInfo(
+                    resource=resource,
+                    waiting_for=resource,
+                    held_by=cycle[(i + 1) % len(cycle)],
+                    wait_start_time=self._wait_start_times.get(current, deadlock.detected_at),
+                    timeout=30.0,  # 默认超时时间
+                )
+            )
+        return infos
 
     async def check_deadlock(self) -> Optional[List[DeadlockInfo]]:
         """
-        检查死锁
+        取出自上次检查以来检测到的死锁(检测本身在 add_wait 时完成, 这里不遍历等待图)
         :return: 死锁信息列表
         """
-        async with self._lock:
-            deadlocks = []
-            visited = set()
-
-            for node in self._wait_for_graph:
-                if node not in visited:
-                    cycle = self._detect_cycle(node, visited, set())
-                    if cycle:
-                        # 构建死锁信息
-                        for i in range(len(cycle)):
-                            current = cycle[i]
-                            next_idx = (i + 1) % len(cycle)
-                            next_node = cycle[next_idx]
-
-                            for resource in self._wait_for_graph[current]:
-                                if self._resource_holders[resource] == next_node:
-                                    deadlocks.append(
-                                        DeadlockInfo(
-                                            resource=resource,
-                                            waiting_for=resource,
-                                            held_by=next_node,
-                                            wait_start_time=self._wait_start_times[current],
-                                            timeout=30.0,  # 默认超时时间
-                                        )
-                                    )
-
-            return deadlocks if deadlocks else None
+        if not self._detected:
+            return None
+        deadlocks = [info for cycle in self._detected for info in cycle]
+        self._detected.clear()
+        return deadlocks
+
+    def metrics(self) -> Dict[str, Any]:
+        """等待图统计"""
+        return {**self._graph.metrics(), "victims": len(self._victims)}
 
 
 class LockManager:
@@ -763,68 +767,71 @@ class LockManager:
 
         raise ValueError(f"不支持的锁类型: {lock_type}")
 
-    async def acquire_lock(self, lock_type: LockType, resource: str, timeout: float = None, **kwargs: Any) -> BaseLock:
+    async def acquire_lock(
+        self, lock_type: LockType, resource: str, timeout: float = None, owner: Optional[str] = None, **kwargs: Any
+    ) -> BaseLock:
         """
         获取锁
         :param lock_type: 锁类型
         :param resource: 资源标识
         :param timeout: 超时时间
+        :param owner: 锁持有者标识, 默认为当前协程任务
         :param kwargs: 其他参数
         :return: 锁对象
         :raises LockAcquisitionError: 获取锁失败
         :raises LockWaitTimeout: 等待超时
-        :raises DeadlockError: 检测到死锁
+        :raises DeadlockError: 检测到死锁且本持有者被选为牺牲者
         """
         if timeout is None:
             timeout = self._lock_wait_timeout
+        if owner is None:
+            owner = _current_owner()
 
         start_time = time.time()
-        lock_id = str(id(resource))
+        detector = self._deadlock_detector
 
-        while True:
-            try:
+        try:
+            while True:
                 async with self._lock:
-                    # 检查资源是否已被锁定
-                    if resource in self._locks:
-                        current_holder = self._locks[resource].owner
-                        # 添加等待关系用于死锁检测
-                        await self._deadlock_detector.add_wait(lock_id, resource, current_holder)
-
-                        # 检查死锁
-                        deadlocks = await self._deadlock_detector.check_deadlock()
-                        if deadlocks:
-                            await self._deadlock_detector.remove_wait(lock_id)
-                            raise DeadlockError(f"检测到死锁: {deadlocks}")
-
-                        # 检查超时
-                        if time.time() - start_time > timeout:
-                            await self._deadlock_detector.remove_wait(lock_id)
-                            raise LockWaitTimeout(f"等待锁超时: {resource}")
-
-                        # 等待一段时间后重试
-                        await asyncio.sleep(0.1)
-                        continue
-
-                    # 尝试获取锁
-                    lock = await self.create_lock(lock_type, resource, timeout=timeout, **kwargs)
-
-                    if await lock.acquire():
-                        self._locks[resource] = LockInfo(
-                            type=lock_type,
-                            resource=resource,
-                            owner=lock_id,
-                            acquired_at=time.time(),
-                            timeout=timeout,
-                            expires_at=time.time() + timeout,
-                        )
-                        await self._deadlock_detector.remove_wait(lock_id)
-                        return lock
-
-            except (DeadlockError, LockWaitTimeout) as e:
-                raise e
-            except Exception as e:
-                await self._deadlock_detector.remove_wait(lock_id)
-                raise LockAcquisitionError(f"获取锁失败: {str(e)}")
+                    if detector.is_victim(owner):
+                        raise DeadlockError(f"等待 {resource} 时被选为死锁牺牲者: {owner}")
+
+                    current = self._locks.get(resource)
+                    if current is None:
+                        # 尝试获取锁
+                        lock = await self.create_lock(lock_type, resource, timeout=timeout, **kwargs)
+                        if await lock.acquire():
+                            self._locks[resource] = LockInfo(
+                                type=lock_type,
+                                resource=resource,
+                                owner=owner,
+                                acquired_at=time.time(),
+                                timeout=timeout,
+                                expires_at=time.time() + timeout,
+                            )
+                            detector.acquired(owner, resource)
+                            return lock
+                    elif current.owner == owner:
+                        raise DeadlockError(f"重复获取尚未释放的锁: {resource}")
+                    else:
+                        # 添加等待关系, 只检测这条新等待边是否成环
+                        deadlock = await detector.add_wait(owner, resource, current.owner)
+                        if deadlock is not None and deadlock.victim == owner:
+                            raise DeadlockError(f"检测到死锁: {' -> '.join(deadlock.cycle)}")
+
+                    # 检查超时
+                    if time.time() - start_time > timeout:
+                        raise LockWaitTimeout(f"等待锁超时: {resource}")
+
+                # 在锁表之外等待, 让持有者可以释放
+                await asyncio.sleep(0.1)
+
+        except (DeadlockError, LockWaitTimeout) as e:
+            raise e
+        except Exception as e:
+            raise LockAcquisitionError(f"获取锁失败: {str(e)}")
+        finally:
+            await detector.remove_wait(owner)
 
     async def release_lock(self, lock: BaseLock) -> None:
         """
@@ -835,29 +842,31 @@ class LockManager:
         try:
             async with self._lock:
                 await lock.release()
-                if lock.resource in self._locks:
-                    self._locks[lock.resource].is_released = True
-                    del self._locks[lock.resource]
+                lock_info = self._locks.pop(lock.resource, None)
+                if lock_info is not None:
+                    lock_info.is_released = True
+                    self._deadlock_detector.released(lock_info.owner, lock.resource)
 
         except Exception as e:
             raise LockReleaseError(f"释放锁失败: {str(e)}")
 
     @asynccontextmanager
     async def lock(
-        self, lock_type: LockType, resource: str, timeout: float = None, **kwargs: Any
+        self, lock_type: LockType, resource: str, timeout: float = None, owner: Optional[str] = None, **kwargs: Any
     ) -> AsyncGenerator[BaseLock, None]:
         """
         锁上下文管理器
         :param lock_type: 锁类型
         :param resource: 资源标识
         :param timeout: 超时时间
+        :param owner: 锁持有者标识, 默认为当前协程任务
         :param kwargs: 其他参数
         :yield: 锁对象
         :raises LockAcquisitionError: 获取锁失败
         :raises LockWaitTimeout: 等待超时
         :raises DeadlockError: 检测到死锁
         """
-        lock = await self.acquire_lock(lock_type, resource, timeout=timeout, **kwargs)
+        lock = await self.acquire_lock(lock_type, resource, timeout=timeout, owner=owner, **kwargs)
         try:
             yield lock
         finally:
@@ -888,7 +897,8 @@ class LockManager:
             now = time.time()
             expired = [resource for resource, lock_info in self._locks.items() if now >= lock_info.expires_at]
             for resource in expired:
-                del self._locks[resource]
+                lock_info = self._locks.pop(resource)
+                self._deadlock_detector.released(lock_info.owner, resource)
 
     def set_default_timeout(self, timeout: float) -> None:
         """
@@ -906,8 +916,8 @@ class LockManager:
             try:
                 deadlocks = await self._deadlock_detector.check_deadlock()
                 if deadlocks:
+                    # 牺牲者在检测时已被选出, 其等待会以 DeadlockError 结束
                     logger.warning(f"检测到死锁: {deadlocks}")
-                    # 这里可以添加死锁处理逻辑，比如选择牺牲者
                 await asyncio.sleep(interval)
             except Exception as e:
                 logger.error(f"死锁检测失败: {str(e)}")
@@ -3,50 +3,113 @@
 实现数据分片功能
 """
 
-import hashlib
-from typing import Any, Dict, List
+import asyncio
+import inspect
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, List, Mapping, Optional
 
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import scoped_session, sessionmaker
 
 from core.config.manager import config_manager
+from core.db.utils.scatter import ShardResult, merge_aggregates, merge_ordered, scatter, shard_hash, with_timeout
+
+logger = logging.getLogger(__name__)
+
+# 同步驱动对应的异步驱动
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+}
+# 分片默认超时(秒)
+DEFAULT_SHARD_TIMEOUT = 10.0
+# 流式查询每次读取的行数
+STREAM_CHUNK_SIZE = 500
+
+
+def to_async_url(url: str) -> Optional[str]:
+    """
+    将同步数据库地址转换为异步驱动地址
+    :param url: 数据库地址
+    :return: 异步地址, 无对应异步驱动时返回 None
+    """
+    parsed = make_url(url)
+    if parsed.get_dialect().is_async:
+        return url
+    driver = ASYNC_DRIVERS.get(parsed.drivername)
+    return parsed.set(drivername=driver).render_as_string(hide_password=False) if driver else None
 
 
 class ShardingManager:
     """分库分表管理器"""
 
-    def __init__(self):
+    def __init__(
+        self,
+        shard_urls: Optional[Mapping[str, str]] = None,
+        timeout: Optional[float] = None,
+        use_async: Optional[bool] = None,
+    ):
+        """
+        :param shard_urls: {分片键: 数据库地址}, 默认读取配置 SHARD_DATABASE_URLS
+        :param timeout: 单分片超时秒数, 默认读取配置 SHARD_TIMEOUT
+        :param use_async: 是否创建异步引擎, 默认读取配置 SHARD_ASYNC_ENABLED
+        """
         self.config = config_manager.database
-        self._setup_shards()
+        self.timeout = timeout or getattr(self.config, "SHARD_TIMEOUT", DEFAULT_SHARD_TIMEOUT)
+        self.use_async = getattr(self.config, "SHARD_ASYNC_ENABLED", True) if use_async is None else use_async
+        self._setup_shards(self.config.SHARD_DATABASE_URLS if shard_urls is None else shard_urls)
+
+    def _engine_options(self, url: str) -> Dict[str, Any]:
+        if make_url(url).get_backend_name() == "sqlite":
+            return {}
+        return {
+            "pool_size": self.config.POOL_SIZE,
+            "max_overflow": self.config.MAX_OVERFLOW,
+            "pool_timeout": self.config.POOL_TIMEOUT,
+            "pool_recycle": self.config.POOL_RECYCLE,
+        }
 
-    def _setup_shards(self):
+    def _setup_shards(self, shard_urls: Mapping[str, str]):
         """初始化分片"""
         self.shard_engines = {}
         self.shard_sessions = {}
+        self.async_engines = {}
+        self.async_sessions = {}
 
         # 创建分片引擎和会话
-        for shard_key, url in self.config.SHARD_DATABASE_URLS.items():
-            engine = create_engine(
-                url,
-                pool_size=self.config.POOL_SIZE,
-                max_overflow=self.config.MAX_OVERFLOW,
-                pool_timeout=self.config.POOL_TIMEOUT,
-                pool_recycle=self.config.POOL_RECYCLE,
-            )
+        for shard_key, url in shard_urls.items():
+            engine = create_engine(url, **self._engine_options(url))
 
             session = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
 
             self.shard_engines[shard_key] = engine
             self.shard_sessions[shard_key] = session
 
+            # 异步引擎用于跨分片并发查询, 驱动缺失时回退到线程中执行同步会话
+            async_url = to_async_url(url) if self.use_async else None
+            if async_url is None:
+                continue
+            try:
+                async_engine = create_async_engine(async_url, **self._engine_options(url))
+            except Exception as e:
+                logger.warning(f"Async engine unavailable for {shard_key}, falling back to sync: {e}")
+                continue
+            self.async_engines[shard_key] = async_engine
+            self.async_sessions[shard_key] = async_sessionmaker(async_engine, expire_on_commit=False)
+
     def get_shard_key(self, value: Any) -> str:
         """
         计算分片键
         :param value: 用于计算分片的值
         :return: 分片键
         """
-        # 计算哈希值
-        hash_value = int(hashlib.md5(str(value).encode()).hexdigest(), 16)
+        # 计算哈希值(带缓存)
+        hash_value = shard_hash(value)
 
         # 根据分片数量取模
         shard_count = len(self.shard_engines)
@@ -67,7 +130,7 @@ class ShardingManager:
             return base_name
 
         # 计算表分片
-        hash_value = int(hashlib.md5(str(shard_value).encode()).hexdigest(), 16)
+        hash_value = shard_hash(shard_value)
         table_index = hash_value % self.config.TABLES_PER_SHARD
 
         return f"{base_name}_{table_index}"
@@ -93,26 +156,161 @@ class ShardingManager:
 
         return [f"{base_name}_{i}" for i in range(self.config.TABLES_PER_SHARD)]
 
+    async def _run_on_shard(
+        self, shard_key: str, callback: Callable, args: tuple, kwargs: dict, async_session: bool = True
+    ) -> Any:
+        """
+        在单个分片上执行回调
+        协程回调在 async_session 为 True 且分片有异步引擎时使用 AsyncSession, 否则使用分片的同步会话;
+        同步回调在线程中使用独立的同步会话
+        """
+        if inspect.iscoroutinefunction(callback):
+            if async_session and shard_key in self.async_sessions:
+                async with self.async_sessions[shard_key]() as session:
+                    return await callback(session, *args, **kwargs)
+            return await callback(self.shard_sessions[shard_key], *args, **kwargs)
+
+        def run() -> Any:
+            with self.shard_sessions[shard_key].session_factory() as session:
+                return callback(session, *args, **kwargs)
+
+        return await asyncio.to_thread(run)
+
+    async def _scatter(
+        self, callback: Callable, args: tuple, kwargs: dict, timeout: Optional[float], async_session: bool
+    ) -> Dict[str, ShardResult]:
+        async def run(shard_key: str) -> Any:
+            return await self._run_on_shard(shard_key, callback, args, kwargs, async_session)
+
+        targets = {shard_key: shard_key for shard_key in self.shard_sessions}
+        return await scatter(targets, run, timeout=timeout or self.timeout)
+
+    async def scatter(
+        self, callback: Callable, *args, timeout: Optional[float] = None, **kwargs
+    ) -> Dict[str, ShardResult]:
+        """
+        在所有分片上并发执行操作
+        协程回调收到 AsyncSession(分片没有可用的异步驱动时为同步 Session), 同步回调在线程中收到同步 Session
+        :param callback: 回调函数, 第一个参数为分片会话
+        :param timeout: 单分片超时秒数, 默认使用管理器配置
+        :return: {分片键: 执行结果}
+        """
+        return await self._scatter(callback, args, kwargs, timeout, async_session=True)
+
     async def execute_all_shards(self, callback, *args, **kwargs) -> Dict[str, Any]:
         """
         在所有分片上执行操作
+        各分片并发执行, 回调收到的仍是分片的同步 Session(协程回调与以前一致);
+        需要 AsyncSession 的协程回调请使用 scatter
         :param callback: 回调函数
         :return: 各分片的执行结果
         """
-        results = {}
-        for shard_key, session in self.shard_sessions.items():
-            try:
-                result = await callback(session, *args, **kwargs)
-                results[shard_key] = result
-            except Exception as e:
-                results[shard_key] = {"error": str(e)}
-        return results
+        results = await self._scatter(callback, args, kwargs, None, async_session=False)
+        return {
+            shard_key: result.value if result.ok else {"error": result.error} for shard_key, result in results.items()
+        }
+
+    async def _stream_shard(
+        self, shard_key: str, statement, chunk_size: int, timeout: Optional[float]
+    ) -> AsyncIterator[Any]:
+        """流式读取单个分片的查询结果, 执行查询和之后的每次读取都受单分片超时限制"""
+        async for row in with_timeout(self._read_shard(shard_key, statement, chunk_size), timeout, shard_key):
+            yield row
+
+    async def _read_shard(self, shard_key: str, statement, chunk_size: int) -> AsyncIterator[Any]:
+        """读取单个分片的查询结果"""
+        statement = statement.execution_options(yield_per=chunk_size)
+        if shard_key in self.async_sessions:
+            async with self.async_sessions[shard_key]() as session:
+                result = await session.stream(statement)
+                async for row in result:
+                    yield row
+            return
+
+        session = self.shard_sessions[shard_key].session_factory()
+        try:
+            result = await asyncio.to_thread(session.execute, statement)
+            partitions = result.partitions(chunk_size)
+            while True:
+                partition = await asyncio.to_thread(next, partitions, None)
+                if partition is None:
+                    break
+                for row in partition:
+                    yield row
+        finally:
+            await asyncio.to_thread(session.close)
+
+    async def stream_all_shards(
+        self,
+        statement,
+        key: Callable[[Any], Any],
+        *,
+        reverse: bool = False,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        chunk_size: int = STREAM_CHUNK_SIZE,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[Any]:
+        """
+        跨分片的 ORDER BY + LIMIT 查询
+        每个分片只需返回前 offset+limit 行, 结果按 key 多路归并后流式返回
+        :param statement: 已按 key 排序的 select 语句
+        :param key: 从结果行取排序键
+        :param reverse: 语句是否为降序
+        :param limit: 返回行数
+        :param offset: 跳过行数
+        :param chunk_size: 每次从分片读取的行数
+        :param timeout: 单分片每次读取的超时秒数, 默认使用管理器配置
+        :return: 全局有序的结果行
+        :raises ShardTimeoutError: 某个分片超时
+        """
+        if limit is not None:
+            statement = statement.limit(offset + limit)
+        timeout = timeout or self.timeout
+        streams = [
+            self._stream_shard(shard_key, statement, chunk_size, timeout) for shard_key in self.shard_sessions
+        ]
+        async for row in merge_ordered(streams, key, reverse=reverse, limit=limit, offset=offset):
+            yield row
+
+    async def aggregate_all_shards(
+        self, statement, spec: Mapping[str, str], *, timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        跨分片聚合
+        各分片并发执行返回单行部分聚合的语句, 再合并为全局结果
+        :param statement: 聚合语句, 列需使用 label 命名, 如 select(func.count().label("total"))
+        :param spec: {列名: count / sum / min / max}
+        :param timeout: 单分片超时秒数
+        :return: 全局聚合结果
+        :raises RuntimeError: 任一分片失败时(部分结果会导致聚合值错误)
+        """
+
+        def partial(session) -> Dict[str, Any]:
+            return dict(session.execute(statement).mappings().one())
+
+        async def partial_async(session) -> Dict[str, Any]:
+            result = session.execute(statement)
+            if inspect.isawaitable(result):
+                result = await result
+            return dict(result.mappings().one())
+
+        results = await self.scatter(partial_async if self.async_sessions else partial, timeout=timeout)
+        failed = {shard_key: result.error for shard_key, result in results.items() if not result.ok}
+        if failed:
+            raise RuntimeError(f"Aggregate failed on shards: {failed}")
+        return merge_aggregates((result.value for result in results.values()), spec)
 
     def dispose(self):
         """释放所有分片连接"""
         for engine in self.shard_engines.values():
             engine.dispose()
 
+    async def dispose_async(self):
+        """释放所有分片的异步连接"""
+        for engine in self.async_engines.values():
+            await engine.dispose()
+
 
 # 创建分片管理器实例
 sharding_manager = ShardingManager()
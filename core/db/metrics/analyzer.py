@@ -1,7 +1,5 @@
-import json
 import logging
 import random
-import re
 import time
 import uuid
 from collections import defaultdict
@@ -12,6 +10,9 @@ from typing import Dict, List, Optional
 
 from sqlalchemy.engine import CursorResult
 
+from core.db.utils.fingerprint import fingerprint_sql, normalize_sql
+from core.db.utils.log_store import IndexedLogStore, IndexEntry
+
 logger = logging.getLogger(__name__)
 
 
@@ -37,6 +38,12 @@ class SlowQueryInfo:
         """转换为字典"""
         return asdict(self)
 
+    def to_record(self) -> Dict:
+        """转换为可 JSON 序列化的日志记录"""
+        data = asdict(self)
+        data["start_time"] = self.start_time.isoformat()
+        return data
+
     @classmethod
     def from_dict(cls, data: Dict) -> "SlowQueryInfo":
         """从字典创建"""
@@ -64,14 +71,15 @@ class SlowQueryLogger:
         self.collect_stats = collect_stats
         self.sample_rate = sample_rate
 
-        self.current_file: Optional[Path] = None
-        self.current_size = 0
-
-        # 创建日志目录
-        self.log_dir.mkdir(parents=True, exist_ok=True)
-
-        # 初始化当前日志文件
-        self._init_current_file()
+        # 带时间和SQL指纹索引的分段日志
+        self._store = IndexedLogStore(
+            log_dir=str(self.log_dir),
+            prefix="slow_query",
+            indexer=self._index_record,
+            key_fields=("fingerprint",),
+            max_segment_size=max_file_size,
+            max_segments=max_files,
+        )
 
         # 统计信息
         self._stats = {
@@ -83,51 +91,30 @@ class SlowQueryLogger:
             "avg_duration": 0.0,
         }
 
-    def _init_current_file(self):
-        """初始化当前日志文件"""
-        # 查找最新的日志文件
-        log_files = sorted(self.log_dir.glob("slow_query_*.log"), key=lambda p: p.stat().st_mtime, reverse=True)
-
-        if not log_files:
-            # 创建新文件
-            self.current_file = self.log_dir / f"slow_query_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-            self.current_size = 0
-        else:
-            self.current_file = log_files[0]
-            self.current_size = self.current_file.stat().st_size
-
-        # 如果当前文件大小超过限制,创建新文件
-        if self.current_size >= self.max_file_size:
-            self._rotate_files()
-
-    def _rotate_files(self):
-        """轮转日志文件"""
-        # 获取所有日志文件
-        log_files = sorted(self.log_dir.glob("slow_query_*.log"), key=lambda p: p.stat().st_mtime)
-
-        # 如果文件数超过限制,删除最旧的文件
-        while len(log_files) >= self.max_files:
-            log_files[0].unlink()
-            log_files = log_files[1:]
-
-        # 创建新文件
-        self.current_file = self.log_dir / f"slow_query_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-        self.current_size = 0
+    @staticmethod
+    def _index_record(record: Dict):
+        """提取日志记录的索引: 开始时间、SQL指纹、执行时长、是否带表/索引统计"""
+        return datetime.fromisoformat(record["start_time"]).timestamp(), {
+            "fingerprint": fingerprint_sql(record["sql"]),
+            "duration": record["duration"],
+            "stats": bool(record.get("table_stats") or record.get("index_stats")),
+        }
 
-    def _write_entry(self, entry: SlowQueryInfo):
-        """写入日志条目"""
-        # 如果当前文件大小超过限制,轮转文件
-        if self.current_size >= self.max_file_size:
-            self._rotate_files()
+    @property
+    def store(self) -> IndexedLogStore:
+        return self._store
 
-        # 写入日志条目
-        entry_data = json.dumps(entry.to_dict()) + "\n"
-        entry_size = len(entry_data.encode("utf-8"))
+    @property
+    def current_file(self) -> Optional[Path]:
+        return self._store.current_file
 
-        with self.current_file.open("a", encoding="utf-8") as f:
-            f.write(entry_data)
+    @property
+    def current_size(self) -> int:
+        return self._store.current_size
 
-        self.current_size += entry_size
+    def _write_entry(self, entry: SlowQueryInfo):
+        """写入日志条目"""
+        self._store.append(entry.to_record())
 
     async def _collect_explain_plan(self, session, sql: str, parameters: Dict) -> Optional[Dict]:
         """收集执行计划"""
@@ -278,57 +265,48 @@ class SlowQueryLogger:
         # 写入日志
         self._write_entry(query_info)
 
+    def find_entries(
+        self,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        min_duration: Optional[float] = None,
+        fingerprint: Optional[str] = None,
+    ) -> List[IndexEntry]:
+        """在索引上查找慢查询, 不读取日志内容"""
+        return self._store.find(
+            start=start_time.timestamp() if start_time else None,
+            end=end_time.timestamp() if end_time else None,
+            where={"fingerprint": fingerprint} if fingerprint else None,
+            predicate=(lambda e: e.attrs["duration"] >= min_duration) if min_duration else None,
+        )
+
+    def read_entries(self, entries: List[IndexEntry]) -> List[SlowQueryInfo]:
+        """读取索引条目对应的慢查询记录"""
+        return [SlowQueryInfo.from_dict(data) for data in self._store.read(entries)]
+
     def get_slow_queries(
         self,
         start_time: Optional[datetime] = None,
         end_time: Optional[datetime] = None,
         min_duration: Optional[float] = None,
         limit: int = 100,
+        fingerprint: Optional[str] = None,
     ) -> List[SlowQueryInfo]:
-        """获取慢查询记录"""
-        queries = []
-
-        # 遍历所有日志文件
-        for log_file in sorted(self.log_dir.glob("slow_query_*.log"), key=lambda p: p.stat().st_mtime):
-            with log_file.open("r", encoding="utf-8") as f:
-                for line in f:
-                    try:
-                        entry_data = json.loads(line)
-                        query = SlowQueryInfo.from_dict(entry_data)
-
-                        # 过滤条件
-                        if start_time and query.start_time < start_time:
-                            continue
-                        if end_time and query.start_time > end_time:
-                            continue
-                        if min_duration and query.duration < min_duration:
-                            continue
-
-                        queries.append(query)
-
-                        if len(queries) >= limit:
-                            break
-                    except Exception as e:
-                        logger.error(f"Failed to parse log entry: {e}")
-
-        return sorted(queries, key=lambda q: q.duration, reverse=True)
+        """获取慢查询记录(按执行时长倒序的前 limit 条)"""
+        entries = self.find_entries(start_time, end_time, min_duration, fingerprint)
+        entries.sort(key=lambda e: e.attrs["duration"], reverse=True)
+        return self.read_entries(entries[:limit])
 
     def get_metrics(self) -> Dict:
         """获取日志指标"""
-        log_files = list(self.log_dir.glob("slow_query_*.log"))
-        total_size = sum(f.stat().st_size for f in log_files)
-
-        return {
-            "log_dir": str(self.log_dir),
-            "threshold": self.threshold,
-            "max_file_size": self.max_file_size,
-            "max_files": self.max_files,
-            "current_file": str(self.current_file) if self.current_file else None,
-            "current_size": self.current_size,
-            "total_files": len(log_files),
-            "total_size": total_size,
-            "stats": self._stats.copy(),
-        }
+        metrics = self._store.get_metrics()
+        metrics.update(
+            {
+                "threshold": self.threshold,
+                "stats": self._stats.copy(),
+            }
+        )
+        return metrics
 
 
 class QueryPattern:
@@ -394,20 +372,7 @@ class QueryAnalyzer:
 
     def _normalize_sql(self, sql: str) -> str:
         """规范化SQL,提取模式"""
-
-        # 这里使用简单的方式,仅作示例
-        sql = sql.lower()
-
-        # 替换数字
-        sql = re.sub(r"\d+", "?", sql)
-
-        # 替换字符串
-        sql = re.sub(r"'[^']*'", "?", sql)
-
-        # 替换IN列表
-        sql = re.sub(r"in\s*\([^)]+\)", "in (?)", sql)
-
-        return sql
+        return normalize_sql(sql)
 
     def _analyze_patterns(self, queries: List[SlowQueryInfo]) -> List[QueryPattern]:
         """分析查询模式"""
@@ -423,6 +388,32 @@ class QueryAnalyzer:
         # 过滤掉出现次数少的模式
         return [pattern for pattern in patterns.values() if pattern.total_count >= self.pattern_threshold]
 
+    def _analyze_pattern_entries(self, entries: List[IndexEntry]) -> List[QueryPattern]:
+        """按索引中的SQL指纹分析查询模式, 只读取达到阈值的模式的示例查询"""
+        groups: Dict[str, List[IndexEntry]] = defaultdict(list)
+        for entry in entries:
+            groups[entry.attrs["fingerprint"]].append(entry)
+
+        patterns = []
+        for fingerprint, group in groups.items():
+            if len(group) < self.pattern_threshold:
+                continue
+            durations = [e.attrs["duration"] for e in group]
+            slowest = sorted(group, key=lambda e: e.attrs["duration"], reverse=True)[:5]
+            examples = self.logger.read_entries(slowest)
+            patterns.append(
+                QueryPattern(
+                    pattern_id=fingerprint,
+                    sql_pattern=self._normalize_sql(examples[0].sql) if examples else "",
+                    total_count=len(group),
+                    total_duration=sum(durations),
+                    min_duration=min(durations),
+                    max_duration=max(durations),
+                    example_queries=examples,
+                )
+            )
+        return patterns
+
     def _analyze_tables(self, queries: List[SlowQueryInfo]) -> Dict[str, Dict]:
         """分析表使用情况"""
         table_stats = defaultdict(
@@ -496,6 +487,17 @@ class QueryAnalyzer:
 
         return dict(distribution)
 
+    @staticmethod
+    def _analyze_entry_time_distribution(entries: List[IndexEntry]) -> Dict[str, int]:
+        """按索引时间戳分析时间分布"""
+        distribution = defaultdict(int)
+
+        for entry in entries:
+            hour = datetime.fromtimestamp(entry.timestamp).strftime("%H:00")
+            distribution[hour] += 1
+
+        return dict(distribution)
+
     def analyze(
         self,
         start_time: Optional[datetime] = None,
@@ -503,14 +505,14 @@ class QueryAnalyzer:
         min_duration: Optional[float] = None,
     ) -> Dict:
         """分析慢查询"""
-        # 获取慢查询记录
-        queries = self.logger.get_slow_queries(
+        # 在索引上获取慢查询, 只有需要明细时才读取日志
+        entries = self.logger.find_entries(
             start_time=start_time,
             end_time=end_time,
             min_duration=min_duration,
         )
 
-        if not queries:
+        if not entries:
             return {
                 "patterns": [],
                 "tables": {},
@@ -526,16 +528,21 @@ class QueryAnalyzer:
             }
 
         # 分析查询模式
-        patterns = self._analyze_patterns(queries)
+        patterns = self._analyze_pattern_entries(entries)
+
+        # 只读取带表/索引统计的记录
+        with_stats = self.logger.read_entries([e for e in entries if e.attrs.get("stats")])
 
         # 分析表使用情况
-        tables = self._analyze_tables(queries)
+        tables = self._analyze_tables(with_stats)
 
         # 分析索引使用情况
-        indexes = self._analyze_indexes(queries)
+        indexes = self._analyze_indexes(with_stats)
 
         # 分析时间分布
-        time_distribution = self._analyze_time_distribution(queries)
+        time_distribution = self._analyze_entry_time_distribution(entries)
+
+        total_duration = sum(e.attrs["duration"] for e in entries)
 
         # 生成分析报告
         return {
@@ -544,9 +551,9 @@ class QueryAnalyzer:
             "indexes": indexes,
             "time_distribution": time_distribution,
             "summary": {
-                "total_queries": len(queries),
-                "total_duration": sum(q.duration for q in queries),
-                "avg_duration": sum(q.duration for q in queries) / len(queries),
+                "total_queries": len(entries),
+                "total_duration": total_duration,
+                "avg_duration": total_duration / len(entries),
                 "start_time": start_time.isoformat() if start_time else None,
                 "end_time": end_time.isoformat() if end_time else None,
             },
@@ -1,7 +1,9 @@
-from typing import Generic, List, TypeVar
+from typing import Generic, List, Optional, TypeVar
 
 from pydantic import BaseModel, conint
 
+from core.db.utils.keyset import KeysetPage, OffsetPage
+
 T = TypeVar("T")
 
 
@@ -16,23 +18,73 @@ class PageResponse(BaseModel, Generic[T]):
     """分页响应"""
 
     items: List[T]  # 数据列表
-    total: int  # 总数
-    page: int  # 当前页
+    total: Optional[int] = None  # 总数, 跳过统计时为空
+    page: Optional[int] = None  # 当前页, 键集分页时为空
     size: int  # 每页大小
-    pages: int  # 总页数
-    has_next: bool  # 是否有下一页
-    has_prev: bool  # 是否有上一页
+    pages: Optional[int] = None  # 总页数
+    has_next: bool = False  # 是否有下一页
+    has_prev: bool = False  # 是否有上一页
+    total_estimated: bool = False  # 总数是否为估算值
+    next_cursor: Optional[str] = None  # 下一页游标
+    prev_cursor: Optional[str] = None  # 上一页游标
 
     @classmethod
-    def create(cls, items: List[T], total: int, page: int, size: int) -> "PageResponse[T]":
+    def create(
+        cls,
+        items: List[T],
+        total: Optional[int],
+        page: int,
+        size: int,
+        has_next: Optional[bool] = None,
+        total_estimated: bool = False,
+    ) -> "PageResponse[T]":
         """创建分页响应
         Args:
             items: 数据列表
-            total: 总数
+            total: 总数, 为空时不计算总页数
             page: 当前页
             size: 每页大小
+            has_next: 是否有下一页, 为空时按精确总数计算; 跳过或估算总数时应由多取一行的查询给出
+            total_estimated: 总数是否为估算值, 估算时不计算总页数
         """
-        pages = (total + size - 1) // size
+        pages = None
+        if total is not None and not total_estimated:
+            pages = (total + size - 1) // size
+        if has_next is None:
+            has_next = page < pages if pages is not None else False
+        return cls(
+            items=items,
+            total=total,
+            page=page,
+            size=size,
+            pages=pages,
+            has_next=has_next,
+            has_prev=page > 1,
+            total_estimated=total_estimated,
+        )
+
+    @classmethod
+    def from_offset(cls, page: OffsetPage) -> "PageResponse[T]":
+        """由页码分页结果创建分页响应"""
+        return cls.create(
+            items=page.items,
+            total=page.total,
+            page=page.page,
+            size=page.size,
+            has_next=page.has_next,
+            total_estimated=page.total_estimated,
+        )
+
+    @classmethod
+    def from_keyset(cls, page: KeysetPage) -> "PageResponse[T]":
+        """由键集分页结果创建分页响应"""
         return cls(
-            items=items, total=total, page=page, size=size, pages=pages, has_next=page < pages, has_prev=page > 1
+            items=page.items,
+            total=page.total,
+            size=page.size,
+            has_next=page.has_next,
+            has_prev=page.has_prev,
+            total_estimated=page.total_estimated,
+            next_cursor=page.next_cursor,
+            prev_cursor=page.prev_cursor,
         )
@@ -0,0 +1,381 @@
+"""
+连接池自动扩缩容
+以获取连接的等待时间和排队深度驱动扩缩容, 带滞回区间、冷却时间和上下限;
+连接数上限由可调整的准入闸门保证, 调整时不重建引擎;
+附带确定性的模拟器, 用于比较不同策略在突发流量下的等待延迟
+"""
+
+import asyncio
+import math
+import time
+from bisect import bisect_left
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Protocol, Sequence
+
+# 获取连接等待时间的直方图分桶(秒)
+ACQUIRE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class LatencyHistogram:
+    """固定分桶的延迟直方图"""
+
+    def __init__(self, buckets: Sequence[float] = ACQUIRE_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        """
+        估算分位数, 返回所在分桶的上界(落在最后一个分桶时返回最大值)
+        :param q: 分位, 0~1
+        :return: 分位数(秒)
+        """
+        if self.count == 0:
+            return 0.0
+        rank = math.ceil(q * self.count)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict:
+        """累计分桶计数与常用分位数"""
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = self.count
+        return {
+            "buckets": buckets,
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+
+@dataclass
+class PoolSample:
+    """一个采样窗口内的连接池负载"""
+
+    size: int
+    wait_p95: float  # 获取连接等待时间 p95(秒)
+    queue_depth: int  # 窗口内最大排队数
+    utilization: float  # 窗口内平均使用率
+    in_use: int  # 采样时已借出的连接数
+
+
+class AcquireTracker:
+    """跟踪获取连接的等待时间、排队深度和连接占用"""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic, buckets: Sequence[float] = ACQUIRE_BUCKETS):
+        self.clock = clock
+        self.buckets = buckets
+        self.histogram = LatencyHistogram(buckets)
+        self._window = LatencyHistogram(buckets)
+        self.waiting = 0
+        self.in_use = 0
+        self._max_waiting = 0
+        self._busy_area = 0.0
+        self._last_change = clock()
+        self._window_start = self._last_change
+
+    def _set_in_use(self, delta: int) -> None:
+        now = self.clock()
+        self._busy_area += self.in_use * (now - self._last_change)
+        self._last_change = now
+        self.in_use += delta
+
+    def start_wait(self) -> None:
+        """开始等待连接"""
+        self.waiting += 1
+        self._max_waiting = max(self._max_waiting, self.waiting)
+
+    def acquired(self, wait: float) -> None:
+        """获取到连接"""
+        self.waiting -= 1
+        self._set_in_use(1)
+        self.histogram.observe(wait)
+        self._window.observe(wait)
+
+    def cancelled(self) -> None:
+        """放弃等待(超时或出错)"""
+        self.waiting -= 1
+
+    def released(self) -> None:
+        """归还连接"""
+        self._set_in_use(-1)
+
+    def sample(self, size: int) -> PoolSample:
+        """结束当前窗口并返回其统计"""
+        self._set_in_use(0)
+        elapsed = self._last_change - self._window_start
+        utilization = self._busy_area / (size * elapsed) if size > 0 and elapsed > 0 else 0.0
+        sample = PoolSample(
+            size=size,
+            wait_p95=self._window.percentile(0.95),
+            queue_depth=self._max_waiting,
+            utilization=utilization,
+            in_use=self.in_use,
+        )
+        self._window = LatencyHistogram(self.buckets)
+        self._max_waiting = self.waiting
+        self._busy_area = 0.0
+        self._window_start = self._last_change
+        return sample
+
+
+class CapacityGate:
+    """
+    可调整上限的连接准入
+    借出数达到上限时按先来后到排队; 调大上限立即放行排队者;
+    调小时已借出的连接照常使用并归还, 借出数降到新上限以下后才放行新的请求
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self._waiters: deque = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def try_acquire(self) -> bool:
+        """不等待地获取名额, 有排队者或已达上限时返回 False"""
+        if self._waiters or self.in_use >= self.limit:
+            return False
+        self.in_use += 1
+        return True
+
+    async def acquire(self) -> None:
+        """获取名额, 达到上限时排队等待"""
+        if self.try_acquire():
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                if future in self._waiters:
+                    self._waiters.remove(future)
+            else:
+                # 已放行但调用方被取消, 归还名额
+                self.release()
+            raise
+
+    def release(self) -> None:
+        """归还名额"""
+        self.in_use -= 1
+        self._wake()
+
+    def resize(self, limit: int) -> None:
+        """调整上限"""
+        self.limit = limit
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_use < self.limit:
+            future = self._waiters.popleft()
+            if not future.done():
+                self.in_use += 1
+                future.set_result(None)
+
+
+class ScalingPolicy(Protocol):
+    """扩缩容策略"""
+
+    def decide(self, sample: PoolSample, now: float) -> int:
+        """根据采样返回目标连接数"""
+        ...
+
+
+@dataclass
+class QueueWaitPolicy:
+    """
+    基于等待时间和排队深度的扩缩容
+    有排队且等待超过阈值时按排队深度一次扩到位; 只有连续多个窗口等待接近零且使用率低时才逐步缩容,
+    扩容与缩容的触发条件之间留有滞回区间, 并各自有冷却时间, 避免突发后来回震荡
+    """
+
+    min_size: int = 5
+    max_size: int = 20
+    scale_up_wait: float = 0.05  # 等待 p95 超过该值(秒)且有排队时扩容
+    scale_up_utilization: float = 0.8  # 或使用率超过该值且有排队时扩容
+    target_wait: float = 0.01  # 等待 p95 低于该值才考虑缩容
+    scale_down_utilization: float = 0.3  # 使用率低于该值才考虑缩容
+    target_utilization: float = 0.7  # 缩容后的目标使用率
+    scale_down_samples: int = 3  # 连续满足缩容条件的窗口数
+    scale_down_step: int = 2  # 每次最多缩减的连接数
+    scale_up_cooldown: float = 5.0  # 两次扩容的最小间隔(秒)
+    scale_down_cooldown: float = 60.0  # 任意调整后到下一次缩容的最小间隔(秒)
+    _last_up: float = field(default=-math.inf, repr=False)
+    _last_change: float = field(default=-math.inf, repr=False)
+    _low_samples: int = field(default=0, repr=False)
+
+    def _clamp(self, size: int) -> int:
+        return max(self.min_size, min(self.max_size, size))
+
+    def decide(self, sample: PoolSample, now: float) -> int:
+        size = sample.size
+        # 瞬时获取到连接的请求也会短暂计入排队, 只有等待明显时才视为排队
+        queued = sample.queue_depth > 0 and sample.wait_p95 > self.target_wait
+        if queued and (sample.wait_p95 > self.scale_up_wait or sample.utilization >= self.scale_up_utilization):
+            self._low_samples = 0
+            if now - self._last_up < self.scale_up_cooldown:
+                return self._clamp(size)
+            # 按排队深度一次扩到位
+            target = self._clamp(size + sample.queue_depth)
+            if target != size:
+                self._last_up = self._last_change = now
+            return target
+
+        if queued or sample.utilization >= self.scale_down_utilization:
+            self._low_samples = 0
+            return self._clamp(size)
+
+        self._low_samples += 1
+        if self._low_samples < self.scale_down_samples or now - self._last_change < self.scale_down_cooldown:
+            return self._clamp(size)
+        needed = math.ceil(sample.utilization * size / self.target_utilization)
+        target = self._clamp(max(needed, sample.in_use, size - self.scale_down_step))
+        if target != size:
+            self._last_change = now
+            self._low_samples = 0
+        return target
+
+
+@dataclass
+class UtilizationPolicy:
+    """按采样时刻的使用率扩缩容(原策略, 保留用于对比)"""
+
+    min_size: int = 5
+    max_size: int = 20
+    scale_up_threshold: float = 0.8
+    scale_down_threshold: float = 0.3
+    scale_step: int = 2
+    scale_cooldown: float = 60.0
+    _last_change: float = field(default=-math.inf, repr=False)
+
+    def decide(self, sample: PoolSample, now: float) -> int:
+        size = sample.size
+        utilization = sample.in_use / size if size > 0 else 0
+        if now - self._last_change <= self.scale_cooldown:
+            return size
+        if utilization >= self.scale_up_threshold and size < self.max_size:
+            self._last_change = now
+            return min(size + self.scale_step, self.max_size)
+        if utilization <= self.scale_down_threshold and size > self.min_size:
+            self._last_change = now
+            return max(size - self.scale_step, self.min_size)
+        return size
+
+
+@dataclass
+class SimulationResult:
+    """模拟结果"""
+
+    waits: List[float]
+    sizes: List[int]  # 每次评估后的连接数
+    resizes: int
+
+    def percentile(self, q: float) -> float:
+        if not self.waits:
+            return 0.0
+        ordered = sorted(self.waits)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+def simulate(
+    policy: ScalingPolicy,
+    rates: Sequence[float],
+    *,
+    service_time: float = 0.05,
+    initial_size: int = 5,
+    interval: float = 1.0,
+    tick: float = 0.005,
+) -> SimulationResult:
+    """
+    确定性地模拟连接池在给定流量下的表现
+    与 DynamicPool 相同, 连接数上限由 CapacityGate 保证: 请求按到达顺序排队等待名额,
+    每个请求占用连接 service_time 秒; 缩容时已借出的连接用完后归还;
+    每隔 interval 秒以 AcquireTracker 的窗口统计调用一次策略
+    :param policy: 扩缩容策略
+    :param rates: 每秒到达的请求数, 每个元素代表一秒
+    :param service_time: 单个请求占用连接的时间(秒)
+    :param initial_size: 初始连接数
+    :param interval: 策略评估间隔(秒)
+    :param tick: 模拟步长(秒)
+    :return: 各请求的等待时间与连接数变化
+    """
+    steps_per_second = round(1 / tick)
+    eval_every = max(1, round(interval / tick))
+    now = 0.0
+    tracker = AcquireTracker(clock=lambda: now)
+    size = initial_size
+    gate = CapacityGate(size)
+    queue: deque = deque()
+    running: deque = deque()  # 结束时间, 服务时间固定因此天然有序
+    waits: List[float] = []
+    sizes: List[int] = []
+    resizes = 0
+    pending = 0.0
+
+    for step in range(len(rates) * steps_per_second):
+        now = step * tick
+        while running and running[0] <= now + 1e-9:
+            running.popleft()
+            gate.release()
+            tracker.released()
+
+        pending += rates[step // steps_per_second] * tick
+        arrivals = int(pending + 1e-9)
+        pending -= arrivals
+        for _ in range(arrivals):
+            queue.append(now)
+            tracker.start_wait()
+
+        while queue and gate.try_acquire():
+            wait = now - queue.popleft()
+            waits.append(wait)
+            tracker.acquired(wait)
+            running.append(now + service_time)
+
+        if step and step % eval_every == 0:
+            target = policy.decide(tracker.sample(size), now)
+            if target != size:
+                resizes += 1
+                size = target
+                gate.resize(size)
+            sizes.append(size)
+
+    return SimulationResult(waits=waits, sizes=sizes, resizes=resizes)
+
+
+__all__ = [
+    "ACQUIRE_BUCKETS",
+    "LatencyHistogram",
+    "PoolSample",
+    "AcquireTracker",
+    "CapacityGate",
+    "ScalingPolicy",
+    "QueueWaitPolicy",
+    "UtilizationPolicy",
+    "SimulationResult",
+    "simulate",
+]
@@ -4,13 +4,15 @@
 
 import asyncio
 import logging
-from typing import Dict, Optional
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
 
-from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
 from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from core.config.load.db import DatabaseConfig
 from core.config.setting import get_settings
+from core.db.pool.autoscale import AcquireTracker, CapacityGate, QueueWaitPolicy, ScalingPolicy
 
 logger = logging.getLogger(__name__)
 
@@ -44,7 +46,11 @@ class PoolMetrics:
 
 
 class DynamicPool:
-    """动态连接池"""
+    """
+    动态连接池
+    引擎只创建一次, 可借出的连接数由 CapacityGate 限制为 size, 扩缩容只调整闸门上限;
+    引擎常驻 min_size 个连接, 超出部分归还时若已有 min_size 个空闲连接则直接关闭, 缩容后多余的连接随之释放
+    """
 
     def __init__(
         self,
@@ -55,8 +61,12 @@ class DynamicPool:
         scale_up_threshold: float = 0.8,  # 扩容阈值
         scale_down_threshold: float = 0.3,  # 缩容阈值
         scale_step: int = 2,  # 每次扩缩容步长
-        scale_cooldown: int = 60,  # 扩缩容冷却时间（秒）
+        scale_cooldown: int = 60,  # 缩容冷却时间（秒）
         metrics_interval: int = 5,  # 指标收集间隔（秒）
+        scale_up_wait: float = 0.05,  # 获取连接等待 p95 超过该值（秒）时扩容
+        scale_up_cooldown: float = 5,  # 扩容冷却时间（秒）
+        scale_interval: float = 1,  # 扩缩容评估间隔（秒）
+        policy: Optional[ScalingPolicy] = None,  # 自定义扩缩容策略
     ):
         self.config = config
         self.min_size = min_size
@@ -67,15 +77,30 @@ class DynamicPool:
         self.scale_step = scale_step
         self.scale_cooldown = scale_cooldown
         self.metrics_interval = metrics_interval
+        self.scale_interval = scale_interval
+        self.policy = policy or QueueWaitPolicy(
+            min_size=min_size,
+            max_size=max_size,
+            scale_up_wait=scale_up_wait,
+            scale_up_utilization=scale_up_threshold,
+            scale_down_utilization=scale_down_threshold,
+            target_utilization=target_utilization,
+            scale_down_step=scale_step,
+            scale_up_cooldown=scale_up_cooldown,
+            scale_down_cooldown=scale_cooldown,
+        )
 
+        self.size = min_size
         self.engine: Optional[AsyncEngine] = None
         self.metrics = PoolMetrics()
+        self.tracker = AcquireTracker()
+        self.gate = CapacityGate(min_size)
         self._monitor_task: Optional[asyncio.Task] = None
         self._scaler_task: Optional[asyncio.Task] = None
 
     async def start(self):
         """启动连接池"""
-        # 创建引擎
+        # 创建引擎, 引擎允许的连接数不小于 max_size, 实际可借出的数量由闸门控制
         self.engine = create_async_engine(
             self.config.url,
             poolclass=AsyncAdaptedQueuePool,
@@ -86,6 +111,7 @@ class DynamicPool:
             pool_recycle=self.config.pool_recycle,
             echo=self.config.echo,
         )
+        self.gate.resize(self.size)
 
         # 启动监控任务
         self._monitor_task = asyncio.create_task(self._monitor_metrics())
@@ -120,73 +146,66 @@ class DynamicPool:
 
             await asyncio.sleep(self.metrics_interval)
 
+    @asynccontextmanager
+    async def connect(self) -> AsyncIterator[AsyncConnection]:
+        """获取连接, 借出数达到 size 时排队; 记录等待时间和排队深度供扩缩容使用"""
+        loop = asyncio.get_running_loop()
+        self.tracker.start_wait()
+        start = loop.time()
+        try:
+            await self.gate.acquire()
+        except BaseException:
+            self.tracker.cancelled()
+            raise
+        try:
+            conn = await self.engine.connect()
+        except BaseException:
+            self.gate.release()
+            self.tracker.cancelled()
+            raise
+        self.tracker.acquired(loop.time() - start)
+        try:
+            yield conn
+        finally:
+            try:
+                await conn.close()
+            finally:
+                self.gate.release()
+                self.tracker.released()
+
     async def _auto_scale(self):
-        """自动扩缩容"""
+        """根据获取连接的等待时间和排队深度自动扩缩容"""
+        loop = asyncio.get_running_loop()
         while True:
+            await asyncio.sleep(self.scale_interval)
             try:
-                if self.engine and self.engine.pool:
-                    pool = self.engine.pool
-                    current_size = pool.size()
-                    active_connections = pool.checkedout()
-                    utilization = active_connections / current_size if current_size > 0 else 0
-
-                    # 扩容
-                    if (
-                        utilization >= self.scale_up_threshold
-                        and current_size < self.max_size
-                        and asyncio.get_event_loop().time() - self.metrics.last_scale_time > self.scale_cooldown
-                    ):
-                        new_size = min(current_size + self.scale_step, self.max_size)
-                        await self._resize_pool(new_size)
-                        self.metrics.last_scale_time = asyncio.get_event_loop().time()
-                        logger.info(f"Pool scaled up to {new_size}")
-
-                    # 缩容
-                    elif (
-                        utilization <= self.scale_down_threshold
-                        and current_size > self.min_size
-                        and asyncio.get_event_loop().time() - self.metrics.last_scale_time > self.scale_cooldown
-                    ):
-                        new_size = max(current_size - self.scale_step, self.min_size)
-                        await self._resize_pool(new_size)
-                        self.metrics.last_scale_time = asyncio.get_event_loop().time()
-                        logger.info(f"Pool scaled down to {new_size}")
+                if not self.engine:
+                    continue
+                sample = self.tracker.sample(self.size)
+                new_size = self.policy.decide(sample, loop.time())
+                if new_size != self.size:
+                    direction = "up" if new_size > self.size else "down"
+                    await self._resize_pool(new_size)
+                    self.metrics.last_scale_time = loop.time()
+                    logger.info(
+                        f"Pool scaled {direction} to {new_size} "
+                        f"(wait p95={sample.wait_p95:.3f}s, queue={sample.queue_depth}, "
+                        f"utilization={sample.utilization:.2f})"
+                    )
 
             except Exception as e:
                 logger.error("Failed to auto scale", exc_info=e)
 
-            await asyncio.sleep(self.metrics_interval)
-
     async def _resize_pool(self, new_size: int):
-        """调整连接池大小"""
-        if not self.engine:
-            return
-
-        try:
-            # 创建新引擎
-            new_engine = create_async_engine(
-                self.config.url,
-                poolclass=AsyncAdaptedQueuePool,
-                pool_pre_ping=True,
-                pool_size=new_size,
-                max_overflow=self.max_size - new_size,
-                pool_timeout=self.config.pool_timeout,
-                pool_recycle=self.config.pool_recycle,
-                echo=self.config.echo,
-            )
-
-            # 等待所有连接释放
-            old_engine = self.engine
-            self.engine = new_engine
-
-            # 关闭旧引擎
-            await old_engine.dispose()
-
-        except Exception as e:
-            logger.error("Failed to resize pool", exc_info=e)
-            raise
-
-    async def get_status(self) -> Dict[str, int]:
+        """
+        调整连接池大小
+        只调整闸门上限, 不重建引擎: 扩容立即放行排队的请求;
+        缩容时已借出的连接照常归还, 借出数降到新上限以下后才放行新的请求
+        """
+        self.size = new_size
+        self.gate.resize(new_size)
+
+    async def get_status(self) -> Dict[str, object]:
         """获取连接池状态"""
         if not self.engine or not self.engine.pool:
             return {
@@ -204,4 +223,8 @@ class DynamicPool:
             "active_connections": pool.checkedout(),
             "idle_connections": pool.checkedin(),
             "waiting_connections": pool.overflow(),
+            "target_size": self.size,
+            "checked_out": self.gate.in_use,
+            "acquire_waiting": self.tracker.waiting,
+            "acquire_latency": self.tracker.histogram.snapshot(),
         }
@@ -3,11 +3,17 @@
 """
 import asyncio
 import logging
-from typing import Dict, List, Optional, Set
+import random
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Hashable, List, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
 
 from core.config.setting import get_settings
 from core.db.core.manager import DatabaseConfig
 from core.db.pool.dynamic_pool import DynamicPool
+from core.db.pool.routing import ReadYourWrites, ReplicaState, choose_replica, classify_sql
 
 logger = logging.getLogger(__name__)
 
@@ -30,8 +36,7 @@ class ReplicaNode:
         self.weight = weight
         self.max_lag = max_lag
         self.pool: Optional[DynamicPool] = None
-        self._lag = 0
-        self._available = True
+        self.state = ReplicaState(weight=weight, max_lag=max_lag)
 
     async def start(self):
         """启动从节点"""
@@ -46,30 +51,58 @@ class ReplicaNode:
             self.pool = None
             logger.info(f"Replica node {self.name} stopped")
 
-    async def check_lag(self) -> int:
+    async def check_lag(self) -> float:
         """检查复制延迟"""
         if not self.pool:
             return -1
 
         try:
             async with self.pool.engine.connect() as conn:
-                result = await conn.execute("SHOW SLAVE STATUS")
-                row = result.fetchone()
-                if row:
-                    self._lag = row.Seconds_Behind_Master or 0
-                    self._available = True
-                    return self._lag
+                lag = await self._query_lag(conn)
+            self.state.observe(lag)
         except Exception as e:
             logger.error(f"Failed to check lag for replica {self.name}", exc_info=e)
-            self._available = False
-            self._lag = -1
+            self.state.observe(None)
+            return -1
+
+        return self.state.lag
 
-        return self._lag
+    @staticmethod
+    async def _query_lag(conn: AsyncConnection) -> Optional[float]:
+        """按方言查询复制延迟(秒)"""
+        if conn.dialect.name == "postgresql":
+            result = await conn.execute(
+                text("SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)")
+            )
+            return float(result.scalar() or 0)
+
+        result = await conn.execute(text("SHOW SLAVE STATUS"))
+        row = result.mappings().fetchone()
+        if row is None:
+            return 0.0
+        lag = row.get("Seconds_Behind_Master")
+        # 复制线程停止时为 NULL
+        return None if lag is None else float(lag)
+
+    @asynccontextmanager
+    async def connect(self) -> AsyncIterator[AsyncConnection]:
+        """获取连接并计入在途请求"""
+        self.state.inflight += 1
+        try:
+            async with self.pool.connect() as conn:
+                yield conn
+        finally:
+            self.state.inflight -= 1
+
+    @property
+    def lag(self) -> float:
+        """最近一次测得的复制延迟"""
+        return self.state.lag
 
     @property
     def is_available(self) -> bool:
         """是否可用"""
-        return self._available and self._lag <= self.max_lag
+        return self.pool is not None and self.state.is_available
 
 
 class TransactionRouter:
@@ -89,22 +122,26 @@ class TransactionRouter:
         self.allow_replica_lag = allow_replica_lag
         self.transaction_route_to_master = transaction_route_to_master
 
+        self._force_master_keywords = frozenset(keyword.upper() for keyword in self.force_master_keywords)
+        self._force_master_tables = frozenset(table.lower() for table in self.force_master_tables)
+
     def should_use_master(self, sql: str, in_transaction: bool = False) -> bool:
         """是否使用主库"""
         # 在事务中且配置为使用主库
         if in_transaction and self.transaction_route_to_master:
             return True
 
-        # 包含强制主库关键字
-        sql_upper = sql.upper()
-        if any(keyword in sql_upper for keyword in self.force_master_keywords):
+        # 按词法分类(带缓存), 列名和字符串字面量不会被误判为关键字
+        info = classify_sql(sql)
+        if info.is_write:
             return True
 
-        # 包含强制主库表
-        if any(table in sql_upper for table in self.force_master_tables):
+        # 包含强制主库关键字
+        if info.keywords & self._force_master_keywords:
             return True
 
-        return False
+        # 包含强制主库表
+        return bool(info.identifiers & self._force_master_tables)
 
 
 class ReadWritePool:
@@ -114,7 +151,7 @@ class ReadWritePool:
         self,
         master_config: DatabaseConfig,
         replica_configs: List[Dict] = None,
-        read_strategy: str = "random",  # random, round_robin, weighted
+        read_strategy: str = "adaptive",  # random, round_robin, weighted, adaptive(按延迟和负载加权)
         auto_failover: bool = True,
         health_check_interval: int = 10,
         force_master_keywords: Optional[set] = None,
@@ -123,6 +160,7 @@ class ReadWritePool:
         transaction_route_to_master: bool = True,
         sticky_master: bool = True,
         track_queries: bool = True,
+        consistency_window: float = 30.0,
     ):
         self.master_config = master_config
         self.replica_configs = replica_configs or []
@@ -138,6 +176,9 @@ class ReadWritePool:
         self.sticky_master = sticky_master
         self.track_queries = track_queries
 
+        # 读己之写: 写入后该会话/用户的读请求在从库追上之前路由到主库
+        self.consistency = ReadYourWrites(window=consistency_window)
+
         self.master_pool: Optional[DynamicPool] = None
         self.replicas: List[ReplicaNode] = []
         self._current_replica = 0  # 用于轮询策略
@@ -196,7 +237,7 @@ class ReadWritePool:
                 if self.master_pool:
                     try:
                         async with self.master_pool.engine.connect() as conn:
-                            await conn.execute("SELECT 1")
+                            await conn.execute(text("SELECT 1"))
                     except Exception as e:
                         logger.error("Master database health check failed", exc_info=e)
 
@@ -209,33 +250,66 @@ class ReadWritePool:
 
             await asyncio.sleep(self.health_check_interval)
 
-    def get_read_pool(self) -> Optional[DynamicPool]:
-        """获取读连接池"""
-        # 如果没有可用的从库，返回主库
-        available_replicas = [r for r in self.replicas if r.is_available]
+    def record_write(self, consistency_key: Optional[Hashable]) -> Optional[float]:
+        """
+        记录会话/用户的写入
+        :param consistency_key: 会话或用户标识
+        :return: 读己之写令牌
+        """
+        if consistency_key is None:
+            return None
+        return self.consistency.record_write(consistency_key)
+
+    def select_replica(self, consistency_key: Optional[Hashable] = None) -> Optional[ReplicaNode]:
+        """
+        选择从库
+        :param consistency_key: 会话或用户标识, 只会选择已同步到其最近写入的从库
+        :return: 从库节点, 没有满足条件的从库时为 None(应读主库)
+        """
+        available_replicas = [
+            r for r in self.replicas if r.is_available and self.consistency.is_fresh(r.state, consistency_key)
+        ]
         if not available_replicas:
-            return self.master_pool
+            return None
 
         # 根据策略选择从库
         if self.read_strategy == "random":
-            return available_replicas[0].pool
+            return random.choice(available_replicas)
         elif self.read_strategy == "round_robin":
             self._current_replica = (self._current_replica + 1) % len(available_replicas)
-            return available_replicas[self._current_replica].pool
+            return available_replicas[self._current_replica]
         elif self.read_strategy == "weighted":
             total_weight = sum(r.weight for r in available_replicas)
             if total_weight == 0:
-                return available_replicas[0].pool
+                return available_replicas[0]
 
             # 加权随机
-            import random
             r = random.uniform(0, total_weight)
             for replica in available_replicas:
                 r -= replica.weight
                 if r <= 0:
-                    return replica.pool
+                    return replica
+        elif self.read_strategy == "adaptive":
+            return choose_replica(available_replicas) or available_replicas[0]
+
+        return available_replicas[0]
 
-        return available_replicas[0].pool
+    def get_read_pool(self, consistency_key: Optional[Hashable] = None) -> Optional[DynamicPool]:
+        """获取读连接池"""
+        # 如果没有可用的从库，返回主库
+        replica = self.select_replica(consistency_key)
+        return replica.pool if replica else self.master_pool
+
+    @asynccontextmanager
+    async def read_connection(self, consistency_key: Optional[Hashable] = None) -> AsyncIterator[AsyncConnection]:
+        """获取读连接, 从库连接计入其在途请求用于负载加权"""
+        replica = self.select_replica(consistency_key)
+        if replica is None:
+            async with self.master_pool.connect() as conn:
+                yield conn
+            return
+        async with replica.connect() as conn:
+            yield conn
 
     def get_write_pool(self) -> Optional[DynamicPool]:
         """获取写连接池"""
@@ -251,7 +325,9 @@ class ReadWritePool:
         for replica in self.replicas:
             status["replicas"][replica.name] = {
                 "available": replica.is_available,
-                "lag": replica._lag,
+                "lag": replica.lag,
+                "inflight": replica.state.inflight,
+                "effective_weight": replica.state.effective_weight,
                 "pool": await replica.pool.get_status() if replica.pool else None,
             }
 
@@ -0,0 +1,331 @@
+"""
+读写路由
+基于词法的语句分类(带缓存)、按复制延迟和在途请求加权的从库选择,
+以及读己之写(read-your-writes)令牌: 写入后仅在从库追上之前将该会话/用户的读路由到主库
+"""
+
+import random
+import re
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, Hashable, Iterable, NamedTuple, Optional, Pattern, Sequence, TypeVar
+
+from core.db.utils.fingerprint import fingerprint_sql, normalize_sql
+
+# 可以路由到从库的语句, 其余语句一律视为写
+READ_KEYWORDS = frozenset({"SELECT", "SHOW", "EXPLAIN", "DESCRIBE", "DESC", "VALUES", "TABLE"})
+# 解析缓存大小
+PARSE_CACHE_SIZE = 4096
+
+# 注释、字符串字面量、带引号的标识符、单词、其他单字符
+_TOKEN_RE = re.compile(
+    r"""--[^\n]*|/\*.*?\*/|'(?:[^']|'')*'|"((?:[^"]|"")*)"|`([^`]*)`|([A-Za-z_][\w$]*)|\S""",
+    re.DOTALL,
+)
+
+
+class StatementInfo(NamedTuple):
+    """语句分类结果"""
+
+    is_write: bool
+    keywords: FrozenSet[str]  # 出现的关键字(大写)
+    identifiers: FrozenSet[str]  # 出现的标识符(小写, 含表名)
+
+
+def _tokens(sql: str):
+    """词法切分, 跳过注释和字符串字面量; 单词统一为小写, 引号标识符保留原名的小写形式"""
+    for match in _TOKEN_RE.finditer(sql):
+        quoted = match.group(1) if match.group(1) is not None else match.group(2)
+        if quoted is not None:
+            yield "ident", quoted.lower()
+        elif match.group(3):
+            yield "word", match.group(3).lower()
+        elif match.group(0) in ("(", ")", ";"):
+            yield "punct", match.group(0)
+
+
+def parse_statement(sql: str) -> StatementInfo:
+    """
+    按词法判断语句是否需要主库(不缓存)
+    不会被列名(updated_at)、字符串字面量('DELETE')或注释误判;
+    未知语句按写处理以保证安全
+    :param sql: 原始SQL
+    :return: 分类结果
+    """
+    words = []
+    identifiers = set()
+    for kind, value in _tokens(sql):
+        if kind == "punct":
+            continue
+        identifiers.add(value)
+        if kind == "word":
+            words.append(value.upper())
+    keywords = frozenset(words)
+
+    if not words:
+        return StatementInfo(False, keywords, frozenset(identifiers))
+
+    first = words[0]
+    if first == "WITH":
+        # 数据修改型 CTE: WITH t AS (...) INSERT/UPDATE/DELETE ...
+        is_write = bool(keywords & {"INSERT", "UPDATE", "DELETE", "MERGE"})
+    elif first == "EXPLAIN":
+        # EXPLAIN ANALYZE 会真正执行语句
+        is_write = "ANALYZE" in keywords and bool(keywords & {"INSERT", "UPDATE", "DELETE", "MERGE"})
+    else:
+        is_write = first not in READ_KEYWORDS
+
+    if not is_write and first in ("SELECT", "WITH"):
+        # 加锁读与 SELECT ... INTO 需要主库
+        is_write = "INTO" in keywords or any(
+            _has_sequence(words, clause) for clause in (("FOR", "UPDATE"), ("FOR", "SHARE"), ("LOCK", "IN", "SHARE"))
+        )
+    return StatementInfo(is_write, keywords, frozenset(identifiers))
+
+
+# 按原始SQL缓存的分类
+classify_sql = lru_cache(maxsize=PARSE_CACHE_SIZE)(parse_statement)
+
+
+def _has_sequence(words: Sequence[str], sequence: Sequence[str]) -> bool:
+    size = len(sequence)
+    return any(tuple(words[i : i + size]) == tuple(sequence) for i in range(len(words) - size + 1))
+
+
+def compile_table_matcher(tables: Iterable[str]) -> Optional[Pattern]:
+    """
+    将表名编译为一个正则, 一次扫描匹配所有表
+    :param tables: 表名
+    :return: 正则, 无表名时为 None
+    """
+    names = sorted({table.lower() for table in tables if table}, key=len, reverse=True)
+    if not names:
+        return None
+    alternatives = "|".join(re.escape(name) for name in names)
+    return re.compile(rf"(?<![\w$])(?:{alternatives})(?![\w$])", re.IGNORECASE)
+
+
+class RouteClassifier:
+    """
+    按 SQL 指纹缓存的路由判定
+    缓存键为去除字面量后的指纹, 仅字面量不同的语句共享一个条目; 缓存按 LRU 淘汰, 大小有上限
+    """
+
+    def __init__(
+        self,
+        force_master_keywords: Iterable[str] = (),
+        force_master_tables: Iterable[str] = (),
+        cache_size: int = PARSE_CACHE_SIZE,
+    ):
+        """
+        :param force_master_keywords: 出现即走主库的关键字
+        :param force_master_tables: 涉及即走主库的表
+        :param cache_size: 缓存条目上限
+        """
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, bool]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.set_rules(force_master_keywords, force_master_tables)
+
+    def set_rules(self, force_master_keywords: Iterable[str], force_master_tables: Iterable[str]) -> None:
+        """更新强制主库规则并清空缓存"""
+        self._keywords = frozenset(keyword.upper() for keyword in force_master_keywords)
+        self._tables = frozenset(table.lower() for table in force_master_tables)
+        self._table_matcher = compile_table_matcher(self._tables)
+        self.clear()
+
+    def _decide(self, normalized: str) -> bool:
+        info = parse_statement(normalized)
+        if info.is_write or info.keywords & self._keywords:
+            return True
+        return bool(self._table_matcher and self._table_matcher.search(normalized))
+
+    def is_write(self, sql: str) -> bool:
+        """
+        是否需要路由到主库
+        :param sql: 原始SQL
+        :return: 是否走主库
+        """
+        key = fingerprint_sql(sql)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return cached
+
+        self.misses += 1
+        result = self._decide(normalize_sql(sql))
+        self._cache[key] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+        return result
+
+    def clear(self) -> None:
+        """清空缓存和统计"""
+        self._cache.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def memory_bytes(self) -> int:
+        """缓存占用内存的估算值(字节), 布尔值为单例不计入"""
+        return sys.getsizeof(self._cache) + sum(sys.getsizeof(key) for key in self._cache)
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "cache_size": len(self._cache),
+            "cache_capacity": self.cache_size,
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cache_evictions": self.evictions,
+            "cache_hit_rate": round(self.hit_rate, 4),
+            "cache_memory_bytes": self.memory_bytes(),
+        }
+
+
+@dataclass
+class ReplicaState:
+    """从库的实时状态: 复制延迟与在途请求"""
+
+    weight: int = 1
+    max_lag: float = 5
+    lag: float = 0.0
+    checked_at: float = field(default_factory=time.time)
+    inflight: int = 0
+    available: bool = True
+
+    def observe(self, lag: Optional[float], at: Optional[float] = None) -> None:
+        """
+        记录一次延迟检查
+        :param lag: 复制延迟(秒), None 表示检查失败
+        :param at: 检查时间
+        """
+        self.checked_at = time.time() if at is None else at
+        if lag is None or lag < 0:
+            self.available = False
+            return
+        self.available = True
+        self.lag = float(lag)
+
+    @property
+    def caught_up_to(self) -> float:
+        """从库数据至少已同步到的时间点"""
+        return self.checked_at - self.lag
+
+    @property
+    def is_available(self) -> bool:
+        return self.available and self.lag <= self.max_lag
+
+    @property
+    def effective_weight(self) -> float:
+        """按延迟和在途请求折算后的权重: 延迟越接近上限、在途请求越多, 权重越低"""
+        if not self.is_available:
+            return 0.0
+        return self.weight * (1 - self.lag / (self.max_lag + 1)) / (1 + self.inflight)
+
+
+T = TypeVar("T")
+
+
+def choose_replica(
+    candidates: Sequence[T],
+    state: Callable[[T], ReplicaState] = lambda replica: replica.state,
+    rng: random.Random = random,
+) -> Optional[T]:
+    """
+    按有效权重加权随机选择从库
+    :param candidates: 候选从库
+    :param state: 获取从库状态
+    :param rng: 随机数生成器
+    :return: 选中的从库, 无可用从库时为 None
+    """
+    weights = [state(candidate).effective_weight for candidate in candidates]
+    total = sum(weights)
+    if total <= 0:
+        return None
+    point = rng.uniform(0, total)
+    chosen = None
+    for candidate, weight in zip(candidates, weights):
+        if weight <= 0:
+            continue
+        chosen = candidate
+        point -= weight
+        if point <= 0:
+            break
+    return chosen
+
+
+class ReadYourWrites:
+    """
+    读己之写令牌
+    按会话或用户记录最近一次写入时间; 仅当从库已同步到该时间点后才允许其读请求走从库
+    """
+
+    def __init__(self, window: float = 30.0, max_keys: int = 100000, clock: Callable[[], float] = time.time):
+        """
+        :param window: 令牌有效期(秒), 超过后不再约束读路由
+        :param max_keys: 最多跟踪的会话/用户数, 超出时淘汰最久未写入的
+        :param clock: 时钟
+        """
+        self.window = window
+        self.max_keys = max_keys
+        self.clock = clock
+        self._tokens: "OrderedDict[Hashable, float]" = OrderedDict()
+
+    def record_write(self, key: Hashable, at: Optional[float] = None) -> float:
+        """
+        记录写入并返回令牌(写入时间), 令牌可下发给客户端在后续请求中带回
+        :param key: 会话或用户标识
+        :param at: 写入时间, 默认为当前时间
+        :return: 令牌
+        """
+        token = self.clock() if at is None else at
+        token = max(token, self._tokens.get(key, token))
+        self._tokens[key] = token
+        self._tokens.move_to_end(key)
+        while len(self._tokens) > self.max_keys:
+            self._tokens.popitem(last=False)
+        return token
+
+    def token(self, key: Optional[Hashable]) -> Optional[float]:
+        """获取仍在有效期内的令牌"""
+        if key is None:
+            return None
+        token = self._tokens.get(key)
+        if token is not None and self.clock() - token > self.window:
+            del self._tokens[key]
+            return None
+        return token
+
+    def is_fresh(self, state: ReplicaState, key: Optional[Hashable]) -> bool:
+        """从库是否已包含该会话/用户的全部写入"""
+        token = self.token(key)
+        return token is None or state.caught_up_to >= token
+
+    def forget(self, key: Hashable) -> None:
+        self._tokens.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+
+__all__ = [
+    "READ_KEYWORDS",
+    "StatementInfo",
+    "parse_statement",
+    "classify_sql",
+    "compile_table_matcher",
+    "RouteClassifier",
+    "ReplicaState",
+    "choose_replica",
+    "ReadYourWrites",
+]
@@ -1,5 +1,5 @@
 import logging
-from typing import Any, Optional, Dict
+from typing import Any, Dict, Hashable, Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql.elements import ClauseElement
@@ -17,14 +17,16 @@ class SessionProxy:
         router: TransactionRouter,
         master_session: AsyncSession,
         replica_session: Optional[AsyncSession] = None,
-        sticky_master: bool = True,  # 是否开启主库粘性会话
+        sticky_master: bool = True,  # 是否开启主库粘性会话(仅持续到从库追上本会话的写入)
         track_queries: bool = True,  # 是否跟踪查询
+        consistency_key: Optional[Hashable] = None,  # 读己之写标识, 如用户ID, 默认按会话
     ):
         self.router = router
         self.master_session = master_session
         self.replica_session = replica_session
         self.sticky_master = sticky_master
         self.track_queries = track_queries
+        self.consistency_key = consistency_key if consistency_key is not None else id(self)
 
         self._in_transaction = False
         self._used_master = False  # 是否使用过主库
@@ -43,8 +45,8 @@ class SessionProxy:
         if self._in_transaction:
             return self.master_session
 
-        # 如果开启主库粘性会话且使用过主库，继续使用主库
-        if self.sticky_master and self._used_master:
+        # 如果开启主库粘性会话且写入过，在从库追上之前继续使用主库
+        if self.sticky_master and self._used_master and not self._replicas_caught_up():
             return self.master_session
 
         # 如果没有从库会话，使用主库会话
@@ -53,6 +55,24 @@ class SessionProxy:
 
         return self.replica_session
 
+    def _replicas_caught_up(self) -> bool:
+        """所有可用从库是否都已同步到本会话最近一次写入"""
+        pool = self.router.pool
+        consistency = getattr(pool, "consistency", None)
+        if consistency is None:
+            # 无法判断同步进度时保持粘性
+            return False
+        if consistency.token(self.consistency_key) is None:
+            return True
+        replicas = [replica for replica in pool.replicas if replica.is_available]
+        return bool(replicas) and all(consistency.is_fresh(replica.state, self.consistency_key) for replica in replicas)
+
+    def _mark_master(self, is_write: bool) -> None:
+        """标记使用过主库并记录写入"""
+        self._used_master = True
+        if is_write and hasattr(self.router.pool, "record_write"):
+            self.router.pool.record_write(self.consistency_key)
+
     async def execute(self, statement: ClauseElement, *args, **kwargs) -> Any:
         """执行SQL语句"""
         # 更新查询统计
@@ -80,7 +100,7 @@ class SessionProxy:
 
         # 标记使用过主库
         if session is self.master_session:
-            self._used_master = True
+            self._mark_master(is_write)
 
         # 执行查询
         return await session.execute(statement, *args, **kwargs)
@@ -112,7 +132,7 @@ class SessionProxy:
 
         # 标记使用过主库
         if session is self.master_session:
-            self._used_master = True
+            self._mark_master(is_write)
 
         # 执行查询
         return await session.execute(sql, *args, **kwargs)
@@ -1,12 +1,12 @@
 import logging
-import re
-from typing import Optional, Set, Dict
+from typing import Dict, Hashable, Optional, Set
 
 from sqlalchemy.sql import Select, Insert, Update, Delete
 from sqlalchemy.sql.elements import ClauseElement
 
 from core.db.pool.dynamic_pool import DynamicPool
 from core.db.pool.read_write_pool import ReadWritePool
+from core.db.pool.routing import PARSE_CACHE_SIZE, RouteClassifier
 
 logger = logging.getLogger(__name__)
 
@@ -14,20 +14,6 @@ logger = logging.getLogger(__name__)
 class TransactionRouter:
     """事务路由器"""
 
-    # 写操作SQL关键字
-    WRITE_KEYWORDS = {
-        "INSERT",
-        "UPDATE",
-        "DELETE",
-        "CREATE",
-        "DROP",
-        "ALTER",
-        "GRANT",
-        "TRUNCATE",
-        "REPLACE",
-        "LOCK",
-    }
-
     def __init__(
         self,
         pool: ReadWritePool,
@@ -35,6 +21,7 @@ class TransactionRouter:
         force_master_tables: Set[str] = None,  # 强制主库表
         allow_replica_lag: int = 5,  # 允许的从库延迟（秒）
         transaction_route_to_master: bool = True,  # 事务是否强制路由到主库
+        parse_cache_size: int = PARSE_CACHE_SIZE,  # SQL解析缓存条目上限
     ):
         self.pool = pool
         self.force_master_keywords = force_master_keywords or set()
@@ -42,36 +29,16 @@ class TransactionRouter:
         self.allow_replica_lag = allow_replica_lag
         self.transaction_route_to_master = transaction_route_to_master
 
-        # SQL解析缓存
-        self._parse_cache: Dict[str, bool] = {}
+        # SQL解析缓存: 按指纹索引的有界 LRU, 写操作按词法识别, 强制主库表预编译为一个正则
+        self._classifier = RouteClassifier(
+            force_master_keywords=self.force_master_keywords,
+            force_master_tables=self.force_master_tables,
+            cache_size=parse_cache_size,
+        )
 
     def is_write_operation(self, sql: str) -> bool:
         """判断是否为写操作"""
-        # 检查缓存
-        if sql in self._parse_cache:
-            return self._parse_cache[sql]
-
-        # 转换为大写以便匹配
-        sql_upper = sql.upper()
-
-        # 检查是否包含写操作关键字
-        is_write = any(keyword in sql_upper for keyword in self.WRITE_KEYWORDS)
-
-        # 检查是否包含强制主库关键字
-        is_force_master = any(keyword in sql_upper for keyword in self.force_master_keywords)
-
-        # 检查是否操作强制主库表
-        for table in self.force_master_tables:
-            if re.search(rf"\b{table}\b", sql, re.IGNORECASE):
-                is_force_master = True
-                break
-
-        result = is_write or is_force_master
-
-        # 缓存结果
-        self._parse_cache[sql] = result
-
-        return result
+        return self._classifier.is_write(sql)
 
     def is_write_statement(self, statement: ClauseElement) -> bool:
         """判断SQLAlchemy语句是否为写操作"""
@@ -82,12 +49,14 @@ class TransactionRouter:
         statement: Optional[ClauseElement] = None,
         sql: Optional[str] = None,
         in_transaction: bool = False,
+        consistency_key: Optional[Hashable] = None,
     ) -> DynamicPool:
         """获取语句对应的连接池
         Args:
             statement: SQLAlchemy语句
             sql: 原始SQL
             in_transaction: 是否在事务中
+            consistency_key: 会话或用户标识, 写入后其读请求在从库追上之前走主库
         """
         # 在事务中且配置要求路由到主库
         if in_transaction and self.transaction_route_to_master:
@@ -103,9 +72,10 @@ class TransactionRouter:
 
         # 获取对应的连接池
         if is_write:
+            self.pool.record_write(consistency_key)
             return self.pool.get_write_pool()
         else:
-            return self.pool.get_read_pool()
+            return self.pool.get_read_pool(consistency_key)
 
     async def get_suitable_replica(self, required_lag: Optional[int] = None) -> Optional[DynamicPool]:
         """获取满足复制延迟要求的从库
@@ -116,7 +86,7 @@ class TransactionRouter:
 
         # 获取所有可用且复制延迟在允许范围内的从库
         suitable_replicas = [
-            replica for replica in self.pool.replicas if (replica.is_available and replica.replication_lag <= max_lag)
+            replica for replica in self.pool.replicas if (replica.is_available and replica.lag <= max_lag)
         ]
 
         if not suitable_replicas:
@@ -142,12 +112,12 @@ class TransactionRouter:
 
     def clear_cache(self):
         """清空SQL解析缓存"""
-        self._parse_cache.clear()
+        self._classifier.clear()
 
     def get_metrics(self) -> Dict:
         """获取路由器指标"""
         return {
-            "cache_size": len(self._parse_cache),
+            **self._classifier.metrics(),
             "force_master_keywords": list(self.force_master_keywords),
             "force_master_tables": list(self.force_master_tables),
             "allow_replica_lag": self.allow_replica_lag,
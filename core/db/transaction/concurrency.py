@@ -1,8 +1,13 @@
 import asyncio
+import heapq
+import itertools
 import logging
+import time
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, Set
+from typing import Dict, List, Set, Tuple
+
+from core.db.utils.waitgraph import Deadlock, WaitForGraph
 
 logger = logging.getLogger(__name__)
 
@@ -18,13 +23,24 @@ class TransactionLock:
 
 
 class ConcurrencyManager:
-    """事务并发控制器"""
+    """
+    事务并发控制器
+    锁表以资源为键, 获取和释放都是字典操作, 过期清理按到期时间堆弹出; 冲突时可以等待,
+    等待关系记录在增量式等待图中, 只在新增等待边时检测死锁并选择牺牲者
+    """
 
     def __init__(self, max_concurrent_transactions: int = 100):
         self.max_concurrent_transactions = max_concurrent_transactions
         self._locks: Dict[str, TransactionLock] = {}  # resource -> lock
+        self._expiry: List[Tuple[float, int, str, TransactionLock]] = []  # 按到期时间排序的锁
+        self._sequence = itertools.count()
         self._transaction_resources: Dict[str, Set[str]] = {}  # transaction_id -> resources
         self._semaphore = asyncio.Semaphore(max_concurrent_transactions)
+        self._admitted: Set[str] = set()  # 已占用并发名额的事务
+        self._graph = WaitForGraph()
+        self._waiters: Dict[str, Set[str]] = {}  # resource -> 等待该资源的事务
+        self._wakeups: Dict[str, asyncio.Event] = {}  # transaction_id -> 唤醒事件
+        self._victims: Set[str] = set()  # 被选为死锁牺牲者的事务
 
         # 统计信息
         self._stats = {
@@ -36,57 +52,71 @@ class ConcurrencyManager:
             "deadlocks_detected": 0,
         }
 
-    def _is_deadlock(self, transaction_id: str, resource: str, visited: Set[str]) -> bool:
-        """检测死锁"""
-        if resource not in self._locks:
-            return False
-
-        lock = self._locks[resource]
-        if lock.transaction_id == transaction_id:
-            return True
-
-        if lock.transaction_id in visited:
-            return False
-
-        visited.add(lock.transaction_id)
-
-        # 检查持有该锁的事务是否在等待其他资源
-        for other_resource in self._transaction_resources.get(lock.transaction_id, set()):
-            if self._is_deadlock(transaction_id, other_resource, visited):
-                return True
-
-        return False
-
     def _clean_expired_locks(self):
         """清理过期的锁"""
-        now = datetime.now()
-        expired_resources = []
-
-        for resource, lock in self._locks.items():
-            if (now - lock.acquired_at).total_seconds() > lock.timeout:
-                expired_resources.append(resource)
+        now = time.monotonic()
+        while self._expiry and self._expiry[0][0] < now:
+            _, _, resource, lock = heapq.heappop(self._expiry)
+            # 锁已释放或被重新获取时, 堆中的旧记录直接丢弃
+            if self._locks.get(resource) is lock:
                 self._stats["lock_timeouts"] += 1
-
-        for resource in expired_resources:
-            self._release_resource(resource)
+                self._release_resource(resource)
 
     def _release_resource(self, resource: str):
-        """释放资源"""
-        if resource in self._locks:
-            lock = self._locks[resource]
-            if lock.transaction_id in self._transaction_resources:
-                self._transaction_resources[lock.transaction_id].remove(resource)
-                if not self._transaction_resources[lock.transaction_id]:
-                    del self._transaction_resources[lock.transaction_id]
-            del self._locks[resource]
-
-    async def acquire(self, transaction_id: str, resources: Set[str], timeout: int = 30) -> bool:
+        """释放资源并唤醒等待该资源的事务"""
+        lock = self._locks.pop(resource, None)
+        if lock is None:
+            return
+        held = self._transaction_resources.get(lock.transaction_id)
+        if held is not None:
+            held.discard(resource)
+            if not held:
+                del self._transaction_resources[lock.transaction_id]
+        self._graph.released(lock.transaction_id)
+        for waiter in self._waiters.pop(resource, ()):
+            event = self._wakeups.get(waiter)
+            if event is not None:
+                event.set()
+
+    def _holders(self, transaction_id: str, resources: Set[str]) -> Dict[str, str]:
+        """被其他事务持有的资源 -> 持有者"""
+        holders = {}
+        for resource in resources:
+            lock = self._locks.get(resource)
+            if lock is not None and lock.transaction_id != transaction_id:
+                holders[resource] = lock.transaction_id
+        return holders
+
+    def _abort_victim(self, deadlock: Deadlock) -> None:
+        """中止牺牲者的等待, 使其 acquire 返回 False"""
+        self._victims.add(deadlock.victim)
+        event = self._wakeups.get(deadlock.victim)
+        if event is not None:
+            event.set()
+
+    def _stop_waiting(self, transaction_id: str, resources: Set[str]) -> None:
+        self._graph.remove_wait(transaction_id)
+        self._wakeups.pop(transaction_id, None)
+        for resource in resources:
+            waiters = self._waiters.get(resource)
+            if waiters is not None:
+                waiters.discard(transaction_id)
+                if not waiters:
+                    del self._waiters[resource]
+
+    async def acquire(
+        self, transaction_id: str, resources: Set[str], timeout: int = 30, wait_timeout: float = 0
+    ) -> bool:
         """获取事务锁
 
+        同一事务可以多次调用以逐步加锁; wait_timeout 大于 0 时在冲突资源上等待,
+        等待期间若检测到死锁, 代价最低的事务(持有锁最少、最年轻)被中止
+
         Args:
             transaction_id: 事务ID
             resources: 需要锁定的资源集合
             timeout: 锁超时时间(秒)
+            wait_timeout: 冲突时最长等待时间(秒), 0 表示不等待
 
         Returns:
             bool: 是否成功获取所有锁
@@ -96,68 +126,112 @@ class ConcurrencyManager:
             self._clean_expired_locks()
 
             # 检查是否超过最大并发数
-            if not await self._semaphore.acquire():
-                return False
+            admitted = transaction_id not in self._admitted
+            if admitted:
+                await self._semaphore.acquire()
+                self._admitted.add(transaction_id)
+                self._graph.register(transaction_id)
 
             try:
-                # 检查资源冲突
-                for resource in resources:
-                    if resource in self._locks:
-                        current_lock = self._locks[resource]
-                        if current_lock.transaction_id != transaction_id:
-                            # 检查死锁
-                            if self._is_deadlock(transaction_id, resource, {transaction_id}):
-                                self._stats["deadlocks_detected"] += 1
-                                return False
-                            self._stats["lock_conflicts"] += 1
-                            return False
-
-                # 获取所有资源的锁
-                now = datetime.now()
-                for resource in resources:
-                    self._locks[resource] = TransactionLock(
-                        transaction_id=transaction_id, resources=resources, acquired_at=now, timeout=timeout
-                    )
-
-                # 记录事务资源
-                self._transaction_resources[transaction_id] = resources
+                acquired = await self._wait_and_lock(transaction_id, set(resources), timeout, wait_timeout)
+            except Exception as e:
+                logger.error(f"Error acquiring locks: {e}")
+                acquired = False
 
+            if not acquired and admitted and transaction_id not in self._transaction_resources:
+                self._admitted.discard(transaction_id)
+                self._graph.remove(transaction_id)
+                self._semaphore.release()
+            elif acquired and admitted:
                 # 更新统计信息
                 self._stats["total_transactions"] += 1
                 self._stats["current_transactions"] += 1
                 self._stats["max_concurrent_reached"] = max(
                     self._stats["max_concurrent_reached"], self._stats["current_transactions"]
                 )
-
-                return True
-
-            except Exception as e:
-                logger.error(f"Error acquiring locks: {e}")
-                self._semaphore.release()
-                return False
+            return acquired
 
         except Exception as e:
             logger.error(f"Error in acquire: {e}")
             return False
 
+    async def _wait_and_lock(self, transaction_id: str, resources: Set[str], timeout: int, wait_timeout: float) -> bool:
+        deadline = time.monotonic() + wait_timeout
+        conflicted = False
+        try:
+            while True:
+                if transaction_id in self._victims:
+                    return False
+
+                holders = self._holders(transaction_id, resources)
+                if not holders:
+                    break
+
+                if not conflicted:
+                    conflicted = True
+                    self._stats["lock_conflicts"] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+
+                deadlock = self._graph.add_wait(transaction_id, set(holders.values()))
+                if deadlock is not None:
+                    self._stats["deadlocks_detected"] += 1
+                    logger.warning(f"Deadlock detected: {deadlock.cycle}, victim {deadlock.victim}")
+                    if deadlock.victim == transaction_id:
+                        return False
+                    self._abort_victim(deadlock)
+                    # 牺牲者释放锁后会唤醒本事务; 在此之前不保留等待边
+                    self._graph.remove_wait(transaction_id)
+
+                event = self._wakeups[transaction_id] = asyncio.Event()
+                for resource in holders:
+                    self._waiters.setdefault(resource, set()).add(transaction_id)
+                try:
+                    await asyncio.wait_for(event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    return False
+        finally:
+            self._stop_waiting(transaction_id, resources)
+
+        # 获取所有资源的锁
+        now = datetime.now()
+        expires_at = time.monotonic() + timeout
+        owned = self._transaction_resources.setdefault(transaction_id, set())
+        for resource in resources:
+            if resource not in owned:
+                owned.add(resource)
+                self._graph.acquired(transaction_id)
+            lock = self._locks[resource] = TransactionLock(
+                transaction_id=transaction_id, resources=owned, acquired_at=now, timeout=timeout
+            )
+            heapq.heappush(self._expiry, (expires_at, next(self._sequence), resource, lock))
+        return True
+
     async def release(self, transaction_id: str):
         """释放事务锁"""
         try:
             # 释放该事务持有的所有资源
             if transaction_id in self._transaction_resources:
-                resources = self._transaction_resources[transaction_id]
-                for resource in resources:
+                for resource in list(self._transaction_resources[transaction_id]):
                     self._release_resource(resource)
 
-                # 更新统计信息
-                self._stats["current_transactions"] -= 1
+            self._graph.remove(transaction_id)
+            self._victims.discard(transaction_id)
 
             # 释放信号量
-            self._semaphore.release()
+            if transaction_id in self._admitted:
+                self._admitted.discard(transaction_id)
+                self._stats["current_transactions"] -= 1
+                self._semaphore.release()
 
         except Exception as e:
             logger.error(f"Error releasing locks: {e}")
 
+    def is_victim(self, transaction_id: str) -> bool:
+        """事务是否被选为死锁牺牲者(应回滚并调用 release)"""
+        return transaction_id in self._victims
+
     def get_metrics(self) -> Dict:
         """获取并发控制指标"""
         return {
@@ -167,6 +241,8 @@ class ConcurrencyManager:
             "current_state": {
                 "active_locks": len(self._locks),
                 "active_transactions": len(self._transaction_resources),
+                "waiting_transactions": len(self._wakeups),
             },
             "stats": self._stats.copy(),
+            "wait_graph": self._graph.metrics(),
         }
@@ -1,12 +1,46 @@
 import asyncio
 import logging
 from contextlib import asynccontextmanager
-from typing import Dict, List, Optional, Set
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Set
 
 from core.db.transaction.distributed import DistributedTransaction, DistributedTransactionManager, TransactionState
+from core.db.transaction.log import TransactionLog
 
 logger = logging.getLogger(__name__)
 
+# 恢复时处理单个参与者: (事务ID, 参与者, 是否提交) -> 是否成功
+Resolver = Callable[[str, str, bool], Awaitable[bool]]
+
+
+def prepared_resolver(engines: Mapping[str, Any], log: TransactionLog) -> Resolver:
+    """
+    按事务日志中的 xid 完成已准备的参与者, 用于 recover
+    提交执行 COMMIT PREPARED(MySQL 为 XA COMMIT), 回滚执行 ROLLBACK PREPARED;
+    没有 xid 的参与者从未执行 PREPARE, 其事务已随连接断开回滚, 只有回滚决定能视为完成
+    :param engines: {参与者名: 同步 Engine}
+    :param log: 事务日志
+    :return: 恢复用的参与者处理函数
+    """
+
+    def resolve_sync(transaction_id: str, participant: str, commit: bool) -> bool:
+        xid = log.get_participant_xids(transaction_id).get(participant)
+        if xid is None:
+            return not commit
+        with engines[participant].connect() as conn:
+            if xid not in conn.recover_twophase():
+                # 已经提交或回滚过(提交决定只在全部参与者准备后做出), 或 PREPARE 前崩溃、已随连接断开回滚
+                return True
+            if commit:
+                conn.commit_prepared(xid, recover=True)
+            else:
+                conn.rollback_prepared(xid, recover=True)
+        return True
+
+    async def resolve(transaction_id: str, participant: str, commit: bool) -> bool:
+        return await asyncio.to_thread(resolve_sync, transaction_id, participant, commit)
+
+    return resolve
+
 
 class TransactionCoordinator:
     """事务协调器"""
@@ -44,12 +78,15 @@ class TransactionCoordinator:
         return False
 
     async def prepare(self, transaction: DistributedTransaction) -> bool:
-        """准备阶段"""
-        return await self._execute_with_retry(
-            operation=transaction.prepare,
-            timeout=self.prepare_timeout,
-            error_message=f"Prepare phase for transaction {transaction.transaction_id}",
-        )
+        """准备阶段(不重试: 否决后事务已回滚)"""
+        try:
+            async with asyncio.timeout(self.prepare_timeout):
+                return await transaction.prepare()
+        except asyncio.TimeoutError:
+            logger.error(
+                f"Prepare phase for transaction {transaction.transaction_id} timed out after {self.prepare_timeout}s"
+            )
+            return False
 
     async def commit(self, transaction: DistributedTransaction) -> bool:
         """提交阶段"""
@@ -92,6 +129,51 @@ class TransactionCoordinator:
             # 清理事务
             self.manager.remove_transaction(transaction.transaction_id)
 
+    async def recover(self, resolver: Resolver, log: Optional[TransactionLog] = None) -> Dict[str, str]:
+        """
+        崩溃恢复: 根据事务日志完成未完成的事务
+        已记录提交决定的事务继续提交, 其余按回滚处理; 各事务、各参与者并发处理
+        :param resolver: 对单个参与者执行提交或回滚, 如 COMMIT PREPARED / ROLLBACK PREPARED
+        :param log: 事务日志, 默认使用管理器的日志
+        :return: {事务ID: committed / rolled_back / pending}
+        """
+        log = log or self.manager.log
+        if log is None:
+            raise ValueError("Transaction log is required for recovery")
+
+        async def resolve(transaction_id: str, decision: Optional[str]) -> str:
+            commit = decision == "commit"
+            done_state = "committed" if commit else "rolled_back"
+            names = [name for name, state in log.get_participant_states(transaction_id).items() if state != done_state]
+            outcomes = await asyncio.gather(
+                *(
+                    self._execute_with_retry(
+                        operation=lambda name=name: resolver(transaction_id, name, commit),
+                        timeout=self.commit_timeout if commit else self.rollback_timeout,
+                        error_message=f"Recovering participant {name} of transaction {transaction_id}",
+                    )
+                    for name in names
+                )
+            )
+            record = log.log_participant_commit if commit else log.log_participant_rollback
+            for name, ok in zip(names, outcomes):
+                record(transaction_id, name, ok)
+            if not all(outcomes):
+                return "pending"
+            log.log_transaction_recovered(transaction_id, done_state)
+            return done_state
+
+        in_doubt = {
+            transaction_id: decision
+            for transaction_id, decision in log.get_in_doubt().items()
+            if self.manager.get_transaction(transaction_id) is None  # 跳过本进程中仍在进行的事务
+        }
+        states = await asyncio.gather(*(resolve(tx_id, decision) for tx_id, decision in in_doubt.items()))
+        results = dict(zip(in_doubt, states))
+        if results:
+            logger.info(f"Recovered transactions: {results}")
+        return results
+
     def get_metrics(self) -> Dict:
         """获取协调器指标"""
         return {
@@ -1,11 +1,18 @@
 import asyncio
+import functools
+import inspect
 import logging
+import uuid
 from contextlib import asynccontextmanager
 from datetime import datetime
 from enum import Enum
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Union
 
-from sqlalchemy.ext.asyncio import AsyncSession
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.orm import Session
+
+    from core.db.transaction.log import TransactionLog
 
 logger = logging.getLogger(__name__)
 
@@ -23,67 +30,127 @@ class TransactionState(Enum):
     FAILED = "failed"  # 失败状态
 
 
-class TransactionParticipant:
-    """事务参与者"""
+def _current_xid(session: "Session") -> Any:
+    """两阶段会话当前事务的 xid"""
+    return session.connection().get_transaction().xid
+
+
+def _prepare_session(session: "Session") -> None:
+    session.prepare()
 
-    def __init__(self, name: str, session: AsyncSession, timeout: int = 10):
+
+class TransactionParticipant:
+    """
+    事务参与者
+    会话以 twophase=True 创建时使用数据库原生的两阶段提交(PostgreSQL 的 PREPARE TRANSACTION, MySQL 的 XA);
+    普通会话的准备阶段只执行 flush, 提交阶段失败时无法撤销其他已提交的参与者
+    """
+
+    def __init__(
+        self,
+        name: str,
+        session: Union["AsyncSession", "Session"],
+        timeout: float = 10,
+        on_prepare: Optional[Callable[[Any], None]] = None,
+    ):
+        """
+        :param on_prepare: 两阶段会话执行 PREPARE 之前以 xid 调用, 用于先把 xid 写入事务日志
+        """
         self.name = name
         self.session = session
         self.timeout = timeout
+        self.on_prepare = on_prepare
+        self.xid: Optional[Any] = None
         self.state = TransactionState.INIT
         self.prepared_at: Optional[datetime] = None
         self.committed_at: Optional[datetime] = None
         self.rolled_back_at: Optional[datetime] = None
         self.error: Optional[Exception] = None
 
-    async def prepare(self) -> bool:
-        """准备阶段"""
+    @property
+    def two_phase(self) -> bool:
+        """会话是否使用数据库原生的两阶段提交"""
+        return bool(getattr(getattr(self.session, "sync_session", self.session), "twophase", False))
+
+    async def _call(self, method: str) -> None:
+        """调用会话方法, 兼容同步 Session 和 AsyncSession"""
+        result = getattr(self.session, method)()
+        if inspect.isawaitable(result):
+            await result
+
+    async def _run_sync(self, func: Callable[["Session"], Any]) -> Any:
+        """以同步 Session 调用函数, AsyncSession 通过 run_sync 执行"""
+        run_sync = getattr(self.session, "run_sync", None)
+        if run_sync is not None:
+            return await run_sync(func)
+        return func(self.session)
+
+    async def _prepare(self) -> None:
+        """
+        执行准备: 将挂起的修改发送到数据库, 约束冲突等错误在此暴露为否决票;
+        两阶段会话随后执行 PREPARE, 之后的提交只会因连接故障失败, 并可在恢复时按 xid 完成
+        """
+        await self._call("flush")
+        if not self.two_phase:
+            return
+        self.xid = await self._run_sync(_current_xid)
+        if self.on_prepare is not None:
+            self.on_prepare(self.xid)
+        await self._run_sync(_prepare_session)
+
+    async def _commit(self) -> None:
+        await self._call("commit")
+
+    async def _rollback(self) -> None:
+        await self._call("rollback")
+
+    async def _run(self, operation, phase: str) -> bool:
+        """在超时限制内执行一个阶段"""
         try:
-            self.state = TransactionState.PREPARING
-            # 开启事务
-            await self.session.begin()
-            self.state = TransactionState.PREPARED
-            self.prepared_at = datetime.now()
+            await asyncio.wait_for(operation(), self.timeout)
             return True
+        except asyncio.TimeoutError:
+            self.error = TimeoutError(f"{phase} timed out after {self.timeout}s")
         except Exception as e:
-            logger.error(f"Prepare failed for participant {self.name}: {e}")
-            self.state = TransactionState.FAILED
             self.error = e
+        logger.error(f"{phase.capitalize()} failed for participant {self.name}: {self.error}")
+        self.state = TransactionState.FAILED
+        return False
+
+    async def prepare(self) -> bool:
+        """准备阶段, 返回投票结果"""
+        self.state = TransactionState.PREPARING
+        if not await self._run(self._prepare, "prepare"):
             return False
+        self.state = TransactionState.PREPARED
+        self.prepared_at = datetime.now()
+        return True
 
     async def commit(self) -> bool:
         """提交阶段"""
-        try:
-            self.state = TransactionState.COMMITTING
-            await self.session.commit()
-            self.state = TransactionState.COMMITTED
-            self.committed_at = datetime.now()
-            return True
-        except Exception as e:
-            logger.error(f"Commit failed for participant {self.name}: {e}")
-            self.state = TransactionState.FAILED
-            self.error = e
+        self.state = TransactionState.COMMITTING
+        if not await self._run(self._commit, "commit"):
             return False
+        self.state = TransactionState.COMMITTED
+        self.committed_at = datetime.now()
+        return True
 
     async def rollback(self) -> bool:
         """回滚阶段"""
-        try:
-            self.state = TransactionState.ROLLING_BACK
-            await self.session.rollback()
-            self.state = TransactionState.ROLLED_BACK
-            self.rolled_back_at = datetime.now()
-            return True
-        except Exception as e:
-            logger.error(f"Rollback failed for participant {self.name}: {e}")
-            self.state = TransactionState.FAILED
-            self.error = e
+        self.state = TransactionState.ROLLING_BACK
+        if not await self._run(self._rollback, "rollback"):
             return False
+        self.state = TransactionState.ROLLED_BACK
+        self.rolled_back_at = datetime.now()
+        return True
 
     def get_state(self) -> Dict:
         """获取状态信息"""
         return {
             "name": self.name,
             "state": self.state.value,
+            "two_phase": self.two_phase,
+            "xid": self.xid,
             "prepared_at": self.prepared_at.isoformat() if self.prepared_at else None,
             "committed_at": self.committed_at.isoformat() if self.committed_at else None,
             "rolled_back_at": self.rolled_back_at.isoformat() if self.rolled_back_at else None,
@@ -92,108 +159,151 @@ class TransactionParticipant:
 
 
 class DistributedTransaction:
-    """分布式事务"""
-
-    def __init__(self, transaction_id: str, coordinator_timeout: int = 30, participant_timeout: int = 10):
+    """
+    分布式事务(两阶段提交)
+    各参与者的准备和提交并发执行, 每个参与者有独立超时; 出现第一张否决票即取消其余准备并回滚。
+    配置事务日志时, 提交决定先落盘再通知参与者, 崩溃后据此恢复未完成的事务。
+    只有全部参与者使用 twophase=True 的会话时才是严格的两阶段提交, 普通会话的参与者只在准备阶段 flush
+    """
+
+    def __init__(
+        self,
+        transaction_id: str,
+        coordinator_timeout: int = 30,
+        participant_timeout: int = 10,
+        log: Optional["TransactionLog"] = None,
+    ):
         self.transaction_id = transaction_id
         self.coordinator_timeout = coordinator_timeout
         self.participant_timeout = participant_timeout
+        self.log = log
         self.participants: List[TransactionParticipant] = []
         self.state = TransactionState.INIT
+        self.decision: Optional[str] = None  # commit / rollback
         self.started_at = datetime.now()
         self.completed_at: Optional[datetime] = None
         self.error: Optional[Exception] = None
+        self._log("log_transaction_start", self)
 
-    def add_participant(self, name: str, session: AsyncSession) -> TransactionParticipant:
+    def add_participant(
+        self, name: str, session: Union["AsyncSession", "Session"], timeout: Optional[float] = None
+    ) -> TransactionParticipant:
         """添加参与者"""
-        participant = TransactionParticipant(name=name, session=session, timeout=self.participant_timeout)
+        participant = TransactionParticipant(name=name, session=session, timeout=timeout or self.participant_timeout)
+        return self.join(participant)
+
+    def join(self, participant: TransactionParticipant) -> TransactionParticipant:
+        """加入自定义参与者"""
+        if participant.on_prepare is None and self.log is not None:
+            # PREPARE 之前先把 xid 写入日志
+            participant.on_prepare = functools.partial(
+                self.log.log_participant_xid, self.transaction_id, participant.name
+            )
         self.participants.append(participant)
         return participant
 
+    def _log(self, method: str, *args, **kwargs) -> None:
+        if self.log is not None:
+            getattr(self.log, method)(*args, **kwargs)
+
     async def prepare(self) -> bool:
         """准备阶段"""
         self.state = TransactionState.PREPARING
+        self._log("log_transaction_prepare", self)
 
-        # 并行执行所有参与者的准备操作
-        prepare_tasks = [participant.prepare() for participant in self.participants]
-
+        # 并发准备, 第一张否决票即中止
+        tasks = {asyncio.create_task(participant.prepare()): participant for participant in self.participants}
+        pending = set(tasks)
+        vetoed: Optional[TransactionParticipant] = None
         try:
-            results = await asyncio.gather(*prepare_tasks)
-            success = all(results)
+            while pending and vetoed is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    participant = tasks[task]
+                    ok = task.exception() is None and task.result()
+                    error = None if ok else str(participant.error or task.exception())
+                    self._log("log_participant_prepare", self.transaction_id, participant.name, ok, error)
+                    if not ok and vetoed is None:
+                        vetoed = participant
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
 
-            if success:
-                self.state = TransactionState.PREPARED
-            else:
-                self.state = TransactionState.FAILED
-                await self.rollback()
+        if vetoed is None and all(p.state == TransactionState.PREPARED for p in self.participants):
+            self.state = TransactionState.PREPARED
+            return True
 
-            return success
-        except Exception as e:
-            logger.error(f"Prepare phase failed: {e}")
-            self.state = TransactionState.FAILED
-            self.error = e
-            await self.rollback()
-            return False
+        failed = vetoed.name if vetoed else "unknown"
+        logger.error(f"Prepare phase of transaction {self.transaction_id} vetoed by {failed}")
+        self.error = vetoed.error if vetoed else None
+        await self.rollback()
+        return False
 
     async def commit(self) -> bool:
-        """提交阶段"""
-        if self.state != TransactionState.PREPARED:
-            logger.error("Cannot commit: transaction not prepared")
-            return False
+        """
+        提交阶段
+        提交决定一旦落盘便不可撤销: 个别参与者提交失败时不回滚其他参与者, 而是保留给重试或恢复
+        """
+        if self.decision != "commit":
+            if self.state != TransactionState.PREPARED:
+                logger.error("Cannot commit: transaction not prepared")
+                return False
+            self.decision = "commit"
+            self._log("log_transaction_commit", self)
 
         self.state = TransactionState.COMMITTING
+        pending = [p for p in self.participants if p.state != TransactionState.COMMITTED]
+        results = await asyncio.gather(*(participant.commit() for participant in pending))
+        for participant, ok in zip(pending, results):
+            error = None if ok else str(participant.error)
+            self._log("log_participant_commit", self.transaction_id, participant.name, ok, error)
 
-        # 并行执行所有参与者的提交操作
-        commit_tasks = [participant.commit() for participant in self.participants]
-
-        try:
-            results = await asyncio.gather(*commit_tasks)
-            success = all(results)
-
-            if success:
-                self.state = TransactionState.COMMITTED
-            else:
-                self.state = TransactionState.FAILED
-                await self.rollback()
-
+        if all(results):
+            self.state = TransactionState.COMMITTED
             self.completed_at = datetime.now()
-            return success
-        except Exception as e:
-            logger.error(f"Commit phase failed: {e}")
-            self.state = TransactionState.FAILED
-            self.error = e
-            await self.rollback()
-            return False
+            self._log("log_transaction_complete", self)
+            return True
+
+        self.state = TransactionState.FAILED
+        failed = [p.name for p, ok in zip(pending, results) if not ok]
+        self.error = RuntimeError(f"Commit failed on participants: {failed}")
+        logger.error(f"Transaction {self.transaction_id} committed partially, pending participants: {failed}")
+        return False
 
     async def rollback(self) -> bool:
         """回滚阶段"""
-        self.state = TransactionState.ROLLING_BACK
-
-        # 并行���行所有参与者的回滚操作
-        rollback_tasks = [participant.rollback() for participant in self.participants]
-
-        try:
-            results = await asyncio.gather(*rollback_tasks)
-            success = all(results)
-
-            if success:
-                self.state = TransactionState.ROLLED_BACK
-            else:
-                self.state = TransactionState.FAILED
-
-            self.completed_at = datetime.now()
-            return success
-        except Exception as e:
-            logger.error(f"Rollback phase failed: {e}")
-            self.state = TransactionState.FAILED
-            self.error = e
+        if self.decision == "commit":
+            logger.error(f"Cannot roll back transaction {self.transaction_id}: commit already decided")
             return False
+        if self.state == TransactionState.ROLLED_BACK:
+            return True
+        if self.decision is None:
+            self.decision = "rollback"
+            self._log("log_transaction_rollback", self)
+
+        self.state = TransactionState.ROLLING_BACK
+        pending = [p for p in self.participants if p.state != TransactionState.ROLLED_BACK]
+        results = await asyncio.gather(*(participant.rollback() for participant in pending))
+        for participant, ok in zip(pending, results):
+            error = None if ok else str(participant.error)
+            self._log("log_participant_rollback", self.transaction_id, participant.name, ok, error)
+
+        self.completed_at = datetime.now()
+        if all(results):
+            self.state = TransactionState.ROLLED_BACK
+            self._log("log_transaction_complete", self)
+            return True
+        self.state = TransactionState.FAILED
+        return False
 
     def get_state(self) -> Dict:
         """获取事务状态"""
         return {
             "transaction_id": self.transaction_id,
             "state": self.state.value,
+            "decision": self.decision,
             "started_at": self.started_at.isoformat(),
             "completed_at": self.completed_at.isoformat() if self.completed_at else None,
             "error": str(self.error) if self.error else None,
@@ -204,16 +314,18 @@ class DistributedTransaction:
 class DistributedTransactionManager:
     """分布式事务管理器"""
 
-    def __init__(self, coordinator_timeout: int = 30, participant_timeout: int = 10):
+    def __init__(
+        self, coordinator_timeout: int = 30, participant_timeout: int = 10, log: Optional["TransactionLog"] = None
+    ):
         self.coordinator_timeout = coordinator_timeout
         self.participant_timeout = participant_timeout
+        self.log = log
         self.active_transactions: Dict[str, DistributedTransaction] = {}
-        self._transaction_id = 0
 
     def _generate_transaction_id(self) -> str:
         """生成事务ID"""
-        self._transaction_id += 1
-        return f"tx_{self._transaction_id}"
+        # 事务ID需跨进程唯一, 否则重启后会与日志中未完成的事务冲突
+        return f"tx_{uuid.uuid4().hex}"
 
     def create_transaction(self) -> DistributedTransaction:
         """创建新事务"""
@@ -222,6 +334,7 @@ class DistributedTransactionManager:
             transaction_id=transaction_id,
             coordinator_timeout=self.coordinator_timeout,
             participant_timeout=self.participant_timeout,
+            log=self.log,
         )
         self.active_transactions[transaction_id] = transaction
         return transaction
@@ -1,14 +1,21 @@
-import json
 import logging
+import os
 from datetime import datetime
 from enum import Enum
 from pathlib import Path
 from typing import Dict, List, Optional
 
+from core.db.utils.log_store import IndexedLogStore
+
 from .distributed import DistributedTransaction
 
 logger = logging.getLogger(__name__)
 
+# 未完成事务索引文件
+OPEN_INDEX_FILE = "open_transactions.idx"
+# 索引中已完成事务的行数超过该值(且超过未完成事务数)时压缩
+OPEN_INDEX_COMPACT_THRESHOLD = 1000
+
 
 class LogEntryType(Enum):
     """日志条目类型"""
@@ -24,6 +31,23 @@ class LogEntryType(Enum):
     ERROR = "error"
 
 
+# 事务级条目在未完成事务索引中的标记
+_OPEN_INDEX_MARKS = {
+    LogEntryType.TRANSACTION_START: "start",
+    LogEntryType.TRANSACTION_COMMIT: "commit",
+    LogEntryType.TRANSACTION_ROLLBACK: "rollback",
+    LogEntryType.TRANSACTION_COMPLETE: "complete",
+}
+
+# 恢复依赖的条目: 返回前记录和索引都已落盘(事务开始和提交/回滚决定);
+# 完成标记丢失只会让恢复重复一次已完成的操作, 不需要同步
+_DURABLE_ENTRIES = {
+    LogEntryType.TRANSACTION_START,
+    LogEntryType.TRANSACTION_COMMIT,
+    LogEntryType.TRANSACTION_ROLLBACK,
+}
+
+
 class TransactionLogEntry:
     """事务日志条目"""
 
@@ -72,7 +96,11 @@ class TransactionLogEntry:
 
 
 class TransactionLog:
-    """事务日志"""
+    """
+    事务日志
+    记录追加写入带索引的分段日志; 另以追加写的小文件维护未完成事务及其提交决定,
+    崩溃恢复只读取该文件和未完成事务的记录, 耗时与未完成事务数成正比而不是与历史长度成正比
+    """
 
     def __init__(
         self,
@@ -83,60 +111,97 @@ class TransactionLog:
         self.log_dir = Path(log_dir)
         self.max_file_size = max_file_size
         self.max_files = max_files
-        self.current_file: Optional[Path] = None
-        self.current_size = 0
 
-        # 创建日志目录
-        self.log_dir.mkdir(parents=True, exist_ok=True)
+        # 未完成事务: 事务ID -> 提交决定(None 表示尚未决定)
+        self._open: Dict[str, Optional[str]] = {}
+
+        # 带时间和事务ID索引的分段日志; 恢复需要未完成事务的全部记录, 这些记录所在的分段不会被轮转删除
+        self._store = IndexedLogStore(
+            log_dir=str(self.log_dir),
+            prefix="transaction",
+            indexer=self._index_record,
+            key_fields=("transaction_id",),
+            max_segment_size=max_file_size,
+            max_segments=max_files,
+            pinned=lambda: list(self._open),
+        )
 
-        # 初始化当前日志文件
-        self._init_current_file()
+        self._open_path = self.log_dir / OPEN_INDEX_FILE
+        self._open_lines = 0
+        self._load_open_index()
 
-    def _init_current_file(self):
-        """初始化当前日志文件"""
-        # 查找最新的日志文件
-        log_files = sorted(self.log_dir.glob("transaction_*.log"), key=lambda p: p.stat().st_mtime, reverse=True)
+    @staticmethod
+    def _index_record(record: Dict):
+        """提取日志记录的索引: 时间戳、事务ID、条目类型"""
+        return datetime.fromisoformat(record["timestamp"]).timestamp(), {
+            "transaction_id": record["transaction_id"],
+            "entry_type": record["entry_type"],
+        }
 
-        if not log_files:
-            # 创建新文件
-            self.current_file = self.log_dir / f"transaction_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-            self.current_size = 0
+    @property
+    def current_file(self) -> Optional[Path]:
+        return self._store.current_file
+
+    @property
+    def current_size(self) -> int:
+        return self._store.current_size
+
+    def _load_open_index(self):
+        """载入未完成事务索引"""
+        if not self._open_path.exists():
+            return
+        with self._open_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                transaction_id, _, mark = line.rstrip("\n").partition("\t")
+                if not mark:
+                    continue  # 崩溃时写了一半的行
+                self._open_lines += 1
+                self._apply_mark(transaction_id, mark)
+
+    def _apply_mark(self, transaction_id: str, mark: str):
+        if mark == "complete":
+            self._open.pop(transaction_id, None)
+        elif mark == "start":
+            self._open.setdefault(transaction_id, None)
         else:
-            self.current_file = log_files[0]
-            self.current_size = self.current_file.stat().st_size
-
-        # 如果当前文件大小超过限制,创建新文件
-        if self.current_size >= self.max_file_size:
-            self._rotate_files()
-
-    def _rotate_files(self):
-        """轮转日志文件"""
-        # 获取所有日志文件
-        log_files = sorted(self.log_dir.glob("transaction_*.log"), key=lambda p: p.stat().st_mtime)
-
-        # 如果文件数超过限制,删除最旧的文件
-        while len(log_files) >= self.max_files:
-            log_files[0].unlink()
-            log_files = log_files[1:]
-
-        # 创建新文件
-        self.current_file = self.log_dir / f"transaction_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-        self.current_size = 0
-
-    def _write_entry(self, entry: TransactionLogEntry):
-        """写入日志条目"""
-        # 如果当前文件大小超过限制,轮转文件
-        if self.current_size >= self.max_file_size:
-            self._rotate_files()
-
-        # 写入日志条目
-        entry_data = json.dumps(entry.to_dict()) + "\n"
-        entry_size = len(entry_data.encode("utf-8"))
-
-        with self.current_file.open("a", encoding="utf-8") as f:
-            f.write(entry_data)
-
-        self.current_size += entry_size
+            self._open[transaction_id] = mark
+
+    def _track(self, entry: TransactionLogEntry, sync: bool = False):
+        """维护未完成事务索引"""
+        mark = _OPEN_INDEX_MARKS.get(entry.entry_type)
+        if mark is None:
+            return
+        self._apply_mark(entry.transaction_id, mark)
+        with self._open_path.open("a", encoding="utf-8") as f:
+            f.write(f"{entry.transaction_id}\t{mark}\n")
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        self._open_lines += 1
+        if self._open_lines - len(self._open) > max(OPEN_INDEX_COMPACT_THRESHOLD, len(self._open)):
+            self._compact_open_index()
+
+    def _compact_open_index(self):
+        """只保留未完成事务, 原子替换索引文件"""
+        tmp_path = self._open_path.with_suffix(".tmp")
+        lines = []
+        for transaction_id, decision in self._open.items():
+            lines.append(f"{transaction_id}\tstart\n")
+            if decision:
+                lines.append(f"{transaction_id}\t{decision}\n")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._open_path)
+        self._open_lines = len(lines)
+
+    def _write_entry(self, entry: TransactionLogEntry, sync: Optional[bool] = None):
+        """写入日志条目, 提交决定等恢复依赖的条目在返回前落盘"""
+        if sync is None:
+            sync = entry.entry_type in _DURABLE_ENTRIES
+        self._store.append(entry.to_dict(), sync=sync)
+        self._track(entry, sync=sync)
 
     def log_transaction_start(self, transaction: DistributedTransaction):
         """记录事务开始"""
@@ -207,6 +272,17 @@ class TransactionLog:
         )
         self._write_entry(entry)
 
+    def log_participant_xid(self, transaction_id: str, participant_name: str, xid):
+        """记录参与者即将 PREPARE 的 xid, 在 PREPARE 之前落盘, 崩溃后据此提交或回滚已准备的事务"""
+        entry = TransactionLogEntry(
+            transaction_id=transaction_id,
+            entry_type=LogEntryType.PARTICIPANT_PREPARE,
+            participant_name=participant_name,
+            state="preparing",
+            details={"xid": xid},
+        )
+        self._write_entry(entry, sync=True)
+
     def log_participant_commit(self, transaction_id: str, participant_name: str, success: bool, error: str = None):
         """记录参与者提交阶段"""
         entry = TransactionLogEntry(
@@ -236,34 +312,55 @@ class TransactionLog:
         )
         self._write_entry(entry)
 
-    def get_transaction_log(self, transaction_id: str) -> List[TransactionLogEntry]:
-        """获取事务日志"""
-        entries = []
+    def log_transaction_recovered(self, transaction_id: str, state: str):
+        """记录恢复完成的事务"""
+        entry = TransactionLogEntry(
+            transaction_id=transaction_id,
+            entry_type=LogEntryType.TRANSACTION_COMPLETE,
+            state=state,
+            details={"recovered": True},
+        )
+        self._write_entry(entry)
 
-        # 遍历所有日志文件
-        for log_file in sorted(self.log_dir.glob("transaction_*.log"), key=lambda p: p.stat().st_mtime):
-            with log_file.open("r", encoding="utf-8") as f:
-                for line in f:
-                    try:
-                        entry_data = json.loads(line)
-                        if entry_data["transaction_id"] == transaction_id:
-                            entries.append(TransactionLogEntry.from_dict(entry_data))
-                    except Exception as e:
-                        logger.error(f"Failed to parse log entry: {e}")
+    def get_in_doubt(self) -> Dict[str, Optional[str]]:
+        """
+        获取未完成的事务
+        :return: {事务ID: 提交决定}, 决定为 commit 的事务需要继续提交, 其余按回滚处理
+        """
+        return dict(self._open)
+
+    def get_participant_states(self, transaction_id: str) -> Dict[str, Optional[str]]:
+        """
+        获取事务各参与者的最新状态
+        :param transaction_id: 事务ID
+        :return: {参与者: 最新状态}, 只登记在准备阶段的参与者状态为 None
+        """
+        states: Dict[str, Optional[str]] = {}
+        for entry in self.get_transaction_log(transaction_id):
+            if entry.entry_type == LogEntryType.TRANSACTION_PREPARE:
+                for name in entry.details.get("participants", []):
+                    states.setdefault(name, None)
+            elif entry.participant_name:
+                states[entry.participant_name] = entry.state
+        return states
+
+    def get_participant_xids(self, transaction_id: str) -> Dict[str, object]:
+        """
+        获取事务各参与者的两阶段 xid
+        :param transaction_id: 事务ID
+        :return: {参与者: xid}, 不含未使用两阶段会话的参与者
+        """
+        return {
+            entry.participant_name: entry.details["xid"]
+            for entry in self.get_transaction_log(transaction_id)
+            if entry.entry_type == LogEntryType.PARTICIPANT_PREPARE and "xid" in entry.details
+        }
 
-        return sorted(entries, key=lambda e: e.timestamp)
+    def get_transaction_log(self, transaction_id: str) -> List[TransactionLogEntry]:
+        """获取事务日志"""
+        records = self._store.query(where={"transaction_id": transaction_id})
+        return [TransactionLogEntry.from_dict(record) for record in records]
 
     def get_metrics(self) -> Dict:
         """获取日志指标"""
-        log_files = list(self.log_dir.glob("transaction_*.log"))
-        total_size = sum(f.stat().st_size for f in log_files)
-
-        return {
-            "log_dir": str(self.log_dir),
-            "max_file_size": self.max_file_size,
-            "max_files": self.max_files,
-            "current_file": str(self.current_file) if self.current_file else None,
-            "current_size": self.current_size,
-            "total_files": len(log_files),
-            "total_size": total_size,
-        }
+        return {**self._store.get_metrics(), "open_transactions": len(self._open)}
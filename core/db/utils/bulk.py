@@ -0,0 +1,331 @@
+"""
+批量写入
+分块的多行 INSERT / UPDATE / UPSERT, 数据库支持 RETURNING 时一次往返取回写入后的行,
+否则回退为写入后按键批量查询; 同时兼容同步 Session 和 AsyncSession.
+这些是 Core 层语句, 不触发 ORM 的 before_insert/before_update/after_update 事件,
+事件负责的时间戳、ext_json 规范化和模型缓存清除在这里直接处理
+"""
+
+import inspect
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from sqlalchemy import case, insert, inspect as sa_inspect, literal, select, update
+
+from core.db.core import cache as model_cache
+from core.db.core.utils import normalize_json
+
+# 默认每块行数
+DEFAULT_CHUNK_SIZE = 1000
+# 未声明参数上限的方言按保守值处理
+DEFAULT_MAX_PARAMETERS = 32000
+
+
+async def _execute(session: Any, statement, params: Any = None, **kwargs):
+    """兼容同步 Session 和 AsyncSession 执行语句"""
+    if params is not None:
+        result = session.execute(statement, params, **kwargs)
+    else:
+        result = session.execute(statement, **kwargs)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+def to_row(obj: Any, exclude_unset: bool = False) -> Dict[str, Any]:
+    """
+    将输入数据转换为行字典, 保留 datetime 等原生类型
+    :param obj: 字典或 pydantic 模型
+    :param exclude_unset: 是否排除未设置的字段(用于部分更新)
+    :return: 行字典
+    """
+    if isinstance(obj, dict):
+        return obj
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(exclude_unset=exclude_unset)
+    return obj.dict(exclude_unset=exclude_unset)
+
+
+def _dialect(session: Any):
+    return session.get_bind().dialect
+
+
+def _chunks(rows: Sequence[Any], size: int) -> Iterator[Sequence[Any]]:
+    for start in range(0, len(rows), size):
+        yield rows[start : start + size]
+
+
+def _rows_per_statement(session: Any, rows: Sequence[Dict[str, Any]], chunk_size: int) -> int:
+    """单条多行语句可容纳的行数, 受方言绑定参数上限约束"""
+    max_parameters = getattr(_dialect(session), "insertmanyvalues_max_parameters", None) or DEFAULT_MAX_PARAMETERS
+    columns = max((len(row) for row in rows), default=1) or 1
+    return max(1, min(chunk_size, max_parameters // columns))
+
+
+def supports_returning(session: Any, kind: str = "insert") -> bool:
+    """
+    当前方言是否支持 RETURNING
+    :param session: 会话
+    :param kind: insert 或 update
+    :return: 是否支持
+    """
+    dialect = _dialect(session)
+    if kind == "insert":
+        return bool(getattr(dialect, "insert_executemany_returning", False))
+    return bool(getattr(dialect, "update_returning", False))
+
+
+def _with_event_fields(model: Any, rows: Sequence[Dict[str, Any]], insert: bool) -> List[Dict[str, Any]]:
+    """
+    补上 ORM 事件(core.db.core.utils.setup_timestamp_events)会设置的字段:
+    插入时设置 create_time/update_time 并规范化 ext_json, 更新时设置 update_time
+    """
+    columns = sa_inspect(model).columns
+    now = datetime.now()
+    stamps = {name: now for name in (("create_time", "update_time") if insert else ("update_time",)) if name in columns}
+    normalize = insert and "ext_json" in columns
+    if not stamps and not normalize:
+        return list(rows)
+    prepared = []
+    for row in rows:
+        row = {**row, **stamps}
+        if normalize and row.get("ext_json"):
+            row["ext_json"] = normalize_json(row["ext_json"])
+        prepared.append(row)
+    return prepared
+
+
+async def invalidate_cached(model: Any, keys: Iterable[Any]) -> None:
+    """
+    清除模型缓存(core.db.core.cache 中 after_update 事件清除的同一个键), 模型未启用缓存时不做任何事
+    :param model: 模型类
+    :param keys: 主键
+    """
+    if not getattr(model, "_cache_enabled", False):
+        return
+    model_cache.init_cache_manager()
+    for key in keys:
+        await model_cache.cache_manager.delete(f"{model._cache_prefix}:id:{key}")
+
+
+def _primary_key(model: Any):
+    primary_key = sa_inspect(model).primary_key
+    if len(primary_key) != 1:
+        raise ValueError(f"{model.__name__} must have a single-column primary key for bulk operations")
+    return primary_key[0]
+
+
+async def _select_by(session: Any, model: Any, column, keys: Sequence[Any]) -> List[Any]:
+    """按键批量查询并刷新会话中的已有对象"""
+    statement = select(model).where(column.in_(keys)).execution_options(populate_existing=True)
+    return list((await _execute(session, statement)).scalars().all())
+
+
+def _order_by_keys(objs: Sequence[Any], attr: str, keys: Sequence[Any]) -> List[Any]:
+    by_key = {getattr(obj, attr): obj for obj in objs}
+    return [by_key[key] for key in keys if key in by_key]
+
+
+async def bulk_insert(
+    session: Any,
+    model: Any,
+    rows: Sequence[Dict[str, Any]],
+    *,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    returning: bool = True,
+) -> List[Any]:
+    """
+    批量插入
+    支持 RETURNING 时使用 insertmanyvalues 的多行 INSERT ... RETURNING, 每块一次往返;
+    否则回退为 ORM 批量 flush(由驱动 executemany 并回填主键)
+    :param session: 会话
+    :param model: 模型类
+    :param rows: 行数据
+    :param chunk_size: 每块行数
+    :param returning: 是否返回插入后的对象
+    :return: 插入后的对象, 与 rows 顺序一致; returning=False 时为空列表
+    """
+    created: List[Any] = []
+    if not rows:
+        return created
+    rows = _with_event_fields(model, rows, insert=True)
+
+    if supports_returning(session, "insert"):
+        statement = insert(model)
+        if returning:
+            statement = statement.returning(model, sort_by_parameter_order=True)
+        for chunk in _chunks(rows, chunk_size):
+            result = await _execute(session, statement, list(chunk))
+            if returning:
+                created.extend(result.scalars().all())
+        return created
+
+    # 回退路径: 交给 ORM 工作单元批量插入
+    for chunk in _chunks(rows, chunk_size):
+        objs = [model(**row) for row in chunk]
+        session.add_all(objs)
+        flushed = session.flush()
+        if inspect.isawaitable(flushed):
+            await flushed
+        if returning:
+            created.extend(objs)
+    return created
+
+
+def _upsert_statement(session: Any, model: Any, chunk: Sequence[Dict[str, Any]], conflict_keys, update_fields):
+    """按方言构造 INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE"""
+    name = _dialect(session).name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif name in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+    else:
+        raise NotImplementedError(f"Upsert is not supported for dialect {name}")
+
+    statement = dialect_insert(model).values(list(chunk))
+    if name in ("mysql", "mariadb"):
+        fields = update_fields or conflict_keys[:1]  # 无需更新时以自身赋值实现"忽略"
+        return statement.on_duplicate_key_update({field: statement.inserted[field] for field in fields})
+    if not update_fields:
+        return statement.on_conflict_do_nothing(index_elements=list(conflict_keys))
+    return statement.on_conflict_do_update(
+        index_elements=list(conflict_keys),
+        set_={field: statement.excluded[field] for field in update_fields},
+    )
+
+
+async def bulk_upsert(
+    session: Any,
+    model: Any,
+    rows: Sequence[Dict[str, Any]],
+    *,
+    conflict_keys: Sequence[str],
+    update_fields: Optional[Sequence[str]] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    returning: bool = True,
+) -> List[Any]:
+    """
+    批量插入或更新
+    :param session: 会话
+    :param model: 模型类
+    :param rows: 行数据
+    :param conflict_keys: 唯一约束列, 如 ["student_id"]
+    :param update_fields: 冲突时更新的列, None 表示行中除冲突列外的全部列, 空列表表示冲突时忽略
+    :param chunk_size: 每块行数
+    :param returning: 是否返回写入后的对象
+    :return: 写入后的对象(冲突忽略的行不返回)
+
+    模型启用缓存时清除返回的行和输入中带主键的行的缓存; returning=False 时只能清除输入中带主键的行
+    """
+    results: List[Any] = []
+    if not rows:
+        return results
+    if update_fields is None:
+        update_fields = [field for field in rows[0] if field not in conflict_keys]
+    rows = _with_event_fields(model, rows, insert=True)
+    if update_fields and "update_time" in rows[0] and "update_time" not in update_fields:
+        # 冲突时按更新处理, 刷新 update_time, create_time 保持原值
+        update_fields = [*update_fields, "update_time"]
+
+    use_returning = returning and supports_returning(session, "insert")
+    single_key = len(conflict_keys) == 1
+    size = _rows_per_statement(session, rows, chunk_size)
+    for chunk in _chunks(rows, size):
+        statement = _upsert_statement(session, model, chunk, conflict_keys, update_fields)
+        if use_returning:
+            statement = statement.returning(model)
+            result = await _execute(session, statement, execution_options={"populate_existing": True})
+            results.extend(result.scalars().all())
+            continue
+
+        await _execute(session, statement)
+        if returning and single_key:
+            # 回退路径: 按冲突键查回写入后的行
+            key = conflict_keys[0]
+            keys = [row[key] for row in chunk]
+            results.extend(_order_by_keys(await _select_by(session, model, getattr(model, key), keys), key, keys))
+
+    if getattr(model, "_cache_enabled", False):
+        pk = _primary_key(model).key
+        keys = {getattr(obj, pk) for obj in results}
+        keys.update(row[pk] for row in rows if row.get(pk) is not None)
+        await invalidate_cached(model, keys)
+    return results
+
+
+async def bulk_update(
+    session: Any,
+    model: Any,
+    rows: Sequence[Dict[str, Any]],
+    *,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    returning: bool = True,
+) -> List[Any]:
+    """
+    按主键批量更新
+    每块生成一条 UPDATE ... SET col = CASE pk WHEN ... END WHERE pk IN (...),
+    不同行可以更新不同的列; 支持 RETURNING 时同一语句取回更新后的行, 否则再按主键查询一次
+    :param session: 会话
+    :param model: 模型类
+    :param rows: 行数据, 每行必须包含主键
+    :param chunk_size: 每块行数
+    :param returning: 是否返回更新后的对象(会话中已有的对象同时被刷新)
+    :return: 更新后的对象, 与 rows 顺序一致(不存在的主键被跳过)
+    """
+    updated: List[Any] = []
+    if not rows:
+        return updated
+
+    pk_column = _primary_key(model)
+    pk = pk_column.key
+    rows = _with_event_fields(model, rows, insert=False)
+    use_returning = returning and supports_returning(session, "update")
+    size = _rows_per_statement(session, rows, chunk_size)
+
+    for chunk in _chunks(rows, size):
+        keys = [row[pk] for row in chunk]
+        fields = []
+        for row in chunk:
+            fields.extend(field for field in row if field != pk and field not in fields)
+        if not fields:
+            continue
+
+        values = {}
+        for field in fields:
+            column = getattr(model, field)
+            whens = {row[pk]: literal(row[field], column.type) for row in chunk if field in row}
+            # 未提供该列的行保持原值
+            values[field] = case(whens, value=pk_column, else_=column)
+
+        statement = (
+            update(model)
+            .where(pk_column.in_(keys))
+            .values(values)
+            .execution_options(synchronize_session=False)
+        )
+        if use_returning:
+            result = await _execute(
+                session, statement.returning(model), execution_options={"populate_existing": True}
+            )
+            updated.extend(_order_by_keys(result.scalars().all(), pk, keys))
+            continue
+
+        await _execute(session, statement)
+        if returning:
+            updated.extend(_order_by_keys(await _select_by(session, model, pk_column, keys), pk, keys))
+
+    await invalidate_cached(model, [row[pk] for row in rows])
+    return updated
+
+
+__all__ = [
+    "DEFAULT_CHUNK_SIZE",
+    "invalidate_cached",
+    "supports_returning",
+    "to_row",
+    "bulk_insert",
+    "bulk_upsert",
+    "bulk_update",
+]
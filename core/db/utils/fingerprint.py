@@ -0,0 +1,46 @@
+"""
+SQL指纹
+去除字面量后的规范化SQL及其哈希, 用于慢查询归类和路由缓存
+"""
+
+import hashlib
+import re
+from functools import lru_cache
+
+# 字符串字面量(支持 '' 转义)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+# 数值字面量(不匹配标识符中的数字)
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.IGNORECASE)
+# IN 列表
+_IN_LIST_RE = re.compile(r"\bin\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+# VALUES 多行
+_VALUES_RE = re.compile(r"\bvalues\s*(\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+# 空白
+_SPACE_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def normalize_sql(sql: str) -> str:
+    """
+    规范化SQL: 小写、去除字面量、折叠IN列表和多行VALUES、压缩空白
+    :param sql: 原始SQL
+    :return: 规范化后的SQL
+    """
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _SPACE_RE.sub(" ", sql).strip().lower()
+    sql = _IN_LIST_RE.sub("in (?)", sql)
+    sql = _VALUES_RE.sub(r"values \1", sql)
+    return sql
+
+
+def fingerprint_sql(sql: str) -> str:
+    """
+    计算SQL指纹
+    :param sql: 原始SQL
+    :return: 规范化SQL的短哈希
+    """
+    return hashlib.md5(normalize_sql(sql).encode("utf-8")).hexdigest()[:16]
+
+
+__all__ = ["normalize_sql", "fingerprint_sql"]
@@ -0,0 +1,507 @@
+"""
+键集分页
+不透明游标编码、多列排序的键集条件构造, 以及可跳过或估算的总数统计
+"""
+
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Generic, List, Optional, Sequence, Tuple, TypeVar, Union
+from uuid import UUID
+
+from sqlalchemy import and_, false, func, inspect, or_, select, tuple_
+
+T = TypeVar("T")
+
+# 估算总数时最多统计的行数
+DEFAULT_ESTIMATE_CAP = 10000
+
+
+class CursorError(ValueError):
+    """游标无效或与当前排序不匹配"""
+
+
+class TotalMode(str, Enum):
+    """总数统计方式"""
+
+    EXACT = "exact"  # 精确 COUNT
+    ESTIMATE = "estimate"  # 最多统计 cap 行, 超出时标记为估算值
+    NONE = "none"  # 不统计
+
+
+@dataclass(frozen=True)
+class SortKey:
+    """排序键"""
+
+    name: str
+    descending: bool = False
+
+    def __str__(self) -> str:
+        return f"-{self.name}" if self.descending else self.name
+
+
+def parse_sort(
+    sort: Union[str, Sequence[str], None],
+    default: Sequence[str] = ("-id",),
+    tiebreaker: Optional[str] = "id",
+) -> Tuple[SortKey, ...]:
+    """
+    解析排序参数
+    支持 "a,-b"、["a", "-b"] 和 ["a asc", "b desc"] 三种写法,
+    末尾自动追加唯一的决胜字段, 保证排序全序
+    :param sort: 排序参数
+    :param default: 未指定排序时的默认排序
+    :param tiebreaker: 决胜字段(通常为主键), None 表示排序本身已唯一
+    :return: 排序键元组
+    """
+    if not sort:
+        sort = default
+    if isinstance(sort, str):
+        sort = sort.split(",")
+
+    keys: List[SortKey] = []
+    for item in sort:
+        item = item.strip()
+        if not item:
+            continue
+        if " " in item:
+            name, direction = item.split(None, 1)
+            keys.append(SortKey(name, direction.strip().lower() == "desc"))
+        elif item.startswith("-"):
+            keys.append(SortKey(item[1:], True))
+        else:
+            keys.append(SortKey(item.lstrip("+"), False))
+
+    if not keys:
+        raise CursorError("Sort order is empty")
+    if tiebreaker and all(key.name != tiebreaker for key in keys):
+        # 决胜字段沿用首个排序方向, 便于使用行值比较
+        keys.append(SortKey(tiebreaker, keys[0].descending))
+    return tuple(keys)
+
+
+def _sort_signature(keys: Sequence[SortKey]) -> str:
+    return ",".join(str(key) for key in keys)
+
+
+def _encode_value(value: Any) -> Any:
+    """将排序值编码为可JSON序列化的带类型标记的形式"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    if isinstance(value, time):
+        return {"t": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"dec": str(value)}
+    if isinstance(value, UUID):
+        return {"uuid": str(value)}
+    if isinstance(value, Enum):
+        return _encode_value(value.value)
+    raise CursorError(f"Unsupported cursor value type: {type(value).__name__}")
+
+
+_DECODERS = {
+    "dt": datetime.fromisoformat,
+    "d": date.fromisoformat,
+    "t": time.fromisoformat,
+    "dec": Decimal,
+    "uuid": UUID,
+}
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        ((tag, raw),) = value.items()
+        return _DECODERS[tag](raw)
+    return value
+
+
+def encode_cursor(keys: Sequence[SortKey], values: Sequence[Any], backward: bool = False) -> str:
+    """
+    编码游标
+    :param keys: 排序键
+    :param values: 边界行的排序值
+    :param backward: 是否为向前翻页的游标
+    :return: base64url 编码的不透明游标
+    """
+    payload = {"s": _sort_signature(keys), "v": [_encode_value(v) for v in values]}
+    if backward:
+        payload["b"] = 1
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str, keys: Sequence[SortKey]) -> Tuple[List[Any], bool]:
+    """
+    解码游标
+    :param cursor: 不透明游标
+    :param keys: 当前请求的排序键, 必须与生成游标时一致
+    :return: (边界行的排序值, 是否向前翻页)
+    :raises CursorError: 游标格式错误或排序不匹配
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        values = [_decode_value(v) for v in payload["v"]]
+        signature = payload["s"]
+    except (binascii.Error, ValueError, KeyError, TypeError) as e:
+        raise CursorError(f"Malformed cursor: {e}") from e
+
+    if signature != _sort_signature(keys) or len(values) != len(keys):
+        raise CursorError("Cursor does not match the requested sort order")
+    return values, bool(payload.get("b"))
+
+
+def _after(column: Any, value: Any, descending: bool, nullable: bool):
+    """单列"位于边界值之后"的条件, NULL 视为大于任何值; 不可能成立时返回 None"""
+    if value is None:
+        # 升序时 NULL 排在最后, 之后没有更大的值; 降序时 NULL 排在最前, 之后是全部非 NULL 值
+        return column.isnot(None) if descending else None
+    if descending:
+        return column < value
+    return or_(column > value, column.is_(None)) if nullable else column > value
+
+
+def _equals(column: Any, value: Any):
+    return column.is_(None) if value is None else column == value
+
+
+def keyset_condition(
+    columns: Sequence[Any], keys: Sequence[SortKey], values: Sequence[Any], nullable: Optional[Sequence[bool]] = None
+):
+    """
+    构造"位于边界行之后"的条件
+    方向一致且不涉及 NULL 时使用行值比较 (a, b) > (x, y), 可直接利用复合索引;
+    否则展开为 a > x OR (a = x AND b < y) ..., 可为空的列按 NULL 大于任何值处理(与 order_by_keys 一致)
+    :param columns: 排序列
+    :param keys: 排序键(方向已按翻页方向调整)
+    :param values: 边界行的排序值
+    :param nullable: 每列是否可为空, 默认均不可为空
+    :return: SQL 条件表达式
+    """
+    nullable = list(nullable) if nullable is not None else [False] * len(columns)
+    if len({key.descending for key in keys}) == 1 and not any(nullable) and all(v is not None for v in values):
+        left, right = tuple_(*columns), tuple_(*values)
+        return left < right if keys[0].descending else left > right
+
+    clauses = []
+    for i, key in enumerate(keys):
+        step = _after(columns[i], values[i], key.descending, nullable[i] or values[i] is None)
+        if step is None:
+            continue
+        equals = [_equals(columns[j], values[j]) for j in range(i)]
+        clauses.append(and_(*equals, step) if equals else step)
+    return or_(*clauses) if clauses else false()
+
+
+def order_by_keys(columns: Sequence[Any], keys: Sequence[SortKey], nullable: Optional[Sequence[bool]] = None) -> list:
+    """
+    按排序键生成 ORDER BY 子句; 可为空的列先按 IS NULL 排序, 使 NULL 在各数据库上都视为最大值
+    (不使用 NULLS FIRST/LAST, MySQL 不支持)
+    """
+    nullable = list(nullable) if nullable is not None else [False] * len(columns)
+    order = []
+    for column, key, is_nullable in zip(columns, keys, nullable):
+        if is_nullable:
+            is_null = column.is_(None)
+            order.append(is_null.desc() if key.descending else is_null.asc())
+        order.append(column.desc() if key.descending else column.asc())
+    return order
+
+
+@dataclass
+class KeysetPage(Generic[T]):
+    """键集分页结果"""
+
+    items: List[T]
+    size: int
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+    has_next: bool = False
+    has_prev: bool = False
+    total: Optional[int] = None
+    total_estimated: bool = False
+
+    def to_dict(self) -> dict:
+        return {
+            "items": self.items,
+            "size": self.size,
+            "next_cursor": self.next_cursor,
+            "prev_cursor": self.prev_cursor,
+            "has_next": self.has_next,
+            "has_prev": self.has_prev,
+            "total": self.total,
+            "total_estimated": self.total_estimated,
+        }
+
+
+@dataclass
+class OffsetPage(Generic[T]):
+    """
+    页码分页结果
+    多取一行判断是否有下一页, 不依赖总数; 迭代时依次产生 items 和 total, 兼容 (数据列表, 总数) 解包
+    """
+
+    items: List[T]
+    page: int
+    size: int
+    has_next: bool = False
+    total: Optional[int] = None
+    total_estimated: bool = False
+
+    @property
+    def has_prev(self) -> bool:
+        return self.page > 1
+
+    @property
+    def pages(self) -> Optional[int]:
+        """总页数, 总数未统计或为估算值时为 None"""
+        if self.total is None or self.total_estimated:
+            return None
+        return (self.total + self.size - 1) // self.size
+
+    def __iter__(self):
+        return iter((self.items, self.total))
+
+    @classmethod
+    def from_rows(
+        cls, rows: Sequence[T], page: int, size: int, total: Optional[int] = None, total_estimated: bool = False
+    ) -> "OffsetPage[T]":
+        """
+        由多取一行的查询结果构建
+        :param rows: LIMIT size + 1 的查询结果
+        """
+        rows = list(rows)
+        return cls(
+            items=rows[:size],
+            page=page,
+            size=size,
+            has_next=len(rows) > size,
+            total=total,
+            total_estimated=total_estimated,
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "items": self.items,
+            "page": self.page,
+            "size": self.size,
+            "pages": self.pages,
+            "has_next": self.has_next,
+            "has_prev": self.has_prev,
+            "total": self.total,
+            "total_estimated": self.total_estimated,
+        }
+
+
+class KeysetPaginator:
+    """
+    键集分页器
+    对 2.0 风格的 Select 和旧式 ORM Query 均适用:
+    apply() 替换排序、追加边界条件并多取一行; build_page() 裁剪结果并生成前后游标
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        sort: Union[str, Sequence[str], None] = None,
+        cursor: Optional[str] = None,
+        size: int = 20,
+        max_size: int = 100,
+        tiebreaker: Optional[str] = "id",
+    ):
+        """
+        :param model: 模型类
+        :param sort: 排序参数, 见 parse_sort
+        :param cursor: 上一页返回的游标, None 或空串表示第一页
+        :param size: 每页数量
+        :param max_size: 每页数量上限
+        :param tiebreaker: 决胜字段
+        """
+        self.model = model
+        self.keys = parse_sort(sort, tiebreaker=tiebreaker)
+        self.size = min(max(1, size), max_size)
+        # 只接受映射的列, 关系、属性和方法不能作为排序字段
+        mapped = inspect(model).columns
+        self.columns = []
+        self.nullable = []
+        for key in self.keys:
+            if key.name not in mapped:
+                raise CursorError(f"Unknown sort field: {key.name}")
+            self.columns.append(getattr(model, key.name))
+            self.nullable.append(bool(mapped[key.name].nullable))
+
+        self.values: Optional[List[Any]] = None
+        self.backward = False
+        if cursor:
+            self.values, self.backward = decode_cursor(cursor, self.keys)
+
+    @property
+    def _scan_keys(self) -> Tuple[SortKey, ...]:
+        # 向前翻页时按相反方向扫描, 取到结果后再反转
+        if not self.backward:
+            return self.keys
+        return tuple(SortKey(key.name, not key.descending) for key in self.keys)
+
+    def apply(self, query):
+        """
+        为查询追加键集条件、排序和 LIMIT
+        :param query: Select 或 Query
+        :return: 新的查询对象
+        """
+        keys = self._scan_keys
+        if self.values is not None:
+            query = query.filter(keyset_condition(self.columns, keys, self.values, self.nullable))
+        order = order_by_keys(self.columns, keys, self.nullable)
+        return query.order_by(None).order_by(*order).limit(self.size + 1)
+
+    def _cursor_for(self, item: Any, backward: bool) -> str:
+        return encode_cursor(self.keys, [getattr(item, key.name) for key in self.keys], backward)
+
+    def build_page(
+        self, rows: Sequence[T], total: Optional[int] = None, total_estimated: bool = False
+    ) -> KeysetPage[T]:
+        """
+        由 apply() 后的查询结果构造分页结果
+        :param rows: 查询结果(最多 size + 1 行)
+        :param total: 总数
+        :param total_estimated: 总数是否为估算值
+        :return: 分页结果
+        """
+        rows = list(rows)
+        more = len(rows) > self.size
+        items = rows[: self.size]
+        if self.backward:
+            items.reverse()
+            has_prev, has_next = more, True
+        else:
+            has_next, has_prev = more, self.values is not None
+
+        page = KeysetPage(
+            items=items,
+            size=self.size,
+            has_next=has_next,
+            has_prev=has_prev,
+            total=total,
+            total_estimated=total_estimated,
+        )
+        if items:
+            if has_next:
+                page.next_cursor = self._cursor_for(items[-1], backward=False)
+            if has_prev:
+                page.prev_cursor = self._cursor_for(items[0], backward=True)
+        return page
+
+
+def count_statement(query, cap: Optional[int] = None):
+    """
+    构造统计查询: 去掉排序, 可选地只统计前 cap 行
+    :param query: Select 查询
+    :param cap: 统计上限
+    :return: COUNT 查询
+    """
+    query = query.order_by(None)
+    if cap is not None:
+        query = query.limit(cap)
+    return select(func.count()).select_from(query.subquery())
+
+
+async def resolve_total(
+    db: Any, query, mode: Union[TotalMode, str] = TotalMode.EXACT, cap: int = DEFAULT_ESTIMATE_CAP
+) -> Tuple[Optional[int], bool]:
+    """
+    按统计方式计算总数
+    :param db: AsyncSession
+    :param query: 未分页的 Select 查询
+    :param mode: 统计方式
+    :param cap: 估算模式下的统计上限
+    :return: (总数, 是否为估算值)
+    """
+    mode = TotalMode(mode)
+    if mode is TotalMode.NONE:
+        return None, False
+    if mode is TotalMode.EXACT:
+        return await db.scalar(count_statement(query)), False
+    counted = await db.scalar(count_statement(query, cap + 1))
+    return min(counted, cap), counted > cap
+
+
+def resolve_total_sync(query, mode: Union[TotalMode, str] = TotalMode.EXACT, cap: int = DEFAULT_ESTIMATE_CAP):
+    """
+    resolve_total 的旧式 ORM Query 版本
+    :param query: 未分页的 Query
+    :param mode: 统计方式
+    :param cap: 估算模式下的统计上限
+    :return: (总数, 是否为估算值)
+    """
+    mode = TotalMode(mode)
+    if mode is TotalMode.NONE:
+        return None, False
+    query = query.order_by(None)
+    if mode is TotalMode.EXACT:
+        return query.count(), False
+    counted = query.limit(cap + 1).count()
+    return min(counted, cap), counted > cap
+
+
+def offset_window(query, page: int, size: int):
+    """页码分页的 OFFSET/LIMIT, 多取一行用于判断是否有下一页"""
+    return query.offset((page - 1) * size).limit(size + 1)
+
+
+async def fetch_offset_page(
+    db: Any, query, page: int, size: int, mode: Union[TotalMode, str] = TotalMode.EXACT, unique: bool = False
+) -> OffsetPage:
+    """
+    页码分页查询
+    :param db: AsyncSession
+    :param query: 已排序、未分页的 Select 查询
+    :param page: 页码
+    :param size: 每页数量
+    :param mode: 总数统计方式
+    :param unique: 是否对结果去重(包含集合预加载时需要)
+    :return: 分页结果
+    """
+    total, estimated = await resolve_total(db, query, mode)
+    result = await db.scalars(offset_window(query, page, size))
+    rows = result.unique().all() if unique else result.all()
+    return OffsetPage.from_rows(rows, page, size, total=total, total_estimated=estimated)
+
+
+def fetch_offset_page_sync(query, page: int, size: int, mode: Union[TotalMode, str] = TotalMode.EXACT) -> OffsetPage:
+    """
+    fetch_offset_page 的旧式 ORM Query 版本
+    :param query: 已排序、未分页的 Query
+    """
+    total, estimated = resolve_total_sync(query, mode)
+    rows = offset_window(query, page, size).all()
+    return OffsetPage.from_rows(rows, page, size, total=total, total_estimated=estimated)
+
+
+__all__ = [
+    "CursorError",
+    "TotalMode",
+    "SortKey",
+    "KeysetPage",
+    "KeysetPaginator",
+    "OffsetPage",
+    "parse_sort",
+    "encode_cursor",
+    "decode_cursor",
+    "keyset_condition",
+    "order_by_keys",
+    "count_statement",
+    "resolve_total",
+    "resolve_total_sync",
+    "offset_window",
+    "fetch_offset_page",
+    "fetch_offset_page_sync",
+    "DEFAULT_ESTIMATE_CAP",
+]
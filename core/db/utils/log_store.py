@@ -0,0 +1,451 @@
+"""
+索引日志存储
+追加写入的 JSON Lines 分段文件, 每个分段带一个旁路索引文件:
+    {prefix}_{时间}.log  记录, 每行一条 JSON
+    {prefix}_{时间}.idx  索引, 每行: 偏移\t长度\t时间戳\t属性JSON
+
+索引在打开时载入内存, 按时间(分段内有序, 二分查找)和键字段(哈希表)定位记录,
+查询只对命中的记录通过 mmap 读取并反序列化, 耗时与结果数量成正比而不是与日志大小成正比。
+"""
+
+import bisect
+import json
+import logging
+import mmap
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 索引函数: 记录 -> (时间戳, 属性)
+Indexer = Callable[[Dict], Tuple[float, Dict[str, Any]]]
+
+
+class IndexEntry(NamedTuple):
+    """索引条目"""
+
+    segment: str
+    offset: int
+    length: int
+    timestamp: float
+    attrs: Dict[str, Any]
+
+
+class _Segment:
+    """分段的内存索引"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.name = path.stem
+        self.entries: List[IndexEntry] = []
+        self.timestamps: List[float] = []
+        self.size = 0
+        self.min_time = float("inf")
+        self.max_time = float("-inf")
+
+    @property
+    def index_path(self) -> Path:
+        return self.path.with_suffix(".idx")
+
+    def add(self, entry: IndexEntry) -> None:
+        """加入索引条目(通常按时间递增, 乱序时插入到正确位置)"""
+        if not self.timestamps or entry.timestamp >= self.timestamps[-1]:
+            self.entries.append(entry)
+            self.timestamps.append(entry.timestamp)
+        else:
+            pos = bisect.bisect_right(self.timestamps, entry.timestamp)
+            self.entries.insert(pos, entry)
+            self.timestamps.insert(pos, entry.timestamp)
+        self.min_time = min(self.min_time, entry.timestamp)
+        self.max_time = max(self.max_time, entry.timestamp)
+
+    def range(self, start: Optional[float], end: Optional[float]) -> List[IndexEntry]:
+        """按时间范围取索引条目"""
+        lo = 0 if start is None else bisect.bisect_left(self.timestamps, start)
+        hi = len(self.timestamps) if end is None else bisect.bisect_right(self.timestamps, end)
+        return self.entries[lo:hi]
+
+
+class IndexedLogStore:
+    """带旁路索引的追加写日志存储"""
+
+    def __init__(
+        self,
+        log_dir: str,
+        prefix: str,
+        indexer: Indexer,
+        key_fields: Sequence[str] = (),
+        max_segment_size: int = 100 * 1024 * 1024,
+        max_segments: int = 10,
+        pinned: Optional[Callable[[], Iterable[Any]]] = None,
+    ):
+        """
+        :param log_dir: 日志目录
+        :param prefix: 分段文件名前缀
+        :param indexer: 从记录中提取时间戳和索引属性的函数
+        :param key_fields: 需要建立等值索引的属性
+        :param max_segment_size: 单个分段的最大字节数
+        :param max_segments: 保留的分段数量
+        :param pinned: 返回仍在使用的键值(第一个键字段), 包含这些键的记录的分段不会被轮转或归档删除,
+            此时分段数可能超过 max_segments
+        """
+        if pinned is not None and not key_fields:
+            raise ValueError("pinned requires at least one key field")
+        self.log_dir = Path(log_dir)
+        self.prefix = prefix
+        self.indexer = indexer
+        self.key_fields = tuple(key_fields)
+        self.max_segment_size = max_segment_size
+        self.max_segments = max_segments
+        self.pinned = pinned
+
+        self._segments: Dict[str, _Segment] = {}
+        self._keys: Dict[str, Dict[Any, List[IndexEntry]]] = {field: defaultdict(list) for field in self.key_fields}
+        self._active: Optional[_Segment] = None
+        self._lock = threading.Lock()
+
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self._load()
+
+    # ------------------------------------------------------------------ 加载
+
+    def _segment_paths(self) -> List[Path]:
+        return sorted(self.log_dir.glob(f"{self.prefix}_*.log"), key=lambda p: p.name)
+
+    def _load(self) -> None:
+        """载入所有分段的索引, 缺失或不完整的索引从数据文件重建"""
+        for path in self._segment_paths():
+            segment = _Segment(path)
+            segment.size = path.stat().st_size
+            indexed_size = self._load_index(segment)
+            if indexed_size < segment.size:
+                self._rebuild_index(segment, indexed_size)
+            self._register(segment)
+
+        segments = list(self._segments.values())
+        if segments and segments[-1].size < self.max_segment_size:
+            self._active = segments[-1]
+
+    def _load_index(self, segment: _Segment) -> int:
+        """
+        读取分段的索引文件
+        :return: 索引覆盖到的数据文件字节数
+        """
+        if not segment.index_path.exists():
+            return 0
+        covered = 0
+        with segment.index_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    offset, length, ts, attrs = line.rstrip("\n").split("\t", 3)
+                    entry = IndexEntry(segment.name, int(offset), int(length), float(ts), json.loads(attrs))
+                except ValueError:
+                    # 末尾的不完整行(写入中断), 之后的数据从数据文件重建
+                    break
+                if entry.offset + entry.length > segment.size:
+                    break
+                segment.add(entry)
+                covered = entry.offset + entry.length
+        return covered
+
+    def _rebuild_index(self, segment: _Segment, start: int) -> None:
+        """从数据文件的 start 偏移开始扫描并补齐索引"""
+        for offset, raw in self._scan(segment.path, start):
+            try:
+                record = json.loads(raw)
+                ts, attrs = self.indexer(record)
+            except Exception as e:
+                logger.error(f"Failed to index log entry in {segment.path.name}@{offset}: {e}")
+                continue
+            entry = IndexEntry(segment.name, offset, len(raw), ts, attrs)
+            segment.add(entry)
+
+        # 重写整个索引文件, 顺带去掉可能存在的不完整行
+        with segment.index_path.open("w", encoding="utf-8") as f:
+            f.writelines(self._format_index(entry) for entry in segment.entries)
+
+    @staticmethod
+    def _scan(path: Path, start: int = 0) -> Iterator[Tuple[int, bytes]]:
+        """通过 mmap 逐行扫描数据文件, 产出 (偏移, 行内容)"""
+        with path.open("rb") as f:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # 空文件无法映射
+                return
+            with mm:
+                pos = start
+                size = len(mm)
+                while pos < size:
+                    end = mm.find(b"\n", pos)
+                    if end == -1:
+                        # 末尾不完整的行
+                        return
+                    if end > pos:
+                        yield pos, mm[pos : end + 1]
+                    pos = end + 1
+
+    def _register(self, segment: _Segment) -> None:
+        self._segments[segment.name] = segment
+        for entry in segment.entries:
+            self._index_keys(entry)
+
+    def _index_keys(self, entry: IndexEntry) -> None:
+        for field in self.key_fields:
+            value = entry.attrs.get(field)
+            if value is not None:
+                self._keys[field][value].append(entry)
+
+    @staticmethod
+    def _format_index(entry: IndexEntry) -> str:
+        attrs = json.dumps(entry.attrs, ensure_ascii=False, default=str, separators=(",", ":"))
+        return f"{entry.offset}\t{entry.length}\t{entry.timestamp}\t{attrs}\n"
+
+    # ------------------------------------------------------------------ 写入
+
+    def _pinned_segments(self) -> Set[str]:
+        """包含仍在使用的键的分段"""
+        if self.pinned is None:
+            return set()
+        index = self._keys[self.key_fields[0]]
+        return {entry.segment for value in self.pinned() for entry in index.get(value, ())}
+
+    def _new_segment(self) -> _Segment:
+        """创建新分段, 超出数量限制时删除最旧的未固定分段"""
+        excess = len(self._segments) - self.max_segments + 1
+        if excess > 0:
+            pinned = self._pinned_segments()
+            droppable = [name for name in self._segments if name not in pinned]
+            for name in droppable[:excess]:
+                self._drop_segment(name)
+            if excess > len(droppable):
+                logger.warning(
+                    f"Keeping {len(self._segments) + 1} {self.prefix} segments (limit {self.max_segments}): "
+                    f"{len(pinned)} segments hold records still in use"
+                )
+
+        name = f"{self.prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+        segment = _Segment(self.log_dir / f"{name}.log")
+        segment.path.touch()
+        self._segments[segment.name] = segment
+        return segment
+
+    def _drop_segment(self, name: str) -> None:
+        """删除分段及其索引"""
+        segment = self._segments.pop(name)
+        segment.path.unlink(missing_ok=True)
+        segment.index_path.unlink(missing_ok=True)
+        for field, index in self._keys.items():
+            for value in {entry.attrs.get(field) for entry in segment.entries}:
+                entries = index.get(value)
+                if entries is not None:
+                    entries[:] = [e for e in entries if e.segment != name]
+                    if not entries:
+                        del index[value]
+
+    def append(self, record: Dict, sync: bool = False) -> IndexEntry:
+        """
+        追加一条记录
+        :param record: 可 JSON 序列化的记录
+        :param sync: 是否在返回前 fsync 数据文件(索引可从数据文件重建, 不需要同步)
+        :return: 索引条目
+        """
+        ts, attrs = self.indexer(record)
+        data = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+        with self._lock:
+            if self._active is None or self._active.size >= self.max_segment_size:
+                self._active = self._new_segment()
+            segment = self._active
+
+            with segment.path.open("ab") as f:
+                f.write(data)
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            entry = IndexEntry(segment.name, segment.size, len(data), ts, attrs)
+            with segment.index_path.open("a", encoding="utf-8") as f:
+                f.write(self._format_index(entry))
+
+            segment.size += len(data)
+            segment.add(entry)
+            self._index_keys(entry)
+        return entry
+
+    # ------------------------------------------------------------------ 查询
+
+    def find(
+        self,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        where: Optional[Dict[str, Any]] = None,
+        predicate: Optional[Callable[[IndexEntry], bool]] = None,
+    ) -> List[IndexEntry]:
+        """
+        只查索引, 不读取记录
+        :param start: 起始时间戳(含)
+        :param end: 结束时间戳(含)
+        :param where: 键字段等值条件, 字段必须在 key_fields 中
+        :param predicate: 对索引条目的附加过滤
+        :return: 按时间排序的索引条目
+        """
+        with self._lock:
+            if where:
+                field, value = next(iter(where.items()))
+                if field not in self._keys:
+                    raise ValueError(f"Field is not indexed: {field}")
+                candidates = list(self._keys[field].get(value, ()))
+                candidates.sort(key=lambda e: e.timestamp)
+                rest = {k: v for k, v in where.items() if k != field}
+                entries = [
+                    e
+                    for e in candidates
+                    if (start is None or e.timestamp >= start)
+                    and (end is None or e.timestamp <= end)
+                    and all(e.attrs.get(k) == v for k, v in rest.items())
+                ]
+            else:
+                entries = []
+                for segment in self._segments.values():
+                    if start is not None and segment.max_time < start:
+                        continue
+                    if end is not None and segment.min_time > end:
+                        continue
+                    entries.extend(segment.range(start, end))
+
+        if predicate is not None:
+            entries = [e for e in entries if predicate(e)]
+        return entries
+
+    def read(self, entries: Iterable[IndexEntry]) -> List[Dict]:
+        """
+        通过 mmap 读取索引条目对应的记录
+        :param entries: 索引条目
+        :return: 记录列表, 顺序与输入一致
+        """
+        entries = list(entries)
+        by_segment: Dict[str, List[int]] = defaultdict(list)
+        for i, entry in enumerate(entries):
+            by_segment[entry.segment].append(i)
+
+        records: List[Optional[Dict]] = [None] * len(entries)
+        for name, positions in by_segment.items():
+            segment = self._segments.get(name)
+            if segment is None:
+                continue
+            with segment.path.open("rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    for i in positions:
+                        entry = entries[i]
+                        try:
+                            records[i] = json.loads(mm[entry.offset : entry.offset + entry.length])
+                        except Exception as e:
+                            logger.error(f"Failed to parse log entry {name}@{entry.offset}: {e}")
+        return [r for r in records if r is not None]
+
+    def query(
+        self,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        where: Optional[Dict[str, Any]] = None,
+        predicate: Optional[Callable[[IndexEntry], bool]] = None,
+        order_by: Optional[Callable[[IndexEntry], Any]] = None,
+        reverse: bool = False,
+        limit: Optional[int] = None,
+    ) -> List[Dict]:
+        """
+        查询记录: 先在索引上过滤、排序、截断, 最后只读取命中的记录
+        :param order_by: 对索引条目的排序键, 默认按时间
+        :param reverse: 是否倒序
+        :param limit: 返回数量上限
+        """
+        entries = self.find(start, end, where, predicate)
+        if order_by is not None:
+            entries.sort(key=order_by, reverse=reverse)
+        elif reverse:
+            entries.reverse()
+        if limit is not None:
+            entries = entries[:limit]
+        return self.read(entries)
+
+    # ------------------------------------------------------------------ 归档
+
+    def compact_to_sqlite(self, db_path: str, table: Optional[str] = None, drop: bool = False) -> int:
+        """
+        将已封存(非活动)的分段归档到 SQLite, 按时间和键字段建立索引
+        :param db_path: SQLite 文件路径
+        :param table: 表名, 默认使用前缀
+        :param drop: 归档后是否删除分段文件
+        :return: 归档的记录数
+        """
+        table = table or self.prefix
+        columns = "".join(f", {field} TEXT" for field in self.key_fields)
+        with self._lock:
+            sealed = [s for s in self._segments.values() if s is not self._active]
+
+        conn = sqlite3.connect(db_path)
+        try:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (ts REAL, segment TEXT{columns}, attrs TEXT, data TEXT)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_ts ON {table} (ts)")
+            for field in self.key_fields:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_{field} ON {table} ({field})")
+
+            placeholders = ", ".join("?" for _ in range(4 + len(self.key_fields)))
+            total = 0
+            for segment in sealed:
+                conn.execute(f"DELETE FROM {table} WHERE segment = ?", (segment.name,))
+                rows = []
+                with segment.path.open("rb") as f:
+                    data = f.read()
+                for entry in segment.entries:
+                    raw = data[entry.offset : entry.offset + entry.length].decode("utf-8").rstrip("\n")
+                    keys = tuple(entry.attrs.get(field) for field in self.key_fields)
+                    rows.append((entry.timestamp, segment.name, *keys, json.dumps(entry.attrs, default=str), raw))
+                conn.executemany(f"INSERT INTO {table} VALUES ({placeholders})", rows)
+                total += len(rows)
+            conn.commit()
+        finally:
+            conn.close()
+
+        if drop:
+            with self._lock:
+                pinned = self._pinned_segments()
+                for segment in sealed:
+                    if segment.name in self._segments and segment.name not in pinned:
+                        self._drop_segment(segment.name)
+        return total
+
+    # ------------------------------------------------------------------ 统计
+
+    @property
+    def current_file(self) -> Optional[Path]:
+        return self._active.path if self._active else None
+
+    @property
+    def current_size(self) -> int:
+        return self._active.size if self._active else 0
+
+    def __len__(self) -> int:
+        return sum(len(segment.entries) for segment in self._segments.values())
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取存储指标"""
+        return {
+            "log_dir": str(self.log_dir),
+            "max_file_size": self.max_segment_size,
+            "max_files": self.max_segments,
+            "current_file": str(self.current_file) if self.current_file else None,
+            "current_size": self.current_size,
+            "total_files": len(self._segments),
+            "total_size": sum(segment.size for segment in self._segments.values()),
+            "total_entries": len(self),
+            "indexed_keys": {field: len(index) for field, index in self._keys.items()},
+        }
+
+
+__all__ = ["IndexedLogStore", "IndexEntry", "Indexer"]
@@ -0,0 +1,112 @@
+"""
+请求级查询计数
+按 SQL 指纹统计一次请求内执行的语句, 同一指纹重复执行达到阈值时判定为疑似 N+1
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from core.db.utils.fingerprint import fingerprint_sql
+
+# 同一指纹在一次请求中执行多少次视为疑似 N+1
+DEFAULT_N_PLUS_ONE_THRESHOLD = 10
+
+_current_counter: ContextVar[Optional["QueryCounter"]] = ContextVar("query_counter", default=None)
+_installed_targets = set()
+
+
+class QueryCounter:
+    """查询计数器"""
+
+    def __init__(self, threshold: int = DEFAULT_N_PLUS_ONE_THRESHOLD):
+        """
+        :param threshold: 疑似 N+1 的重复次数阈值
+        """
+        self.threshold = threshold
+        self.total = 0
+        self.by_fingerprint: Counter = Counter()
+        self._samples: Dict[str, str] = {}
+
+    def record(self, statement: str) -> None:
+        """
+        记录一条已执行的语句
+        :param statement: SQL
+        """
+        fingerprint = fingerprint_sql(statement)
+        self.total += 1
+        self.by_fingerprint[fingerprint] += 1
+        if fingerprint not in self._samples:
+            self._samples[fingerprint] = statement
+
+    @property
+    def suspects(self) -> List[Dict[str, Any]]:
+        """重复执行次数达到阈值的语句, 按次数降序"""
+        return [
+            {"fingerprint": fingerprint, "count": count, "sql": self._samples[fingerprint]}
+            for fingerprint, count in self.by_fingerprint.most_common()
+            if count >= self.threshold
+        ]
+
+    @property
+    def has_n_plus_one(self) -> bool:
+        return any(count >= self.threshold for count in self.by_fingerprint.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "distinct": len(self.by_fingerprint),
+            "suspects": self.suspects,
+        }
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    counter = _current_counter.get()
+    if counter is not None:
+        counter.record(statement)
+
+
+def install_query_counter(target: Any = Engine) -> None:
+    """
+    注册语句执行监听, 重复调用无副作用
+    :param target: Engine 类(全部引擎)或某个引擎实例, AsyncEngine 需传 sync_engine
+    """
+    target = getattr(target, "sync_engine", target)
+    if target in _installed_targets:
+        return
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    _installed_targets.add(target)
+
+
+def current_query_counter() -> Optional[QueryCounter]:
+    """获取当前上下文的查询计数器"""
+    return _current_counter.get()
+
+
+@contextmanager
+def count_queries(threshold: int = DEFAULT_N_PLUS_ONE_THRESHOLD) -> Iterator[QueryCounter]:
+    """
+    在上下文内统计执行的语句
+    :param threshold: 疑似 N+1 的重复次数阈值
+    :return: 查询计数器
+    """
+    install_query_counter()
+    counter = QueryCounter(threshold)
+    token = _current_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _current_counter.reset(token)
+
+
+__all__ = [
+    "QueryCounter",
+    "install_query_counter",
+    "current_query_counter",
+    "count_queries",
+    "DEFAULT_N_PLUS_ONE_THRESHOLD",
+]
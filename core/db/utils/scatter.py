@@ -0,0 +1,249 @@
+"""
+跨分片分发与归并
+并发地在各分片上执行查询(单分片超时互不影响), 并以流式方式归并结果:
+有序归并用于 ORDER BY + LIMIT, 部分聚合用于 COUNT / SUM / MIN / MAX
+"""
+
+import asyncio
+import hashlib
+import heapq
+import inspect
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Union,
+)
+
+# 路由哈希缓存大小
+ROUTE_CACHE_SIZE = 65536
+
+# 行流: 异步迭代器或普通可迭代对象
+RowStream = Union[AsyncIterator[Any], Iterable[Any]]
+
+
+@lru_cache(maxsize=ROUTE_CACHE_SIZE)
+def _hash(value: str) -> int:
+    return int(hashlib.md5(value.encode()).hexdigest(), 16)
+
+
+def shard_hash(value: Any) -> int:
+    """
+    计算分片哈希, 热点键命中缓存时不再重复计算 md5
+    :param value: 分片值
+    :return: 哈希值
+    """
+    return _hash(str(value))
+
+
+@dataclass
+class ShardResult:
+    """单个分片的执行结果"""
+
+    shard: str
+    ok: bool
+    value: Any = None
+    error: Optional[str] = None
+    elapsed: float = 0.0
+
+
+async def _call(func: Callable[..., Any], target: Any) -> Any:
+    """协程函数直接等待, 同步函数放入线程执行, 避免阻塞事件循环"""
+    if inspect.iscoroutinefunction(func):
+        return await func(target)
+    result = await asyncio.to_thread(func, target)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+async def scatter(
+    targets: Mapping[str, Any],
+    func: Callable[[Any], Union[Any, Awaitable[Any]]],
+    *,
+    timeout: Optional[float] = None,
+) -> Dict[str, ShardResult]:
+    """
+    在所有分片上并发执行操作, 总耗时取决于最慢的分片而非各分片之和
+    :param targets: {分片名: 会话/引擎等执行对象}
+    :param func: 接收执行对象的协程函数或同步函数
+    :param timeout: 单分片超时秒数, 超时的分片记为失败, 不影响其他分片
+    :return: {分片名: 结果}, 顺序与 targets 一致
+    """
+
+    async def run_one(shard: str, target: Any) -> ShardResult:
+        start = time.perf_counter()
+        try:
+            value = await asyncio.wait_for(_call(func, target), timeout)
+            return ShardResult(shard, True, value, elapsed=time.perf_counter() - start)
+        except asyncio.TimeoutError:
+            error = f"timed out after {timeout}s"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        return ShardResult(shard, False, error=error, elapsed=time.perf_counter() - start)
+
+    results = await asyncio.gather(*(run_one(shard, target) for shard, target in targets.items()))
+    return {result.shard: result for result in results}
+
+
+class ShardTimeoutError(asyncio.TimeoutError):
+    """分片在超时时间内没有返回数据"""
+
+
+async def with_timeout(stream: AsyncIterator[Any], timeout: Optional[float], shard: str = "") -> AsyncIterator[Any]:
+    """
+    为行流的每次读取设置超时, 流式查询中卡住的分片不会让归并无限等待
+    :param stream: 异步行流
+    :param timeout: 每次读取的超时秒数, None 表示不限制
+    :param shard: 分片名, 用于错误信息
+    :return: 原行流中的行
+    :raises ShardTimeoutError: 某次读取超时
+    """
+    iterator = stream.__aiter__()
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(iterator.__anext__(), timeout)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                raise ShardTimeoutError(f"Shard {shard} timed out after {timeout}s") from None
+            yield item
+    finally:
+        close = getattr(iterator, "aclose", None)
+        if close is not None:
+            await close()
+
+
+async def _aiter(stream: RowStream) -> AsyncIterator[Any]:
+    if hasattr(stream, "__aiter__"):
+        iterator = stream.__aiter__()
+        try:
+            async for item in iterator:
+                yield item
+        finally:
+            # 提前结束时关闭分片的行流, 释放其会话
+            close = getattr(iterator, "aclose", None)
+            if close is not None:
+                await close()
+    else:
+        for item in stream:
+            yield item
+
+
+async def merge_ordered(
+    streams: Sequence[RowStream],
+    key: Callable[[Any], Any],
+    *,
+    reverse: bool = False,
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> AsyncIterator[Any]:
+    """
+    多路有序归并
+    各分片按相同的 ORDER BY 返回有序行流(且各自已应用 LIMIT offset+limit),
+    归并时每个分片只预读一行, 得到前 limit 行后立即停止拉取
+    :param streams: 各分片的有序行流
+    :param key: 排序键
+    :param reverse: 是否降序
+    :param limit: 返回行数上限
+    :param offset: 跳过的行数
+    :return: 全局有序的行
+    """
+    iterators = [_aiter(stream).__aiter__() for stream in streams]
+    heap: List[Any] = []
+
+    async def push(index: int) -> None:
+        try:
+            row = await iterators[index].__anext__()
+        except StopAsyncIteration:
+            return
+        sort_key = key(row)
+        # 降序时使用包装键反转比较, index 保证同键时稳定且不比较行本身
+        heapq.heappush(heap, (_Reversed(sort_key) if reverse else sort_key, index, row))
+
+    await asyncio.gather(*(push(index) for index in range(len(iterators))))
+    produced = 0
+    try:
+        while heap:
+            _, index, row = heapq.heappop(heap)
+            if offset > 0:
+                offset -= 1
+            else:
+                yield row
+                produced += 1
+                if limit is not None and produced >= limit:
+                    return
+            await push(index)
+    finally:
+        for iterator in iterators:
+            close = getattr(iterator, "aclose", None)
+            if close is not None:
+                await close()
+
+
+class _Reversed:
+    """反转比较顺序的排序键"""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __lt__(self, other: "_Reversed") -> bool:
+        return other.value < self.value
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _Reversed) and other.value == self.value
+
+
+# 部分聚合的合并函数
+_COMBINE: Dict[str, Callable[[Any, Any], Any]] = {
+    "count": lambda a, b: a + b,
+    "sum": lambda a, b: a + b,
+    "min": min,
+    "max": max,
+}
+
+
+def merge_aggregates(partials: Iterable[Mapping[str, Any]], spec: Mapping[str, str]) -> Dict[str, Any]:
+    """
+    合并各分片的部分聚合结果
+    :param partials: 各分片的聚合行, 如 [{"total": 10, "amount": 3.5}, ...]
+    :param spec: {列名: count / sum / min / max}
+    :return: 全局聚合结果; 所有分片均为空时 SUM/MIN/MAX 为 None, COUNT 为 0
+    """
+    for column, func in spec.items():
+        if func not in _COMBINE:
+            raise ValueError(f"Unsupported aggregate for {column}: {func}")
+
+    merged: Dict[str, Any] = {column: 0 if func == "count" else None for column, func in spec.items()}
+    for partial in partials:
+        for column, func in spec.items():
+            value = partial.get(column)
+            if value is None:
+                continue
+            current = merged[column]
+            merged[column] = value if current is None else _COMBINE[func](current, value)
+    return merged
+
+
+__all__ = [
+    "ShardResult",
+    "ShardTimeoutError",
+    "shard_hash",
+    "scatter",
+    "with_timeout",
+    "merge_ordered",
+    "merge_aggregates",
+]
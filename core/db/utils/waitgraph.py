@@ -0,0 +1,212 @@
+"""
+增量式等待图(wait-for graph)
+只在新增等待边时检测环, 用 Pearce-Kelly 动态拓扑序把搜索限制在受影响的区间内,
+无需每次重建和遍历整张图; 发现死锁时按代价选择牺牲者(持有锁最少、最年轻的事务)
+"""
+
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+TxId = Hashable
+
+
+@dataclass
+class Deadlock:
+    """检测到的死锁"""
+
+    cycle: List[TxId]  # 环上的事务, 从新增等待的事务开始, 每个等待下一个
+    victim: TxId  # 选出的牺牲者
+    detected_at: float = field(default_factory=time.time)
+
+
+@dataclass
+class _Node:
+    order: int  # 拓扑序
+    started_at: float
+    held: int = 0  # 持有的锁数量
+    waits_for: Set[TxId] = field(default_factory=set)
+    waited_by: Set[TxId] = field(default_factory=set)
+
+
+def default_cost(node: _Node) -> Tuple[int, float]:
+    """牺牲代价: 持有锁越少、开始越晚代价越低"""
+    return node.held, -node.started_at
+
+
+class WaitForGraph:
+    """
+    增量式等待图
+    节点为事务, 边 a -> b 表示 a 在等待 b 持有的锁. 图始终保持无环:
+    新增的边若会成环则不加入, 而是返回 Deadlock, 由调用方中止牺牲者后重试
+    """
+
+    def __init__(self, cost: Callable[[_Node], Tuple] = default_cost, clock: Callable[[], float] = time.time):
+        self._nodes: Dict[TxId, _Node] = {}
+        self._order = itertools.count()
+        self._cost = cost
+        self._clock = clock
+        self.edges = 0
+        self.checks = 0
+        self.deadlocks = 0
+        self.visited = 0  # 检测过程中访问的节点总数
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __contains__(self, tx: TxId) -> bool:
+        return tx in self._nodes
+
+    def _node(self, tx: TxId) -> _Node:
+        node = self._nodes.get(tx)
+        if node is None:
+            node = self._nodes[tx] = _Node(order=next(self._order), started_at=self._clock())
+        return node
+
+    def register(self, tx: TxId, started_at: Optional[float] = None) -> None:
+        """
+        登记事务(未登记的事务在首次出现时自动登记)
+        :param tx: 事务ID
+        :param started_at: 事务开始时间, 用于选择牺牲者
+        """
+        node = self._node(tx)
+        if started_at is not None:
+            node.started_at = started_at
+
+    def acquired(self, tx: TxId, count: int = 1) -> None:
+        """事务获得锁"""
+        self._node(tx).held += count
+
+    def released(self, tx: TxId, count: int = 1) -> None:
+        """事务释放锁"""
+        node = self._nodes.get(tx)
+        if node is not None:
+            node.held = max(0, node.held - count)
+
+    def held(self, tx: TxId) -> int:
+        """事务持有的锁数量"""
+        node = self._nodes.get(tx)
+        return node.held if node else 0
+
+    def waits_for(self, tx: TxId) -> Set[TxId]:
+        """事务当前等待的事务"""
+        node = self._nodes.get(tx)
+        return set(node.waits_for) if node else set()
+
+    def add_wait(self, waiter: TxId, holders: Iterable[TxId]) -> Optional[Deadlock]:
+        """
+        设置等待关系(替换该事务原有的等待边)
+        只搜索拓扑序介于两端之间的节点, 与图中其他事务的数量无关
+        :param waiter: 等待的事务
+        :param holders: 持有所需锁的事务
+        :return: 会形成环时返回死锁信息(此时不保留 waiter 的任何等待边), 否则 None
+        """
+        self.remove_wait(waiter)
+        source = self._node(waiter)
+        for holder in holders:
+            if holder == waiter or holder in source.waits_for:
+                continue
+            self.checks += 1
+            cycle = self._insert(waiter, holder)
+            if cycle is not None:
+                self.remove_wait(waiter)
+                self.deadlocks += 1
+                return Deadlock(cycle=cycle, victim=self.choose_victim(cycle), detected_at=self._clock())
+        return None
+
+    def remove_wait(self, waiter: TxId) -> None:
+        """移除事务的全部等待边(获得锁、放弃等待时调用)"""
+        node = self._nodes.get(waiter)
+        if node is None:
+            return
+        for holder in node.waits_for:
+            self._nodes[holder].waited_by.discard(waiter)
+        self.edges -= len(node.waits_for)
+        node.waits_for.clear()
+
+    def remove(self, tx: TxId) -> None:
+        """移除事务(提交或回滚后调用), 等待它的边一并移除"""
+        node = self._nodes.pop(tx, None)
+        if node is None:
+            return
+        for holder in node.waits_for:
+            self._nodes[holder].waited_by.discard(tx)
+        for waiter in node.waited_by:
+            self._nodes[waiter].waits_for.discard(tx)
+        self.edges -= len(node.waits_for) + len(node.waited_by)
+
+    def choose_victim(self, cycle: List[TxId]) -> TxId:
+        """在环上选择代价最低的事务作为牺牲者"""
+        return min(cycle, key=lambda tx: self._cost(self._nodes[tx]))
+
+    def _insert(self, source: TxId, target: TxId) -> Optional[List[TxId]]:
+        """加入边 source -> target, 成环时不加入并返回环"""
+        src, dst = self._nodes[source], self._node(target)
+        if src.order > dst.order:
+            # 拓扑序被破坏: 在 [dst.order, src.order] 区间内向前搜索, 能回到 source 即成环
+            forward = self._search_forward(target, src.order, source)
+            if isinstance(forward, list):
+                return forward
+            backward = self._search_backward(source, dst.order)
+            self._reorder(backward, forward)
+        src.waits_for.add(target)
+        dst.waited_by.add(source)
+        self.edges += 1
+        return None
+
+    def _search_forward(self, start: TxId, upper: int, goal: TxId):
+        parents: Dict[TxId, Optional[TxId]] = {start: None}
+        stack = [start]
+        while stack:
+            tx = stack.pop()
+            self.visited += 1
+            for nxt in self._nodes[tx].waits_for:
+                if nxt == goal:
+                    path = [tx]
+                    while parents[path[-1]] is not None:
+                        path.append(parents[path[-1]])
+                    return [goal] + path[::-1]
+                if nxt not in parents and self._nodes[nxt].order < upper:
+                    parents[nxt] = tx
+                    stack.append(nxt)
+        return set(parents)
+
+    def _search_backward(self, start: TxId, lower: int) -> Set[TxId]:
+        seen = {start}
+        stack = [start]
+        while stack:
+            tx = stack.pop()
+            self.visited += 1
+            for prev in self._nodes[tx].waited_by:
+                if prev not in seen and self._nodes[prev].order > lower:
+                    seen.add(prev)
+                    stack.append(prev)
+        return seen
+
+    def _reorder(self, backward: Set[TxId], forward: Set[TxId]) -> None:
+        """把受影响节点的拓扑序重新分配: 能到达 source 的排在 target 可达的节点之前"""
+        key = lambda tx: self._nodes[tx].order  # noqa: E731
+        moved = sorted(backward, key=key) + sorted(forward, key=key)
+        slots = sorted(self._nodes[tx].order for tx in moved)
+        for tx, order in zip(moved, slots):
+            self._nodes[tx].order = order
+
+    def is_consistent(self) -> bool:
+        """全图校验每条边都符合拓扑序(即图中无环), 仅用于测试和排查"""
+        return all(
+            node.order < self._nodes[nxt].order for node in self._nodes.values() for nxt in node.waits_for
+        )
+
+    def metrics(self) -> Dict:
+        """检测统计"""
+        return {
+            "transactions": len(self._nodes),
+            "wait_edges": self.edges,
+            "checks": self.checks,
+            "deadlocks": self.deadlocks,
+            "visited": self.visited,
+        }
+
+
+__all__ = ["Deadlock", "WaitForGraph", "default_cost"]
@@ -7,7 +7,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.config.manager import config_manager
-from core.config.setting import settings
+from core.config.setting import current_settings
 from core.dependencies.db import async_db, sync_db
 from models import User
 
@@ -25,7 +25,7 @@ async def get_current_user(db: AsyncSession = Depends(async_db), token: str = De
     )
 
     try:
-        security_config = settings.security
+        security_config = current_settings().security
         if not security_config:
             raise ValueError("Security configuration not found")
 
@@ -29,8 +29,9 @@ from core.middlewares.cors import CustomCORSMiddleware
 from core.middlewares.encryption import EncryptionMiddleware
 from core.middlewares.interceptors import InterceptorMiddleware
 from core.middlewares.logging import LoggingMiddleware
-from core.middlewares.metrics import MetricsMiddleware, MonitorMiddleware
+from core.middlewares.metrics import METRICS_PATH, MetricsMiddleware, metrics_endpoint
 from core.middlewares.monitor import PerformanceMonitorMiddleware
+from core.middlewares.query_counter import QueryCounterMiddleware
 from core.middlewares.rate_limit import RateLimitMiddleware
 from core.middlewares.request import RequestContextMiddleware, RequestLoggingMiddleware
 from core.middlewares.security import SecurityMiddleware
@@ -67,8 +68,9 @@ class MiddlewareManager:
         self.app.add_middleware(InterceptorMiddleware)   # 拦截器中间件
         self.app.add_middleware(LoggingMiddleware)   # 日志中间件
         self.app.add_middleware(MetricsMiddleware)   # 指标中间件
-        self.app.add_middleware(MonitorMiddleware)   # 监控中间件
+        self.app.add_route(METRICS_PATH, metrics_endpoint, include_in_schema=False)  # Prometheus 抓取端点
         self.app.add_middleware(PerformanceMonitorMiddleware)   # 性能监控中间件
+        self.app.add_middleware(QueryCounterMiddleware)   # 查询计数中间件(N+1 检测)
         # self.app.add_middleware(RateLimitMiddleware) # 限流中间件
         self.app.add_middleware(RequestContextMiddleware) # 请求上下文中间件
         self.app.add_middleware(RequestLoggingMiddleware) # 请求日志中间件
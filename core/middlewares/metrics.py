@@ -1,118 +1,76 @@
 # -*- coding:utf-8 -*-
 """
-@Project ：Speedy 
+@Project ：Speedy
 @File    ：metrics.py
 @Author  ：PySuper
-@Date    ：2024/12/24 17:12 
+@Date    ：2024/12/24 17:12
 @Desc    ：Speedy metrics.py
 """
 import time
-from typing import Callable
 
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
 from starlette.requests import Request
 from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-from core.middlewares.prometheus import REQUESTS_IN_PROGRESS
-from core.strong.monitoring import ACTIVE_REQUESTS, REQUEST_COUNT, REQUEST_LATENCY
-from middlewares.base import BaseCustomMiddleware
+from core.middlewares.monitor import resource_sampler
+from core.middlewares.prometheus import normalize_method, render_latest, route_metrics, route_template
 
 
-class MetricsMiddleware(BaseCustomMiddleware):
+class MetricsMiddleware:
     """
     性能监控中间件
-    收集请求指标
-    """
-
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
-        method = request.method
-        endpoint = request.url.path
+    收集请求指标, 以路由模板而非原始路径作为 endpoint 标签
 
-        # 记录正在处理的请求数
-        REQUESTS_IN_PROGRESS.labels(method=method, endpoint=endpoint).inc()
-
-        # 记录请求开始时间
-        start_time = time.time()
+    实现为纯 ASGI 中间件: 不经过 BaseHTTPMiddleware 的响应流转发,
+    每个请求只有一次计时和两次字典查找的开销
+    """
 
+    def __init__(self, app: ASGIApp, sampler=resource_sampler, metrics=route_metrics):
+        self.app = app
+        self.sampler = sampler
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # 首个请求时按路由表预建指标并启动资源采样
+        if not self.metrics.prepared and "app" in scope:
+            self.metrics.prepare(scope["app"])
+        if not self.sampler.running:
+            self.sampler.start()
+
+        method = normalize_method(scope["method"])
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress = self.metrics.in_progress(method)
+        in_progress.inc()
+        start_time = time.perf_counter()
         try:
-            response = await call_next(request)
-
-            # 记录请求延迟
-            REQUEST_LATENCY.labels(method=method, endpoint=endpoint).observe(time.time() - start_time)
-
-            # 记录请求计数
-            REQUEST_COUNT.labels(method=method, endpoint=endpoint, status=response.status_code).inc()
-
-            return response
-        except Exception as exc:
-            # 记录异常请求
-            REQUEST_COUNT.labels(method=method, endpoint=endpoint, status=500).inc()
-            raise
+            await self.app(scope, receive, send_wrapper)
         finally:
-            # 减少正在处理的请求数
-            REQUESTS_IN_PROGRESS.labels(method=method, endpoint=endpoint).dec()
+            # 路由在下游匹配后写入 scope, 此时才能取得模板
+            self.metrics.observe(method, route_template(scope), status_code, time.perf_counter() - start_time)
+            in_progress.dec()
 
 
-class MetricsMiddleware(BaseCustomMiddleware):
-    """
-    指标监控中间件
-    """
-
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        # 记录开始时间
-        start_time = time.time()
-
-        # 处理请求
-        response = await call_next(request)
-
-        # 计算处理时间
-        process_time = time.time() - start_time
+METRICS_PATH = "/metrics"
 
-        # 记录请求计数
-        REQUEST_COUNT.labels(method=request.method, endpoint=request.url.path, status=response.status_code).inc()
 
-        # 记录请求延迟
-        REQUEST_LATENCY.labels(method=request.method, endpoint=request.url.path).observe(process_time)
-        
-        print(" ✅ MetricsMiddleware")
-        return response
-
-
-class MonitorMiddleware(BaseCustomMiddleware):
+async def metrics_endpoint(request: Request) -> Response:
     """
-    监控中间件
+    Prometheus 抓取端点
+    多进程部署时汇总所有 worker 的指标
     """
+    content, content_type = render_latest()
+    return Response(content=content, media_type=content_type)
+
 
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
-        # 记录请求开始时间
-        start_time = time.time()
-
-        # 处理请求
-        response = await call_next(request)
-
-        # 计算处理时间
-        process_time = time.time() - start_time
-
-        # 记录请求延迟
-        REQUEST_LATENCY.labels(method=request.method, endpoint=request.url.path).observe(process_time)
-
-        # 记录请求计数
-        REQUEST_COUNT.labels(method=request.method, endpoint=request.url.path, status=response.status_code).inc()
-        
-        print(" ✅ MonitorMiddleware")
-        return response
-    
-    async def after_response(
-        self,
-        request: Request,
-        response: Response,
-    ) -> Response:
-        # 记录请求结束时间
-        end_time = time.time()
-        
-        # 记录活��请求数
-        ACTIVE_REQUESTS.labels(method=request.method, endpoint=request.url.path).dec()
-
-        return response
-
-        
\ No newline at end of file
+__all__ = ["METRICS_PATH", "MetricsMiddleware", "metrics_endpoint"]
@@ -1,5 +1,6 @@
 """统一的监控中间件实现"""
 
+import asyncio
 import os
 import random
 import time
@@ -11,6 +12,12 @@ from pydantic import BaseModel, ConfigDict
 
 from core.loge.manager import logic
 from core.middlewares.base import BaseCustomMiddleware, MiddlewareConfig
+from core.middlewares.prometheus import (
+    PROCESS_CPU_PERCENT,
+    PROCESS_MEMORY_RSS,
+    PROCESS_OPEN_FDS,
+    PROCESS_THREADS,
+)
 
 
 class MonitorConfig(MiddlewareConfig):
@@ -43,24 +50,110 @@ class RequestMetrics:
         self.response_size = len(response.body) if hasattr(response, "body") else 0
 
 
+class ResourceSampler:
+    """
+    进程资源采样器
+    由一个后台任务定期采集 CPU/内存/文件描述符/线程数并写入 Prometheus 指标,
+    请求路径上只读取最近一次的采样结果
+    """
+
+    def __init__(self, interval: float = 5.0):
+        """
+        :param interval: 采样间隔(秒)
+        """
+        self.interval = interval
+        self._process: Optional[psutil.Process] = None
+        self._pid: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self.snapshot: Dict[str, float] = {}
+        self.samples = 0
+
+    def _get_process(self) -> psutil.Process:
+        # fork 出的 worker 进程ID不同, 需要重新绑定并预热 cpu_percent
+        pid = os.getpid()
+        if self._process is None or self._pid != pid:
+            self._process = psutil.Process(pid)
+            self._pid = pid
+            self._process.cpu_percent(None)
+        return self._process
+
+    def sample(self) -> Dict[str, float]:
+        """
+        立即采样一次
+        :return: 采样结果
+        """
+        process = self._get_process()
+        with process.oneshot():
+            cpu = process.cpu_percent(None)
+            memory_info = process.memory_info()
+            threads = process.num_threads()
+            fds = process.num_fds() if hasattr(process, "num_fds") else process.num_handles()
+
+        PROCESS_CPU_PERCENT.set(cpu)
+        PROCESS_MEMORY_RSS.set(memory_info.rss)
+        PROCESS_OPEN_FDS.set(fds)
+        PROCESS_THREADS.set(threads)
+
+        self.snapshot = {
+            "cpu": cpu,
+            "rss": memory_info.rss / 1024 / 1024,  # MB
+            "vms": memory_info.vms / 1024 / 1024,  # MB
+            "fds": fds,
+            "threads": threads,
+            "timestamp": time.time(),
+        }
+        self.samples += 1
+        return self.snapshot
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                self.sample()
+            except psutil.Error as e:
+                logic.warning(f"Resource sampling failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """在当前事件循环中启动采样任务(重复调用无副作用)"""
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止采样任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# 全局资源采样器
+resource_sampler = ResourceSampler()
+
+
 class SystemMetrics:
-    """系统指标"""
+    """系统指标, 读取资源采样器的最近一次结果"""
+
+    @staticmethod
+    def _snapshot() -> Dict[str, float]:
+        return resource_sampler.snapshot or resource_sampler.sample()
 
     @staticmethod
     def get_memory_usage() -> Dict[str, float]:
         """获取内存使用情况"""
-        process = psutil.Process(os.getpid())
-        memory_info = process.memory_info()
-        return {
-            "rss": memory_info.rss / 1024 / 1024,  # MB
-            "vms": memory_info.vms / 1024 / 1024,  # MB
-        }
+        snapshot = SystemMetrics._snapshot()
+        return {"rss": snapshot["rss"], "vms": snapshot["vms"]}  # MB
 
     @staticmethod
     def get_cpu_usage() -> float:
         """获取CPU使用率"""
-        process = psutil.Process(os.getpid())
-        return process.cpu_percent()
+        return SystemMetrics._snapshot()["cpu"]
 
 
 class PerformanceMonitorMiddleware(BaseCustomMiddleware):
@@ -71,7 +164,6 @@ class PerformanceMonitorMiddleware(BaseCustomMiddleware):
         self.config = MonitorConfig(**(config or {}))
         # self.logger = get_logger("performance_monitor")
         self.logger = logic
-        print(" ✅ PerformanceMonitorMiddleware")
 
     def _should_sample(self) -> bool:
         """是否需要采样"""
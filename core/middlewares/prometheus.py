@@ -1,13 +1,38 @@
 # -*- coding:utf-8 -*-
 """
-@Project ：Speedy 
+@Project ：Speedy
 @File    ：prometheus.py
 @Author  ：PySuper
-@Date    ：2024/12/24 17:18 
+@Date    ：2024/12/24 17:18
 @Desc    ：Speedy prometheus.py
+
+HTTP 与进程资源的 Prometheus 指标
+请求按路由模板(如 /students/{id})打标签, 避免原始路径导致的时间序列膨胀;
+设置 PROMETHEUS_MULTIPROC_DIR 时按多进程模式聚合各 worker 的指标
 """
 
-from prometheus_client import Counter, Gauge, Histogram
+import os
+from typing import Dict, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# 未匹配任何路由的请求统一归入该标签, 防止扫描器制造任意多的序列
+UNMATCHED_ROUTE = "<unmatched>"
+
+# 已知的请求方法, 其余归为 OTHER
+KNOWN_METHODS = frozenset({"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"})
+
+# 请求耗时分桶(秒)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
 
 # Prometheus指标
 REQUEST_COUNT = Counter(
@@ -20,12 +45,15 @@ REQUEST_LATENCY = Histogram(
     "http_request_duration_seconds",
     "HTTP request duration in seconds",
     ["method", "endpoint"],
+    buckets=LATENCY_BUCKETS,
 )
 
+# 路由在请求处理完成前未知, 进行中的请求数只按方法统计
 REQUESTS_IN_PROGRESS = Gauge(
     "http_requests_in_progress",
     "Number of HTTP requests in progress",
-    ["method", "endpoint"],
+    ["method"],
+    multiprocess_mode="livesum",
 )
 
 RATE_LIMIT_EXCEEDED = Counter(
@@ -33,3 +61,184 @@ RATE_LIMIT_EXCEEDED = Counter(
     "Number of requests that exceeded the rate limit",
     ["method", "endpoint"],
 )
+
+# 进程资源指标, 由后台采样器定期更新, 多进程模式下对存活 worker 求和
+PROCESS_CPU_PERCENT = Gauge(
+    "app_process_cpu_percent",
+    "Process CPU usage percent",
+    multiprocess_mode="livesum",
+)
+
+PROCESS_MEMORY_RSS = Gauge(
+    "app_process_memory_rss_bytes",
+    "Process resident memory in bytes",
+    multiprocess_mode="livesum",
+)
+
+PROCESS_OPEN_FDS = Gauge(
+    "app_process_open_fds",
+    "Number of open file descriptors",
+    multiprocess_mode="livesum",
+)
+
+PROCESS_THREADS = Gauge(
+    "app_process_threads",
+    "Number of process threads",
+    multiprocess_mode="livesum",
+)
+
+
+def normalize_method(method: str) -> str:
+    """将请求方法限制在已知集合内"""
+    return method if method in KNOWN_METHODS else "OTHER"
+
+
+def route_template(scope: dict) -> str:
+    """
+    获取请求匹配到的路由模板
+    路由匹配后 Starlette 会把路由对象写入 scope["route"]
+    :param scope: ASGI scope
+    :return: 路由模板, 未匹配时为 UNMATCHED_ROUTE
+    """
+    route = scope.get("route")
+    if route is None:
+        return UNMATCHED_ROUTE
+    path = getattr(route, "path_format", None) or getattr(route, "path", None)
+    if not path:
+        return UNMATCHED_ROUTE
+    return scope.get("root_path", "") + path
+
+
+class RouteMetrics:
+    """
+    按路由模板记录请求指标
+    缓存已创建的带标签子指标, 每次请求只做一次字典查找,
+    并可在启动时按路由表预先创建全部子指标
+    """
+
+    def __init__(
+        self,
+        request_count: Counter = REQUEST_COUNT,
+        request_latency: Histogram = REQUEST_LATENCY,
+        in_progress: Gauge = REQUESTS_IN_PROGRESS,
+    ):
+        self._request_count = request_count
+        self._request_latency = request_latency
+        self._in_progress = in_progress
+        self._latency_children: Dict[Tuple[str, str], object] = {}
+        self._count_children: Dict[Tuple[str, str, int], object] = {}
+        self._progress_children: Dict[str, object] = {}
+        self.prepared = False
+
+    def prepare(self, app) -> int:
+        """
+        按应用路由表预先创建子指标
+        :param app: Starlette/FastAPI 应用
+        :return: 预创建的 (方法, 路由) 组合数
+        """
+        count = 0
+        for route in getattr(app, "routes", []):
+            path = getattr(route, "path_format", None) or getattr(route, "path", None)
+            methods = getattr(route, "methods", None)
+            if not path or not methods:
+                continue
+            for method in methods:
+                self._latency_child(normalize_method(method), path)
+                count += 1
+        self.prepared = True
+        return count
+
+    def _latency_child(self, method: str, route: str):
+        key = (method, route)
+        child = self._latency_children.get(key)
+        if child is None:
+            child = self._latency_children[key] = self._request_latency.labels(method=method, endpoint=route)
+        return child
+
+    def _count_child(self, method: str, route: str, status: int):
+        key = (method, route, status)
+        child = self._count_children.get(key)
+        if child is None:
+            child = self._count_children[key] = self._request_count.labels(
+                method=method, endpoint=route, status=str(status)
+            )
+        return child
+
+    def in_progress(self, method: str):
+        """获取某方法的进行中请求数子指标"""
+        child = self._progress_children.get(method)
+        if child is None:
+            child = self._progress_children[method] = self._in_progress.labels(method=method)
+        return child
+
+    def observe(self, method: str, route: str, status: int, duration: float) -> None:
+        """
+        记录一次请求
+        :param method: 请求方法(已规范化)
+        :param route: 路由模板
+        :param status: 响应状态码
+        :param duration: 耗时(秒)
+        """
+        self._latency_child(method, route).observe(duration)
+        self._count_child(method, route, status).inc()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "latency_series": len(self._latency_children),
+            "count_series": len(self._count_children),
+        }
+
+
+# 全局路由指标
+route_metrics = RouteMetrics()
+
+
+def is_multiprocess() -> bool:
+    """是否启用了 prometheus_client 多进程模式"""
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.environ.get("prometheus_multiproc_dir"))
+
+
+def render_latest(registry: Optional[CollectorRegistry] = None) -> Tuple[bytes, str]:
+    """
+    导出指标文本
+    多进程模式下从共享目录汇总所有 worker 的指标
+    :param registry: 指定的注册表, 默认使用全局注册表
+    :return: (指标文本, Content-Type)
+    """
+    if registry is None:
+        if is_multiprocess():
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int) -> None:
+    """
+    清理已退出 worker 的存活指标文件, 供 gunicorn 的 child_exit 钩子调用
+    :param pid: 退出的进程ID
+    """
+    if is_multiprocess():
+        multiprocess.mark_process_dead(pid)
+
+
+__all__ = [
+    "UNMATCHED_ROUTE",
+    "LATENCY_BUCKETS",
+    "REQUEST_COUNT",
+    "REQUEST_LATENCY",
+    "REQUESTS_IN_PROGRESS",
+    "RATE_LIMIT_EXCEEDED",
+    "PROCESS_CPU_PERCENT",
+    "PROCESS_MEMORY_RSS",
+    "PROCESS_OPEN_FDS",
+    "PROCESS_THREADS",
+    "RouteMetrics",
+    "route_metrics",
+    "normalize_method",
+    "route_template",
+    "is_multiprocess",
+    "render_latest",
+    "mark_process_dead",
+]
@@ -0,0 +1,64 @@
+"""
+查询计数中间件
+统计每个请求执行的SQL语句数, 发现疑似 N+1 查询时记录告警
+"""
+
+import logging
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.db.utils.query_counter import DEFAULT_N_PLUS_ONE_THRESHOLD, count_queries
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounterMiddleware:
+    """
+    查询计数中间件
+    实现为纯 ASGI 中间件, 通过上下文变量把计数器传给数据库引擎的执行监听
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        threshold: int = DEFAULT_N_PLUS_ONE_THRESHOLD,
+        expose_header: bool = True,
+        header_name: str = "X-Query-Count",
+    ):
+        """
+        :param app: ASGI应用
+        :param threshold: 同一语句重复执行多少次视为疑似 N+1
+        :param expose_header: 是否在响应头中返回查询数
+        :param header_name: 响应头名称
+        """
+        self.app = app
+        self.threshold = threshold
+        self.expose_header = expose_header
+        self.header_name = header_name.lower().encode("latin-1")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with count_queries(self.threshold) as counter:
+
+            async def send_wrapper(message: Message) -> None:
+                if self.expose_header and message["type"] == "http.response.start":
+                    # 响应头发出时下游查询已经执行完毕(流式响应除外)
+                    headers = list(message.get("headers", []))
+                    headers.append((self.header_name, str(counter.total).encode("latin-1")))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+        if counter.has_n_plus_one:
+            suspects = "; ".join(f"{item['count']}x {item['sql']}" for item in counter.suspects)
+            logger.warning(
+                f"Possible N+1 queries: {scope['method']} {scope['path']} "
+                f"executed {counter.total} statements, repeated: {suspects}"
+            )
+
+
+__all__ = ["QueryCounterMiddleware"]
@@ -6,17 +6,20 @@
 import asyncio
 import logging
 from datetime import timedelta
-from typing import Any, Dict, Generic, List, Optional, Tuple, Type, TypeVar, Union
+from typing import Any, Dict, Generic, Iterable, List, Optional, Tuple, Type, TypeVar, Union
 
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from sqlalchemy import func, select, text
+from sqlalchemy import select, text
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from core.cache.managers.manager import cache_manager
 from core.db.core.base import AbstractModel
+from core.db.core.loader import model_loader
+from core.db.utils.bulk import bulk_insert, bulk_update, bulk_upsert, to_row
+from core.db.utils.keyset import KeysetPage, KeysetPaginator, OffsetPage, TotalMode, offset_window, resolve_total
 from core.schemas.base.pagination import PaginationParams
 from core.strong.metrics import metrics_collector
 
@@ -108,21 +111,64 @@ class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
             logger.error(f"Unexpected error in get: {e}", exc_info=True)
             raise
 
+    async def load(self, db: AsyncSession, id: int) -> Optional[ModelType]:
+        """
+        按ID加载单条记录
+        同一事件循环轮次内的 load 调用会去重并合并为一次 IN 查询, 结果在会话内缓存
+        :param id: 记录ID
+        """
+        if id is None:
+            return None
+        return await model_loader(db, self.model, only_active=True).load(id)
+
+    async def load_many(self, db: AsyncSession, ids: List[int]) -> List[Optional[ModelType]]:
+        """
+        按ID批量加载记录
+        :param ids: 记录ID列表(可重复)
+        :return: 与ID顺序一致的记录列表, 不存在的为 None
+        """
+        return await model_loader(db, self.model, only_active=True).load_many(ids)
+
+    async def load_related(self, db: AsyncSession, fk_column: str, keys: List[Any]) -> List[List[ModelType]]:
+        """
+        按外键批量加载一对多关联记录
+        :param fk_column: 外键列名, 如 "course_id"
+        :param keys: 外键值列表
+        :return: 与键顺序一致的记录列表的列表
+        """
+        return await model_loader(db, self.model, column=fk_column, many=True, only_active=True).load_many(keys)
+
     async def get_multi(
-        self, db: AsyncSession, *, pagination: PaginationParams, use_cache: bool = True, **filters: Any
-    ) -> Tuple[List[ModelType], int]:
+        self,
+        db: AsyncSession,
+        *,
+        pagination: PaginationParams,
+        use_cache: bool = True,
+        total_mode: TotalMode = TotalMode.EXACT,
+        **filters: Any,
+    ) -> OffsetPage[ModelType]:
         """
         获取多条记录
         :param use_cache: 是否使用缓存
+        :param total_mode: 总数统计方式, NONE 时返回的总数为 None
+        :return: 分页结果, 可按 (数据列表, 总数) 解包
         """
         try:
             if use_cache:
-                cache_key = self._build_cache_key("multi", page=pagination.page, size=pagination.size, **filters)
+                cache_key = self._build_cache_key(
+                    "multi", page=pagination.page, size=pagination.size, total=TotalMode(total_mode).value, **filters
+                )
                 cached = await cache_manager.get(cache_key)
                 if cached is not None:
                     metrics_collector.track_cache("repository", True)
-                    items = [self.model(**item) for item in cached["items"]]
-                    return items, cached["total"]
+                    return OffsetPage(
+                        items=[self.model(**item) for item in cached["items"]],
+                        page=pagination.page,
+                        size=pagination.size,
+                        has_next=cached.get("has_next", False),
+                        total=cached["total"],
+                        total_estimated=cached.get("total_estimated", False),
+                    )
                 metrics_collector.track_cache("repository", False)
 
             async with db.begin():
@@ -135,35 +181,36 @@ class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
                         query = query.where(getattr(self.model, field) == value)
 
                 # 获取总数
-                count_query = select(func.count()).select_from(query.subquery())
-                total = await self._execute_with_metrics("count", db.scalar, count_query)
+                total, estimated = await self._resolve_total(db, query, total_mode)
 
                 # 优化大数据量查询
                 if pagination.size > 100:
                     # 使用游标分页
-                    query = (
-                        query.order_by(self.model.id)
-                        .options(selectinload("*"))
-                        .offset((pagination.page - 1) * pagination.size)
-                        .limit(pagination.size)
-                    )
-                else:
-                    # 使用普通分页
-                    query = (
-                        query.options(selectinload("*"))
-                        .offset((pagination.page - 1) * pagination.size)
-                        .limit(pagination.size)
-                    )
+                    query = query.order_by(self.model.id)
+
+                # 多取一行判断是否有下一页
+                query = offset_window(query.options(selectinload("*")), pagination.page, pagination.size)
 
                 # 执行查询
                 result = await self._execute_with_metrics("get_multi", db.execute, query)
-                items = result.scalars().all()
+                page = OffsetPage.from_rows(
+                    result.scalars().all(),
+                    pagination.page,
+                    pagination.size,
+                    total=total,
+                    total_estimated=estimated,
+                )
 
                 if use_cache:
-                    cache_data = {"items": [jsonable_encoder(item) for item in items], "total": total}
+                    cache_data = {
+                        "items": [jsonable_encoder(item) for item in page.items],
+                        "total": total,
+                        "total_estimated": estimated,
+                        "has_next": page.has_next,
+                    }
                     await cache_manager.set(cache_key, cache_data, expire=self.cache_ttl)
 
-                return items, total
+                return page
 
         except SQLAlchemyError as e:
             logger.error(f"Database error in get_multi: {e}", exc_info=True)
@@ -172,6 +219,78 @@ class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
             logger.error(f"Unexpected error in get_multi: {e}", exc_info=True)
             raise
 
+    async def _resolve_total(self, db: AsyncSession, query, total_mode: TotalMode) -> Tuple[Optional[int], bool]:
+        """按统计方式计算总数并记录指标"""
+        if TotalMode(total_mode) is TotalMode.NONE:
+            return None, False
+        return await self._execute_with_metrics("count", resolve_total, db, query, total_mode)
+
+    async def get_page(
+        self,
+        db: AsyncSession,
+        *,
+        size: int = 20,
+        cursor: Optional[str] = None,
+        order_by: Union[str, List[str], None] = None,
+        total_mode: TotalMode = TotalMode.NONE,
+        use_cache: bool = True,
+        **filters: Any,
+    ) -> KeysetPage[ModelType]:
+        """
+        键集(游标)分页获取多条记录
+        按排序键定位而不是 OFFSET 跳行, 深页与首页代价相同
+        :param size: 每页数量
+        :param cursor: 上一次返回的 next_cursor / prev_cursor, 为空表示第一页
+        :param order_by: 排序字段, 如 "-created_at,name", 自动以 id 作为决胜字段
+        :param total_mode: 总数统计方式, 默认不统计
+        :param use_cache: 是否使用缓存
+        :return: 分页结果
+        """
+        try:
+            paginator = KeysetPaginator(self.model, sort=order_by, cursor=cursor, size=size)
+
+            if use_cache:
+                cache_key = self._build_cache_key(
+                    "page",
+                    cursor=cursor or "",
+                    size=paginator.size,
+                    order_by=",".join(str(key) for key in paginator.keys),
+                    total=TotalMode(total_mode).value,
+                    **filters,
+                )
+                cached = await cache_manager.get(cache_key)
+                if cached is not None:
+                    metrics_collector.track_cache("repository", True)
+                    cached["items"] = [self.model(**item) for item in cached["items"]]
+                    return KeysetPage(**cached)
+                metrics_collector.track_cache("repository", False)
+
+            async with db.begin():
+                query = select(self.model).where(self.model.is_deleted == False)
+                for field, value in filters.items():
+                    if value is not None:
+                        query = query.where(getattr(self.model, field) == value)
+
+                total, estimated = await self._resolve_total(db, query, total_mode)
+                result = await self._execute_with_metrics(
+                    "get_page", db.execute, paginator.apply(query).options(selectinload("*"))
+                )
+                page = paginator.build_page(result.scalars().all(), total=total, total_estimated=estimated)
+
+                if use_cache:
+                    cache_data = page.to_dict()
+                    cache_data["items"] = [jsonable_encoder(item) for item in page.items]
+                    await cache_manager.set(cache_key, cache_data, expire=self.cache_ttl)
+
+                return page
+
+        except SQLAlchemyError as e:
+            logger.error(f"Database error in get_page: {e}", exc_info=True)
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error in get_page: {e}", exc_info=True)
+            raise
+
     async def create(self, db: AsyncSession, *, obj_in: CreateSchemaType, use_cache: bool = True) -> ModelType:
         """创建记录"""
         async with self._lock:  # 使用锁保护创建操作
@@ -245,6 +364,7 @@ class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
                         obj.is_deleted = True
                         db.add(obj)
                         await self._execute_with_metrics("remove", db.commit)
+                        model_loader(db, self.model, only_active=True).clear(id)
 
                         if use_cache:
                             cache_key = self._build_cache_key("id", id=id)
@@ -259,30 +379,38 @@ class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
                 logger.error(f"Unexpected error in remove: {e}", exc_info=True)
                 raise
 
+    async def _invalidate_ids(self, ids: Iterable[Any]) -> None:
+        """清除按主键缓存的记录"""
+        for id in ids:
+            await cache_manager.delete(self._build_cache_key("id", id=id))
+
     async def bulk_create(
         self, db: AsyncSession, *, objs_in: List[CreateSchemaType], batch_size: int = 1000
     ) -> List[ModelType]:
-        """批量创建记录"""
-        async with self._lock:  # 使用锁保护批量创建操作
-            try:
-                created_objs = []
-                for i in range(0, len(objs_in), batch_size):
-                    batch = objs_in[i : i + batch_size]
-                    async with db.begin():
-                        db_objs = [self.model(**jsonable_encoder(obj)) for obj in batch]
-                        db.add_all(db_objs)
-                        await self._execute_with_metrics("bulk_create", db.commit)
-                        for obj in db_objs:
-                            await db.refresh(obj)
-                        created_objs.extend(db_objs)
-                return created_objs
+        """
+        批量创建记录
+        每批一条多行 INSERT ... RETURNING 并在独立事务中提交, 不再逐个 refresh, 也不占用仓储锁
+        :param batch_size: 每批行数
+        :return: 创建后的记录(含数据库生成的主键和默认值)
+        """
+        try:
+            created_objs = []
+            rows = [to_row(obj) for obj in objs_in]
+            for i in range(0, len(rows), batch_size):
+                async with db.begin():
+                    created_objs.extend(
+                        await self._execute_with_metrics(
+                            "bulk_create", bulk_insert, db, self.model, rows[i : i + batch_size], chunk_size=batch_size
+                        )
+                    )
+            return created_objs
 
-            except SQLAlchemyError as e:
-                logger.error(f"Database error in bulk_create: {e}", exc_info=True)
-                raise
-            except Exception as e:
-                logger.error(f"Unexpected error in bulk_create: {e}", exc_info=True)
-                raise
+        except SQLAlchemyError as e:
+            logger.error(f"Database error in bulk_create: {e}", exc_info=True)
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error in bulk_create: {e}", exc_info=True)
+            raise
 
     async def bulk_update(
         self,
@@ -290,34 +418,87 @@ class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         *,
         objs: List[Tuple[ModelType, Union[UpdateSchemaType, Dict[str, Any]]]],
         batch_size: int = 1000,
+        use_cache: bool = True,
     ) -> List[ModelType]:
-        """批量更新记录"""
-        async with self._lock:  # 使用锁保护批量更新操作
-            try:
-                updated_objs = []
-                for i in range(0, len(objs), batch_size):
-                    batch = objs[i : i + batch_size]
-                    async with db.begin():
-                        for db_obj, obj_in in batch:
-                            if isinstance(obj_in, dict):
-                                update_data = obj_in
-                            else:
-                                update_data = obj_in.dict(exclude_unset=True)
-                            for field, value in update_data.items():
-                                setattr(db_obj, field, value)
-                            db.add(db_obj)
-                        await self._execute_with_metrics("bulk_update", db.commit)
-                        for db_obj, _ in batch:
-                            await db.refresh(db_obj)
-                            updated_objs.append(db_obj)
-                return updated_objs
+        """
+        批量更新记录
+        每批一条 UPDATE ... CASE ... RETURNING, 会话中的对象随结果一并刷新
+        :param objs: (记录, 更新数据) 列表
+        :param batch_size: 每批行数
+        :param use_cache: 是否清除对应的缓存
+        :return: 更新后的记录
+        """
+        try:
+            updated_objs = []
+            rows = [{"id": db_obj.id, **to_row(obj_in, exclude_unset=True)} for db_obj, obj_in in objs]
+            for i in range(0, len(rows), batch_size):
+                async with db.begin():
+                    updated_objs.extend(
+                        await self._execute_with_metrics(
+                            "bulk_update", bulk_update, db, self.model, rows[i : i + batch_size], chunk_size=batch_size
+                        )
+                    )
 
-            except SQLAlchemyError as e:
-                logger.error(f"Database error in bulk_update: {e}", exc_info=True)
-                raise
-            except Exception as e:
-                logger.error(f"Unexpected error in bulk_update: {e}", exc_info=True)
-                raise
+            if use_cache:
+                await self._invalidate_ids(row["id"] for row in rows)
+            return updated_objs
+
+        except SQLAlchemyError as e:
+            logger.error(f"Database error in bulk_update: {e}", exc_info=True)
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error in bulk_update: {e}", exc_info=True)
+            raise
+
+    async def bulk_upsert(
+        self,
+        db: AsyncSession,
+        *,
+        objs_in: List[Union[CreateSchemaType, Dict[str, Any]]],
+        conflict_keys: List[str],
+        update_fields: Optional[List[str]] = None,
+        batch_size: int = 1000,
+        use_cache: bool = True,
+    ) -> List[ModelType]:
+        """
+        批量插入或更新(INSERT ... ON CONFLICT)
+        :param objs_in: 待写入数据
+        :param conflict_keys: 唯一约束列
+        :param update_fields: 冲突时更新的列, None 表示全部非冲突列, 空列表表示冲突时忽略
+        :param batch_size: 每批行数
+        :param use_cache: 是否清除对应的缓存(按返回记录和输入数据中的主键)
+        :return: 写入后的记录
+        """
+        try:
+            results = []
+            rows = [to_row(obj) for obj in objs_in]
+            for i in range(0, len(rows), batch_size):
+                async with db.begin():
+                    results.extend(
+                        await self._execute_with_metrics(
+                            "bulk_upsert",
+                            bulk_upsert,
+                            db,
+                            self.model,
+                            rows[i : i + batch_size],
+                            conflict_keys=conflict_keys,
+                            update_fields=update_fields,
+                            chunk_size=batch_size,
+                        )
+                    )
+
+            if use_cache:
+                ids = {obj.id for obj in results}
+                ids.update(row["id"] for row in rows if row.get("id") is not None)
+                await self._invalidate_ids(ids)
+            return results
+
+        except SQLAlchemyError as e:
+            logger.error(f"Database error in bulk_upsert: {e}", exc_info=True)
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error in bulk_upsert: {e}", exc_info=True)
+            raise
 
     async def execute_raw_sql(self, db: AsyncSession, sql: str, params: Optional[Dict[str, Any]] = None) -> Any:
         """执行原始SQL"""
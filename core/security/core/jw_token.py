@@ -12,7 +12,7 @@ from typing import Any, Dict, Optional
 import jwt
 from fastapi import HTTPException, status
 
-from core.config.setting import settings
+from core.config.setting import current_settings
 
 
 class JWTHandler:
@@ -31,8 +31,9 @@ class JWTHandler:
         :param claims: 额外的声明
         :return: JWT token
         """
+        security = current_settings().security
         if expires_delta is None:
-            expires_delta = timedelta(minutes=settings.security.ACCESS_TOKEN_EXPIRE_MINUTES)
+            expires_delta = timedelta(minutes=security.ACCESS_TOKEN_EXPIRE_MINUTES)
 
         expire = datetime.utcnow() + expires_delta
 
@@ -41,7 +42,7 @@ class JWTHandler:
         if claims:
             to_encode.update(claims)
 
-        return jwt.encode(to_encode, settings.security.SECRET_KEY, algorithm=cls.ALGORITHM)
+        return jwt.encode(to_encode, security.SECRET_KEY, algorithm=cls.ALGORITHM)
 
     @classmethod
     def decode_token(cls, token: str) -> Dict[str, Any]:
@@ -51,7 +52,7 @@ class JWTHandler:
         :return: 解码后的数据
         """
         try:
-            payload = jwt.decode(token, settings.security.SECRET_KEY, algorithms=[cls.ALGORITHM])
+            payload = jwt.decode(token, current_settings().security.SECRET_KEY, algorithms=[cls.ALGORITHM])
 
             if datetime.fromtimestamp(payload["exp"]) < datetime.utcnow():
                 raise HTTPException(
@@ -1,280 +1,276 @@
+import asyncio
 import os
 import shutil
-import tarfile
 from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Dict, Iterable, List, Optional
 
 import aioboto3
 from croniter import croniter
 
 from core.config.setting import settings
 from core.loge.pysuper_logging import get_logger
+from core.strong.backup_stream import (
+    BackupEngine,
+    BackupManifest,
+    BackupMode,
+    LocalBackupStorage,
+    ProgressCallback,
+    StreamSource,
+    TokenBucket,
+    command_sink,
+    command_source,
+    file_source,
+    sqlite_restore,
+    sqlite_source,
+)
 
 logger = get_logger("backup")
 
+# 数据流名称
+DATABASE_STREAM = "database.sql"
+UPLOADS_PREFIX = "uploads/"
+CONFIG_PREFIX = "config/"
+ENV_STREAM = ".env"
+
 
 class BackupManager:
     """备份管理器"""
 
     def __init__(self):
         self.backup_dir = Path(settings.BACKUP_DIR)
-        self.backup_dir.mkdir(parents=True, exist_ok=True)
+        self.storage = LocalBackupStorage(self.backup_dir)
+        throttle = TokenBucket(settings.BACKUP_BANDWIDTH_LIMIT) if settings.BACKUP_BANDWIDTH_LIMIT > 0 else None
+        self.engine = BackupEngine(
+            self.storage,
+            workers=settings.BACKUP_WORKERS or None,
+            compression_level=6 if settings.BACKUP_COMPRESSION else None,
+            throttle=throttle,
+            max_size=settings.BACKUP_MAX_SIZE,
+        )
 
         # S3会话
         if settings.DR_ENABLED:
             self.s3_session = aioboto3.Session()
 
     def _get_backup_name(self) -> str:
-        """生成备份文件名"""
+        """生成备份名称"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        return f"backup_{timestamp}.tar.gz"
-
-    async def create_backup(self) -> dict:
-        """创建备份"""
+        return f"backup_{timestamp}"
+
+    async def create_backup(self, mode: Optional[str] = None, progress: Optional[ProgressCallback] = None) -> dict:
+        """
+        创建备份, 数据库导出和文件以流的方式切块、压缩后直接写入存储
+        :param mode: 备份方式 full/incremental/differential, 默认为 BACKUP_MODE
+        :param progress: 进度回调, 在备份线程中调用
+        :return: 备份信息
+        """
         try:
             backup_name = self._get_backup_name()
-            backup_path = self.backup_dir / backup_name
-
-            # 创建临时目录
-            temp_dir = self.backup_dir / "temp"
-            temp_dir.mkdir(exist_ok=True)
-
-            try:
-                # 备份数据库
-                await self._backup_database(temp_dir)
-
-                # 备份上传的文件
-                await self._backup_uploads(temp_dir)
-
-                # 备份配置文件
-                await self._backup_configs(temp_dir)
-
-                # 创建压缩文件
-                with tarfile.open(backup_path, "w:gz") as tar:
-                    tar.add(temp_dir, arcname="")
-
-                # 获取备份文件大小
-                size = os.path.getsize(backup_path)
+            streams: Dict[str, StreamSource] = {DATABASE_STREAM: self._database_source()}
+            streams.update(self._file_sources(Path(settings.UPLOAD_DIR), UPLOADS_PREFIX))
+            streams.update(self._config_sources())
 
-                # 检查备份大小
-                if size > settings.BACKUP_MAX_SIZE:
-                    raise ValueError(f"Backup size exceeds limit: {size} bytes")
-
-                # 如果启用了灾难恢复，上传到S3
-                if settings.DR_ENABLED:
-                    await self._upload_to_s3(backup_path)
+            manifest = await asyncio.to_thread(
+                self.engine.backup, backup_name, streams, BackupMode(mode or settings.BACKUP_MODE), progress
+            )
 
-                return {
-                    "name": backup_name,
-                    "path": str(backup_path),
-                    "size": size,
-                    "timestamp": datetime.now().isoformat(),
-                }
+            # 如果启用了灾难恢复，上传到S3
+            if settings.DR_ENABLED:
+                await self._upload_to_s3(manifest)
 
-            finally:
-                # 清理临时目录
-                if temp_dir.exists():
-                    shutil.rmtree(temp_dir)
+            return self._backup_info(manifest)
 
         except Exception as e:
             logger.error(f"Failed to create backup: {str(e)}")
             raise
 
-    async def _backup_database(self, temp_dir: Path):
-        """备份数据库"""
-        try:
-            # 使用mysqldump命令备份数据库
-            dump_file = temp_dir / "database.sql"
-            cmd = (
-                f"mysqldump -h {settings.MYSQL_SERVER} "
-                f"-P {settings.MYSQL_PORT} "
-                f"-u {settings.MYSQL_USER} "
-                f"-p{settings.MYSQL_PASSWORD} "
-                f"{settings.MYSQL_DB} > {dump_file}"
-            )
-            os.system(cmd)
-        except Exception as e:
-            logger.error(f"Failed to backup database: {str(e)}")
-            raise
-
-    async def _backup_uploads(self, temp_dir: Path):
-        """备份上传的文件"""
-        try:
-            upload_dir = Path(settings.UPLOAD_DIR)
-            if upload_dir.exists():
-                shutil.copytree(upload_dir, temp_dir / "uploads", dirs_exist_ok=True)
-        except Exception as e:
-            logger.error(f"Failed to backup uploads: {str(e)}")
-            raise
-
-    async def _backup_configs(self, temp_dir: Path):
-        """备份配置文���"""
-        try:
-            # 备份.env文件
-            env_file = Path(".env")
-            if env_file.exists():
-                shutil.copy2(env_file, temp_dir / ".env")
-
-            # 备份其他配置文件
-            config_dir = Path("config")
-            if config_dir.exists():
-                shutil.copytree(config_dir, temp_dir / "config", dirs_exist_ok=True)
-        except Exception as e:
-            logger.error(f"Failed to backup configs: {str(e)}")
-            raise
-
-    async def _upload_to_s3(self, backup_path: Path):
-        """上传备份到S3"""
+    @staticmethod
+    def _backup_info(manifest: BackupManifest) -> dict:
+        return {
+            "name": manifest.name,
+            "mode": manifest.mode.value,
+            "parent": manifest.parent,
+            "size": manifest.size,
+            "stored_size": manifest.stored_size,
+            "chunks": manifest.chunks,
+            "reused_chunks": manifest.reused_chunks,
+            "timestamp": manifest.created,
+        }
+
+    def _database_source(self) -> StreamSource:
+        """数据库导出流: SQLite 直接导出, 其他数据库通过 mysqldump 的标准输出读取"""
+        db = settings.db
+        if db.driver.startswith("sqlite"):
+            return lambda: sqlite_source(db.database)
+        args = [
+            "mysqldump",
+            "-h",
+            db.host,
+            "-P",
+            str(db.port),
+            "-u",
+            db.username,
+            "--single-transaction",
+            "--quick",
+            db.database,
+        ]
+        return lambda: command_source(args, env={"MYSQL_PWD": db.password})
+
+    @staticmethod
+    def _file_sources(directory: Path, prefix: str) -> Dict[str, StreamSource]:
+        """目录中每个文件一个数据流"""
+        sources: Dict[str, StreamSource] = {}
+        if directory.exists():
+            for path in sorted(directory.rglob("*")):
+                if path.is_file():
+                    sources[f"{prefix}{path.relative_to(directory).as_posix()}"] = lambda path=path: file_source(path)
+        return sources
+
+    def _config_sources(self) -> Dict[str, StreamSource]:
+        """备份配置文件"""
+        sources = self._file_sources(Path("config"), CONFIG_PREFIX)
+        env_file = Path(".env")
+        if env_file.exists():
+            sources[ENV_STREAM] = lambda: file_source(env_file)
+        return sources
+
+    async def _upload_to_s3(self, manifest: BackupManifest):
+        """上传本次写入的块和清单到S3"""
         try:
             bucket = settings.DR_BACKUP_LOCATION.split("://")[1]
-            key = f"backups/{backup_path.name}"
 
             async with self.s3_session.client("s3") as s3:
-                with open(backup_path, "rb") as f:
-                    await s3.upload_fileobj(f, bucket, key)
+                for key in [*manifest.written, manifest.key]:
+                    data = await asyncio.to_thread(self.storage.get, key)
+                    await s3.put_object(Bucket=bucket, Key=f"backups/{key}", Body=data)
 
-            logger.info(f"Backup uploaded to S3: {key}")
+            logger.info(f"Backup uploaded to S3: {manifest.name} ({len(manifest.written)} new chunks)")
         except Exception as e:
             logger.error(f"Failed to upload backup to S3: {str(e)}")
             raise
 
-    async def restore_backup(self, backup_name: str) -> bool:
-        """恢复备份"""
-        try:
-            backup_path = self.backup_dir / backup_name
-            if not backup_path.exists():
-                raise FileNotFoundError(f"Backup not found: {backup_name}")
+    async def list_backups(self) -> List[dict]:
+        """列出全部备份"""
+        manifests = await asyncio.to_thread(self.engine.manifests)
+        return [self._backup_info(manifest) for manifest in manifests]
 
-            # 创建临时目录
-            temp_dir = self.backup_dir / "temp_restore"
-            temp_dir.mkdir(exist_ok=True)
+    async def verify_backup(self, backup_name: str) -> dict:
+        """校验备份的全部数据块, 失败时抛出 BackupVerificationError"""
+        manifest = await asyncio.to_thread(self.engine.verify, backup_name)
+        return self._backup_info(manifest)
 
-            try:
-                # 解压备份文件
-                with tarfile.open(backup_path, "r:gz") as tar:
-                    tar.extractall(temp_dir)
-
-                # 恢复数据库
-                await self._restore_database(temp_dir)
+    async def restore_backup(self, backup_name: str) -> bool:
+        """恢复备份, 先校验全部数据再开始恢复"""
+        try:
+            manifest = await asyncio.to_thread(self.engine.verify, backup_name)
 
-                # 恢复上传的文件
-                await self._restore_uploads(temp_dir)
+            # 恢复数据库
+            await asyncio.to_thread(self._restore_database, manifest)
 
-                # 恢复配置文件
-                await self._restore_configs(temp_dir)
+            # 恢复上传的文件
+            await asyncio.to_thread(self._restore_files, manifest, UPLOADS_PREFIX, Path(settings.UPLOAD_DIR))
 
-                return True
+            # 恢复配置文件
+            await asyncio.to_thread(self._restore_configs, manifest)
 
-            finally:
-                # 清理临时目录
-                if temp_dir.exists():
-                    shutil.rmtree(temp_dir)
+            return True
 
         except Exception as e:
             logger.error(f"Failed to restore backup: {str(e)}")
             raise
 
-    async def _restore_database(self, temp_dir: Path):
-        """恢复数据库"""
+    def _read(self, manifest: BackupManifest, stream: str) -> Iterable[bytes]:
+        return self.engine.read(manifest.name, stream, manifest=manifest)
+
+    def _restore_database(self, manifest: BackupManifest):
+        """恢复数据库: SQLite 先导入临时文件再替换原文件, 其他数据库的数据流直接写入 mysql 的标准输入"""
         try:
-            dump_file = temp_dir / "database.sql"
-            if dump_file.exists():
-                cmd = (
-                    f"mysql -h {settings.MYSQL_SERVER} "
-                    f"-P {settings.MYSQL_PORT} "
-                    f"-u {settings.MYSQL_USER} "
-                    f"-p{settings.MYSQL_PASSWORD} "
-                    f"{settings.MYSQL_DB} < {dump_file}"
-                )
-                os.system(cmd)
+            if DATABASE_STREAM not in manifest.streams:
+                return
+            db = settings.db
+            if db.driver.startswith("sqlite"):
+                sqlite_restore(db.database, self._read(manifest, DATABASE_STREAM))
+                return
+            args = ["mysql", "-h", db.host, "-P", str(db.port), "-u", db.username, db.database]
+            command_sink(args, self._read(manifest, DATABASE_STREAM), env={"MYSQL_PWD": db.password})
         except Exception as e:
             logger.error(f"Failed to restore database: {str(e)}")
             raise
 
-    async def _restore_uploads(self, temp_dir: Path):
-        """恢复上传的文件"""
+    def _restore_files(self, manifest: BackupManifest, prefix: str, directory: Path):
+        """恢复目录: 先写入临时目录, 完成后替换原目录"""
         try:
-            upload_source = temp_dir / "uploads"
-            if upload_source.exists():
-                upload_dir = Path(settings.UPLOAD_DIR)
-                if upload_dir.exists():
-                    shutil.rmtree(upload_dir)
-                shutil.copytree(upload_source, upload_dir)
+            names = [name for name in manifest.streams if name.startswith(prefix)]
+            if not names:
+                return
+            temp_dir = directory.with_name(f"{directory.name}.restore")
+            if temp_dir.exists():
+                shutil.rmtree(temp_dir)
+            for name in names:
+                path = temp_dir / name[len(prefix) :]
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(path, "wb") as f:
+                    for data in self._read(manifest, name):
+                        f.write(data)
+            if directory.exists():
+                shutil.rmtree(directory)
+            os.replace(temp_dir, directory)
         except Exception as e:
-            logger.error(f"Failed to restore uploads: {str(e)}")
+            logger.error(f"Failed to restore {prefix.rstrip('/')}: {str(e)}")
             raise
 
-    async def _restore_configs(self, temp_dir: Path):
+    def _restore_configs(self, manifest: BackupManifest):
         """恢复配置文件"""
         try:
             # 恢复.env文件
-            env_file = temp_dir / ".env"
-            if env_file.exists():
-                shutil.copy2(env_file, ".env")
+            if ENV_STREAM in manifest.streams:
+                with open(".env", "wb") as f:
+                    for data in self._read(manifest, ENV_STREAM):
+                        f.write(data)
 
             # 恢复其他配置文件
-            config_source = temp_dir / "config"
-            if config_source.exists():
-                config_dir = Path("config")
-                if config_dir.exists():
-                    shutil.rmtree(config_dir)
-                shutil.copytree(config_source, config_dir)
+            self._restore_files(manifest, CONFIG_PREFIX, Path("config"))
         except Exception as e:
             logger.error(f"Failed to restore configs: {str(e)}")
             raise
 
     async def cleanup_old_backups(self):
-        """清理旧备份"""
+        """清理旧备份: 删除过期的清单, 再回收不再被引用的块"""
         try:
             retention_days = settings.BACKUP_RETENTION_DAYS
             cutoff_date = datetime.now() - timedelta(days=retention_days)
 
-            # 清理本地备份
-            for backup_file in self.backup_dir.glob("backup_*.tar.gz"):
-                try:
-                    # 从文件名中提取时间戳
-                    timestamp_str = backup_file.stem.split("_")[1]
-                    timestamp = datetime.strptime(timestamp_str, "%Y%m%d_%H%M%S")
-
-                    if timestamp < cutoff_date:
-                        backup_file.unlink()
-                        logger.info(f"Deleted old backup: {backup_file.name}")
-                except Exception as e:
-                    logger.error(f"Failed to process backup file {backup_file}: {str(e)}")
+            expired = [
+                manifest
+                for manifest in await asyncio.to_thread(self.engine.manifests)
+                if manifest.created_at < cutoff_date
+            ]
+            for manifest in expired:
+                await asyncio.to_thread(self.engine.delete, manifest.name)
+                logger.info(f"Deleted old backup: {manifest.name}")
+            removed = await asyncio.to_thread(self.engine.collect_garbage)
 
             # 清理S3备份
             if settings.DR_ENABLED:
-                await self._cleanup_s3_backups(cutoff_date)
+                await self._cleanup_s3_backups([manifest.key for manifest in expired] + removed)
 
         except Exception as e:
             logger.error(f"Failed to cleanup old backups: {str(e)}")
             raise
 
-    async def _cleanup_s3_backups(self, cutoff_date: datetime):
-        """清理S3上的旧备份"""
+    async def _cleanup_s3_backups(self, keys: List[str]):
+        """删除S3上已在本地清理的清单和块"""
         try:
             bucket = settings.DR_BACKUP_LOCATION.split("://")[1]
 
             async with self.s3_session.client("s3") as s3:
-                paginator = s3.get_paginator("list_objects_v2")
-
-                async for page in paginator.paginate(Bucket=bucket, Prefix="backups/backup_"):
-                    if "Contents" not in page:
-                        continue
-
-                    for obj in page["Contents"]:
-                        try:
-                            # 从文件名中提取时间戳
-                            key = obj["Key"]
-                            filename = key.split("/")[-1]
-                            timestamp_str = filename.split("_")[1].split(".")[0]
-                            timestamp = datetime.strptime(timestamp_str, "%Y%m%d_%H%M%S")
-
-                            if timestamp < cutoff_date:
-                                await s3.delete_object(Bucket=bucket, Key=key)
-                                logger.info(f"Deleted old S3 backup: {key}")
-                        except Exception as e:
-                            logger.error(f"Failed to process S3 object {key}: {str(e)}")
+                # 每次最多删除1000个对象
+                for start in range(0, len(keys), 1000):
+                    objects = [{"Key": f"backups/{key}"} for key in keys[start : start + 1000]]
+                    await s3.delete_objects(Bucket=bucket, Delete={"Objects": objects, "Quiet": True})
+            if keys:
+                logger.info(f"Deleted {len(keys)} old S3 backup objects")
 
         except Exception as e:
             logger.error(f"Failed to cleanup S3 backups: {str(e)}")
@@ -0,0 +1,763 @@
+"""
+流式增量备份
+数据源(数据库导出、文件)以字节流读取, 按内容切分为块, 每块以 sha256 寻址, 在线程池中并行压缩后直接写入存储后端,
+不落地完整的导出文件. 已存在的块不再压缩和上传: 增量备份跳过上一次备份中的块, 差异备份跳过上一次全量备份中的块.
+每次备份写入一个清单(manifest), 记录每个数据流的块序列, 恢复时按清单读取并校验每块及整个数据流的哈希
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# 读取数据源的块大小
+READ_SIZE = 256 * 1024
+# 命令失败时错误信息中保留的标准错误输出长度
+STDERR_LIMIT = 4096
+MANIFEST_PREFIX = "manifests/"
+CHUNK_PREFIX = "chunks/"
+
+
+class BackupError(Exception):
+    """备份错误"""
+
+    pass
+
+
+class BackupVerificationError(BackupError):
+    """备份数据校验失败"""
+
+    pass
+
+
+class BackupMode(str, Enum):
+    """备份方式"""
+
+    FULL = "full"  # 全量: 写入全部块
+    INCREMENTAL = "incremental"  # 增量: 跳过上一次备份中已有的块
+    DIFFERENTIAL = "differential"  # 差异: 跳过上一次全量备份中已有的块
+
+
+# ---------------------------------------------------------------------------
+# 存储后端
+# ---------------------------------------------------------------------------
+
+
+class BackupStorage(ABC):
+    """备份存储后端, 以键值方式保存块和清单; 方法在工作线程中调用"""
+
+    @abstractmethod
+    def put(self, key: str, data: bytes) -> None:
+        """写入对象, 写入需是原子的"""
+        pass
+
+    @abstractmethod
+    def get(self, key: str) -> bytes:
+        """读取对象, 不存在时抛出 KeyError"""
+        pass
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """删除对象, 不存在时忽略"""
+        pass
+
+    @abstractmethod
+    def keys(self, prefix: str = "") -> Iterator[str]:
+        """列出以 prefix 开头的键"""
+        pass
+
+
+class LocalBackupStorage(BackupStorage):
+    """本地目录存储, 先写临时文件再重命名"""
+
+    def __init__(self, root: os.PathLike):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        parts = key.split("/")
+        if not key or any(part in ("", ".", "..") for part in parts):
+            raise ValueError(f"Invalid backup key: {key!r}")
+        return self.root.joinpath(*parts)
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(temp, "wb") as f:
+                f.write(data)
+            os.replace(temp, path)
+        except BaseException:
+            temp.unlink(missing_ok=True)
+            raise
+
+    def get(self, key: str) -> bytes:
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            raise KeyError(key) from None
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).is_file()
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def keys(self, prefix: str = "") -> Iterator[str]:
+        for path in sorted(self.root.rglob("*")):
+            if not path.is_file() or path.name.startswith("."):
+                continue
+            key = path.relative_to(self.root).as_posix()
+            if key.startswith(prefix):
+                yield key
+
+
+# ---------------------------------------------------------------------------
+# 切块、限速、进度
+# ---------------------------------------------------------------------------
+
+
+class Chunker:
+    """
+    按内容切块
+    在达到 min_size 之后的换行处, 按换行前 window 字节的哈希决定是否切分(概率 1/2^mask_bits),
+    超过 max_size 时强制切分. 切分点只取决于附近的内容, 导出文件中插入或修改几行只影响相邻的块
+    """
+
+    def __init__(
+        self, min_size: int = 512 * 1024, max_size: int = 4 * 1024 * 1024, mask_bits: int = 6, window: int = 64
+    ):
+        if not 0 < min_size <= max_size:
+            raise ValueError("Chunk sizes must satisfy 0 < min_size <= max_size")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.mask = (1 << mask_bits) - 1
+        self.window = window
+
+    def _boundary(self, buffer: bytearray, start: int) -> Tuple[Optional[int], int]:
+        """
+        查找切分点
+        :return: (切分位置, 下次继续查找的位置), 数据不足时切分位置为 None
+        """
+        limit = min(len(buffer), self.max_size)
+        position = max(start, self.min_size - 1)
+        while position < limit:
+            index = buffer.find(b"\n", position, limit)
+            if index < 0:
+                break
+            if zlib.crc32(buffer[max(index - self.window, 0) : index + 1]) & self.mask == 0:
+                return index + 1, 0
+            position = index + 1
+        if len(buffer) >= self.max_size:
+            return self.max_size, 0
+        return None, max(position, limit)
+
+    def split(self, stream: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        把字节流切分为块
+        :param stream: 字节块迭代器
+        :return: 块迭代器
+        """
+        buffer = bytearray()
+        scanned = 0
+        for data in stream:
+            buffer += data
+            while True:
+                cut, scanned = self._boundary(buffer, scanned)
+                if cut is None:
+                    break
+                yield bytes(buffer[:cut])
+                del buffer[:cut]
+        while buffer:
+            cut, scanned = self._boundary(buffer, scanned)
+            cut = cut or len(buffer)
+            yield bytes(buffer[:cut])
+            del buffer[:cut]
+
+
+class TokenBucket:
+    """令牌桶限速, 单位为字节/秒; 允许透支, 透支的部分在后续调用中等待"""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Any] = time.sleep,
+    ):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: int) -> float:
+        """
+        消耗令牌, 不足时阻塞等待
+        :param amount: 字节数
+        :return: 等待的秒数
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+
+@dataclass
+class BackupProgress:
+    """备份或恢复进度"""
+
+    name: str
+    stream: str = ""
+    bytes_read: int = 0
+    bytes_written: int = 0
+    chunks: int = 0
+    reused_chunks: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def throughput(self) -> float:
+        """读取速度(字节/秒)"""
+        elapsed = self.elapsed
+        return self.bytes_read / elapsed if elapsed > 0 else 0.0
+
+
+ProgressCallback = Callable[[BackupProgress], Any]
+
+
+# ---------------------------------------------------------------------------
+# 清单
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class StreamEntry:
+    """
+    清单中的一个数据流, chunks 为 (哈希, 原始大小, 压缩方式) 序列
+    块在备份之间按原始数据的哈希共享, 复用的块可能由压缩设置不同的备份写入, 因此每块单独记录压缩方式
+    """
+
+    chunks: List[Tuple[str, int, str]] = field(default_factory=list)
+    size: int = 0
+    sha256: str = ""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"chunks": [list(chunk) for chunk in self.chunks], "size": self.size, "sha256": self.sha256}
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any], compression: str = "zlib") -> "StreamEntry":
+        """:param compression: 旧版清单的块没有记录压缩方式, 使用清单的压缩方式"""
+        chunks = [(chunk[0], chunk[1], chunk[2] if len(chunk) > 2 else compression) for chunk in data["chunks"]]
+        return cls(chunks=chunks, size=data["size"], sha256=data["sha256"])
+
+
+@dataclass
+class BackupManifest:
+    """一次备份的清单"""
+
+    name: str
+    mode: BackupMode
+    created: str
+    parent: Optional[str] = None
+    compression: str = "zlib"  # 本次写入的块的压缩方式, 复用的块以块记录为准
+    streams: Dict[str, StreamEntry] = field(default_factory=dict)
+    size: int = 0
+    stored_size: int = 0
+    chunks: int = 0
+    reused_chunks: int = 0
+    # 本次写入的块, 不保存到清单中
+    written: List[str] = field(default_factory=list, repr=False)
+
+    @property
+    def key(self) -> str:
+        return f"{MANIFEST_PREFIX}{self.name}.json"
+
+    @property
+    def created_at(self) -> datetime:
+        return datetime.fromisoformat(self.created)
+
+    def chunk_hashes(self) -> Set[str]:
+        return {chunk[0] for entry in self.streams.values() for chunk in entry.chunks}
+
+    def chunk_compressions(self) -> Dict[str, str]:
+        """块哈希 -> 压缩方式"""
+        return {digest: compression for entry in self.streams.values() for digest, _, compression in entry.chunks}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "mode": self.mode.value,
+            "created": self.created,
+            "parent": self.parent,
+            "compression": self.compression,
+            "streams": {name: entry.to_dict() for name, entry in self.streams.items()},
+            "size": self.size,
+            "stored_size": self.stored_size,
+            "chunks": self.chunks,
+            "reused_chunks": self.reused_chunks,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "BackupManifest":
+        compression = data.get("compression", "zlib")
+        return cls(
+            name=data["name"],
+            mode=BackupMode(data["mode"]),
+            created=data["created"],
+            parent=data.get("parent"),
+            compression=compression,
+            streams={name: StreamEntry.from_dict(entry, compression) for name, entry in data["streams"].items()},
+            size=data.get("size", 0),
+            stored_size=data.get("stored_size", 0),
+            chunks=data.get("chunks", 0),
+            reused_chunks=data.get("reused_chunks", 0),
+        )
+
+
+def chunk_key(digest: str) -> str:
+    return f"{CHUNK_PREFIX}{digest[:2]}/{digest}"
+
+
+def ordered_map(executor: Executor, fn: Callable[[T], R], items: Iterable[T], window: int) -> Iterator[R]:
+    """
+    在线程池中执行 fn 并按输入顺序返回结果, 同时最多 window 个任务在执行, 内存占用有上限
+    """
+    pending: deque = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+# ---------------------------------------------------------------------------
+# 备份引擎
+# ---------------------------------------------------------------------------
+
+StreamSource = Callable[[], Iterable[bytes]]
+
+
+class BackupEngine:
+    """流式备份与恢复"""
+
+    def __init__(
+        self,
+        storage: BackupStorage,
+        chunker: Optional[Chunker] = None,
+        workers: Optional[int] = None,
+        compression_level: Optional[int] = 6,
+        throttle: Optional[TokenBucket] = None,
+        max_size: Optional[int] = None,
+    ):
+        """
+        :param storage: 存储后端
+        :param chunker: 切块策略
+        :param workers: 压缩、校验线程数, 默认为 CPU 数
+        :param compression_level: zlib 压缩级别, None 表示不压缩
+        :param throttle: 写入存储的限速
+        :param max_size: 单次备份写入存储的字节数上限
+        """
+        self.storage = storage
+        self.chunker = chunker or Chunker()
+        self.workers = workers or os.cpu_count() or 1
+        self.compression_level = compression_level
+        self.throttle = throttle
+        self.max_size = max_size
+        # 备份与垃圾回收互斥, 避免回收进行中的备份已写入但尚未被清单引用的块
+        self._lock = threading.Lock()
+
+    # 清单
+
+    def manifests(self) -> List[BackupManifest]:
+        """全部备份清单, 按创建时间排序"""
+        manifests = [
+            BackupManifest.from_dict(json.loads(self.storage.get(key)))
+            for key in self.storage.keys(MANIFEST_PREFIX)
+            if key.endswith(".json")
+        ]
+        return sorted(manifests, key=lambda manifest: manifest.created)
+
+    def load_manifest(self, name: str) -> BackupManifest:
+        try:
+            return BackupManifest.from_dict(json.loads(self.storage.get(f"{MANIFEST_PREFIX}{name}.json")))
+        except KeyError:
+            raise BackupError(f"Backup not found: {name}") from None
+
+    def _known_chunks(self, mode: BackupMode) -> Tuple[Optional[str], Dict[str, str]]:
+        """基准备份和可以跳过的块 {哈希: 压缩方式}"""
+        if mode is BackupMode.FULL:
+            return None, {}
+        manifests = self.manifests()
+        if mode is BackupMode.DIFFERENTIAL:
+            manifests = [manifest for manifest in manifests if manifest.mode is BackupMode.FULL]
+        if not manifests:
+            return None, {}
+        base = manifests[-1]
+        return base.name, base.chunk_compressions()
+
+    @property
+    def compression(self) -> str:
+        """新写入的块的压缩方式"""
+        return "zlib" if self.compression_level is not None else "none"
+
+    # 备份
+
+    def _prepare(self, args: Tuple[bytes, Mapping[str, str]]) -> Tuple[str, int, Optional[bytes]]:
+        chunk, known = args
+        digest = hashlib.sha256(chunk).hexdigest()
+        if digest in known:
+            return digest, len(chunk), None
+        if self.compression_level is None:
+            return digest, len(chunk), chunk
+        return digest, len(chunk), zlib.compress(chunk, self.compression_level)
+
+    def backup(
+        self,
+        name: str,
+        streams: Mapping[str, StreamSource],
+        mode: BackupMode = BackupMode.INCREMENTAL,
+        progress: Optional[ProgressCallback] = None,
+    ) -> BackupManifest:
+        """
+        创建备份, 全部数据流写入成功后才写入清单; 中途失败时已写入的块会在垃圾回收时删除
+        :param name: 备份名称
+        :param streams: 数据流名称 -> 返回字节块迭代器的函数
+        :param mode: 备份方式
+        :param progress: 进度回调, 每写入一块调用一次
+        :return: 备份清单
+        """
+        mode = BackupMode(mode)
+        with self._lock:
+            return self._backup(name, streams, mode, progress)
+
+    def _backup(
+        self, name: str, streams: Mapping[str, StreamSource], mode: BackupMode, progress: Optional[ProgressCallback]
+    ) -> BackupManifest:
+        parent, known = self._known_chunks(mode)
+        manifest = BackupManifest(
+            name=name,
+            mode=mode,
+            created=datetime.now().isoformat(),
+            parent=parent,
+            compression=self.compression,
+        )
+        state = BackupProgress(name=name)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="backup") as executor:
+            for stream_name, source in streams.items():
+                state.stream = stream_name
+                entry = StreamEntry()
+                stream_hash = hashlib.sha256()
+                chunks = ((chunk, known) for chunk in self._read(source, stream_hash, entry))
+                for digest, size, data in ordered_map(executor, self._prepare, chunks, self.workers * 2):
+                    state.bytes_read += size
+                    state.chunks += 1
+                    # 同一次备份中重复的块只写入一次; 复用的块沿用写入时的压缩方式
+                    if data is None or digest in known:
+                        entry.chunks.append((digest, size, known[digest]))
+                        state.reused_chunks += 1
+                    else:
+                        entry.chunks.append((digest, size, manifest.compression))
+                        self._store(manifest, digest, data)
+                        known[digest] = manifest.compression
+                        state.bytes_written += len(data)
+                        if self.max_size is not None and state.bytes_written > self.max_size:
+                            raise BackupError(f"Backup size exceeds limit: {state.bytes_written} bytes")
+                    self._report(progress, state)
+                entry.sha256 = stream_hash.hexdigest()
+                manifest.streams[stream_name] = entry
+
+        manifest.size = state.bytes_read
+        manifest.stored_size = state.bytes_written
+        manifest.chunks = state.chunks
+        manifest.reused_chunks = state.reused_chunks
+        self.storage.put(manifest.key, json.dumps(manifest.to_dict(), ensure_ascii=False).encode("utf-8"))
+        logger.info(
+            f"Backup {name} ({mode.value}) finished: {manifest.size} bytes read, {manifest.stored_size} bytes "
+            f"written, {manifest.reused_chunks}/{manifest.chunks} chunks reused in {state.elapsed:.2f}s"
+        )
+        return manifest
+
+    def _read(self, source: StreamSource, stream_hash: Any, entry: StreamEntry) -> Iterator[bytes]:
+        for chunk in self.chunker.split(source()):
+            stream_hash.update(chunk)
+            entry.size += len(chunk)
+            yield chunk
+
+    def _store(self, manifest: BackupManifest, digest: str, data: bytes) -> None:
+        if self.throttle is not None:
+            self.throttle.consume(len(data))
+        key = chunk_key(digest)
+        self.storage.put(key, data)
+        manifest.written.append(key)
+
+    @staticmethod
+    def _report(progress: Optional[ProgressCallback], state: BackupProgress) -> None:
+        if progress is None:
+            return
+        try:
+            progress(state)
+        except Exception as e:
+            logger.error(f"Backup progress callback error: {e}")
+
+    # 恢复
+
+    def _load_chunk(self, args: Tuple[str, int, str]) -> bytes:
+        digest, size, compression = args
+        try:
+            data = self.storage.get(chunk_key(digest))
+        except KeyError:
+            raise BackupVerificationError(f"Missing chunk {digest}") from None
+        if compression == "zlib":
+            try:
+                data = zlib.decompress(data)
+            except zlib.error as e:
+                raise BackupVerificationError(f"Corrupted chunk {digest}: {e}") from None
+        if len(data) != size or hashlib.sha256(data).hexdigest() != digest:
+            raise BackupVerificationError(f"Checksum mismatch for chunk {digest}")
+        return data
+
+    def read(
+        self,
+        name: str,
+        stream: str,
+        progress: Optional[ProgressCallback] = None,
+        manifest: Optional[BackupManifest] = None,
+    ) -> Iterator[bytes]:
+        """
+        读取备份中的数据流, 每块读取时校验; 数据流结束时校验整体哈希
+        :param name: 备份名称
+        :param stream: 数据流名称
+        :param progress: 进度回调
+        :param manifest: 已加载的清单
+        :return: 原始数据块迭代器
+        """
+        manifest = manifest or self.load_manifest(name)
+        if stream not in manifest.streams:
+            raise BackupError(f"Stream {stream} not found in backup {name}")
+        entry = manifest.streams[stream]
+        state = BackupProgress(name=name, stream=stream)
+        stream_hash = hashlib.sha256()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="restore") as executor:
+            for data in ordered_map(executor, self._load_chunk, entry.chunks, self.workers * 2):
+                stream_hash.update(data)
+                state.bytes_read += len(data)
+                state.chunks += 1
+                self._report(progress, state)
+                yield data
+        if state.bytes_read != entry.size or stream_hash.hexdigest() != entry.sha256:
+            raise BackupVerificationError(f"Checksum mismatch for stream {stream} in backup {name}")
+
+    def verify(self, name: str) -> BackupManifest:
+        """
+        校验备份的全部数据, 校验失败时抛出 BackupVerificationError
+        :param name: 备份名称
+        :return: 备份清单
+        """
+        manifest = self.load_manifest(name)
+        for stream in manifest.streams:
+            for _ in self.read(name, stream, manifest=manifest):
+                pass
+        return manifest
+
+    # 清理
+
+    def delete(self, name: str) -> None:
+        """删除备份清单, 块在垃圾回收时删除"""
+        self.storage.delete(f"{MANIFEST_PREFIX}{name}.json")
+
+    def collect_garbage(self) -> List[str]:
+        """
+        删除不再被任何清单引用的块
+        :return: 删除的键
+        """
+        with self._lock:
+            referenced = {chunk_key(digest) for manifest in self.manifests() for digest in manifest.chunk_hashes()}
+            removed = [key for key in self.storage.keys(CHUNK_PREFIX) if key not in referenced]
+            for key in removed:
+                self.storage.delete(key)
+        if removed:
+            logger.info(f"Removed {len(removed)} unreferenced backup chunks")
+        return removed
+
+
+# ---------------------------------------------------------------------------
+# 数据源与恢复目标
+# ---------------------------------------------------------------------------
+
+
+def file_source(path: os.PathLike, read_size: int = READ_SIZE) -> Iterator[bytes]:
+    """按块读取文件"""
+    with open(path, "rb") as f:
+        while data := f.read(read_size):
+            yield data
+
+
+def _command_error(args: List[str], returncode: int, stderr) -> BackupError:
+    stderr.seek(0, os.SEEK_END)
+    stderr.seek(max(stderr.tell() - STDERR_LIMIT, 0))
+    message = stderr.read().decode(errors="replace").strip()
+    return BackupError(f"{args[0]} exited with {returncode}: {message}")
+
+
+def command_source(
+    args: List[str], env: Optional[Dict[str, str]] = None, read_size: int = READ_SIZE
+) -> Iterator[bytes]:
+    """
+    流式读取命令的标准输出, 命令失败时抛出 BackupError
+    标准错误写入临时文件, 命令输出大量错误信息时不会因为管道写满而阻塞
+    :param args: 命令及参数, 不经过 shell
+    :param env: 追加的环境变量(例如 MYSQL_PWD, 避免密码出现在进程参数中)
+    """
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=stderr, env={**os.environ, **(env or {})})
+        try:
+            while data := process.stdout.read(read_size):
+                yield data
+            if process.wait() != 0:
+                raise _command_error(args, process.returncode, stderr)
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+
+
+def command_sink(args: List[str], stream: Iterable[bytes], env: Optional[Dict[str, str]] = None) -> None:
+    """把数据流写入命令的标准输入, 命令失败时抛出 BackupError; 标准错误同样写入临时文件"""
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(args, stdin=subprocess.PIPE, stderr=stderr, env={**os.environ, **(env or {})})
+        try:
+            try:
+                for data in stream:
+                    process.stdin.write(data)
+                process.stdin.close()
+            except BrokenPipeError:
+                # 命令提前退出, 按退出码报告错误
+                pass
+            if process.wait() != 0:
+                raise _command_error(args, process.returncode, stderr)
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            if not process.stdin.closed:
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+
+
+def sqlite_source(path: os.PathLike, batch_size: int = READ_SIZE) -> Iterator[bytes]:
+    """流式导出 SQLite 数据库为 SQL 语句"""
+    connection = sqlite3.connect(str(path))
+    try:
+        batch: List[str] = []
+        length = 0
+        for line in connection.iterdump():
+            batch.append(f"{line}\n")
+            length += len(line) + 1
+            if length >= batch_size:
+                yield "".join(batch).encode("utf-8")
+                batch, length = [], 0
+        if batch:
+            yield "".join(batch).encode("utf-8")
+    finally:
+        connection.close()
+
+
+def sqlite_restore(path: os.PathLike, stream: Iterable[bytes]) -> None:
+    """
+    把 SQL 数据流逐条语句导入 SQLite 数据库
+    先导入同目录下的临时文件, 全部成功后再替换原数据库; 失败时原数据库保持不变
+    """
+    path = Path(path)
+    temp_path = path.with_name(f"{path.name}.restore")
+    temp_path.unlink(missing_ok=True)
+    connection = sqlite3.connect(str(temp_path), isolation_level=None)
+    try:
+        statement = ""
+        pending = b""
+        for data in stream:
+            lines = (pending + data).split(b"\n")
+            pending = lines.pop()
+            for line in lines:
+                statement += line.decode("utf-8") + "\n"
+                if sqlite3.complete_statement(statement):
+                    connection.execute(statement)
+                    statement = ""
+        statement += pending.decode("utf-8")
+        if statement.strip():
+            connection.execute(statement)
+    except BaseException:
+        connection.close()
+        temp_path.unlink(missing_ok=True)
+        raise
+    connection.close()
+    os.replace(temp_path, path)
+
+
+__all__ = [
+    "BackupEngine",
+    "BackupError",
+    "BackupManifest",
+    "BackupMode",
+    "BackupProgress",
+    "BackupStorage",
+    "BackupVerificationError",
+    "Chunker",
+    "LocalBackupStorage",
+    "ProgressCallback",
+    "StreamEntry",
+    "StreamSource",
+    "TokenBucket",
+    "chunk_key",
+    "command_sink",
+    "command_source",
+    "file_source",
+    "ordered_map",
+    "sqlite_restore",
+    "sqlite_source",
+]
@@ -0,0 +1,373 @@
+"""
+滑动窗口断路器
+按次数或按时间的滑动窗口统计失败率和慢调用率, 半开状态只放行有限的并发探测请求;
+按键(例如按下游主机)维护独立的断路器, 注册表有容量上限. 热路径上读取状态只是属性比较,
+记录结果为 O(1)
+"""
+
+import itertools
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from enum import Enum
+from typing import Callable, Dict, Generic, List, Optional, TypeVar
+
+K = TypeVar("K")
+
+
+class BreakerState(str, Enum):
+    """断路器状态"""
+
+    CLOSED = "closed"  # 正常状态
+    OPEN = "open"  # 熔断状态
+    HALF_OPEN = "half_open"  # 半开状态
+
+
+class ManualClock:
+    """手动推进的时钟, 用于确定性测试"""
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@dataclass
+class WindowStats:
+    """窗口内的调用统计"""
+
+    calls: int = 0
+    failures: int = 0
+    slow_calls: int = 0
+
+    @property
+    def failure_rate(self) -> float:
+        return self.failures / self.calls if self.calls else 0.0
+
+    @property
+    def slow_call_rate(self) -> float:
+        return self.slow_calls / self.calls if self.calls else 0.0
+
+
+class CountWindow:
+    """最近 size 次调用的滑动窗口(环形缓冲区, 维护累计值)"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._outcomes: List[int] = [0] * size  # 位 1: 失败, 位 2: 慢调用
+        self._index = 0
+        self.stats = WindowStats()
+
+    def record(self, failed: bool, slow: bool) -> WindowStats:
+        stats = self.stats
+        if stats.calls == self.size:
+            old = self._outcomes[self._index]
+            stats.failures -= old & 1
+            stats.slow_calls -= old >> 1
+        else:
+            stats.calls += 1
+        outcome = int(failed) | int(slow) << 1
+        self._outcomes[self._index] = outcome
+        stats.failures += failed
+        stats.slow_calls += slow
+        self._index = (self._index + 1) % self.size
+        return stats
+
+    def snapshot(self) -> WindowStats:
+        return self.stats
+
+    def reset(self) -> None:
+        self._outcomes = [0] * self.size
+        self._index = 0
+        self.stats = WindowStats()
+
+
+class TimeWindow:
+    """最近 seconds 秒内调用的滑动窗口, 按秒分桶, 过期的桶在访问时增量淘汰"""
+
+    def __init__(self, seconds: int, clock: Callable[[], float] = time.monotonic):
+        self.seconds = seconds
+        self.clock = clock
+        self._buckets = [WindowStats() for _ in range(seconds)]
+        self._epoch = int(clock())  # 最新桶对应的秒
+        self.stats = WindowStats()
+
+    def _advance(self) -> None:
+        now = int(self.clock())
+        if now <= self._epoch:
+            return
+        # 最多清空一轮, 与两次访问之间的间隔无关
+        for second in range(max(self._epoch + 1, now - self.seconds + 1), now + 1):
+            bucket = self._buckets[second % self.seconds]
+            self.stats.calls -= bucket.calls
+            self.stats.failures -= bucket.failures
+            self.stats.slow_calls -= bucket.slow_calls
+            bucket.calls = bucket.failures = bucket.slow_calls = 0
+        self._epoch = now
+
+    def record(self, failed: bool, slow: bool) -> WindowStats:
+        self._advance()
+        bucket = self._buckets[self._epoch % self.seconds]
+        bucket.calls += 1
+        bucket.failures += failed
+        bucket.slow_calls += slow
+        self.stats.calls += 1
+        self.stats.failures += failed
+        self.stats.slow_calls += slow
+        return self.stats
+
+    def snapshot(self) -> WindowStats:
+        self._advance()
+        return self.stats
+
+    def reset(self) -> None:
+        self._buckets = [WindowStats() for _ in range(self.seconds)]
+        self._epoch = int(self.clock())
+        self.stats = WindowStats()
+
+
+@dataclass
+class BreakerConfig:
+    """断路器配置"""
+
+    window_type: str = "count"  # count: 按调用次数; time: 按秒
+    window_size: int = 100  # 调用次数或秒数
+    minimum_calls: int = 10  # 窗口内至少有这么多调用才计算比例
+    failure_rate_threshold: float = 0.5  # 失败率达到该值时熔断
+    slow_call_rate_threshold: float = 1.0  # 慢调用率达到该值时熔断(1.0 表示仅全部为慢调用时)
+    slow_call_duration: float = 5.0  # 超过该耗时(秒)视为慢调用
+    open_duration: float = 60.0  # 熔断后多久进入半开(秒)
+    half_open_calls: int = 5  # 半开时用于判断的探测调用数
+    half_open_max_concurrent: int = 1  # 半开时同时进行的探测数上限
+
+
+class CallNotPermitted(Exception):
+    """断路器拒绝调用"""
+
+    def __init__(self, name: str, state: BreakerState):
+        super().__init__(f"Circuit breaker '{name}' is {state.value}")
+        self.name = name
+        self.state = state
+
+
+class SlidingWindowBreaker:
+    """
+    滑动窗口断路器
+    用法: allow() 为 True 时记下 generation 并执行调用, 结束后以耗时、是否失败和该 generation 调用 record();
+    被放行但未执行(例如被取消)的调用应调用 cancel() 归还半开探测名额.
+    每次状态切换 generation 加一, 在之前的状态下放行的调用结果被忽略, 例如关闭时放行、半开时才结束的调用不算作探测
+    """
+
+    def __init__(
+        self,
+        name: str,
+        config: Optional[BreakerConfig] = None,
+        clock: Callable[[], float] = time.monotonic,
+        on_state_change: Optional[Callable[["SlidingWindowBreaker", BreakerState, BreakerState], None]] = None,
+    ):
+        self.name = name
+        self.config = config or BreakerConfig()
+        self.clock = clock
+        self.on_state_change = on_state_change
+        self.state = BreakerState.CLOSED
+        self.state_changed_at = clock()
+        self._window = self._new_window()
+        self._open_until = 0.0
+        self._probes_in_flight = 0
+        self._probe_stats = WindowStats()
+        self.generation = 0
+        self.rejected = 0
+        self.transitions = 0
+
+    def _new_window(self):
+        if self.config.window_type == "time":
+            return TimeWindow(self.config.window_size, self.clock)
+        return CountWindow(self.config.window_size)
+
+    def allow(self) -> bool:
+        """是否放行一次调用(放行半开探测时占用一个名额)"""
+        state = self.state
+        if state is BreakerState.CLOSED:
+            return True
+        if state is BreakerState.OPEN:
+            if self.clock() < self._open_until:
+                self.rejected += 1
+                return False
+            self._transition(BreakerState.HALF_OPEN)
+        # 半开: 探测总数和并发数都有上限
+        config = self.config
+        started = self._probe_stats.calls + self._probes_in_flight
+        if self._probes_in_flight >= config.half_open_max_concurrent or started >= config.half_open_calls:
+            self.rejected += 1
+            return False
+        self._probes_in_flight += 1
+        return True
+
+    def cancel(self, generation: Optional[int] = None) -> None:
+        """
+        归还 allow() 放行但没有执行的半开探测名额
+        :param generation: 放行时的 generation, 状态已切换时名额已经重置, 不再归还
+        """
+        if generation is not None and generation != self.generation:
+            return
+        if self.state is BreakerState.HALF_OPEN and self._probes_in_flight:
+            self._probes_in_flight -= 1
+
+    def record(self, duration: float, failed: bool, generation: Optional[int] = None) -> None:
+        """
+        记录一次调用结果
+        :param duration: 调用耗时(秒)
+        :param failed: 是否失败
+        :param generation: 放行时的 generation, 与当前不一致时忽略结果; 不提供时按当前状态记录
+        """
+        if generation is not None and generation != self.generation:
+            return
+        slow = duration >= self.config.slow_call_duration
+        if self.state is BreakerState.HALF_OPEN:
+            self._record_probe(failed, slow)
+            return
+        if self.state is BreakerState.OPEN:
+            # 熔断前已放行的调用, 结果不再影响状态
+            return
+        stats = self._window.record(failed, slow)
+        if stats.calls >= self.config.minimum_calls and self._exceeds(stats):
+            self._transition(BreakerState.OPEN)
+
+    def _record_probe(self, failed: bool, slow: bool) -> None:
+        if self._probes_in_flight:
+            self._probes_in_flight -= 1
+        stats = self._probe_stats
+        stats.calls += 1
+        stats.failures += failed
+        stats.slow_calls += slow
+        if self._exceeds(stats):
+            self._transition(BreakerState.OPEN)
+        elif stats.calls >= self.config.half_open_calls:
+            self._transition(BreakerState.CLOSED)
+
+    def _exceeds(self, stats: WindowStats) -> bool:
+        config = self.config
+        return (
+            stats.failure_rate >= config.failure_rate_threshold
+            or stats.slow_call_rate >= config.slow_call_rate_threshold
+        )
+
+    def _transition(self, state: BreakerState) -> None:
+        previous = self.state
+        now = self.clock()
+        self.state = state
+        self.state_changed_at = now
+        self.generation += 1
+        self.transitions += 1
+        self._probes_in_flight = 0
+        self._probe_stats = WindowStats()
+        if state is BreakerState.OPEN:
+            self._open_until = now + self.config.open_duration
+        elif state is BreakerState.CLOSED:
+            self._window.reset()
+        if self.on_state_change is not None:
+            self.on_state_change(self, previous, state)
+
+    def force_open(self) -> None:
+        """手动熔断"""
+        self._transition(BreakerState.OPEN)
+
+    def reset(self) -> None:
+        """手动恢复"""
+        self._transition(BreakerState.CLOSED)
+
+    def get_stats(self) -> Dict:
+        """统计信息"""
+        stats = self._window.snapshot()
+        return {
+            "name": self.name,
+            "state": self.state.value,
+            "calls": stats.calls,
+            "failure_rate": stats.failure_rate,
+            "slow_call_rate": stats.slow_call_rate,
+            "rejected": self.rejected,
+            "transitions": self.transitions,
+            "generation": self.generation,
+            "probes_in_flight": self._probes_in_flight,
+            "state_changed_at": self.state_changed_at,
+        }
+
+
+class BreakerRegistry(Generic[K]):
+    """
+    按键维护断路器的有界注册表
+    已关闭和未关闭(熔断、半开)的断路器分别按最近使用顺序保存, 状态切换时在两者之间移动;
+    超出容量时淘汰最久未使用的已关闭断路器, 没有已关闭的断路器时淘汰最久未使用的, 均为 O(1)
+    """
+
+    def __init__(self, factory: Callable[[K], SlidingWindowBreaker], max_size: int = 1024):
+        self.factory = factory
+        self.max_size = max_size
+        self._closed: "OrderedDict[K, SlidingWindowBreaker]" = OrderedDict()
+        self._tripped: "OrderedDict[K, SlidingWindowBreaker]" = OrderedDict()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._closed) + len(self._tripped)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._closed or key in self._tripped
+
+    def _bucket(self, state: BreakerState) -> "OrderedDict[K, SlidingWindowBreaker]":
+        return self._closed if state is BreakerState.CLOSED else self._tripped
+
+    def get(self, key: K) -> SlidingWindowBreaker:
+        """获取键对应的断路器, 不存在时创建"""
+        for bucket in (self._closed, self._tripped):
+            breaker = bucket.get(key)
+            if breaker is not None:
+                bucket.move_to_end(key)
+                return breaker
+        if len(self) >= self.max_size:
+            self._evict()
+        breaker = self.factory(key)
+        self._watch(key, breaker)
+        self._bucket(breaker.state)[key] = breaker
+        return breaker
+
+    def _watch(self, key: K, breaker: SlidingWindowBreaker) -> None:
+        """状态切换时把断路器移到对应的有序表, 保留原有的回调"""
+        callback = breaker.on_state_change
+
+        def on_state_change(target: SlidingWindowBreaker, previous: BreakerState, state: BreakerState) -> None:
+            source, bucket = self._bucket(previous), self._bucket(state)
+            # 已被淘汰(或键已对应新的断路器)时不再放回注册表
+            if source is not bucket and source.get(key) is target:
+                del source[key]
+                bucket[key] = target
+            if callback is not None:
+                callback(target, previous, state)
+
+        breaker.on_state_change = on_state_change
+
+    def _evict(self) -> None:
+        (self._closed or self._tripped).popitem(last=False)
+        self.evictions += 1
+
+    def items(self):
+        return itertools.chain(self._closed.items(), self._tripped.items())
+
+    def get_all_stats(self) -> Dict[K, Dict]:
+        return {key: breaker.get_stats() for key, breaker in self.items()}
+
+
+__all__ = [
+    "BreakerConfig",
+    "BreakerRegistry",
+    "BreakerState",
+    "CallNotPermitted",
+    "CountWindow",
+    "ManualClock",
+    "SlidingWindowBreaker",
+    "TimeWindow",
+    "WindowStats",
+]
@@ -1,26 +1,45 @@
+import asyncio
+import time
 from datetime import datetime
-from enum import Enum
 from functools import wraps
-from typing import Any, Callable, Dict, Optional, TypeVar
+from typing import Any, Callable, Dict, Hashable, Optional, TypeVar
 
 from core.config.setting import settings
 from core.loge.pysuper_logging import get_logger
+from core.strong.breaker import (
+    BreakerConfig,
+    BreakerRegistry,
+    BreakerState,
+    CallNotPermitted,
+    SlidingWindowBreaker,
+)
 
 logger = get_logger("circuit_breaker")
 
 T = TypeVar("T")
 
+# 断路器状态
+CircuitState = BreakerState
 
-class CircuitState(str, Enum):
-    """断路器状态"""
+# 每个断路器名称下按键(例如按下游主机)维护的断路器数量上限
+DEFAULT_MAX_KEYS = 1024
 
-    CLOSED = "closed"  # 正常状态
-    OPEN = "open"  # 熔断状态
-    HALF_OPEN = "half_open"  # 半开状态
 
+def _log_transition(breaker: SlidingWindowBreaker, previous: BreakerState, state: BreakerState) -> None:
+    message = f"Circuit breaker '{breaker.name}' transitioned from {previous.value} to {state.value}"
+    if state is BreakerState.OPEN:
+        logger.warning(message)
+    else:
+        logger.info(message)
 
-class CircuitBreaker:
-    """断路器"""
+
+class CircuitBreaker(SlidingWindowBreaker):
+    """
+    断路器
+    在时间滑动窗口内按失败率和慢调用率熔断, 半开时只放行有限的探测请求.
+    原有参数的含义: failure_threshold 为计算失败率所需的最少调用数, recovery_timeout 为熔断持续时间,
+    max_failures 为半开时的探测调用数, reset_timeout 为统计窗口的秒数
+    """
 
     def __init__(
         self,
@@ -29,113 +48,60 @@ class CircuitBreaker:
         recovery_timeout: int = None,
         max_failures: int = None,
         reset_timeout: int = None,
+        config: Optional[BreakerConfig] = None,
+        clock: Callable[[], float] = time.monotonic,
     ):
-        self.name = name
         self.failure_threshold = failure_threshold or settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD
         self.recovery_timeout = recovery_timeout or settings.CIRCUIT_BREAKER_RECOVERY_TIMEOUT
         self.max_failures = max_failures or settings.CIRCUIT_BREAKER_MAX_FAILURES
         self.reset_timeout = reset_timeout or settings.CIRCUIT_BREAKER_RESET_TIMEOUT
-
-        self._state = CircuitState.CLOSED
-        self._failure_count = 0
+        if config is None:
+            config = BreakerConfig(
+                window_type="time",
+                window_size=max(1, int(self.reset_timeout)),
+                minimum_calls=self.failure_threshold,
+                open_duration=self.recovery_timeout,
+                half_open_calls=self.max_failures,
+            )
+        super().__init__(name, config, clock=clock, on_state_change=_log_transition)
         self._last_failure_time: Optional[datetime] = None
         self._last_success_time: Optional[datetime] = None
-        self._last_state_change_time = datetime.now()
-
-    @property
-    def state(self) -> CircuitState:
-        """获取当前状态"""
-        return self._state
 
     @property
     def is_closed(self) -> bool:
         """是否处于关闭状态"""
-        return self._state == CircuitState.CLOSED
+        return self.state is CircuitState.CLOSED
 
     @property
     def is_open(self) -> bool:
         """是否处于开启状态"""
-        return self._state == CircuitState.OPEN
+        return self.state is CircuitState.OPEN
 
     @property
     def is_half_open(self) -> bool:
         """是否处于半开状态"""
-        return self._state == CircuitState.HALF_OPEN
+        return self.state is CircuitState.HALF_OPEN
 
     def _should_allow_request(self) -> bool:
         """是否允许请求"""
-        now = datetime.now()
-
-        if self._state == CircuitState.CLOSED:
-            return True
-
-        elif self._state == CircuitState.OPEN:
-            # 检查是否达到恢复时间
-            if (now - self._last_state_change_time).total_seconds() >= self.recovery_timeout:
-                self._transition_to_half_open()
-                return True
-            return False
+        return self.allow()
 
-        elif self._state == CircuitState.HALF_OPEN:
-            # 在半开状态下允许有限的请求通过
-            return True
-
-        return False
-
-    def _on_success(self):
+    def _on_success(self, duration: float = 0.0, generation: Optional[int] = None):
         """处理成功请求"""
         self._last_success_time = datetime.now()
+        self.record(duration, failed=False, generation=generation)
 
-        if self._state == CircuitState.HALF_OPEN:
-            # 如果在半开状态下请求成功，转换为关闭状态
-            self._transition_to_closed()
-
-        # 重置失败计数
-        self._failure_count = 0
-
-    def _on_failure(self):
+    def _on_failure(self, duration: float = 0.0, generation: Optional[int] = None):
         """处理失败请求"""
-        now = datetime.now()
-        self._last_failure_time = now
-        self._failure_count += 1
-
-        # 检查是否需要开启断路器
-        if self._state == CircuitState.CLOSED:
-            if self._failure_count >= self.failure_threshold:
-                self._transition_to_open()
-
-        elif self._state == CircuitState.HALF_OPEN:
-            # 在半开状态下如果请求失败，立即转换为开启状态
-            self._transition_to_open()
-
-    def _transition_to_open(self):
-        """转换到开启状态"""
-        self._state = CircuitState.OPEN
-        self._last_state_change_time = datetime.now()
-        logger.warning(f"Circuit breaker '{self.name}' transitioned to OPEN state")
-
-    def _transition_to_half_open(self):
-        """转换到半开状态"""
-        self._state = CircuitState.HALF_OPEN
-        self._last_state_change_time = datetime.now()
-        logger.info(f"Circuit breaker '{self.name}' transitioned to HALF-OPEN state")
-
-    def _transition_to_closed(self):
-        """转换到关闭状态"""
-        self._state = CircuitState.CLOSED
-        self._last_state_change_time = datetime.now()
-        self._failure_count = 0
-        logger.info(f"Circuit breaker '{self.name}' transitioned to CLOSED state")
+        self._last_failure_time = datetime.now()
+        self.record(duration, failed=True, generation=generation)
 
     def get_stats(self) -> dict:
         """获取统计信息"""
         return {
-            "name": self.name,
-            "state": self._state,
-            "failure_count": self._failure_count,
+            **super().get_stats(),
             "last_failure_time": self._last_failure_time.isoformat() if self._last_failure_time else None,
             "last_success_time": self._last_success_time.isoformat() if self._last_success_time else None,
-            "last_state_change_time": self._last_state_change_time.isoformat(),
             "failure_threshold": self.failure_threshold,
             "recovery_timeout": self.recovery_timeout,
             "max_failures": self.max_failures,
@@ -146,8 +112,10 @@ class CircuitBreaker:
 class CircuitBreakerRegistry:
     """断路器注册表"""
 
-    def __init__(self):
+    def __init__(self, max_keys: int = DEFAULT_MAX_KEYS):
+        self.max_keys = max_keys
         self._breakers: Dict[str, CircuitBreaker] = {}
+        self._keyed: Dict[str, BreakerRegistry] = {}
 
     def get_or_create(
         self,
@@ -156,6 +124,7 @@ class CircuitBreakerRegistry:
         recovery_timeout: int = None,
         max_failures: int = None,
         reset_timeout: int = None,
+        config: Optional[BreakerConfig] = None,
     ) -> CircuitBreaker:
         """获取或创建断路器"""
         if name not in self._breakers:
@@ -165,12 +134,27 @@ class CircuitBreakerRegistry:
                 recovery_timeout=recovery_timeout,
                 max_failures=max_failures,
                 reset_timeout=reset_timeout,
+                config=config,
             )
         return self._breakers[name]
 
+    def keyed(self, name: str, factory: Callable[[Hashable], CircuitBreaker]) -> BreakerRegistry:
+        """
+        获取按键区分的断路器集合, 每个键(例如下游主机)独立统计和熔断
+        :param name: 断路器名称
+        :param factory: 根据键创建断路器
+        :return: 有容量上限的断路器注册表
+        """
+        if name not in self._keyed:
+            self._keyed[name] = BreakerRegistry(factory, max_size=self.max_keys)
+        return self._keyed[name]
+
     def get_all_stats(self) -> Dict[str, dict]:
         """获取所有断路器的统计信息"""
-        return {name: breaker.get_stats() for name, breaker in self._breakers.items()}
+        stats = {name: breaker.get_stats() for name, breaker in self._breakers.items()}
+        for registry in self._keyed.values():
+            stats.update({breaker.name: breaker.get_stats() for _, breaker in registry.items()})
+        return stats
 
 
 # 创建全局断路器注册表
@@ -184,35 +168,65 @@ def circuit_breaker(
     max_failures: int = None,
     reset_timeout: int = None,
     fallback_function: Callable = None,
+    key: Callable[..., Hashable] = None,
+    config: Optional[BreakerConfig] = None,
 ):
-    """断路器装饰器"""
+    """
+    断路器装饰器
+    :param key: 从调用参数计算断路器键(例如下游主机), 每个键使用独立的断路器
+    :param config: 窗口、阈值、慢调用和半开探测配置, 指定时忽略原有的计数参数
+    """
 
     def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
         breaker_name = name or func.__name__
-        breaker = circuit_breaker_registry.get_or_create(
-            name=breaker_name,
-            failure_threshold=failure_threshold,
-            recovery_timeout=recovery_timeout,
-            max_failures=max_failures,
-            reset_timeout=reset_timeout,
-        )
+
+        def create(breaker_key: Hashable = None) -> CircuitBreaker:
+            return CircuitBreaker(
+                name=breaker_name if breaker_key is None else f"{breaker_name}[{breaker_key}]",
+                failure_threshold=failure_threshold,
+                recovery_timeout=recovery_timeout,
+                max_failures=max_failures,
+                reset_timeout=reset_timeout,
+                config=config,
+            )
+
+        if key is None:
+            breaker = circuit_breaker_registry.get_or_create(
+                name=breaker_name,
+                failure_threshold=failure_threshold,
+                recovery_timeout=recovery_timeout,
+                max_failures=max_failures,
+                reset_timeout=reset_timeout,
+                config=config,
+            )
+            select = lambda *args, **kwargs: breaker  # noqa: E731
+        else:
+            breakers = circuit_breaker_registry.keyed(breaker_name, create)
+            select = lambda *args, **kwargs: breakers.get(key(*args, **kwargs))  # noqa: E731
 
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            if not breaker._should_allow_request():
+            current = select(*args, **kwargs)
+            if not current.allow():
                 if fallback_function:
                     return await fallback_function(*args, **kwargs)
-                raise Exception(f"Circuit breaker '{breaker_name}' is open")
+                raise CallNotPermitted(current.name, current.state)
 
+            # 结果只计入放行时的状态, 期间发生状态切换时忽略
+            generation = current.generation
+            start = current.clock()
             try:
                 result = await func(*args, **kwargs)
-                breaker._on_success()
-                return result
-            except Exception as e:
-                breaker._on_failure()
+            except asyncio.CancelledError:
+                current.cancel(generation)
+                raise
+            except Exception:
+                current._on_failure(current.clock() - start, generation)
                 if fallback_function:
                     return await fallback_function(*args, **kwargs)
                 raise
+            current._on_success(current.clock() - start, generation)
+            return result
 
         return wrapper
 
@@ -1,5 +1,4 @@
 import asyncio
-import random
 import socket
 from datetime import datetime
 from enum import Enum
@@ -12,6 +11,7 @@ from tenacity import retry, stop_after_attempt, wait_exponential
 
 from core.config.setting import settings
 from core.loge.pysuper_logging import get_logger
+from core.strong.endpoints import EndpointCache, OutlierDetector
 
 logger = get_logger("service_discovery")
 
@@ -29,8 +29,9 @@ class LoadBalanceStrategy(str, Enum):
 
     RANDOM = "random"
     ROUND_ROBIN = "round_robin"
-    LEAST_CONN = "least_conn"
+    LEAST_CONN = "least_conn"  # 最少未完成请求
     WEIGHTED = "weighted"
+    POWER_OF_TWO = "power_of_two"
 
 
 class ServiceInstance:
@@ -61,7 +62,15 @@ class ServiceDiscovery:
         self.provider = settings.SERVICE_DISCOVERY_PROVIDER
         self._client = None
         self._instances: Dict[str, List[ServiceInstance]] = {}
-        self._current_index = 0
+        # 进程内的实例缓存, 避免每次调用都访问注册中心
+        self._endpoints = EndpointCache(
+            self._resolve_instances,
+            ttl=settings.SERVICE_DISCOVERY_CACHE_TTL,
+            outlier_detector=OutlierDetector(
+                consecutive_failures=settings.SERVICE_OUTLIER_CONSECUTIVE_FAILURES,
+                base_ejection_time=settings.SERVICE_OUTLIER_EJECTION_TIME,
+            ),
+        )
 
     async def init_discovery(self):
         """初始化服务发现"""
@@ -139,95 +148,91 @@ class ServiceDiscovery:
     async def discover_service(
         self, service_name: str, strategy: LoadBalanceStrategy = LoadBalanceStrategy.ROUND_ROBIN
     ) -> Optional[ServiceInstance]:
-        """发现服务"""
+        """
+        发现服务, 从缓存的实例中按负载均衡策略选择一个
+        这里无法知道调用何时结束, LEAST_CONN 和 POWER_OF_TWO 按轮询选择;
+        需要按未完成请求数均衡或统计调用延迟时使用 endpoint()
+        """
         try:
-            # 获取服务实例列表
-            instances = await self._get_service_instances(service_name)
-            if not instances:
-                return None
-
-            # 根据负载均衡策略选择实例
-            if strategy == LoadBalanceStrategy.RANDOM:
-                instance = random.choice(instances)
-            elif strategy == LoadBalanceStrategy.ROUND_ROBIN:
-                instance = instances[self._current_index % len(instances)]
-                self._current_index += 1
-            elif strategy == LoadBalanceStrategy.LEAST_CONN:
-                instance = min(instances, key=lambda x: x.connection_count)
-            elif strategy == LoadBalanceStrategy.WEIGHTED:
-                total_weight = sum(instance.weight for instance in instances)
-                r = random.uniform(0, total_weight)
-                for instance in instances:
-                    r -= instance.weight
-                    if r <= 0:
-                        break
-            else:
-                raise ValueError(f"Unsupported load balance strategy: {strategy}")
-
-            # 更新连接计数
-            instance.connection_count += 1
-            return instance
-
+            endpoint = await self._endpoints.choose(service_name, strategy)
+            return endpoint.instance if endpoint else None
         except Exception as e:
             logger.error(f"Failed to discover service {service_name}: {str(e)}")
             raise
 
+    def endpoint(self, service_name: str, strategy: LoadBalanceStrategy = LoadBalanceStrategy.POWER_OF_TWO):
+        """
+        选择服务实例并跟踪这次调用, 连续失败的实例会被临时摘除
+        用法: async with service_discovery.endpoint("orders") as endpoint: endpoint.host, endpoint.port
+        :param service_name: 服务名称
+        :param strategy: 负载均衡策略
+        :return: 异步上下文管理器, 产出 Endpoint
+        """
+        return self._endpoints.endpoint(service_name, strategy)
+
+    def get_endpoint_stats(self) -> Dict[str, Any]:
+        """实例缓存命中情况和每个实例的延迟统计"""
+        return self._endpoints.get_stats()
+
     async def _get_service_instances(self, service_name: str) -> List[ServiceInstance]:
         """获取服务实例列表"""
-        instances = []
-
         try:
-            if self.provider == ServiceDiscoveryProvider.CONSUL:
-                _, services = self._client.health.service(service_name)
-                for service in services:
-                    if service["Checks"][0]["Status"] == "passing":
-                        instances.append(
-                            ServiceInstance(
-                                host=service["Service"]["Address"],
-                                port=service["Service"]["Port"],
-                                metadata=service["Service"]["Meta"],
-                                healthy=True,
-                                last_check=datetime.now(),
-                            )
-                        )
+            return await self._resolve_instances(service_name)
+        except Exception as e:
+            logger.error(f"Failed to get service instances for {service_name}: {str(e)}")
+            return []
 
-            elif self.provider == ServiceDiscoveryProvider.ETCD:
-                response = self._client.get_prefix(f"/services/{service_name}/")
-                for value, _ in response:
-                    service_data = eval(value.decode("utf-8"))
+    async def _resolve_instances(self, service_name: str) -> List[ServiceInstance]:
+        """从注册中心查询服务实例列表, 失败时抛出异常"""
+        instances = []
+
+        if self.provider == ServiceDiscoveryProvider.CONSUL:
+            _, services = self._client.health.service(service_name)
+            for service in services:
+                if service["Checks"][0]["Status"] == "passing":
                     instances.append(
                         ServiceInstance(
-                            host=service_data["address"],
-                            port=service_data["port"],
-                            metadata={"tags": service_data["tags"]},
+                            host=service["Service"]["Address"],
+                            port=service["Service"]["Port"],
+                            metadata=service["Service"]["Meta"],
                             healthy=True,
                             last_check=datetime.now(),
                         )
                     )
 
-            elif self.provider == ServiceDiscoveryProvider.EUREKA:
-                application = await self._client.get_application(service_name)
-                if application:
-                    for instance in application.instances:
-                        if instance.status == "UP":
-                            instances.append(
-                                ServiceInstance(
-                                    host=instance.ipAddr,
-                                    port=instance.port.port,
-                                    metadata=instance.metadata,
-                                    healthy=True,
-                                    last_check=datetime.now(),
-                                )
-                            )
+        elif self.provider == ServiceDiscoveryProvider.ETCD:
+            response = self._client.get_prefix(f"/services/{service_name}/")
+            for value, _ in response:
+                service_data = eval(value.decode("utf-8"))
+                instances.append(
+                    ServiceInstance(
+                        host=service_data["address"],
+                        port=service_data["port"],
+                        metadata={"tags": service_data["tags"]},
+                        healthy=True,
+                        last_check=datetime.now(),
+                    )
+                )
 
-        except Exception as e:
-            logger.error(f"Failed to get service instances for {service_name}: {str(e)}")
-            return []
+        elif self.provider == ServiceDiscoveryProvider.EUREKA:
+            application = await self._client.get_application(service_name)
+            if application:
+                for instance in application.instances:
+                    if instance.status == "UP":
+                        instances.append(
+                            ServiceInstance(
+                                host=instance.ipAddr,
+                                port=instance.port.port,
+                                metadata=instance.metadata,
+                                healthy=True,
+                                last_check=datetime.now(),
+                            )
+                        )
 
         return instances
 
     async def watch_service(self, service_name: str, callback):
-        """监听服务变化"""
+        """监听服务变化, 变化同时更新实例缓存"""
         if self.provider == ServiceDiscoveryProvider.CONSUL:
             index = None
             while True:
@@ -245,6 +250,7 @@ class ServiceDiscovery:
                                     last_check=datetime.now(),
                                 )
                             )
+                    self._endpoints.update(service_name, instances)
                     await callback(instances)
                 except Exception as e:
                     logger.error(f"Service watch error: {str(e)}")
@@ -254,6 +260,7 @@ class ServiceDiscovery:
             events_iterator, cancel = self._client.watch_prefix(f"/services/{service_name}/")
             try:
                 async for event in events_iterator:
+                    self._endpoints.invalidate(service_name)
                     instances = await self._get_service_instances(service_name)
                     await callback(instances)
             except Exception as e:
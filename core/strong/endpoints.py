@@ -0,0 +1,529 @@
+"""
+客户端服务端点缓存与负载均衡
+按服务名缓存解析到的实例(带 TTL, 也接受注册中心推送的变更), 过期后在后台单飞刷新并继续使用旧数据;
+按连续失败次数临时摘除异常实例, 提供随机、轮询、加权、最少未完成请求和二选一等可插拔的负载均衡策略,
+并记录每个实例的延迟统计
+"""
+
+import asyncio
+import itertools
+import logging
+import math
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class NoAvailableEndpoint(LookupError):
+    """服务没有可用实例"""
+
+    def __init__(self, service: str):
+        super().__init__(f"No available endpoint for service '{service}'")
+        self.service = service
+
+
+class Endpoint:
+    """服务端点及其调用统计"""
+
+    __slots__ = (
+        "host",
+        "port",
+        "weight",
+        "metadata",
+        "instance",
+        "outstanding",
+        "calls",
+        "failures",
+        "consecutive_failures",
+        "latency_ewma",
+        "latency_max",
+        "ejected_until",
+        "ejections",
+    )
+
+    def __init__(self, host: str, port: int, weight: int = 1, metadata: dict = None, instance: Any = None):
+        self.host = host
+        self.port = port
+        self.weight = weight
+        self.metadata = metadata or {}
+        self.instance = instance  # 注册中心返回的原始实例
+        self.outstanding = 0  # 未完成的请求数
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency_ewma = 0.0
+        self.latency_max = 0.0
+        self.ejected_until = 0.0
+        self.ejections = 0
+
+    @property
+    def address(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    def observe(self, latency: float, failed: bool, alpha: float) -> None:
+        """记录一次调用的延迟和结果"""
+        self.calls += 1
+        if self.calls == 1:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += alpha * (latency - self.latency_ewma)
+        if latency > self.latency_max:
+            self.latency_max = latency
+        if failed:
+            self.failures += 1
+            self.consecutive_failures += 1
+        else:
+            self.consecutive_failures = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "address": self.address,
+            "weight": self.weight,
+            "outstanding": self.outstanding,
+            "calls": self.calls,
+            "failures": self.failures,
+            "latency_ewma": self.latency_ewma,
+            "latency_max": self.latency_max,
+            "ejected_until": self.ejected_until,
+            "ejections": self.ejections,
+        }
+
+    def __repr__(self) -> str:
+        return f"Endpoint({self.address})"
+
+
+def default_endpoint(instance: Any) -> Optional[Endpoint]:
+    """
+    把注册中心返回的实例转换为端点, 不健康的实例返回 None
+    兼容 discovery.ServiceInstance(host/port) 和 service_discovery.ServiceInstance(endpoint.host/port)
+    """
+    if isinstance(instance, Endpoint):
+        return instance
+    if getattr(instance, "healthy", True) is False:
+        return None
+    address = getattr(instance, "endpoint", instance)
+    return Endpoint(
+        address.host,
+        address.port,
+        weight=getattr(instance, "weight", 1),
+        metadata=getattr(instance, "metadata", None),
+        instance=instance,
+    )
+
+
+class Balancer:
+    """负载均衡策略, 每个服务持有一个实例, 可以保存自己的状态"""
+
+    def pick(self, endpoints: List[Endpoint]) -> Endpoint:
+        raise NotImplementedError
+
+
+class RandomBalancer(Balancer):
+    """随机"""
+
+    def __init__(self, rng: random.Random = None):
+        self._rng = rng or random.Random()
+
+    def pick(self, endpoints: List[Endpoint]) -> Endpoint:
+        return endpoints[self._rng.randrange(len(endpoints))]
+
+
+class RoundRobinBalancer(Balancer):
+    """轮询"""
+
+    def __init__(self, rng: random.Random = None):
+        self._counter = itertools.count()
+
+    def pick(self, endpoints: List[Endpoint]) -> Endpoint:
+        return endpoints[next(self._counter) % len(endpoints)]
+
+
+class WeightedBalancer(Balancer):
+    """按权重随机"""
+
+    def __init__(self, rng: random.Random = None):
+        self._rng = rng or random.Random()
+
+    def pick(self, endpoints: List[Endpoint]) -> Endpoint:
+        return self._rng.choices(endpoints, weights=[endpoint.weight for endpoint in endpoints])[0]
+
+
+def _load(endpoint: Endpoint) -> Tuple[int, float]:
+    return endpoint.outstanding, endpoint.latency_ewma
+
+
+class LeastOutstandingBalancer(Balancer):
+    """最少未完成请求, 相同时选择延迟较低的"""
+
+    def __init__(self, rng: random.Random = None):
+        pass
+
+    def pick(self, endpoints: List[Endpoint]) -> Endpoint:
+        return min(endpoints, key=_load)
+
+
+class PowerOfTwoBalancer(Balancer):
+    """随机选两个实例, 取未完成请求较少的一个(power of two choices), 选择代价与实例数无关"""
+
+    def __init__(self, rng: random.Random = None):
+        self._rng = rng or random.Random()
+
+    def pick(self, endpoints: List[Endpoint]) -> Endpoint:
+        count = len(endpoints)
+        if count == 1:
+            return endpoints[0]
+        first = self._rng.randrange(count)
+        second = self._rng.randrange(count - 1)
+        if second >= first:
+            second += 1
+        a, b = endpoints[first], endpoints[second]
+        return a if _load(a) <= _load(b) else b
+
+
+BALANCERS: Dict[str, Callable[..., Balancer]] = {
+    "random": RandomBalancer,
+    "round_robin": RoundRobinBalancer,
+    "weighted": WeightedBalancer,
+    "least_conn": LeastOutstandingBalancer,
+    "least_request": LeastOutstandingBalancer,
+    "power_of_two": PowerOfTwoBalancer,
+}
+
+# 依赖未完成请求数的策略, 只有通过 endpoint() 跟踪调用时才有意义
+LOAD_AWARE_STRATEGIES = {"least_conn", "least_request", "power_of_two"}
+
+
+def register_balancer(name: str, factory: Callable[..., Balancer]) -> None:
+    """注册自定义负载均衡策略"""
+    BALANCERS[name] = factory
+
+
+def create_balancer(strategy: Any, rng: random.Random = None) -> Balancer:
+    """
+    按策略名称创建负载均衡器
+    :param strategy: 策略名称或 LoadBalanceStrategy
+    :param rng: 随机数生成器
+    :return: 负载均衡器
+    """
+    name = getattr(strategy, "value", strategy)
+    try:
+        factory = BALANCERS[name]
+    except KeyError:
+        raise ValueError(f"Unsupported load balance strategy: {strategy}") from None
+    return factory(rng)
+
+
+class OutlierDetector:
+    """
+    异常实例检测
+    连续失败达到阈值时摘除实例, 摘除时间随摘除次数线性增长并有上限; 同一服务被摘除的实例不超过一定比例
+    """
+
+    def __init__(
+        self,
+        consecutive_failures: int = 5,
+        base_ejection_time: float = 30.0,
+        max_ejection_time: float = 300.0,
+        max_ejection_percent: float = 0.5,
+    ):
+        self.consecutive_failures = consecutive_failures
+        self.base_ejection_time = base_ejection_time
+        self.max_ejection_time = max_ejection_time
+        self.max_ejection_percent = max_ejection_percent
+
+    def should_eject(self, endpoint: Endpoint, ejected: int, total: int) -> bool:
+        if endpoint.consecutive_failures < self.consecutive_failures:
+            return False
+        return ejected + 1 <= total * self.max_ejection_percent
+
+    def ejection_time(self, endpoint: Endpoint) -> float:
+        return min(self.base_ejection_time * endpoint.ejections, self.max_ejection_time)
+
+
+class ServiceEndpoints:
+    """一个服务的端点集合, 维护可用实例列表和各策略的负载均衡器"""
+
+    def __init__(self, name: str, detector: OutlierDetector, clock: Callable[[], float], rng: random.Random = None):
+        self.name = name
+        self.detector = detector
+        self.clock = clock
+        self.rng = rng
+        self.endpoints: Dict[str, Endpoint] = {}
+        self.expires_at = 0.0
+        self.version = 0
+        self._available: List[Endpoint] = []
+        self._next_return = math.inf  # 最早被摘除的实例恢复的时间
+        self._balancers: Dict[Any, Balancer] = {}
+
+    def replace(self, endpoints: Iterable[Optional[Endpoint]]) -> Tuple[List[Endpoint], List[Endpoint]]:
+        """
+        用注册中心的最新结果替换端点, 保留仍存在实例的统计信息
+        :return: 新增和移除的端点
+        """
+        current: Dict[str, Endpoint] = {}
+        added = []
+        for endpoint in endpoints:
+            if endpoint is None:
+                continue
+            existing = self.endpoints.get(endpoint.address)
+            if existing is None:
+                added.append(endpoint)
+            else:
+                existing.weight = endpoint.weight
+                existing.metadata = endpoint.metadata
+                existing.instance = endpoint.instance
+                endpoint = existing
+            current[endpoint.address] = endpoint
+        removed = [endpoint for address, endpoint in self.endpoints.items() if address not in current]
+        self.endpoints = current
+        if added or removed:
+            self.version += 1
+        self._rebuild(self.clock())
+        return added, removed
+
+    def _rebuild(self, now: float) -> None:
+        available = []
+        next_return = math.inf
+        for endpoint in self.endpoints.values():
+            if endpoint.ejected_until <= now:
+                available.append(endpoint)
+            elif endpoint.ejected_until < next_return:
+                next_return = endpoint.ejected_until
+        # 全部被摘除时退回使用全部实例, 避免服务完全不可用
+        self._available = available or list(self.endpoints.values())
+        self._next_return = next_return
+
+    def available(self) -> List[Endpoint]:
+        """当前可用的端点"""
+        if self._next_return <= self.clock():
+            self._rebuild(self.clock())
+        return self._available
+
+    def pick(self, strategy: Any) -> Optional[Endpoint]:
+        endpoints = self.available()
+        if not endpoints:
+            return None
+        balancer = self._balancers.get(strategy)
+        if balancer is None:
+            balancer = self._balancers[strategy] = create_balancer(strategy, self.rng)
+        return balancer.pick(endpoints)
+
+    def report(self, endpoint: Endpoint, latency: float, failed: bool, alpha: float) -> None:
+        endpoint.observe(latency, failed, alpha)
+        if not failed or endpoint.ejected_until > self.clock():
+            return
+        total = len(self.endpoints)
+        ejected = total - len(self.available())
+        if endpoint.address in self.endpoints and self.detector.should_eject(endpoint, ejected, total):
+            endpoint.ejections += 1
+            endpoint.ejected_until = self.clock() + self.detector.ejection_time(endpoint)
+            endpoint.consecutive_failures = 0
+            self._rebuild(self.clock())
+            logger.warning(f"Endpoint {endpoint.address} of service '{self.name}' ejected after repeated failures")
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        return [endpoint.get_stats() for endpoint in self.endpoints.values()]
+
+
+class EndpointCache:
+    """
+    服务端点缓存
+    首次访问时解析服务实例, 之后在 TTL 内直接使用缓存; 过期后后台刷新(同一服务同时只有一次解析),
+    刷新期间和解析失败时继续使用旧数据. 注册中心推送的变更通过 update() 立即生效
+    """
+
+    def __init__(
+        self,
+        resolver: Callable[[str], Awaitable[Iterable[Any]]],
+        ttl: float = 30.0,
+        to_endpoint: Callable[[Any], Optional[Endpoint]] = default_endpoint,
+        outlier_detector: OutlierDetector = None,
+        latency_alpha: float = 0.2,
+        clock: Callable[[], float] = time.monotonic,
+        rng: random.Random = None,
+    ):
+        """
+        :param resolver: 按服务名解析实例的异步函数, 失败时应抛出异常
+        :param ttl: 缓存有效期(秒)
+        :param to_endpoint: 把实例转换为端点
+        :param outlier_detector: 异常实例检测
+        :param latency_alpha: 延迟指数移动平均的系数
+        :param clock: 时钟
+        :param rng: 随机负载均衡策略使用的随机数生成器
+        """
+        self.resolver = resolver
+        self.ttl = ttl
+        self.to_endpoint = to_endpoint
+        self.detector = outlier_detector or OutlierDetector()
+        self.latency_alpha = latency_alpha
+        self.clock = clock
+        self.rng = rng
+        self._services: Dict[str, ServiceEndpoints] = {}
+        self._refreshing: Dict[str, asyncio.Future] = {}
+        self._listeners: List[Callable[[str, List[Endpoint], List[Endpoint]], Any]] = []
+        self.hits = 0
+        self.misses = 0
+        self.lookups = 0
+        self.lookup_errors = 0
+
+    async def get(self, service: str) -> ServiceEndpoints:
+        """获取服务的端点集合"""
+        entry = self._services.get(service)
+        if entry is not None:
+            self.hits += 1
+            if entry.expires_at <= self.clock():
+                self._refresh(service)
+            return entry
+        self.misses += 1
+        await asyncio.shield(self._refresh(service))
+        return self._services[service]
+
+    async def choose(self, service: str, strategy: Any = "round_robin") -> Optional[Endpoint]:
+        """
+        按策略选择一个端点, 没有可用实例时返回 None
+        这里不跟踪调用, 未完成请求数始终为 0, 依赖它的策略退化为轮询; 需要时使用 endpoint()
+        """
+        entry = await self.get(service)
+        if getattr(strategy, "value", strategy) in LOAD_AWARE_STRATEGIES:
+            strategy = "round_robin"
+        return entry.pick(strategy)
+
+    @asynccontextmanager
+    async def endpoint(self, service: str, strategy: Any = "round_robin"):
+        """
+        选择端点并跟踪这次调用: 统计未完成请求数、延迟和结果, 抛出异常视为失败
+        :raises NoAvailableEndpoint: 服务没有可用实例
+        """
+        entry = await self.get(service)
+        endpoint = entry.pick(strategy)
+        if endpoint is None:
+            raise NoAvailableEndpoint(service)
+        endpoint.outstanding += 1
+        start = time.perf_counter()
+        failed = None  # 被取消的调用不计入统计
+        try:
+            yield endpoint
+            failed = False
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            failed = True
+            raise
+        finally:
+            endpoint.outstanding -= 1
+            if failed is not None:
+                entry.report(endpoint, time.perf_counter() - start, failed, self.latency_alpha)
+
+    def update(self, service: str, instances: Iterable[Any]) -> None:
+        """用注册中心的最新实例列表更新缓存(例如来自 watch 的推送)"""
+        entry = self._services.get(service)
+        if entry is None:
+            entry = self._services[service] = ServiceEndpoints(service, self.detector, self.clock, self.rng)
+        added, removed = entry.replace(self.to_endpoint(instance) for instance in instances)
+        entry.expires_at = self.clock() + self.ttl
+        if added or removed:
+            for listener in self._listeners:
+                try:
+                    listener(service, added, removed)
+                except Exception as e:
+                    logger.error(f"Endpoint listener error: {e}")
+
+    def invalidate(self, service: str) -> None:
+        """使缓存过期, 下一次访问时刷新"""
+        entry = self._services.get(service)
+        if entry is not None:
+            entry.expires_at = 0.0
+
+    def subscribe(self, listener: Callable[[str, List[Endpoint], List[Endpoint]], Any]) -> None:
+        """订阅端点变化, listener(service, added, removed)"""
+        self._listeners.append(listener)
+
+    def _refresh(self, service: str) -> asyncio.Future:
+        future = self._refreshing.get(service)
+        if future is None:
+            future = self._refreshing[service] = asyncio.ensure_future(self._resolve(service))
+            future.add_done_callback(lambda _: self._refreshing.pop(service, None))
+        return future
+
+    async def _resolve(self, service: str) -> None:
+        self.lookups += 1
+        try:
+            instances = await self.resolver(service)
+        except Exception as e:
+            self.lookup_errors += 1
+            entry = self._services.get(service)
+            if entry is None:
+                raise
+            # 保留旧数据, 一个 TTL 后再重试
+            logger.error(f"Failed to refresh endpoints of service '{service}': {e}")
+            entry.expires_at = self.clock() + self.ttl
+            return
+        self.update(service, instances)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "lookups": self.lookups,
+            "lookup_errors": self.lookup_errors,
+            "services": {name: entry.get_stats() for name, entry in self._services.items()},
+        }
+
+
+class InMemoryRegistry:
+    """内存服务注册表, 可作为 EndpointCache 的解析函数, 变更会推送给关联的缓存"""
+
+    def __init__(self):
+        self._services: Dict[str, Dict[str, Endpoint]] = {}
+        self._caches: List[EndpointCache] = []
+        self.lookups = 0
+
+    def register(self, service: str, host: str, port: int, weight: int = 1, metadata: dict = None) -> None:
+        self._services.setdefault(service, {})[f"{host}:{port}"] = Endpoint(host, port, weight, metadata)
+        self._publish(service)
+
+    def deregister(self, service: str, host: str, port: int) -> None:
+        self._services.get(service, {}).pop(f"{host}:{port}", None)
+        self._publish(service)
+
+    def watch(self, cache: EndpointCache) -> None:
+        """把之后的变更推送给缓存"""
+        self._caches.append(cache)
+
+    def _instances(self, service: str) -> List[Endpoint]:
+        return [
+            Endpoint(endpoint.host, endpoint.port, endpoint.weight, endpoint.metadata)
+            for endpoint in self._services.get(service, {}).values()
+        ]
+
+    def _publish(self, service: str) -> None:
+        for cache in self._caches:
+            cache.update(service, self._instances(service))
+
+    async def __call__(self, service: str) -> List[Endpoint]:
+        self.lookups += 1
+        return self._instances(service)
+
+
+__all__ = [
+    "BALANCERS",
+    "Balancer",
+    "Endpoint",
+    "EndpointCache",
+    "InMemoryRegistry",
+    "LOAD_AWARE_STRATEGIES",
+    "LeastOutstandingBalancer",
+    "NoAvailableEndpoint",
+    "OutlierDetector",
+    "PowerOfTwoBalancer",
+    "RandomBalancer",
+    "RoundRobinBalancer",
+    "ServiceEndpoints",
+    "WeightedBalancer",
+    "create_balancer",
+    "default_endpoint",
+    "register_balancer",
+]
@@ -6,9 +6,16 @@
 import asyncio
 import inspect
 import logging
+import time
 from typing import Any, Callable, Dict, List, Optional, Set
 
 from core.exceptions.system.api import SystemException
+from core.strong.event_dispatcher import (
+    BackpressurePolicy,
+    DispatchConfig,
+    EventDispatcher,
+    HandlerStats,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -26,53 +33,124 @@ class Event:
 
 
 class EventBus:
-    """异步事件总线"""
+    """
+    异步事件总线
+    - publish(wait=True): 并发执行处理器并等待完成, 不同发布之间互不阻塞
+    - publish(wait=False): 放入事件类型对应的有界队列后立即返回, 由工作协程异步投递
+    """
 
-    def __init__(self):
+    def __init__(self, default_config: Optional[DispatchConfig] = None):
         # 事件处理器映射 {事件名称: {处理器集合}}
         self._handlers: Dict[str, Set[Callable]] = {}
+        # 批量处理器(接收事件列表) {事件名称: {处理器集合}}
+        self._batch_handlers: Dict[str, Set[Callable]] = {}
         # 错误处理器
         self._error_handlers: List[Callable] = []
-        # 事件处理锁
-        self._lock = asyncio.Lock()
+        # 处理器耗时统计 {处理器名称: 统计}
+        self._handler_stats: Dict[str, HandlerStats] = {}
+        # 按事件类型分发的队列
+        self._dispatcher = EventDispatcher(self._deliver, default_config)
 
-    async def publish(self, event: Event) -> None:
+    async def publish(self, event: Event, wait: bool = True) -> bool:
         """
         发布事件
         :param event: 事件对象
+        :param wait: 是否等待处理器执行完成, False 时为投递即返回模式
+        :return: 事件是否被接受(背压丢弃时返回 False)
         """
-        handlers = self._handlers.get(event.name, set())
-        if not handlers:
+        if not self._handlers.get(event.name):
             logger.debug(f"No handlers found for event: {event}")
+            return False
+
+        if not wait:
+            return await self._dispatcher.dispatch(event.name, event)
+
+        await self._deliver(event.name, [event])
+        return True
+
+    def configure(
+        self,
+        event_name: str,
+        max_queue_size: int = 1000,
+        workers: int = 1,
+        batch_size: int = 1,
+        batch_timeout: float = 0.01,
+        policy: BackpressurePolicy = BackpressurePolicy.BLOCK,
+    ) -> None:
+        """
+        配置事件类型的异步分发参数
+        :param event_name: 事件名称
+        :param max_queue_size: 队列容量
+        :param workers: 工作协程数量
+        :param batch_size: 批量投递大小(高频事件)
+        :param batch_timeout: 凑批等待时间(秒)
+        :param policy: 队列满时的背压策略
+        """
+        self._dispatcher.configure(
+            event_name,
+            DispatchConfig(
+                max_queue_size=max_queue_size,
+                workers=workers,
+                batch_size=batch_size,
+                batch_timeout=batch_timeout,
+                policy=policy,
+            ),
+        )
+
+    async def _deliver(self, event_name: str, events: List[Event]) -> None:
+        """
+        将一批事件投递给处理器
+        :param event_name: 事件名称
+        :param events: 事件列表
+        """
+        handlers = self._handlers.get(event_name)
+        if not handlers:
             return
 
-        async with self._lock:
-            tasks = []
-            for handler in handlers:
-                task = asyncio.create_task(self._safe_handle(handler, event))
-                tasks.append(task)
+        batch_handlers = self._batch_handlers.get(event_name, ())
+        coros = []
+        for handler in list(handlers):
+            if handler in batch_handlers:
+                coros.append(self._safe_handle(handler, events))
+            else:
+                coros.extend(self._safe_handle(handler, event) for event in events)
 
-            if tasks:
-                await asyncio.gather(*tasks, return_exceptions=True)
+        if len(coros) == 1:
+            await coros[0]
+        else:
+            await asyncio.gather(*coros, return_exceptions=True)
 
-    async def _safe_handle(self, handler: Callable, event: Event) -> None:
+    async def _safe_handle(self, handler: Callable, event: Any) -> None:
         """
         安全地执行事件处理器
         :param handler: 处理器函数
-        :param event: 事件对象
+        :param event: 事件对象(批量处理器为事件列表)
         """
+        failed = False
+        start = time.perf_counter()
         try:
             if inspect.iscoroutinefunction(handler):
                 await handler(event)
             else:
                 handler(event)
         except Exception as e:
+            failed = True
+            name = event[0].name if isinstance(event, list) else event.name
             error = SystemException(
-                message=f"Error handling event {event.name}",
-                handler=handler.__name__,
-                original_error=e,
+                message=f"Error handling event {name}",
+                details={"handler": getattr(handler, "__name__", repr(handler)), "error": str(e)},
             )
             await self._handle_error(error)
+        finally:
+            self._record(handler, time.perf_counter() - start, failed)
+
+    def _record(self, handler: Callable, elapsed: float, failed: bool) -> None:
+        """记录处理器耗时, 以 模块:限定名 区分不同模块中的同名处理器"""
+        key = self.handler_key(handler)
+        stats = self._handler_stats.get(key)
+        if stats is None:
+            stats = self._handler_stats[key] = HandlerStats()
+        stats.record(elapsed, failed)
 
     async def _handle_error(self, error: Exception) -> None:
         """
@@ -92,15 +170,20 @@ class EventBus:
             except Exception as e:
                 logger.error(f"Error in error handler: {e}")
 
-    def subscribe(self, event_name: str, handler: Callable) -> None:
+    def subscribe(self, event_name: str, handler: Callable, batch: bool = False) -> None:
         """
         订阅事件
         :param event_name: 事件名称
         :param handler: 处理器函数
+        :param batch: 是否为批量处理器, 批量处理器接收事件列表
         """
         if event_name not in self._handlers:
             self._handlers[event_name] = set()
         self._handlers[event_name].add(handler)
+        if batch:
+            self._batch_handlers.setdefault(event_name, set()).add(handler)
+        elif event_name in self._batch_handlers:
+            self._batch_handlers[event_name].discard(handler)
 
     def unsubscribe(self, event_name: str, handler: Callable) -> None:
         """
@@ -112,6 +195,10 @@ class EventBus:
             self._handlers[event_name].discard(handler)
             if not self._handlers[event_name]:
                 del self._handlers[event_name]
+        if event_name in self._batch_handlers:
+            self._batch_handlers[event_name].discard(handler)
+            if not self._batch_handlers[event_name]:
+                del self._batch_handlers[event_name]
 
     def add_error_handler(self, handler: Callable) -> None:
         """
@@ -132,7 +219,35 @@ class EventBus:
     def clear(self) -> None:
         """清除所有订阅和错误处理器"""
         self._handlers.clear()
+        self._batch_handlers.clear()
         self._error_handlers.clear()
+        self._handler_stats.clear()
+
+    async def drain(self) -> None:
+        """等待异步队列中的事件全部处理完毕"""
+        await self._dispatcher.drain()
+
+    async def close(self, drain: bool = True) -> None:
+        """
+        关闭异步分发队列
+        :param drain: 是否等待队列中的事件处理完毕
+        """
+        await self._dispatcher.stop(drain=drain)
+
+    @staticmethod
+    def handler_key(handler: Callable) -> str:
+        """处理器统计的键: 模块:限定名"""
+        name = getattr(handler, "__qualname__", None) or repr(handler)
+        module = getattr(handler, "__module__", None)
+        return f"{module}:{name}" if module else name
+
+    def get_handler_stats(self) -> Dict[str, Dict[str, float]]:
+        """获取各处理器的耗时统计, 键为 模块:限定名"""
+        return {name: stats.to_dict() for name, stats in self._handler_stats.items()}
+
+    def get_queue_stats(self) -> Dict[str, Dict[str, int]]:
+        """获取各事件类型队列的统计信息"""
+        return self._dispatcher.get_stats()
 
     async def wait_for(self, event_name: str, timeout: Optional[float] = None) -> Event:
         """
@@ -158,4 +273,4 @@ class EventBus:
 event_bus = EventBus()
 
 # 导出
-__all__ = ["event_bus", "EventBus", "Event"]
+__all__ = ["event_bus", "EventBus", "Event", "BackpressurePolicy"]
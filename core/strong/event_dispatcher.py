@@ -0,0 +1,260 @@
+"""
+事件分发器模块
+按事件类型分配有界队列和工作协程, 支持批量投递、背压策略和处理器耗时统计
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from enum import Enum
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from core.exceptions.system.api import SystemException
+
+logger = logging.getLogger(__name__)
+
+# 投递回调: (事件名称, 事件批次) -> None
+DeliverCallback = Callable[[str, List], Awaitable[None]]
+
+
+class BackpressurePolicy(Enum):
+    """队列已满时的背压策略"""
+
+    BLOCK = "block"  # 等待队列腾出空位
+    DROP_NEWEST = "drop_newest"  # 丢弃新事件
+    DROP_OLDEST = "drop_oldest"  # 丢弃队列中最旧的事件
+    RAISE = "raise"  # 抛出异常
+
+
+@dataclass
+class DispatchConfig:
+    """单个事件类型的分发配置"""
+
+    max_queue_size: int = 1000
+    workers: int = 1
+    batch_size: int = 1
+    batch_timeout: float = 0.01
+    policy: BackpressurePolicy = BackpressurePolicy.BLOCK
+
+
+@dataclass
+class HandlerStats:
+    """事件处理器耗时统计"""
+
+    calls: int = 0
+    errors: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+
+    def record(self, elapsed: float, failed: bool = False) -> None:
+        """记录一次调用"""
+        self.calls += 1
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        if failed:
+            self.errors += 1
+
+    @property
+    def avg_time(self) -> float:
+        """平均耗时(秒)"""
+        return self.total_time / self.calls if self.calls else 0.0
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_time": self.total_time,
+            "avg_time": self.avg_time,
+            "max_time": self.max_time,
+        }
+
+
+class EventChannel:
+    """单个事件类型的有界队列及其工作协程"""
+
+    def __init__(self, name: str, config: DispatchConfig, deliver: DeliverCallback):
+        self.name = name
+        self.config = config
+        self._deliver = deliver
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=config.max_queue_size)
+        self._workers: List[asyncio.Task] = []
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def start(self) -> None:
+        """启动工作协程"""
+        if self._workers:
+            return
+        for _ in range(max(1, self.config.workers)):
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    async def stop(self, drain: bool = True) -> None:
+        """
+        停止工作协程
+        :param drain: 是否等待队列中的事件处理完毕
+        """
+        if drain:
+            await self.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    async def put(self, event) -> bool:
+        """
+        按背压策略将事件放入队列
+        :return: 事件是否被接受
+        """
+        policy = self.config.policy
+        if policy == BackpressurePolicy.BLOCK:
+            await self._queue.put(event)
+        else:
+            try:
+                self._queue.put_nowait(event)
+            except asyncio.QueueFull:
+                if policy == BackpressurePolicy.DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                if policy == BackpressurePolicy.RAISE:
+                    self.dropped += 1
+                    raise SystemException(
+                        message=f"Event queue is full: {self.name}",
+                        details={"event": self.name, "max_queue_size": self.config.max_queue_size},
+                    )
+                # DROP_OLDEST: 腾出一个位置再放入
+                try:
+                    self._queue.get_nowait()
+                    self._queue.task_done()
+                    self.dropped += 1
+                except asyncio.QueueEmpty:
+                    pass
+                self._queue.put_nowait(event)
+        self.published += 1
+        return True
+
+    async def _collect_batch(self, first) -> List:
+        """以首个事件为起点收集一个批次"""
+        batch = [first]
+        batch_size = self.config.batch_size
+        if batch_size <= 1:
+            return batch
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.config.batch_timeout
+        while len(batch) < batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker(self) -> None:
+        """工作协程"""
+        while True:
+            first = await self._queue.get()
+            batch = [first]
+            try:
+                batch = await self._collect_batch(first)
+                await self._deliver(self.name, batch)
+                self.delivered += len(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Event channel {self.name} delivery error: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def join(self) -> None:
+        """等待队列中的事件处理完毕"""
+        await self._queue.join()
+
+    @property
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "queue_size": self.qsize,
+            "max_queue_size": self.config.max_queue_size,
+            "workers": len(self._workers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+
+class EventDispatcher:
+    """按事件类型分发的异步事件分发器"""
+
+    def __init__(self, deliver: DeliverCallback, default_config: Optional[DispatchConfig] = None):
+        self._deliver = deliver
+        self._default_config = default_config or DispatchConfig()
+        self._configs: Dict[str, DispatchConfig] = {}
+        self._channels: Dict[str, EventChannel] = {}
+
+    def configure(self, event_name: str, config: DispatchConfig) -> None:
+        """
+        配置事件类型的分发参数, 需在该类型首次分发前调用
+        :param event_name: 事件名称
+        :param config: 分发配置
+        """
+        if event_name in self._channels:
+            raise SystemException(
+                message=f"Event channel already started: {event_name}",
+                details={"event": event_name},
+            )
+        self._configs[event_name] = config
+
+    def _get_channel(self, event_name: str) -> EventChannel:
+        channel = self._channels.get(event_name)
+        if channel is None:
+            config = self._configs.get(event_name, self._default_config)
+            channel = EventChannel(event_name, config, self._deliver)
+            channel.start()
+            self._channels[event_name] = channel
+        return channel
+
+    async def dispatch(self, event_name: str, event) -> bool:
+        """
+        将事件放入对应类型的队列
+        :param event_name: 事件名称
+        :param event: 事件对象
+        :return: 事件是否被接受
+        """
+        return await self._get_channel(event_name).put(event)
+
+    async def drain(self) -> None:
+        """等待所有队列中的事件处理完毕"""
+        for channel in list(self._channels.values()):
+            await channel.join()
+
+    async def stop(self, drain: bool = True) -> None:
+        """停止所有事件通道"""
+        channels = list(self._channels.values())
+        self._channels.clear()
+        for channel in channels:
+            await channel.stop(drain=drain)
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        """获取各事件通道的统计信息"""
+        return {name: channel.get_stats() for name, channel in self._channels.items()}
+
+
+__all__ = [
+    "BackpressurePolicy",
+    "DispatchConfig",
+    "HandlerStats",
+    "EventChannel",
+    "EventDispatcher",
+]
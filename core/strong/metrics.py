@@ -7,8 +7,6 @@ from typing import Dict, Optional
 
 from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, Summary, generate_latest, multiprocess
 
-from core.config.manager import config_manager
-
 
 class MetricsCollector:
     """指标收集器"""
@@ -193,6 +191,9 @@ class MetricsCollector:
         获取指标数据
         :return: 指标数据
         """
+        # 配置在导出时才读取, 记录指标的模块(如存储)导入本模块时不加载整条配置链
+        from core.config.manager import config_manager
+
         if config_manager.metrics.MULTIPROCESS:
             registry = CollectorRegistry()
             multiprocess.MultiProcessCollector(registry)
@@ -1,8 +1,11 @@
 """
 插件系统
 实现插件的动态加载和生命周期管理
+发现插件时只解析模块源码中的 PLUGIN_METADATA, 不执行插件模块; 延迟加载的插件在首次 require() 时才导入
 """
 
+import ast
+import asyncio
 import importlib
 import inspect
 import logging
@@ -11,11 +14,10 @@ import pkgutil
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from enum import Enum
-from typing import Any, Dict, List, Optional
-
-import jsonschema
+from typing import Any, Dict, List, Optional, Tuple
 
 from core.strong.event_bus import Event, event_bus
+from core.strong.startup import StartupProfiler
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +43,7 @@ class PluginMetadata:
     dependencies: List[str] = None
     entry_point: str = "plugin"
     config_schema: dict = None
+    lazy: bool = False  # 是否延迟到首次 require() 时加载, 需要插件显式声明
 
     def __post_init__(self):
         self.dependencies = self.dependencies or []
@@ -122,7 +125,9 @@ class Plugin(ABC):
         """配置插件"""
         try:
             if self.metadata.config_schema:
-                # 使用jsonschema验证配置
+                # 使用jsonschema验证配置, 导入较慢, 只在需要时导入
+                import jsonschema
+
                 try:
                     jsonschema.validate(instance=config, schema=self.metadata.config_schema)
                 except jsonschema.exceptions.ValidationError as e:
@@ -165,10 +170,13 @@ class Plugin(ABC):
 class PluginManager:
     """插件管理器"""
 
-    def __init__(self, plugin_dir: str = "plugins"):
+    def __init__(self, plugin_dir: str = "plugins", profiler: Optional[StartupProfiler] = None):
         self.plugin_dir = plugin_dir
+        self.profiler = profiler or StartupProfiler()
         self._plugins: Dict[str, Plugin] = {}
         self._load_order: List[str] = []
+        self._available: Dict[str, PluginMetadata] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
 
     async def discover(self) -> List[PluginMetadata]:
         """发现可用插件"""
@@ -186,13 +194,16 @@ class PluginManager:
                 if spec is None:
                     continue
 
-                # 导入插件模块
-                module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(module)
+                # 优先从源码读取元数据, 不是字面量时才导入插件模块
+                metadata = self._read_metadata(spec.origin)
+                if metadata is None:
+                    module = importlib.util.module_from_spec(spec)
+                    with self.profiler.measure(f"plugin:{name}", "import"):
+                        spec.loader.exec_module(module)
+                    metadata = getattr(module, "PLUGIN_METADATA", None)
 
                 # 获取插件元数据
-                if hasattr(module, "PLUGIN_METADATA"):
-                    metadata = module.PLUGIN_METADATA
+                if metadata is not None:
                     if isinstance(metadata, dict):
                         metadata = PluginMetadata(**metadata)
                     metadata_list.append(metadata)
@@ -202,6 +213,23 @@ class PluginManager:
 
         return metadata_list
 
+    @staticmethod
+    def _read_metadata(path: Optional[str]) -> Optional[dict]:
+        """从模块源码中读取字面量形式的 PLUGIN_METADATA, 无法读取时返回 None"""
+        if not path or not path.endswith(".py"):
+            return None
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in tree.body:
+            if isinstance(node, ast.Assign) and any(
+                isinstance(target, ast.Name) and target.id == "PLUGIN_METADATA" for target in node.targets
+            ):
+                try:
+                    return ast.literal_eval(node.value)
+                except ValueError:
+                    return None
+        return None
+
     async def load_plugin(self, metadata: PluginMetadata) -> None:
         """
         加载插件
@@ -217,7 +245,8 @@ class PluginManager:
 
         try:
             # 导入插件模块
-            module = importlib.import_module(f"{self.plugin_dir}.{metadata.name}")
+            with self.profiler.measure(f"plugin:{metadata.name}", "import"):
+                module = importlib.import_module(f"{self.plugin_dir}.{metadata.name}")
 
             # 获取插件类
             plugin_cls = None
@@ -234,7 +263,8 @@ class PluginManager:
             plugin = plugin_cls(metadata)
 
             # 加载插件
-            await plugin.load()
+            with self.profiler.measure(f"plugin:{metadata.name}", "init"):
+                await plugin.load()
             plugin.state = PluginState.LOADED
 
             self._plugins[metadata.name] = plugin
@@ -325,9 +355,38 @@ class PluginManager:
             raise PluginError(f"Failed to disable plugin {name}: {str(e)}")
 
     def get_plugin(self, name: str) -> Optional[Plugin]:
-        """获取插件实例"""
+        """获取已加载的插件实例"""
         return self._plugins.get(name)
 
+    async def require(self, name: str, _chain: Tuple[str, ...] = ()) -> Plugin:
+        """
+        获取插件, 未加载时先加载其依赖和插件本身; 并发的首次使用共享同一次加载
+        :param name: 插件名称
+        :return: 插件实例
+        """
+        plugin = self._plugins.get(name)
+        if plugin is not None:
+            return plugin
+        if name in _chain:
+            raise PluginError(f"Circular plugin dependency: {' -> '.join(_chain + (name,))}")
+        loading = self._loading.get(name)
+        if loading is None:
+            metadata = self._available.get(name)
+            if metadata is None:
+                raise PluginError(f"Plugin {name} not found")
+            loading = self._loading[name] = asyncio.ensure_future(
+                self._load_with_dependencies(metadata, _chain + (name,))
+            )
+            loading.add_done_callback(lambda _: self._loading.pop(name, None))
+        return await asyncio.shield(loading)
+
+    async def _load_with_dependencies(self, metadata: PluginMetadata, chain: Tuple[str, ...]) -> Plugin:
+        for dep in metadata.dependencies:
+            await self.require(dep, chain)
+        if metadata.name not in self._plugins:
+            await self.load_plugin(metadata)
+        return self._plugins[metadata.name]
+
     def get_plugins(self) -> List[Plugin]:
         """获取所有插件"""
         return list(self._plugins.values())
@@ -337,19 +396,26 @@ class PluginManager:
         return [p for p in self._plugins.values() if p.state == PluginState.ENABLED]
 
     async def load_all(self) -> None:
-        """加载所有插件"""
+        """发现所有插件并加载非延迟插件, 延迟插件在首次 require() 时加载"""
         metadata_list = await self.discover()
+        self._available.update((metadata.name, metadata) for metadata in metadata_list)
 
         # 按依赖关系排序
         sorted_metadata = self._sort_by_dependencies(metadata_list)
 
         # 加载插件
         for metadata in sorted_metadata:
+            if metadata.lazy or metadata.name in self._plugins:
+                continue
             try:
-                await self.load_plugin(metadata)
+                await self.require(metadata.name)
             except Exception as e:
                 logger.error(f"Failed to load plugin {metadata.name}: {e}")
 
+    def get_available_plugins(self) -> List[PluginMetadata]:
+        """获取已发现的插件(包括尚未加载的延迟插件)"""
+        return list(self._available.values())
+
     async def unload_all(self) -> None:
         """卸载所有插件"""
         # 按依赖关系反向卸载
@@ -5,17 +5,29 @@
 
 import asyncio
 import logging
+from contextlib import AsyncExitStack
 from datetime import datetime, timedelta
-from typing import Any, Callable, Dict, List, Optional, Union
+from typing import Any, AsyncContextManager, Callable, Dict, List, Optional, Union
 
 from croniter import croniter
 
 from core.strong.event_bus import Event, event_bus
-from core.strong.locks import lock_manager
 from core.strong.metrics import metrics_collector
+from core.strong.timer import TimerQueue, timer_queue
 
 logger = logging.getLogger(__name__)
 
+# 定时器键前缀, 与共享同一定时器队列的任务队列区分
+JOB_TIMER_PREFIX = "job:"
+
+
+def _distributed_lock(name: str) -> AsyncContextManager:
+    """默认的任务锁: 非阻塞的分布式锁, 获取失败时抛出 LockError"""
+    # 锁管理器依赖 Redis 连接, 首次加锁时才导入, 导入调度器模块不需要 Redis
+    from core.strong.locks import lock_manager
+
+    return lock_manager.lock(name, timeout=10, blocking=False)
+
 
 class JobStatus:
     """任务状态"""
@@ -158,10 +170,19 @@ class Job:
 class Scheduler:
     """任务调度器"""
 
-    def __init__(self):
+    def __init__(
+        self,
+        timer: Optional[TimerQueue] = None,
+        lock_factory: Optional[Callable[[str], AsyncContextManager]] = None,
+    ):
+        """
+        :param timer: 定时器队列, 默认创建独立实例
+        :param lock_factory: 按锁名称返回异步上下文管理器, 获取失败时抛出异常, 默认为非阻塞的分布式锁
+        """
         self._jobs: Dict[str, Job] = {}
         self._running = False
-        self._scheduler_task: Optional[asyncio.Task] = None
+        self._timer = timer if timer is not None else TimerQueue()
+        self._lock_factory = lock_factory or _distributed_lock
         self._lock = asyncio.Lock()
 
     async def start(self) -> None:
@@ -170,7 +191,9 @@ class Scheduler:
             return
 
         self._running = True
-        self._scheduler_task = asyncio.create_task(self._scheduler_loop())
+        for job in self._jobs.values():
+            self._schedule_job(job)
+        await self._timer.start()
         logger.info("Scheduler started")
 
     async def stop(self) -> None:
@@ -179,12 +202,8 @@ class Scheduler:
             return
 
         self._running = False
-        if self._scheduler_task:
-            self._scheduler_task.cancel()
-            try:
-                await self._scheduler_task
-            except asyncio.CancelledError:
-                pass
+        await self._timer.stop()
+        self._timer.clear(JOB_TIMER_PREFIX)
 
         logger.info("Scheduler stopped")
 
@@ -210,6 +229,8 @@ class Scheduler:
 
         async with self._lock:
             self._jobs[job_id] = job
+            if self._running:
+                self._schedule_job(job)
 
         # 发布任务添加事件
         await event_bus.publish(Event("job_added", {"job_id": job_id}))
@@ -225,6 +246,7 @@ class Scheduler:
             if job_id in self._jobs:
                 job = self._jobs.pop(job_id)
                 job.status = JobStatus.CANCELLED
+                self._timer.cancel(f"{JOB_TIMER_PREFIX}{job_id}")
 
                 # 发布任务移除事件
                 await event_bus.publish(Event("job_removed", {"job_id": job_id}))
@@ -244,36 +266,59 @@ class Scheduler:
         """
         return list(self._jobs.values())
 
-    async def _scheduler_loop(self) -> None:
-        """调度器主循环"""
-        while self._running:
-            try:
-                now = datetime.now()
-
-                # 获取需要运行的任务
-                jobs_to_run = []
-                async with self._lock:
-                    for job in self._jobs.values():
-                        if job.next_run_time and job.next_run_time <= now and job.running_instances < job.max_instances:
-                            jobs_to_run.append(job)
-
-                # 运行任务
-                for job in jobs_to_run:
-                    # 使用分布式锁确保任务不会重复运行
-                    try:
-                        async with lock_manager.lock(f"scheduler:job:{job.job_id}", timeout=10, blocking=False):
-                            asyncio.create_task(job.run())
-                    except Exception as e:
-                        logger.error(f"Failed to acquire lock for job {job.job_id}", exc_info=e)
-
-                # 等待一秒
-                await asyncio.sleep(1)
-
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                logger.error("Error in scheduler loop", exc_info=e)
-                await asyncio.sleep(5)  # 发生错误时等待较长时间
+    def _schedule_job(self, job: Job) -> None:
+        """
+        按下次运行时间登记定时器
+        :param job: 任务对象
+        """
+        key = f"{JOB_TIMER_PREFIX}{job.job_id}"
+        if job.next_run_time is None or job.status == JobStatus.CANCELLED:
+            self._timer.cancel(key)
+            return
+        self._timer.schedule(key, job.next_run_time.timestamp(), self._on_job_due)
+
+    def _on_job_due(self, key: str) -> None:
+        """定时器到期回调"""
+        job = self._jobs.get(key[len(JOB_TIMER_PREFIX) :])
+        if job is None:
+            return
+        if job.running_instances >= job.max_instances:
+            # 上一次运行尚未结束, 运行结束后会重新登记
+            return
+        asyncio.create_task(self._execute(job))
+
+    async def _execute(self, job: Job) -> None:
+        """
+        运行到期任务并登记下一次运行
+        :param job: 任务对象
+        """
+        try:
+            async with AsyncExitStack() as stack:
+                # 使用分布式锁确保任务不会重复运行
+                try:
+                    await stack.enter_async_context(self._lock_factory(f"scheduler:job:{job.job_id}"))
+                except Exception as e:
+                    logger.warning(f"Failed to acquire lock for job {job.job_id}, skipping this run: {e}")
+                    self._skip_run(job)
+                    return
+
+                try:
+                    await job.run()
+                except Exception as e:
+                    logger.error(f"Job {job.job_id} failed", exc_info=e)
+                    self._skip_run(job)
+        finally:
+            if self._running and self._jobs.get(job.job_id) is job:
+                self._schedule_job(job)
+
+    @staticmethod
+    def _skip_run(job: Job) -> None:
+        """跳过本次触发, 从当前时间起计算下次运行时间"""
+        now = datetime.now()
+        if isinstance(job.trigger, timedelta):
+            job.next_run_time = now + job.trigger
+        else:
+            job.next_run_time = job.get_next_run_time(now)
 
     async def get_scheduler_stats(self) -> Dict[str, Any]:
         """
@@ -289,11 +334,12 @@ class Scheduler:
             "running_jobs": running_jobs,
             "failed_jobs": failed_jobs,
             "is_running": self._running,
+            "timer": self._timer.get_stats(),
         }
 
 
-# 创建默认调度器实例
-scheduler = Scheduler()
+# 创建默认调度器实例, 与默认任务队列共用定时器队列
+scheduler = Scheduler(timer=timer_queue)
 
 # 导出
 __all__ = ["scheduler", "Scheduler", "Job", "JobStatus"]
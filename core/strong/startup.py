@@ -0,0 +1,285 @@
+"""
+应用启动编排与启动耗时分析
+按依赖关系并行初始化组件, 标记为延迟的组件在首次使用时才导入和初始化;
+StartupProfiler 记录每个组件的导入、初始化和关闭耗时
+"""
+
+import asyncio
+import importlib
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StartupError(Exception):
+    """启动编排错误: 依赖缺失或循环依赖"""
+
+    pass
+
+
+@dataclass
+class Timing:
+    """一次计时"""
+
+    component: str
+    phase: str  # import / init / close
+    seconds: float
+    offset: float  # 开始时间, 相对分析器创建时
+
+
+class StartupProfiler:
+    """启动耗时分析"""
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self.clock = clock
+        self.origin = clock()
+        self.timings: List[Timing] = []
+
+    @contextmanager
+    def measure(self, component: str, phase: str):
+        """记录代码块的耗时"""
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.timings.append(Timing(component, phase, self.clock() - start, start - self.origin))
+
+    def import_object(self, target: str, component: Optional[str] = None) -> Any:
+        """
+        导入 "module:attr" 指定的对象并记录导入耗时
+        :param target: 模块路径, 可带 ":属性"
+        :param component: 组件名称, 默认为模块路径
+        :return: 导入的对象
+        """
+        module_name, _, attr = target.partition(":")
+        with self.measure(component or module_name, "import"):
+            obj = importlib.import_module(module_name)
+        for part in attr.split(".") if attr else ():
+            obj = getattr(obj, part)
+        return obj
+
+    @property
+    def elapsed(self) -> float:
+        """从创建到现在的耗时"""
+        return self.clock() - self.origin
+
+    def totals(self) -> Dict[str, Dict[str, float]]:
+        """按组件汇总各阶段耗时"""
+        totals: Dict[str, Dict[str, float]] = {}
+        for timing in self.timings:
+            phases = totals.setdefault(timing.component, {})
+            phases[timing.phase] = phases.get(timing.phase, 0.0) + timing.seconds
+        return totals
+
+    def report(self, limit: Optional[int] = None) -> str:
+        """按总耗时从高到低输出各组件的导入和初始化耗时"""
+        rows = sorted(self.totals().items(), key=lambda item: sum(item[1].values()), reverse=True)
+        lines = [f"Startup finished in {self.elapsed * 1000:.1f}ms"]
+        for component, phases in rows[:limit]:
+            detail = ", ".join(f"{phase} {seconds * 1000:.1f}ms" for phase, seconds in phases.items())
+            lines.append(f"  {component:<20} {detail}")
+        return "\n".join(lines)
+
+    def check_budget(self, budget: float) -> bool:
+        """
+        检查启动耗时是否在预算内, 超出时告警
+        :param budget: 预算(秒)
+        :return: 是否在预算内
+        """
+        elapsed = self.elapsed
+        if elapsed <= budget:
+            return True
+        slowest = sorted(self.totals().items(), key=lambda item: sum(item[1].values()), reverse=True)[:3]
+        logger.warning(
+            f"Startup took {elapsed:.2f}s, over the {budget:.2f}s budget; slowest: "
+            + ", ".join(f"{name} {sum(phases.values()):.2f}s" for name, phases in slowest)
+        )
+        return False
+
+
+@dataclass
+class Component:
+    """启动组件"""
+
+    name: str
+    target: Any  # 组件对象, 或 "module:attr" 形式的路径(首次初始化时才导入)
+    depends_on: Tuple[str, ...] = ()
+    lazy: bool = False  # 启动时不初始化, 首次 ensure() 时初始化
+    init: Optional[Callable[[Any], Awaitable[Any]]] = None  # 默认调用对象的 init()
+    close: Optional[Callable[[Any], Awaitable[Any]]] = None  # 默认调用对象的 close()
+
+
+class StartupGraph:
+    """
+    启动组件依赖图
+    start() 并行初始化所有非延迟组件, 每个组件在其依赖完成后立即开始; 同一组件只初始化一次,
+    并发的首次使用共享同一次初始化. stop() 按初始化完成顺序的逆序关闭
+    """
+
+    def __init__(self, profiler: Optional[StartupProfiler] = None):
+        self.profiler = profiler or StartupProfiler()
+        self._components: Dict[str, Component] = {}
+        self._instances: Dict[str, Any] = {}
+        self._ready: Dict[str, asyncio.Future] = {}
+        self._started: List[str] = []
+
+    def add(
+        self,
+        name: str,
+        target: Any,
+        depends_on: Iterable[str] = (),
+        lazy: bool = False,
+        init: Optional[Callable[[Any], Awaitable[Any]]] = None,
+        close: Optional[Callable[[Any], Awaitable[Any]]] = None,
+    ) -> Component:
+        """
+        注册组件
+        :param name: 组件名称
+        :param target: 组件对象或 "module:attr" 路径
+        :param depends_on: 依赖的组件名称
+        :param lazy: 是否延迟到首次使用时初始化
+        :param init: 自定义初始化函数, 参数为组件对象
+        :param close: 自定义关闭函数, 参数为组件对象
+        :return: 组件
+        """
+        if name in self._components:
+            raise StartupError(f"Component {name} already registered")
+        component = Component(name, target, tuple(depends_on), lazy, init, close)
+        self._components[name] = component
+        return component
+
+    def _check(self) -> None:
+        """检查依赖是否存在以及是否有环"""
+        state: Dict[str, int] = {}  # 1: 访问中, 2: 已完成
+
+        def visit(name: str, path: Tuple[str, ...]) -> None:
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                raise StartupError(f"Circular component dependency: {' -> '.join(path + (name,))}")
+            state[name] = 1
+            for dependency in self._components[name].depends_on:
+                if dependency not in self._components:
+                    raise StartupError(f"Component {name} depends on unknown component {dependency}")
+                visit(dependency, path + (name,))
+            state[name] = 2
+
+        for name in self._components:
+            visit(name, ())
+
+    async def start(self) -> None:
+        """初始化所有非延迟组件(及其依赖), 任一组件失败时关闭已初始化的组件并抛出异常"""
+        self._check()
+        eager = [name for name, component in self._components.items() if not component.lazy]
+        results = await asyncio.gather(*(self.ensure(name) for name in eager), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            await self.stop()
+            raise errors[0]
+
+    async def ensure(self, name: str) -> Any:
+        """获取已初始化的组件, 未初始化时先初始化其依赖和组件本身"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        future = self._ready.get(name)
+        if future is None:
+            if name not in self._components:
+                raise StartupError(f"Unknown component {name}")
+            future = self._ready[name] = asyncio.ensure_future(self._initialize(self._components[name]))
+        return await asyncio.shield(future)
+
+    async def _initialize(self, component: Component) -> Any:
+        try:
+            if component.depends_on:
+                await asyncio.gather(*(self.ensure(dependency) for dependency in component.depends_on))
+            instance = component.target
+            if isinstance(instance, str):
+                instance = self.profiler.import_object(instance, component.name)
+            with self.profiler.measure(component.name, "init"):
+                if component.init is not None:
+                    await component.init(instance)
+                elif hasattr(instance, "init"):
+                    await instance.init()
+        except BaseException:
+            # 初始化失败, 下一次使用时重试
+            self._ready.pop(component.name, None)
+            raise
+        self._instances[component.name] = instance
+        self._started.append(component.name)
+        return instance
+
+    def preload(self, *names: str) -> List[asyncio.Future]:
+        """
+        在后台初始化延迟组件, 不阻塞启动; 失败只记录日志, 下一次 ensure() 时重试
+        :param names: 组件名称
+        :return: 后台初始化任务
+        """
+        tasks = []
+        for name in names:
+            task = asyncio.ensure_future(self.ensure(name))
+            task.add_done_callback(lambda task, name=name: self._preloaded(name, task))
+            tasks.append(task)
+        return tasks
+
+    @staticmethod
+    def _preloaded(name: str, task: asyncio.Future) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Failed to preload component {name}: {task.exception()}")
+
+    def get(self, name: str) -> Any:
+        """获取已初始化的组件, 未初始化时返回 None"""
+        return self._instances.get(name)
+
+    def is_started(self, name: str) -> bool:
+        return name in self._instances
+
+    def dependency(self, name: str) -> Callable[[], Awaitable[Any]]:
+        """
+        返回可用于 FastAPI Depends 的函数, 首次请求时初始化延迟组件
+        :param name: 组件名称
+        """
+
+        async def provide() -> Any:
+            return await self.ensure(name)
+
+        return provide
+
+    async def stop(self) -> None:
+        """按初始化完成顺序的逆序关闭组件, 单个组件关闭失败不影响其他组件, 最后抛出第一个异常"""
+        pending = [future for future in self._ready.values() if not future.done()]
+        for future in pending:
+            future.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        first_error: Optional[BaseException] = None
+        for name in reversed(self._started):
+            component = self._components[name]
+            instance = self._instances[name]
+            try:
+                with self.profiler.measure(name, "close"):
+                    if component.close is not None:
+                        await component.close(instance)
+                    elif hasattr(instance, "close"):
+                        await instance.close()
+            except Exception as e:
+                logger.error(f"Failed to close component {name}: {e}")
+                first_error = first_error or e
+        self._started.clear()
+        self._instances.clear()
+        self._ready.clear()
+        if first_error is not None:
+            raise first_error
+
+
+__all__ = [
+    "Component",
+    "StartupError",
+    "StartupGraph",
+    "StartupProfiler",
+    "Timing",
+]
@@ -0,0 +1,181 @@
+"""
+定时器队列
+基于最小堆的共享定时器: 按到期时间排序, 单个协程休眠到最近的到期时间再唤醒
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 到期回调, 参数为定时器键
+TimerCallback = Callable[[str], None]
+
+
+class TimerQueue:
+    """
+    最小堆定时器队列
+    - schedule/cancel 为 O(log n), 取消采用惰性删除
+    - 到期回调在事件循环中同步调用, 耗时操作应在回调中自行创建任务
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        """
+        :param clock: 时钟函数, 返回秒级时间戳
+        """
+        self._clock = clock
+        self._heap: List[Tuple[float, int, str]] = []
+        # 当前有效的定时器 {键: (到期时间, 序号, 回调)}
+        self._timers: Dict[str, Tuple[float, int, TimerCallback]] = {}
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # 共享同一定时器队列的使用者数量, 最后一个使用者停止时才停止休眠协程
+        self._users = 0
+        self.fired = 0
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._timers
+
+    def schedule(self, key: str, deadline: float, callback: TimerCallback) -> None:
+        """
+        添加或替换定时器
+        :param key: 定时器键
+        :param deadline: 到期时间戳(秒)
+        :param callback: 到期回调
+        """
+        seq = next(self._seq)
+        self._timers[key] = (deadline, seq, callback)
+        heapq.heappush(self._heap, (deadline, seq, key))
+
+        # 新定时器早于当前最近到期时间时唤醒休眠协程
+        if self._wakeup is not None and self._heap[0][1] == seq:
+            self._wakeup.set()
+
+        self._maybe_compact()
+
+    def cancel(self, key: str) -> bool:
+        """
+        取消定时器
+        :param key: 定时器键
+        :return: 定时器是否存在
+        """
+        return self._timers.pop(key, None) is not None
+
+    def next_deadline(self) -> Optional[float]:
+        """获取最近的到期时间"""
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: Optional[float] = None) -> List[Tuple[str, TimerCallback]]:
+        """
+        弹出所有已到期的定时器
+        :param now: 当前时间戳
+        :return: [(键, 回调)]
+        """
+        now = self._clock() if now is None else now
+        due = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _, seq, key = heapq.heappop(heap)
+            entry = self._timers.get(key)
+            if entry is None or entry[1] != seq:
+                continue
+            del self._timers[key]
+            due.append((key, entry[2]))
+        return due
+
+    def fire_due(self, now: Optional[float] = None) -> int:
+        """
+        执行所有已到期定时器的回调
+        :return: 执行的回调数量
+        """
+        due = self.pop_due(now)
+        for key, callback in due:
+            try:
+                callback(key)
+            except Exception as e:
+                logger.error(f"Timer callback error for {key}: {e}")
+        self.fired += len(due)
+        return len(due)
+
+    def _discard_stale(self) -> None:
+        """丢弃堆顶已取消或已替换的条目"""
+        heap = self._heap
+        while heap:
+            _, seq, key = heap[0]
+            entry = self._timers.get(key)
+            if entry is not None and entry[1] == seq:
+                return
+            heapq.heappop(heap)
+
+    def _maybe_compact(self) -> None:
+        """失效条目过多时重建堆"""
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._timers):
+            self._heap = [(deadline, seq, key) for key, (deadline, seq, _) in self._timers.items()]
+            heapq.heapify(self._heap)
+
+    async def start(self) -> None:
+        """启动休眠协程, 每个使用者调用一次, 与 stop 成对使用"""
+        self._users += 1
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止休眠协程, 仍有其他使用者时保持运行"""
+        self._users = max(self._users - 1, 0)
+        if self._users > 0 or self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._wakeup = None
+
+    def clear(self, prefix: Optional[str] = None) -> None:
+        """
+        清除定时器
+        :param prefix: 只清除以该前缀开头的定时器, 共享队列的使用者只清除自己的定时器
+        """
+        if prefix is None:
+            self._heap.clear()
+            self._timers.clear()
+            return
+        for key in [key for key in self._timers if key.startswith(prefix)]:
+            del self._timers[key]
+        self._maybe_compact()
+
+    async def _run(self) -> None:
+        """休眠协程: 只在最近的到期时间或有更早的定时器加入时唤醒"""
+        while True:
+            self.fire_due()
+            self._wakeup.clear()
+            deadline = self.next_deadline()
+            timeout = None if deadline is None else max(0.0, deadline - self._clock())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def get_stats(self) -> Dict[str, float]:
+        """获取定时器统计信息"""
+        return {
+            "timers": len(self._timers),
+            "heap_size": len(self._heap),
+            "fired": self.fired,
+            "next_deadline": self.next_deadline(),
+        }
+
+
+# 进程内共享的定时器队列, 默认的任务队列和调度器共用
+timer_queue = TimerQueue()
+
+__all__ = ["TimerQueue", "TimerCallback", "timer_queue"]
@@ -1,12 +1,17 @@
 """
 WebSocket管理器
 实现WebSocket连接管理和消息广播
+
+广播时消息只序列化一次, 由每个连接各自的有界发送队列和写协程异步发送,
+慢消费者按策略丢弃消息或断开, 房间按哈希分片加锁。
+跨进程/节点的房间广播通过 core.strong.websocket_relay.RedisRelay 转发。
 """
 
 import asyncio
 import json
 import logging
-from typing import Any, Dict, List, Optional, Set, Union
+from enum import Enum
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Union
 
 from fastapi import WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
@@ -25,24 +30,113 @@ class WebSocketMessage(BaseModel):
     sender: Optional[str] = None
 
 
+class SlowConsumerPolicy(Enum):
+    """发送队列已满时的慢消费者策略"""
+
+    DROP_NEWEST = "drop_newest"  # 丢弃新消息
+    DROP_OLDEST = "drop_oldest"  # 丢弃队列中最旧的消息
+    DISCONNECT = "disconnect"  # 断开连接
+
+
+def serialize_message(message: Union[dict, WebSocketMessage]) -> str:
+    """将消息序列化为JSON文本, 广播时只调用一次"""
+    if isinstance(message, WebSocketMessage):
+        return message.model_dump_json()
+    return json.dumps(message, ensure_ascii=False, default=str)
+
+
 class WebSocketConnection:
     """WebSocket连接"""
 
-    def __init__(self, websocket: WebSocket, client_id: str):
+    def __init__(
+        self,
+        websocket: WebSocket,
+        client_id: str,
+        max_queue_size: int = 256,
+        policy: SlowConsumerPolicy = SlowConsumerPolicy.DROP_OLDEST,
+        send_timeout: float = 10.0,
+    ):
         self.websocket = websocket
         self.client_id = client_id
         self.rooms: Set[str] = set()
         self.user_data: Dict[str, Any] = {}
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.sent = 0
+        self.dropped = 0
+        self.closed = False
+        self._outbox: asyncio.Queue[str] = asyncio.Queue(maxsize=max_queue_size)
+        self._writer: Optional[asyncio.Task] = None
+        self._on_error: Optional[Callable[[str], Any]] = None
+
+    def start_writer(self, on_error: Optional[Callable[[str], Any]] = None) -> None:
+        """
+        启动写协程
+        :param on_error: 发送失败时的回调, 参数为客户端ID
+        """
+        if self._writer is None:
+            self._on_error = on_error
+            self._writer = asyncio.create_task(self._write_loop())
+
+    async def close(self) -> None:
+        """停止写协程"""
+        self.closed = True
+        if self._writer is not None:
+            writer, self._writer = self._writer, None
+            if writer is not asyncio.current_task():
+                writer.cancel()
+                await asyncio.gather(writer, return_exceptions=True)
+
+    def enqueue(self, payload: str) -> bool:
+        """
+        将已序列化的消息放入发送队列, 不等待
+        :param payload: JSON文本
+        :return: False 表示按策略应断开该连接
+        """
+        if self.closed:
+            return True
+        try:
+            self._outbox.put_nowait(payload)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.policy == SlowConsumerPolicy.DISCONNECT:
+                return False
+            if self.policy == SlowConsumerPolicy.DROP_OLDEST:
+                self._outbox.get_nowait()
+                self._outbox.put_nowait(payload)
+            return True
+
+    async def _write_loop(self) -> None:
+        """写协程: 依次发送队列中的消息"""
+        while True:
+            payload = await self._outbox.get()
+            try:
+                await asyncio.wait_for(self.websocket.send_text(payload), self.send_timeout)
+                self.sent += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error sending message to client {self.client_id}: {e}")
+                self.closed = True
+                if self._on_error:
+                    self._on_error(self.client_id)
+                return
 
     async def send_json(self, message: Union[dict, WebSocketMessage]) -> None:
         """发送JSON消息"""
-        if isinstance(message, WebSocketMessage):
-            message = message.dict()
-        await self.websocket.send_json(message)
+        await self.send_text(serialize_message(message))
 
     async def send_text(self, message: str) -> None:
-        """发送文本消息"""
-        await self.websocket.send_text(message)
+        """发送文本消息, 写协程启动后经由发送队列以保证顺序"""
+        if self._writer is None:
+            await self.websocket.send_text(message)
+        else:
+            self.enqueue(message)
+
+    @property
+    def queue_size(self) -> int:
+        return self._outbox.qsize()
 
     def join_room(self, room: str) -> None:
         """加入房间"""
@@ -57,13 +151,52 @@ class WebSocketConnection:
         return room in self.rooms
 
 
+class _RoomShard:
+    """房间分片"""
+
+    __slots__ = ("lock", "rooms")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.rooms: Dict[str, Set[str]] = {}
+
+
 class WebSocketManager:
     """WebSocket管理器"""
 
-    def __init__(self):
+    def __init__(
+        self,
+        shards: int = 16,
+        max_queue_size: int = 256,
+        policy: SlowConsumerPolicy = SlowConsumerPolicy.DROP_OLDEST,
+        send_timeout: float = 10.0,
+    ):
         self._connections: Dict[str, WebSocketConnection] = {}
-        self._rooms: Dict[str, Set[str]] = {}
+        self._shards: List[_RoomShard] = [_RoomShard() for _ in range(max(1, shards))]
         self._lock = asyncio.Lock()
+        self._max_queue_size = max_queue_size
+        self._policy = policy
+        self._send_timeout = send_timeout
+        self._relay = None
+        self._evicted = 0
+
+    def _shard(self, room: str) -> _RoomShard:
+        return self._shards[hash(room) % len(self._shards)]
+
+    @property
+    def _rooms(self) -> Dict[str, Set[str]]:
+        """所有房间的合并视图(只读)"""
+        rooms: Dict[str, Set[str]] = {}
+        for shard in self._shards:
+            rooms.update(shard.rooms)
+        return rooms
+
+    def set_relay(self, relay) -> None:
+        """
+        设置跨节点广播中继
+        :param relay: 实现 publish(payload, room, exclude) 的中继对象
+        """
+        self._relay = relay
 
     async def connect(self, websocket: WebSocket, client_id: str) -> WebSocketConnection:
         """
@@ -74,14 +207,24 @@ class WebSocketManager:
         """
         await websocket.accept()
 
+        connection = WebSocketConnection(
+            websocket,
+            client_id,
+            max_queue_size=self._max_queue_size,
+            policy=self._policy,
+            send_timeout=self._send_timeout,
+        )
         async with self._lock:
-            connection = WebSocketConnection(websocket, client_id)
+            previous = self._connections.get(client_id)
             self._connections[client_id] = connection
+        if previous is not None:
+            await previous.close()
+        connection.start_writer(on_error=self._schedule_disconnect)
 
-            # 发布连接事件
-            await event_bus.publish(Event("websocket_connected", {"client_id": client_id}))
+        # 发布连接事件
+        await event_bus.publish(Event("websocket_connected", {"client_id": client_id}), wait=False)
 
-            return connection
+        return connection
 
     async def disconnect(self, client_id: str) -> None:
         """
@@ -89,31 +232,35 @@ class WebSocketManager:
         :param client_id: 客户端ID
         """
         async with self._lock:
-            if client_id in self._connections:
-                connection = self._connections[client_id]
+            connection = self._connections.pop(client_id, None)
+        if connection is None:
+            return
+
+        # 离开所有房间
+        for room in list(connection.rooms):
+            await self._remove_from_room(client_id, room, connection)
 
-                # 离开所有房间
-                rooms = list(connection.rooms)
-                for room in rooms:
-                    await self.leave_room(client_id, room)
+        await connection.close()
 
-                # 删除连接
-                del self._connections[client_id]
+        # 发布断开连接事件
+        await event_bus.publish(Event("websocket_disconnected", {"client_id": client_id}), wait=False)
 
-                # 发布断开连接事件
-                await event_bus.publish(Event("websocket_disconnected", {"client_id": client_id}))
+    def _schedule_disconnect(self, client_id: str) -> None:
+        """在后台断开连接(用于写协程和广播路径, 避免在其中等待)"""
+        asyncio.create_task(self.disconnect(client_id))
 
     async def broadcast(
         self,
         message: Union[dict, WebSocketMessage],
         room: Optional[str] = None,
         exclude: Optional[Union[str, List[str]]] = None,
-    ) -> None:
+    ) -> int:
         """
-        广播消息
+        广播消息, 本节点投递后再经中继转发到其他节点
         :param message: 消息内容
         :param room: 目标房间
         :param exclude: 排除的客户端ID
+        :return: 本节点投递的连接数
         """
         if isinstance(exclude, str):
             exclude = [exclude]
@@ -122,18 +269,47 @@ class WebSocketManager:
         if isinstance(message, dict):
             message = WebSocketMessage(**message)
 
-        async with self._lock:
-            if room:
-                # 向指定房间广播
-                if room in self._rooms:
-                    for client_id in self._rooms[room]:
-                        if client_id not in exclude:
-                            await self._send_to_client(client_id, message)
+        payload = serialize_message(message)
+        delivered = self.deliver(payload, room, exclude)
+
+        if self._relay is not None:
+            try:
+                await self._relay.publish(payload, room, exclude)
+            except Exception as e:
+                logger.error(f"Error relaying websocket broadcast: {e}")
+
+        return delivered
+
+    def deliver(self, payload: str, room: Optional[str] = None, exclude: Iterable[str] = ()) -> int:
+        """
+        将已序列化的消息投递到本节点的连接, 不等待发送完成
+        :param payload: JSON文本
+        :param room: 目标房间
+        :param exclude: 排除的客户端ID
+        :return: 投递的连接数
+        """
+        if room:
+            # 快照房间成员, 期间没有 await, 不需要持有分片锁
+            members = tuple(self._shard(room).rooms.get(room, ()))
+        else:
+            members = tuple(self._connections)
+
+        excluded = set(exclude) if exclude else None
+        connections = self._connections
+        delivered = 0
+        for client_id in members:
+            if excluded and client_id in excluded:
+                continue
+            connection = connections.get(client_id)
+            if connection is None:
+                continue
+            if connection.enqueue(payload):
+                delivered += 1
             else:
-                # 向所有客户端广播
-                for client_id in self._connections:
-                    if client_id not in exclude:
-                        await self._send_to_client(client_id, message)
+                self._evicted += 1
+                logger.warning(f"Disconnecting slow websocket client {client_id}")
+                self._schedule_disconnect(client_id)
+        return delivered
 
     async def _send_to_client(self, client_id: str, message: WebSocketMessage) -> None:
         """
@@ -141,12 +317,9 @@ class WebSocketManager:
         :param client_id: 客户端ID
         :param message: 消息内容
         """
-        if client_id in self._connections:
-            try:
-                await self._connections[client_id].send_json(message)
-            except Exception as e:
-                logger.error(f"Error sending message to client {client_id}: {e}")
-                await self.disconnect(client_id)
+        connection = self._connections.get(client_id)
+        if connection is not None:
+            await connection.send_json(message)
 
     async def join_room(self, client_id: str, room: str) -> None:
         """
@@ -154,24 +327,26 @@ class WebSocketManager:
         :param client_id: 客户端ID
         :param room: 房间名称
         """
-        async with self._lock:
-            if client_id in self._connections:
-                if room not in self._rooms:
-                    self._rooms[room] = set()
-
-                self._rooms[room].add(client_id)
-                self._connections[client_id].join_room(room)
-
-                # 发布加入房间事件
-                await event_bus.publish(
-                    Event(
-                        "websocket_room_joined",
-                        {
-                            "client_id": client_id,
-                            "room": room,
-                        },
-                    )
-                )
+        connection = self._connections.get(client_id)
+        if connection is None:
+            return
+
+        shard = self._shard(room)
+        async with shard.lock:
+            shard.rooms.setdefault(room, set()).add(client_id)
+            connection.join_room(room)
+
+        # 发布加入房间事件
+        await event_bus.publish(
+            Event(
+                "websocket_room_joined",
+                {
+                    "client_id": client_id,
+                    "room": room,
+                },
+            ),
+            wait=False,
+        )
 
     async def leave_room(self, client_id: str, room: str) -> None:
         """
@@ -179,27 +354,37 @@ class WebSocketManager:
         :param client_id: 客户端ID
         :param room: 房间名称
         """
-        async with self._lock:
-            if room in self._rooms and client_id in self._rooms[room]:
-                self._rooms[room].remove(client_id)
-
-                # 如果房间为空，删除房间
-                if not self._rooms[room]:
-                    del self._rooms[room]
-
-                if client_id in self._connections:
-                    self._connections[client_id].leave_room(room)
-
-                # 发布离开房间事件
-                await event_bus.publish(
-                    Event(
-                        "websocket_room_left",
-                        {
-                            "client_id": client_id,
-                            "room": room,
-                        },
-                    )
-                )
+        await self._remove_from_room(client_id, room, self._connections.get(client_id))
+
+    async def _remove_from_room(
+        self, client_id: str, room: str, connection: Optional[WebSocketConnection]
+    ) -> None:
+        """从房间中移除客户端"""
+        shard = self._shard(room)
+        async with shard.lock:
+            members = shard.rooms.get(room)
+            if not members or client_id not in members:
+                return
+            members.discard(client_id)
+
+            # 如果房间为空，删除房间
+            if not members:
+                del shard.rooms[room]
+
+            if connection is not None:
+                connection.leave_room(room)
+
+        # 发布离开房间事件
+        await event_bus.publish(
+            Event(
+                "websocket_room_left",
+                {
+                    "client_id": client_id,
+                    "room": room,
+                },
+            ),
+            wait=False,
+        )
 
     def get_connection(self, client_id: str) -> Optional[WebSocketConnection]:
         """获取连接对象"""
@@ -211,13 +396,24 @@ class WebSocketManager:
 
     def get_room_connections(self, room: str) -> List[WebSocketConnection]:
         """获取房间内的所有连接"""
-        if room not in self._rooms:
-            return []
-        return [conn for conn in self._connections.values() if conn.client_id in self._rooms[room]]
+        members = self._shard(room).rooms.get(room, ())
+        return [self._connections[cid] for cid in members if cid in self._connections]
 
     def get_rooms(self) -> List[str]:
         """获取所有房间"""
-        return list(self._rooms.keys())
+        return [room for shard in self._shards for room in shard.rooms]
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取广播统计信息"""
+        connections = list(self._connections.values())
+        return {
+            "connections": len(connections),
+            "rooms": sum(len(shard.rooms) for shard in self._shards),
+            "queued": sum(conn.queue_size for conn in connections),
+            "sent": sum(conn.sent for conn in connections),
+            "dropped": sum(conn.dropped for conn in connections),
+            "evicted": self._evicted,
+        }
 
     async def handle_connection(self, websocket: WebSocket, client_id: str) -> None:
         """
@@ -240,7 +436,7 @@ class WebSocketManager:
                     )
 
                     # 发布消息接收事件
-                    await event_bus.publish(Event("websocket_message_received", message))
+                    await event_bus.publish(Event("websocket_message_received", message), wait=False)
 
                     # 处理房间消息
                     if message.room:
@@ -266,4 +462,6 @@ __all__ = [
     "WebSocketManager",
     "WebSocketConnection",
     "WebSocketMessage",
+    "SlowConsumerPolicy",
+    "serialize_message",
 ]
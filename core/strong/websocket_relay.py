@@ -0,0 +1,97 @@
+"""
+WebSocket广播中继
+通过 Redis pub/sub 在多个进程/节点之间转发房间广播
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from typing import Iterable, List, Optional
+
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+
+class RedisRelay:
+    """基于 Redis pub/sub 的广播中继"""
+
+    def __init__(
+        self,
+        redis: Redis,
+        manager,
+        channel: str = "websocket:broadcast",
+        node_id: Optional[str] = None,
+    ):
+        """
+        :param redis: Redis 异步客户端
+        :param manager: 本节点的 WebSocketManager
+        :param channel: pub/sub 频道
+        :param node_id: 节点ID, 用于忽略本节点发出的消息
+        """
+        self.redis = redis
+        self.manager = manager
+        self.channel = channel
+        self.node_id = node_id or uuid.uuid4().hex
+        self.published = 0
+        self.received = 0
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """订阅频道并启动监听协程"""
+        if self._listener is not None:
+            return
+        self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(self.channel)
+        self._listener = asyncio.create_task(self._listen())
+        self.manager.set_relay(self)
+
+    async def stop(self) -> None:
+        """停止监听并取消订阅"""
+        self.manager.set_relay(None)
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.unsubscribe(self.channel)
+            await self._pubsub.reset()
+            self._pubsub = None
+
+    async def publish(self, payload: str, room: Optional[str] = None, exclude: Iterable[str] = ()) -> None:
+        """
+        将已序列化的消息发布到其他节点
+        :param payload: JSON文本
+        :param room: 目标房间
+        :param exclude: 排除的客户端ID
+        """
+        envelope = json.dumps(
+            {"node": self.node_id, "room": room, "exclude": list(exclude), "payload": payload},
+            ensure_ascii=False,
+        )
+        await self.redis.publish(self.channel, envelope)
+        self.published += 1
+
+    async def _listen(self) -> None:
+        """监听协程: 把其他节点的广播投递到本节点连接"""
+        while True:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+                if message is None or message.get("type") != "message":
+                    continue
+                envelope = json.loads(message["data"])
+                if envelope.get("node") == self.node_id:
+                    continue
+                exclude: List[str] = envelope.get("exclude") or []
+                self.manager.deliver(envelope["payload"], envelope.get("room"), exclude)
+                self.received += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Websocket relay error: {e}")
+                await asyncio.sleep(0.1)
+
+
+__all__ = ["RedisRelay"]
@@ -0,0 +1,113 @@
+"""
+任务执行器
+为任务队列提供可替换的执行方式: 事件循环内执行、线程池执行和进程池执行
+"""
+
+import asyncio
+import functools
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class TaskExecutor:
+    """任务执行器基类"""
+
+    name = "base"
+
+    async def run(self, func: Callable, args: tuple, kwargs: Dict[str, Any]) -> Any:
+        """
+        执行任务函数
+        :param func: 任务函数
+        :param args: 位置参数
+        :param kwargs: 关键字参数
+        :return: 执行结果
+        """
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        """释放执行器资源"""
+
+
+class InlineExecutor(TaskExecutor):
+    """在事件循环中直接执行(协程函数或轻量同步函数)"""
+
+    name = "inline"
+
+    async def run(self, func: Callable, args: tuple, kwargs: Dict[str, Any]) -> Any:
+        if asyncio.iscoroutinefunction(func):
+            return await func(*args, **kwargs)
+        return func(*args, **kwargs)
+
+
+class PoolExecutor(TaskExecutor):
+    """基于 concurrent.futures 执行器的同步函数执行"""
+
+    name = "pool"
+
+    def __init__(self, executor: Executor):
+        self._executor = executor
+
+    async def run(self, func: Callable, args: tuple, kwargs: Dict[str, Any]) -> Any:
+        if asyncio.iscoroutinefunction(func):
+            raise TypeError(f"Coroutine function {func.__name__} cannot run in {self.name} executor")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ThreadExecutor(PoolExecutor):
+    """线程池执行, 适用于阻塞IO的同步函数"""
+
+    name = "thread"
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self._max_workers = max_workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def _executor(self) -> ThreadPoolExecutor:
+        # 首次使用时再创建线程池, 关闭后再次使用时重新创建
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="task-queue")
+        return self._pool
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+class ProcessExecutor(PoolExecutor):
+    """
+    进程池执行, 适用于CPU密集型任务
+    任务函数必须是模块级函数, 参数和返回值必须可以被 pickle 序列化
+    """
+
+    name = "process"
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self._max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def _executor(self) -> ProcessPoolExecutor:
+        # 首次使用时再创建进程池, 避免无CPU任务时启动子进程
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self._max_workers)
+        return self._pool
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+__all__ = [
+    "TaskExecutor",
+    "InlineExecutor",
+    "PoolExecutor",
+    "ThreadExecutor",
+    "ProcessExecutor",
+]
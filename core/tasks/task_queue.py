@@ -1,20 +1,37 @@
 """
 任务队列管理器
 实现异步任务的调度和执行
+
+- 按 queue 名称划分通道, 每个通道独立的并发上限和优先级队列
+- 失败任务按指数退避(带抖动)经定时器重试, 超过重试次数进入死信队列
+- cpu_bound 任务在进程池中执行, 参数和返回值需可 pickle
 """
 
 import asyncio
+import itertools
 import logging
+import random
 import time
+from collections import deque
 from dataclasses import dataclass
 from datetime import datetime
-from enum import Enum
-from typing import Any, Callable, Dict, List, Optional, Union
+from enum import Enum, IntEnum
+from typing import Any, Callable, Deque, Dict, List, Optional, Union
 
 from core.strong.event_bus import Event, event_bus
+from core.strong.timer import TimerQueue, timer_queue
+from core.tasks.executor import InlineExecutor, ProcessExecutor, TaskExecutor, ThreadExecutor
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_QUEUE = "default"
+# 定时器键前缀, 与共享同一定时器队列的其他使用者区分
+TASK_TIMER_PREFIX = "task:"
+EVICT_TIMER_PREFIX = "evict:"
+
+# 事件循环内执行器(无状态, 全局共享)
+_inline_executor = InlineExecutor()
+
 
 class TaskStatus(Enum):
     """任务状态"""
@@ -46,6 +63,52 @@ class TaskResult:
         return None
 
 
+class TaskPriority(IntEnum):
+    """任务优先级, 数值越小越先执行"""
+
+    HIGH = 0
+    NORMAL = 5
+    LOW = 9
+
+
+@dataclass
+class QueueStats:
+    """任务通道统计"""
+
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    retried: int = 0
+    dead_lettered: int = 0
+    wait_time_total: float = 0.0
+    wait_time_max: float = 0.0
+    run_time_total: float = 0.0
+    run_time_max: float = 0.0
+
+    def record(self, wait_time: float, run_time: float) -> None:
+        """记录一次执行的等待和运行耗时"""
+        self.wait_time_total += wait_time
+        self.run_time_total += run_time
+        if wait_time > self.wait_time_max:
+            self.wait_time_max = wait_time
+        if run_time > self.run_time_max:
+            self.run_time_max = run_time
+
+    def to_dict(self) -> Dict[str, float]:
+        executed = self.completed + self.failed + self.retried
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "dead_lettered": self.dead_lettered,
+            "avg_wait_time": self.wait_time_total / executed if executed else 0.0,
+            "max_wait_time": self.wait_time_max,
+            "avg_run_time": self.run_time_total / executed if executed else 0.0,
+            "max_run_time": self.run_time_max,
+        }
+
+
 class Task:
     """异步任务"""
 
@@ -59,36 +122,88 @@ class Task:
         retry_delay: float = 1.0,
         timeout: Optional[float] = None,
         schedule_time: Optional[Union[datetime, float]] = None,
+        priority: int = TaskPriority.NORMAL,
+        queue: str = DEFAULT_QUEUE,
+        cpu_bound: bool = False,
+        executor: Optional[str] = None,
+        retry_backoff: float = 2.0,
+        retry_max_delay: float = 300.0,
+        retry_jitter: bool = True,
     ):
+        """
+        :param task_id: 任务ID
+        :param func: 任务函数
+        :param args: 位置参数
+        :param kwargs: 关键字参数
+        :param retry_times: 最大重试次数
+        :param retry_delay: 首次重试延迟(秒)
+        :param timeout: 超时时间(秒)
+        :param schedule_time: 调度时间
+        :param priority: 优先级, 数值越小越先执行
+        :param queue: 所属通道
+        :param cpu_bound: 是否为CPU密集型任务(在进程池中执行)
+        :param executor: 执行器名称, 默认按 cpu_bound 选择
+        :param retry_backoff: 重试延迟的指数退避倍数
+        :param retry_max_delay: 重试延迟上限(秒)
+        :param retry_jitter: 重试延迟是否加入随机抖动
+        """
         self.task_id = task_id
         self.func = func
         self.args = args
         self.kwargs = kwargs or {}
         self.retry_times = retry_times
         self.retry_delay = retry_delay
+        self.retry_backoff = retry_backoff
+        self.retry_max_delay = retry_max_delay
+        self.retry_jitter = retry_jitter
         self.timeout = timeout
         self.schedule_time = schedule_time
+        self.priority = priority
+        self.queue = queue
+        self.cpu_bound = cpu_bound
+        self.executor = executor or ("process" if cpu_bound else "inline")
         self.status = TaskStatus.SCHEDULED if schedule_time else TaskStatus.PENDING
         self.result: Optional[TaskResult] = None
+        self.attempts = 0
+        self.enqueued_at: Optional[float] = None
         self._current_retry = 0
         self._future: Optional[asyncio.Future] = None
 
-    async def execute(self) -> TaskResult:
-        """执行任务"""
+    def next_retry_delay(self) -> float:
+        """计算下一次重试的延迟(指数退避, 可选抖动)"""
+        retry = max(1, self._current_retry)
+        delay = min(self.retry_max_delay, self.retry_delay * (self.retry_backoff ** (retry - 1)))
+        if self.retry_jitter:
+            delay = delay / 2 + random.uniform(0, delay / 2)
+        return delay
+
+    @property
+    def can_retry(self) -> bool:
+        """是否还可以重试"""
+        return self._current_retry <= self.retry_times
+
+    async def execute(self, executor: Optional[TaskExecutor] = None, retry: bool = True) -> TaskResult:
+        """
+        执行任务
+        :param executor: 执行器, 默认在事件循环中执行
+        :param retry: 是否在本次调用内重试; 由任务队列驱动时为 False, 重试交给定时器
+        """
         if self.status == TaskStatus.CANCELLED:
             return self._create_result(TaskStatus.CANCELLED)
 
         self.status = TaskStatus.RUNNING
+        self.attempts += 1
         start_time = time.time()
+        executor = executor or _inline_executor
 
         try:
             if self.timeout:
                 result = await asyncio.wait_for(
-                    self._execute_with_retry(),
+                    self._execute_with_retry(executor, retry),
                     timeout=self.timeout,
                 )
             else:
-                result = await self._execute_with_retry()
+                result = await self._execute_with_retry(executor, retry)
 
             self.status = TaskStatus.COMPLETED
             return self._create_result(
@@ -100,6 +215,8 @@ class Task:
 
         except asyncio.TimeoutError as e:
             self.status = TaskStatus.FAILED
+            if not retry:
+                self._current_retry += 1
             return self._create_result(
                 TaskStatus.FAILED,
                 error=e,
@@ -115,22 +232,20 @@ class Task:
                 end_time=time.time(),
             )
 
-    async def _execute_with_retry(self) -> Any:
+    async def _execute_with_retry(self, executor: TaskExecutor, retry: bool = True) -> Any:
         """执行任务(带重试)"""
         while True:
             try:
-                if asyncio.iscoroutinefunction(self.func):
-                    return await self.func(*self.args, **self.kwargs)
-                return self.func(*self.args, **self.kwargs)
+                return await executor.run(self.func, self.args, self.kwargs)
             except Exception as e:
                 self._current_retry += 1
-                if self._current_retry > self.retry_times:
+                if not retry or self._current_retry > self.retry_times:
                     raise
 
                 logger.warning(
                     f"Task {self.task_id} failed, retrying {self._current_retry}/{self.retry_times}: {str(e)}"
                 )
-                await asyncio.sleep(self.retry_delay)
+                await asyncio.sleep(self.next_retry_delay())
 
     def _create_result(
         self,
@@ -159,15 +274,61 @@ class Task:
                 self._future.cancel()
 
 
+class _Lane:
+    """任务通道: 优先级队列 + 固定数量的工作者"""
+
+    def __init__(self, name: str, concurrency: int):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self.workers: List[asyncio.Task] = []
+        self.stats = QueueStats()
+
+
 class TaskQueue:
     """任务队列管理器"""
 
-    def __init__(self, max_workers: int = 10):
+    def __init__(
+        self,
+        max_workers: int = 10,
+        max_retained: int = 10000,
+        retention_seconds: float = 3600,
+        timer: Optional[TimerQueue] = None,
+        queues: Optional[Dict[str, int]] = None,
+        executors: Optional[Dict[str, TaskExecutor]] = None,
+        dead_letter_size: int = 1000,
+    ):
+        """
+        :param max_workers: 默认通道的工作者数量
+        :param max_retained: 最多保留的已结束任务数量
+        :param retention_seconds: 已结束任务的保留时长(秒)
+        :param timer: 定时器队列, 默认创建独立实例
+        :param queues: 其他通道及其并发上限 {通道名称: 工作者数量}
+        :param executors: 自定义执行器 {名称: 执行器}, 覆盖内置的 inline/thread/process; 停止队列时不会关闭这些执行器
+        :param dead_letter_size: 死信队列容量
+        """
         self.max_workers = max_workers
+        self.max_retained = max_retained
+        self.retention_seconds = retention_seconds
         self._tasks: Dict[str, Task] = {}
-        self._queue: asyncio.Queue[Task] = asyncio.Queue()
-        self._workers: List[asyncio.Task] = []
-        self._scheduler_task: Optional[asyncio.Task] = None
+        self._finished: deque = deque()
+        self._dead_letters: Deque[Task] = deque(maxlen=dead_letter_size)
+        self._lanes: Dict[str, _Lane] = {DEFAULT_QUEUE: _Lane(DEFAULT_QUEUE, max_workers)}
+        for name, concurrency in (queues or {}).items():
+            self._lanes[name] = _Lane(name, concurrency)
+        # 队列自己创建的执行器, 停止时关闭; 调用方传入的执行器可能被共享, 由调用方负责关闭
+        self._own_executors: Dict[str, TaskExecutor] = {
+            name: executor
+            for name, executor in (("thread", ThreadExecutor()), ("process", ProcessExecutor()))
+            if name not in (executors or {})
+        }
+        self._executors: Dict[str, TaskExecutor] = {
+            "inline": _inline_executor,
+            **self._own_executors,
+            **(executors or {}),
+        }
+        self._seq = itertools.count()
+        self._timer = timer if timer is not None else TimerQueue()
         self._running = False
 
     async def start(self) -> None:
@@ -176,11 +337,11 @@ class TaskQueue:
             return
 
         self._running = True
-        self._scheduler_task = asyncio.create_task(self._scheduler())
+        await self._timer.start()
 
-        for _ in range(self.max_workers):
-            worker = asyncio.create_task(self._worker())
-            self._workers.append(worker)
+        for lane in self._lanes.values():
+            for _ in range(lane.concurrency):
+                lane.workers.append(asyncio.create_task(self._worker(lane)))
 
     async def stop(self) -> None:
         """停止任务队列"""
@@ -189,27 +350,29 @@ class TaskQueue:
 
         self._running = False
 
-        # 取消调度器
-        if self._scheduler_task:
-            self._scheduler_task.cancel()
-            try:
-                await self._scheduler_task
-            except asyncio.CancelledError:
-                pass
+        # 停止定时器, 只清除本队列登记的定时器(定时器队列可能与调度器共享)
+        await self._timer.stop()
+        self._timer.clear(TASK_TIMER_PREFIX)
+        self._timer.clear(EVICT_TIMER_PREFIX)
 
         # 取消所有任务
         for task in self._tasks.values():
             task.cancel()
 
-        # 等待队列清空
-        await self._queue.join()
-
-        # 取消所有工作者
-        for worker in self._workers:
-            worker.cancel()
-
-        await asyncio.gather(*self._workers, return_exceptions=True)
-        self._workers.clear()
+        for lane in self._lanes.values():
+            # 先取消所有工作者, 再清空队列中剩余的任务; 不等待 join(), 已取消的任务不会再被取出
+            for worker in lane.workers:
+                worker.cancel()
+            await asyncio.gather(*lane.workers, return_exceptions=True)
+            lane.workers.clear()
+            while not lane.queue.empty():
+                _, _, task = lane.queue.get_nowait()
+                task.cancel()
+                lane.queue.task_done()
+
+        # 线程池和进程池在下次使用时重新创建, 停止后可以再次启动
+        for executor in self._own_executors.values():
+            executor.shutdown()
 
     async def submit(self, func: Callable, *args, task_id: Optional[str] = None, **kwargs) -> Task:
         """
@@ -220,16 +383,52 @@ class TaskQueue:
         :param kwargs: 关键字参数
         :return: 任务对象
         """
+        return await self.submit_task(func, args, kwargs, task_id=task_id)
+
+    async def submit_task(
+        self,
+        func: Callable,
+        args: tuple = (),
+        kwargs: Optional[dict] = None,
+        *,
+        task_id: Optional[str] = None,
+        schedule_time: Optional[Union[datetime, float]] = None,
+        **options,
+    ) -> Task:
+        """
+        提交任务(支持优先级、通道、CPU密集型和重试选项)
+        :param func: 任务函数
+        :param args: 位置参数
+        :param kwargs: 关键字参数
+        :param task_id: 任务ID
+        :param schedule_time: 调度时间, 为空时立即入队
+        :param options: Task 的其他参数, 如 priority/queue/cpu_bound/retry_times/timeout
+        :return: 任务对象
+        """
         if not self._running:
             raise RuntimeError("Task queue is not running")
 
+        queue = options.get("queue", DEFAULT_QUEUE)
+        if queue not in self._lanes:
+            raise ValueError(f"Unknown task queue: {queue}")
+
         task_id = task_id or str(id(func))
-        task = Task(task_id, func, args, kwargs)
-        self._tasks[task_id] = task
-        await self._queue.put(task)
+        task = Task(task_id, func, args, kwargs, schedule_time=schedule_time, **options)
+        if task.executor not in self._executors:
+            raise ValueError(f"Unknown task executor: {task.executor}")
 
-        # 发布任务提交事件
-        await event_bus.publish(Event("task_submitted", task))
+        self._tasks[task_id] = task
+        self._lanes[queue].stats.submitted += 1
+
+        if schedule_time is None:
+            self._enqueue(task)
+            # 发布任务提交事件
+            await event_bus.publish(Event("task_submitted", task), wait=False)
+        else:
+            deadline = schedule_time.timestamp() if isinstance(schedule_time, datetime) else float(schedule_time)
+            self._timer.schedule(f"{TASK_TIMER_PREFIX}{task_id}", deadline, self._on_task_due)
+            # 发布任务调度事件
+            await event_bus.publish(Event("task_scheduled", task), wait=False)
 
         return task
 
@@ -250,17 +449,7 @@ class TaskQueue:
         :param kwargs: 关键字参数
         :return: 任务对象
         """
-        if not self._running:
-            raise RuntimeError("Task queue is not running")
-
-        task_id = task_id or str(id(func))
-        task = Task(task_id, func, args, kwargs, schedule_time=schedule_time)
-        self._tasks[task_id] = task
-
-        # 发布任务调度事件
-        await event_bus.publish(Event("task_scheduled", task))
-
-        return task
+        return await self.submit_task(func, args, kwargs, task_id=task_id, schedule_time=schedule_time)
 
     def get_task(self, task_id: str) -> Optional[Task]:
         """获取任务"""
@@ -271,57 +460,142 @@ class TaskQueue:
         task = self.get_task(task_id)
         if task:
             task.cancel()
+            if self._timer.cancel(f"{TASK_TIMER_PREFIX}{task_id}"):
+                # 未到期的定时任务不会进入工作队列, 直接登记为已结束
+                self._retire(task)
             # 发布任务取消事件
-            await event_bus.publish(Event("task_cancelled", task))
+            await event_bus.publish(Event("task_cancelled", task), wait=False)
             return True
         return False
 
-    async def _worker(self) -> None:
+    def get_dead_letters(self) -> List[Task]:
+        """获取死信队列中的任务"""
+        return list(self._dead_letters)
+
+    async def retry_dead_letter(self, task_id: str) -> bool:
+        """
+        将死信任务重新入队
+        :param task_id: 任务ID
+        :return: 是否找到该任务
+        """
+        for task in self._dead_letters:
+            if task.task_id == task_id:
+                self._dead_letters.remove(task)
+                task._current_retry = 0
+                task.status = TaskStatus.PENDING
+                self._tasks[task_id] = task
+                self._enqueue(task)
+                return True
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取各通道的队列深度、等待时间和运行时间统计"""
+        return {
+            "queues": {
+                name: {
+                    "depth": lane.queue.qsize(),
+                    "concurrency": lane.concurrency,
+                    **lane.stats.to_dict(),
+                }
+                for name, lane in self._lanes.items()
+            },
+            "tasks": len(self._tasks),
+            "dead_letters": len(self._dead_letters),
+            "timers": len(self._timer),
+        }
+
+    def _enqueue(self, task: Task) -> None:
+        """放入任务所属通道的优先级队列"""
+        task.enqueued_at = time.time()
+        self._lanes[task.queue].queue.put_nowait((task.priority, next(self._seq), task))
+
+    async def _worker(self, lane: _Lane) -> None:
         """工作者协程"""
         while self._running:
             try:
-                task = await self._queue.get()
+                _, _, task = await lane.queue.get()
                 if task.status != TaskStatus.CANCELLED:
-                    result = await task.execute()
-                    # 发布任务完成事件
-                    await event_bus.publish(
-                        Event(
-                            "task_completed" if result.status == TaskStatus.COMPLETED else "task_failed",
-                            task,
-                        )
-                    )
-                self._queue.task_done()
+                    wait_time = time.time() - (task.enqueued_at or time.time())
+                    result = await task.execute(self._executors[task.executor], retry=False)
+                    lane.stats.record(wait_time, result.duration or 0.0)
+                    await self._handle_result(lane, task, result)
+                else:
+                    self._retire(task)
+                lane.queue.task_done()
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 logger.error(f"Worker error: {e}")
 
-    async def _scheduler(self) -> None:
-        """调度器协程"""
-        while self._running:
-            try:
-                now = time.time()
-                for task in list(self._tasks.values()):
-                    if (
-                        task.status == TaskStatus.SCHEDULED
-                        and isinstance(task.schedule_time, (int, float))
-                        and task.schedule_time <= now
-                    ):
-                        task.status = TaskStatus.PENDING
-                        await self._queue.put(task)
-
-                await asyncio.sleep(1)
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                logger.error(f"Scheduler error: {e}")
+    async def _handle_result(self, lane: _Lane, task: Task, result: TaskResult) -> None:
+        """处理执行结果: 成功、退避重试或进入死信队列"""
+        if result.status == TaskStatus.FAILED and task.can_retry and self._running:
+            lane.stats.retried += 1
+            delay = task.next_retry_delay()
+            task.status = TaskStatus.SCHEDULED
+            self._timer.schedule(f"{TASK_TIMER_PREFIX}{task.task_id}", time.time() + delay, self._on_task_due)
+            logger.warning(
+                f"Task {task.task_id} failed, retrying {task._current_retry}/{task.retry_times} "
+                f"in {delay:.2f}s: {result.error}"
+            )
+            await event_bus.publish(Event("task_retrying", task), wait=False)
+            return
+
+        if result.status == TaskStatus.COMPLETED:
+            lane.stats.completed += 1
+        else:
+            lane.stats.failed += 1
+            if result.status == TaskStatus.FAILED:
+                lane.stats.dead_lettered += 1
+                self._dead_letters.append(task)
+                await event_bus.publish(Event("task_dead_lettered", task), wait=False)
+
+        # 发布任务完成事件
+        await event_bus.publish(
+            Event(
+                "task_completed" if result.status == TaskStatus.COMPLETED else "task_failed",
+                task,
+            ),
+            wait=False,
+        )
+        self._retire(task)
+
+    def _on_task_due(self, key: str) -> None:
+        """定时任务到期回调"""
+        task = self._tasks.get(key[len(TASK_TIMER_PREFIX) :])
+        if task is not None and task.status == TaskStatus.SCHEDULED:
+            task.status = TaskStatus.PENDING
+            self._enqueue(task)
+
+    def _retire(self, task: Task) -> None:
+        """
+        登记已结束的任务, 超出保留数量或保留时长后从任务表中移除
+        :param task: 已结束的任务
+        """
+        self._finished.append(task.task_id)
+        self._timer.schedule(
+            f"{EVICT_TIMER_PREFIX}{task.task_id}", time.time() + self.retention_seconds, self._on_evict_due
+        )
+        while len(self._finished) > self.max_retained:
+            self._evict(self._finished.popleft())
+
+    def _on_evict_due(self, key: str) -> None:
+        """已结束任务保留到期回调"""
+        self._evict(key[len(EVICT_TIMER_PREFIX) :])
+
+    def _evict(self, task_id: str) -> None:
+        """移除已结束的任务"""
+        self._timer.cancel(f"{EVICT_TIMER_PREFIX}{task_id}")
+        task = self._tasks.get(task_id)
+        if task is not None and task.status in (TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED):
+            del self._tasks[task_id]
 
     async def init(self):
         pass
 
 
-# 创建默认任务队列实例
-task_queue = TaskQueue()
+# 创建默认任务队列实例, 与默认调度器共用定时器队列
+task_queue = TaskQueue(timer=timer_queue)
 
 # 导出
 __all__ = [
@@ -330,4 +604,6 @@ __all__ = [
     "Task",
     "TaskStatus",
     "TaskResult",
+    "TaskPriority",
+    "QueueStats",
 ]
@@ -1,11 +1,12 @@
-from typing import BinaryIO, Optional, Union
+import asyncio
+from typing import BinaryIO, Dict, List, Optional, Union
 from urllib.parse import urljoin
 
 import oss2
 
 from core.config.setting import settings
 from core.loge.pysuper_logging import get_logger
-from utils.storage import StorageProvider
+from core.third.oss.storage import StorageProvider
 
 logger = get_logger("aliyun_oss")
 
@@ -13,6 +14,9 @@ logger = get_logger("aliyun_oss")
 class AliyunOSSProvider(StorageProvider):
     """阿里云OSS存储提供者"""
 
+    # DeleteMultipleObjects 单次最多 1000 个对象
+    native_delete_limit = 1000
+
     def __init__(
         self,
         access_key_id: str,
@@ -101,12 +105,27 @@ class AliyunOSSProvider(StorageProvider):
     async def delete_file(self, file_path: str, **kwargs) -> bool:
         """删除文件"""
         try:
-            result = self.bucket.delete_object(file_path)
+            result = await asyncio.to_thread(self.bucket.delete_object, file_path)
             return result.status == 204
         except Exception as e:
             logger.error(f"Failed to delete file from OSS: {str(e)}")
             raise
 
+    async def delete_files(self, file_paths: List[str], **kwargs) -> Dict[str, Optional[str]]:
+        """批量删除文件(DeleteMultipleObjects)"""
+        result = await asyncio.to_thread(self.bucket.batch_delete_objects, list(file_paths))
+        deleted = set(result.deleted_keys)
+        return {file_path: None if file_path in deleted else "NotDeleted" for file_path in file_paths}
+
+    async def copy_file(self, source_path: str, target_path: str, **kwargs) -> str:
+        """服务端复制文件, 数据不经过本机"""
+        try:
+            await asyncio.to_thread(self.bucket.copy_object, self.bucket_name, source_path, target_path)
+            return urljoin(self.base_url, target_path)
+        except Exception as e:
+            logger.error(f"Failed to copy file in OSS: {str(e)}")
+            raise
+
     async def get_file_url(
         self,
         file_path: str,
@@ -129,7 +148,7 @@ class AliyunOSSProvider(StorageProvider):
     async def get_file_info(self, file_path: str, **kwargs) -> dict:
         """获取文件信息"""
         try:
-            result = self.bucket.head_object(file_path)
+            result = await asyncio.to_thread(self.bucket.head_object, file_path)
             if result.status == 200:
                 return {
                     "size": result.content_length,
@@ -171,7 +190,7 @@ class AliyunOSSProvider(StorageProvider):
     async def exists(self, file_path: str, **kwargs) -> bool:
         """检查文件是否存在"""
         try:
-            return self.bucket.object_exists(file_path)
+            return await asyncio.to_thread(self.bucket.object_exists, file_path)
         except Exception as e:
             logger.error(f"Failed to check file existence in OSS: {str(e)}")
             raise
@@ -0,0 +1,113 @@
+"""
+存储批量操作
+以有限并发执行逐项操作, 每项独立重试临时性错误并返回各自的结果
+"""
+
+import asyncio
+import random
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional
+
+# 默认并发数
+DEFAULT_CONCURRENCY = 16
+# 默认重试次数(不含首次)
+DEFAULT_RETRIES = 2
+# 视为临时性错误的 HTTP 状态码
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+@dataclass
+class BatchItemResult:
+    """单项结果"""
+
+    key: Any
+    ok: bool
+    value: Any = None
+    error: Optional[str] = None
+    attempts: int = 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"key": self.key, "ok": self.ok, "value": self.value, "error": self.error, "attempts": self.attempts}
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    """从各 SDK 的异常中提取 HTTP 状态码"""
+    for attr in ("status", "status_code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    get_status_code = getattr(exc, "get_status_code", None)
+    if callable(get_status_code):
+        try:
+            return int(get_status_code())
+        except (TypeError, ValueError):
+            return None
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict):
+        return response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return getattr(response, "status", None)
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """
+    判断是否为可重试的临时性错误: 连接/超时错误, 或限流与服务端 5xx
+    :param exc: 异常
+    :return: 是否可重试
+    """
+    if isinstance(exc, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    return _status_code(exc) in TRANSIENT_STATUS
+
+
+async def run_batch(
+    items: Iterable[Any],
+    func: Callable[[Any], Awaitable[Any]],
+    *,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    retries: int = DEFAULT_RETRIES,
+    backoff: float = 0.1,
+    key: Optional[Callable[[Any], Hashable]] = None,
+    is_transient: Callable[[BaseException], bool] = is_transient_error,
+) -> Dict[Hashable, BatchItemResult]:
+    """
+    以有限并发执行批量操作
+    单项失败不影响其他项; 临时性错误按指数退避重试, 其余错误直接记录
+    :param items: 待处理项
+    :param func: 处理单项的协程函数
+    :param concurrency: 最大并发数
+    :param retries: 临时性错误的重试次数
+    :param backoff: 首次重试的等待秒数, 之后翻倍并加随机抖动
+    :param key: 结果字典的键, 默认为项本身
+    :param is_transient: 判断异常是否可重试
+    :return: {键: 单项结果}, 顺序与输入一致
+    """
+    items = list(items)
+    key = key or (lambda item: item)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(item: Any) -> BatchItemResult:
+        item_key = key(item)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                async with semaphore:
+                    value = await func(item)
+                return BatchItemResult(item_key, True, value, attempts=attempt)
+            except Exception as e:
+                if attempt > retries or not is_transient(e):
+                    return BatchItemResult(item_key, False, error=f"{type(e).__name__}: {e}", attempts=attempt)
+            # 退避期间释放并发名额
+            await asyncio.sleep(backoff * 2 ** (attempt - 1) * (1 + random.random() / 2))
+
+    results = await asyncio.gather(*(run_one(item) for item in items))
+    return {result.key: result for result in results}
+
+
+__all__ = [
+    "DEFAULT_CONCURRENCY",
+    "DEFAULT_RETRIES",
+    "BatchItemResult",
+    "is_transient_error",
+    "run_batch",
+]
@@ -1,12 +1,13 @@
+import asyncio
 import io
-from typing import BinaryIO, Optional, Union
+from typing import BinaryIO, Dict, List, Optional, Union
 
 import boto3
 from botocore.client import Config
 
 from core.config.setting import settings
 from core.loge.pysuper_logging import get_logger
-from utils.storage import StorageProvider
+from core.third.oss.storage import StorageProvider
 
 logger = get_logger("ceph")
 
@@ -14,6 +15,9 @@ logger = get_logger("ceph")
 class CephProvider(StorageProvider):
     """Ceph存储提供者"""
 
+    # S3 DeleteObjects 单次最多 1000 个对象
+    native_delete_limit = 1000
+
     def __init__(
         self,
         access_key: str,
@@ -120,12 +124,36 @@ class CephProvider(StorageProvider):
     async def delete_file(self, file_path: str, **kwargs) -> bool:
         """删除文件"""
         try:
-            self.client.delete_object(Bucket=self.bucket, Key=file_path)
+            await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=file_path)
             return True
         except Exception as e:
             logger.error(f"Failed to delete file from Ceph: {str(e)}")
             raise
 
+    async def delete_files(self, file_paths: List[str], **kwargs) -> Dict[str, Optional[str]]:
+        """批量删除文件(S3 DeleteObjects)"""
+        response = await asyncio.to_thread(
+            self.client.delete_objects,
+            Bucket=self.bucket,
+            Delete={"Objects": [{"Key": file_path} for file_path in file_paths], "Quiet": True},
+        )
+        errors = {error["Key"]: f"{error.get('Code')}: {error.get('Message')}" for error in response.get("Errors", [])}
+        return {file_path: errors.get(file_path) for file_path in file_paths}
+
+    async def copy_file(self, source_path: str, target_path: str, **kwargs) -> str:
+        """服务端复制文件, 数据不经过本机"""
+        try:
+            await asyncio.to_thread(
+                self.client.copy_object,
+                Bucket=self.bucket,
+                Key=target_path,
+                CopySource={"Bucket": self.bucket, "Key": source_path},
+            )
+            return f"{self.base_url}/{target_path}"
+        except Exception as e:
+            logger.error(f"Failed to copy file in Ceph: {str(e)}")
+            raise
+
     async def get_file_url(self, file_path: str, expires: Optional[int] = None, **kwargs) -> str:
         """获取文件URL"""
         try:
@@ -150,7 +178,7 @@ class CephProvider(StorageProvider):
     async def get_file_info(self, file_path: str, **kwargs) -> dict:
         """获取文件信息"""
         try:
-            response = self.client.head_object(Bucket=self.bucket, Key=file_path)
+            response = await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=file_path)
 
             return {
                 "content_type": response.get("ContentType"),
@@ -201,7 +229,7 @@ class CephProvider(StorageProvider):
     async def exists(self, file_path: str, **kwargs) -> bool:
         """检查文件是否存在"""
         try:
-            self.client.head_object(Bucket=self.bucket, Key=file_path)
+            await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=file_path)
             return True
         except:
             return False
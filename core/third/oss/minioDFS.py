@@ -1,12 +1,15 @@
+import asyncio
 import io
-from typing import BinaryIO, Optional, Union
+from typing import BinaryIO, Dict, List, Optional, Union
 
 from minio import Minio
+from minio.commonconfig import CopySource
+from minio.deleteobjects import DeleteObject
 from minio.error import S3Error
 
 from core.config.setting import settings
 from core.loge.pysuper_logging import get_logger
-from utils.storage import StorageProvider
+from core.third.oss.storage import StorageProvider
 
 logger = get_logger("minio")
 
@@ -14,6 +17,9 @@ logger = get_logger("minio")
 class MinioProvider(StorageProvider):
     """MinIO存储提供者"""
 
+    # S3 DeleteObjects 单次最多 1000 个对象
+    native_delete_limit = 1000
+
     def __init__(
         self,
         endpoint: str,
@@ -120,12 +126,34 @@ class MinioProvider(StorageProvider):
     async def delete_file(self, file_path: str, **kwargs) -> bool:
         """删除文件"""
         try:
-            self.client.remove_object(bucket_name=self.bucket, object_name=file_path)
+            await asyncio.to_thread(self.client.remove_object, bucket_name=self.bucket, object_name=file_path)
             return True
         except Exception as e:
             logger.error(f"Failed to delete file from MinIO: {str(e)}")
             raise
 
+    async def delete_files(self, file_paths: List[str], **kwargs) -> Dict[str, Optional[str]]:
+        """批量删除文件(S3 DeleteObjects)"""
+
+        def remove() -> list:
+            # remove_objects 惰性执行, 遍历结果才会真正发出请求
+            objects = [DeleteObject(file_path) for file_path in file_paths]
+            return list(self.client.remove_objects(self.bucket, objects))
+
+        errors = {error.name: f"{error.code}: {error.message}" for error in await asyncio.to_thread(remove)}
+        return {file_path: errors.get(file_path) for file_path in file_paths}
+
+    async def copy_file(self, source_path: str, target_path: str, **kwargs) -> str:
+        """服务端复制文件, 数据不经过本机"""
+        try:
+            await asyncio.to_thread(
+                self.client.copy_object, self.bucket, target_path, CopySource(self.bucket, source_path)
+            )
+            return f"{self.base_url}/{self.bucket}/{target_path}"
+        except Exception as e:
+            logger.error(f"Failed to copy file in MinIO: {str(e)}")
+            raise
+
     async def get_file_url(self, file_path: str, expires: Optional[int] = None, **kwargs) -> str:
         """获取文件URL"""
         try:
@@ -147,7 +175,7 @@ class MinioProvider(StorageProvider):
     async def get_file_info(self, file_path: str, **kwargs) -> dict:
         """获取文件信息"""
         try:
-            stat = self.client.stat_object(bucket_name=self.bucket, object_name=file_path)
+            stat = await asyncio.to_thread(self.client.stat_object, bucket_name=self.bucket, object_name=file_path)
 
             return {
                 "size": stat.size,
@@ -200,7 +228,7 @@ class MinioProvider(StorageProvider):
     async def exists(self, file_path: str, **kwargs) -> bool:
         """检查文��是否存在"""
         try:
-            self.client.stat_object(bucket_name=self.bucket, object_name=file_path)
+            await asyncio.to_thread(self.client.stat_object, bucket_name=self.bucket, object_name=file_path)
             return True
         except S3Error as e:
             if e.code == "NoSuchKey":
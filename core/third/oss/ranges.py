@@ -0,0 +1,124 @@
+"""
+HTTP Range 下载
+解析 Range / If-Range 请求头, 以 206 分段响应流式返回存储中的文件
+"""
+
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Optional, Tuple
+from urllib.parse import quote
+
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+
+
+class RangeNotSatisfiable(ValueError):
+    """请求的字节范围超出文件大小"""
+
+    pass
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单个字节范围
+    多段范围和无法识别的单位按规范忽略, 返回完整内容
+    :param header: Range 请求头, 如 "bytes=0-499"、"bytes=500-"、"bytes=-500"
+    :param size: 文件大小
+    :return: (start, end) 闭区间, None 表示返回完整内容
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        start = int(first) if first else None
+        end = int(last) if last else None
+    except ValueError:
+        return None
+    if start is None and end is None:
+        return None
+    if start is None:
+        # 后缀范围: 最后 N 个字节
+        if not end or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(0, size - end), size - 1
+    end = size - 1 if end is None else min(end, size - 1)
+    if start >= size or start > end:
+        raise RangeNotSatisfiable(header)
+    return start, end
+
+
+def if_range_matches(if_range: Optional[str], etag: Optional[str], last_modified: Any = None) -> bool:
+    """
+    判断 If-Range 条件是否成立, 不成立时应忽略 Range 返回完整内容
+    :param if_range: If-Range 请求头
+    :param etag: 当前实体标签
+    :param last_modified: 当前修改时间(datetime)
+    :return: 是否可以按范围响应
+    """
+    if not if_range:
+        return True
+    if if_range.startswith(('"', "W/")):
+        # 仅强校验的实体标签可用于范围请求
+        return etag is not None and not if_range.startswith("W/") and if_range == etag
+    if last_modified is None:
+        return False
+    try:
+        return int(parsedate_to_datetime(if_range).timestamp()) == int(last_modified.timestamp())
+    except (TypeError, ValueError):
+        return False
+
+
+async def range_response(
+    request: Request,
+    storage: Any,
+    path: str,
+    filename: Optional[str] = None,
+    media_type: Optional[str] = None,
+) -> Response:
+    """
+    流式返回存储中的文件, 支持 Range / If-Range
+    :param request: 请求
+    :param storage: 存储后端, 如 storage_manager.backend
+    :param path: 文件路径
+    :param filename: 下载文件名
+    :param media_type: 内容类型
+    :return: 200 完整响应、206 分段响应或 416
+    """
+    info = await storage.get_info(path)
+    if info is None:
+        return Response(status_code=404)
+
+    headers = {"Accept-Ranges": "bytes"}
+    if info.etag:
+        headers["ETag"] = info.etag
+    if info.last_modified:
+        headers["Last-Modified"] = format_datetime(info.last_modified.astimezone(timezone.utc), usegmt=True)
+    if filename:
+        headers["Content-Disposition"] = f"attachment; filename*=utf-8''{quote(filename)}"
+    media_type = media_type or info.content_type or "application/octet-stream"
+
+    byte_range = None
+    if if_range_matches(request.headers.get("if-range"), info.etag, info.last_modified):
+        try:
+            byte_range = parse_range(request.headers.get("range"), info.size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{info.size}"})
+
+    if byte_range is None:
+        headers["Content-Length"] = str(info.size)
+        return StreamingResponse(storage.iter_file(path), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{info.size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        storage.iter_file(path, start, end), status_code=206, media_type=media_type, headers=headers
+    )
+
+
+__all__ = ["RangeNotSatisfiable", "parse_range", "if_range_matches", "range_response"]
@@ -5,25 +5,36 @@
 
 import asyncio
 import hashlib
+import json
 import logging
 import mimetypes
 import os
+import re
+import time
+import uuid
 from abc import ABC, abstractmethod
 from datetime import datetime
 from pathlib import Path
-from typing import BinaryIO, Optional, Union
+from typing import Any, AsyncIterator, BinaryIO, Dict, Optional, Tuple, Union
 from urllib.parse import urljoin
 
 import aiofiles
 from PIL import Image
 from fastapi import UploadFile
 
-from core.config.manager import config_manager
 from core.strong.event_bus import Event, event_bus
 from core.strong.metrics import metrics_collector
 
 logger = logging.getLogger(__name__)
 
+# 流式读写的块大小
+CHUNK_SIZE = 1024 * 1024
+# 断点续传的临时目录(位于存储根目录下)
+UPLOAD_DIR = ".uploads"
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+FileSource = Union[UploadFile, BinaryIO, bytes, AsyncIterator[bytes]]
+
 
 class StorageError(Exception):
     """存储错误"""
@@ -31,6 +42,65 @@ class StorageError(Exception):
     pass
 
 
+class FileTooLargeError(StorageError):
+    """文件超过大小限制"""
+
+    pass
+
+
+class UploadNotFoundError(StorageError):
+    """续传会话不存在或不属于当前用户"""
+
+    pass
+
+
+class UploadOffsetError(StorageError):
+    """续传偏移与已接收的数据量不一致"""
+
+    def __init__(self, expected: int, received: int):
+        super().__init__(f"Upload offset mismatch: expected {expected}, got {received}")
+        self.expected = expected
+        self.received = received
+
+
+async def iter_chunks(file: FileSource, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """
+    按块读取文件来源, 内存占用与文件大小无关
+    :param file: UploadFile、文件对象、bytes 或异步字节流(如 request.stream())
+    :param chunk_size: 块大小
+    :return: 字节块异步迭代器
+    """
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        view = memoryview(file)
+        for start in range(0, len(view), chunk_size):
+            yield bytes(view[start : start + chunk_size])
+    elif isinstance(file, UploadFile):
+        while chunk := await file.read(chunk_size):
+            yield chunk
+    elif hasattr(file, "__aiter__"):
+        async for chunk in file:
+            if chunk:
+                yield chunk
+    else:
+        while chunk := await asyncio.to_thread(file.read, chunk_size):
+            yield chunk
+
+
+async def hash_file(path: Union[str, Path], hash_type: str = "md5", chunk_size: int = CHUNK_SIZE) -> str:
+    """
+    分块计算本地文件哈希
+    :param path: 文件路径
+    :param hash_type: 哈希算法
+    :param chunk_size: 块大小
+    :return: 十六进制摘要
+    """
+    hasher = hashlib.new(hash_type)
+    async with aiofiles.open(path, "rb") as f:
+        while chunk := await f.read(chunk_size):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
 class FileInfo:
     """文件信息"""
 
@@ -42,6 +112,8 @@ class FileInfo:
         path: str,
         url: Optional[str] = None,
         metadata: Optional[dict] = None,
+        checksum: Optional[str] = None,
+        last_modified: Optional[datetime] = None,
     ):
         self.filename = filename
         self.content_type = content_type
@@ -49,8 +121,19 @@ class FileInfo:
         self.path = path
         self.url = url
         self.metadata = metadata or {}
+        self.checksum = checksum
+        self.last_modified = last_modified
         self.created_at = datetime.now()
 
+    @property
+    def etag(self) -> Optional[str]:
+        """实体标签, 优先使用内容哈希, 否则由大小和修改时间生成"""
+        if self.checksum:
+            return f'"{self.checksum}"'
+        if self.last_modified:
+            return f'"{self.size:x}-{int(self.last_modified.timestamp() * 1000):x}"'
+        return None
+
     @property
     def extension(self) -> str:
         """获取文件扩展名"""
@@ -65,6 +148,7 @@ class FileInfo:
             "path": self.path,
             "url": self.url,
             "metadata": self.metadata,
+            "checksum": self.checksum,
             "created_at": self.created_at.isoformat(),
         }
 
@@ -73,12 +157,10 @@ class StorageBackend(ABC):
     """存储后端基类"""
 
     @abstractmethod
-    async def save(
-        self, file: Union[UploadFile, BinaryIO, bytes], path: str, content_type: Optional[str] = None
-    ) -> FileInfo:
+    async def save(self, file: FileSource, path: str, content_type: Optional[str] = None) -> FileInfo:
         """
         保存文件
-        :param file: 文件对象
+        :param file: 文件对象, 也可以是异步字节流
         :param path: 存储路径
         :param content_type: 内容类型
         :return: 文件信息
@@ -121,51 +203,108 @@ class StorageBackend(ABC):
         """
         pass
 
+    async def iter_file(
+        self, path: str, start: int = 0, end: Optional[int] = None, chunk_size: int = CHUNK_SIZE
+    ) -> AsyncIterator[bytes]:
+        """
+        分块读取文件的指定字节范围
+        :param path: 文件路径
+        :param start: 起始偏移(含)
+        :param end: 结束偏移(含), None 表示到文件末尾
+        :param chunk_size: 块大小
+        :return: 字节块异步迭代器
+        """
+        raise StorageError(f"{type(self).__name__} does not support streaming reads")
+        yield b""  # pragma: no cover
+
+    async def calculate_hash(self, path: str, hash_type: str = "md5") -> str:
+        """
+        流式计算文件哈希
+        :param path: 文件路径
+        :param hash_type: 哈希算法
+        :return: 十六进制摘要
+        """
+        hasher = hashlib.new(hash_type)
+        async for chunk in self.iter_file(path):
+            hasher.update(chunk)
+        return hasher.hexdigest()
+
 
 class LocalStorageBackend(StorageBackend):
     """本地文件存储后端"""
 
-    def __init__(self, root_path: str, base_url: str):
+    def __init__(self, root_path: str, base_url: str, hash_type: str = "md5", max_size: Optional[int] = None):
+        """
+        :param root_path: 存储根目录
+        :param base_url: 访问地址前缀
+        :param hash_type: 写入时计算的内容哈希算法
+        :param max_size: 单个文件大小上限(字节), None 表示不限制
+        """
         self.root_path = Path(root_path)
         self.base_url = base_url.rstrip("/")
+        self.hash_type = hash_type
+        self.max_size = max_size
         self._ensure_dir(self.root_path)
+        # 断点续传: upload_id -> (已计算哈希的字节数, 哈希对象)
+        self._upload_hashers: Dict[str, Tuple[int, Any]] = {}
+        self._upload_locks: Dict[str, asyncio.Lock] = {}
 
     def _ensure_dir(self, path: Path) -> None:
         """确保目录存在"""
         if not path.exists():
-            path.mkdir(parents=True)
-
-    async def save(
-        self, file: Union[UploadFile, BinaryIO, bytes], path: str, content_type: Optional[str] = None
-    ) -> FileInfo:
-        """保存文件"""
+            path.mkdir(parents=True, exist_ok=True)
+
+    def _file_info(self, path: str, file_path: Path, content_type: Optional[str], checksum: Optional[str] = None):
+        stat = file_path.stat()
+        return FileInfo(
+            filename=os.path.basename(path),
+            content_type=content_type or mimetypes.guess_type(path)[0],
+            size=stat.st_size,
+            path=path,
+            url=urljoin(self.base_url, path),
+            checksum=checksum,
+            last_modified=datetime.fromtimestamp(stat.st_mtime),
+        )
+
+    async def _write_chunks(
+        self, f, chunks: AsyncIterator[bytes], hasher, written: int = 0, limit: Optional[int] = None
+    ) -> int:
+        """逐块写入并更新哈希, 返回写入后的总字节数"""
+        limit = min(filter(None, (limit, self.max_size)), default=None)
+        async for chunk in chunks:
+            written += len(chunk)
+            if limit is not None and written > limit:
+                raise FileTooLargeError(f"File exceeds size limit of {limit} bytes")
+            if hasher is not None:
+                hasher.update(chunk)
+            await f.write(chunk)
+        return written
+
+    async def save(self, file: FileSource, path: str, content_type: Optional[str] = None) -> FileInfo:
+        """
+        流式保存文件
+        分块写入同目录下的临时文件并同时计算内容哈希, 完成后原子替换目标文件
+        """
         file_path = self.root_path / path
         self._ensure_dir(file_path.parent)
+        content_type = content_type or getattr(file, "content_type", None)
+        tmp_path = file_path.with_name(f".{file_path.name}.{uuid.uuid4().hex}.tmp")
+        hasher = hashlib.new(self.hash_type)
 
         try:
-            if isinstance(file, UploadFile):
-                content = await file.read()
-                size = len(content)
-                content_type = content_type or file.content_type
-            elif isinstance(file, bytes):
-                content = file
-                size = len(content)
-                content_type = content_type or mimetypes.guess_type(path)[0]
-            else:
-                content = file.read()
-                size = len(content)
-                content_type = content_type or mimetypes.guess_type(path)[0]
-
-            async with aiofiles.open(file_path, "wb") as f:
-                await f.write(content)
-
-            url = urljoin(self.base_url, path)
-
-            return FileInfo(filename=os.path.basename(path), content_type=content_type, size=size, path=path, url=url)
+            async with aiofiles.open(tmp_path, "wb") as f:
+                await self._write_chunks(f, iter_chunks(file), hasher)
+            os.replace(tmp_path, file_path)
+            return self._file_info(path, file_path, content_type, hasher.hexdigest())
 
+        except StorageError:
+            raise
         except Exception as e:
             logger.error(f"Failed to save file: {path}", exc_info=e)
             raise StorageError(f"Failed to save file: {str(e)}")
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
 
     async def delete(self, path: str) -> bool:
         """删除文件"""
@@ -194,15 +333,196 @@ class LocalStorageBackend(StorageBackend):
             return None
 
         try:
-            size = file_path.stat().st_size
-            content_type = mimetypes.guess_type(path)[0]
-            url = urljoin(self.base_url, path)
-
-            return FileInfo(filename=os.path.basename(path), content_type=content_type, size=size, path=path, url=url)
+            return self._file_info(path, file_path, None)
         except Exception as e:
             logger.error(f"Failed to get file info: {path}", exc_info=e)
             return None
 
+    async def iter_file(
+        self, path: str, start: int = 0, end: Optional[int] = None, chunk_size: int = CHUNK_SIZE
+    ) -> AsyncIterator[bytes]:
+        """分块读取文件的指定字节范围"""
+        file_path = self.root_path / path
+        if not file_path.exists():
+            raise StorageError(f"File not found: {path}")
+
+        remaining = None if end is None else end - start + 1
+        async with aiofiles.open(file_path, "rb") as f:
+            await f.seek(start)
+            while remaining is None or remaining > 0:
+                chunk = await f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    async def calculate_hash(self, path: str, hash_type: str = "md5") -> str:
+        """流式计算文件哈希"""
+        return await hash_file(self.root_path / path, hash_type)
+
+    # ---------------- 断点续传 ----------------
+
+    def _upload_paths(self, upload_id: str) -> Tuple[Path, Path]:
+        if not _UPLOAD_ID.match(upload_id):
+            raise StorageError(f"Invalid upload id: {upload_id}")
+        upload_dir = self.root_path / UPLOAD_DIR
+        return upload_dir / f"{upload_id}.part", upload_dir / f"{upload_id}.json"
+
+    def _load_upload(self, upload_id: str, owner: Any = None) -> Tuple[Path, Dict[str, Any]]:
+        """读取续传会话, 指定 owner 时只返回该用户创建的会话, 其他用户的会话视为不存在"""
+        part_path, meta_path = self._upload_paths(upload_id)
+        if not meta_path.exists():
+            raise UploadNotFoundError(f"Upload not found: {upload_id}")
+        meta = json.loads(meta_path.read_text())
+        if owner is not None and meta.get("owner") != owner:
+            raise UploadNotFoundError(f"Upload not found: {upload_id}")
+        return part_path, meta
+
+    async def create_upload(
+        self,
+        path: str,
+        content_type: Optional[str] = None,
+        total_size: Optional[int] = None,
+        owner: Any = None,
+        metadata: Optional[dict] = None,
+    ) -> str:
+        """
+        创建续传会话
+        :param path: 最终存储路径
+        :param content_type: 内容类型
+        :param total_size: 文件总大小, 用于完成时校验
+        :param owner: 会话所有者(如用户ID), 后续操作需提供相同的所有者
+        :param metadata: 元数据, 完成时写入文件信息
+        :return: 上传ID
+        """
+        if total_size is not None and self.max_size is not None and total_size > self.max_size:
+            raise FileTooLargeError(f"File exceeds size limit of {self.max_size} bytes")
+        upload_id = uuid.uuid4().hex
+        part_path, meta_path = self._upload_paths(upload_id)
+        self._ensure_dir(part_path.parent)
+        part_path.touch()
+        meta = {
+            "path": path,
+            "content_type": content_type,
+            "total_size": total_size,
+            "owner": owner,
+            "metadata": metadata or {},
+            "created_at": time.time(),
+        }
+        meta_path.write_text(json.dumps(meta))
+        self._upload_hashers[upload_id] = (0, hashlib.new(self.hash_type))
+        return upload_id
+
+    async def get_upload_offset(self, upload_id: str, owner: Any = None) -> int:
+        """
+        获取已接收的字节数, 客户端据此从断点继续上传
+        :param upload_id: 上传ID
+        :param owner: 会话所有者, 不一致时视为会话不存在
+        :return: 偏移量
+        """
+        part_path, _ = self._load_upload(upload_id, owner)
+        return part_path.stat().st_size
+
+    async def upload_chunk(self, upload_id: str, data: FileSource, offset: int, owner: Any = None) -> int:
+        """
+        追加一个分块
+        :param upload_id: 上传ID
+        :param data: 分块数据, 可以是异步字节流
+        :param offset: 分块在文件中的起始偏移, 必须等于已接收的字节数
+        :param owner: 会话所有者, 不一致时视为会话不存在
+        :return: 追加后的偏移量
+        """
+        part_path, meta = self._load_upload(upload_id, owner)
+        async with self._upload_locks.setdefault(upload_id, asyncio.Lock()):
+            current = part_path.stat().st_size
+            if offset != current:
+                raise UploadOffsetError(current, offset)
+
+            # 进程重启后哈希状态丢失, 完成时再从分块文件重新计算
+            position, hasher = self._upload_hashers.get(upload_id, (None, None))
+            if position != current:
+                hasher = None
+            try:
+                async with aiofiles.open(part_path, "ab") as f:
+                    written = await self._write_chunks(f, iter_chunks(data), hasher, current, meta["total_size"])
+            except Exception:
+                # 丢弃不完整的分块, 保持偏移与哈希状态一致
+                os.truncate(part_path, current)
+                raise
+
+            if hasher is not None:
+                self._upload_hashers[upload_id] = (written, hasher)
+            else:
+                self._upload_hashers.pop(upload_id, None)
+            return written
+
+    async def complete_upload(self, upload_id: str, checksum: Optional[str] = None, owner: Any = None) -> FileInfo:
+        """
+        完成续传, 将分块文件移动到最终路径
+        :param upload_id: 上传ID
+        :param checksum: 客户端提供的内容哈希, 不一致时拒绝
+        :param owner: 会话所有者, 不一致时视为会话不存在
+        :return: 文件信息, metadata 包含创建会话时的元数据
+        """
+        part_path, meta = self._load_upload(upload_id, owner)
+        async with self._upload_locks.setdefault(upload_id, asyncio.Lock()):
+            size = part_path.stat().st_size
+            if meta["total_size"] is not None and size != meta["total_size"]:
+                raise UploadOffsetError(meta["total_size"], size)
+
+            position, hasher = self._upload_hashers.get(upload_id, (None, None))
+            digest = hasher.hexdigest() if position == size else await hash_file(part_path, self.hash_type)
+            if checksum and checksum.lower() != digest:
+                raise StorageError(f"Checksum mismatch for upload {upload_id}")
+
+            file_path = self.root_path / meta["path"]
+            self._ensure_dir(file_path.parent)
+            os.replace(part_path, file_path)
+        await self.abort_upload(upload_id)
+        file_info = self._file_info(meta["path"], file_path, meta["content_type"], digest)
+        file_info.metadata.update(meta.get("metadata") or {})
+        return file_info
+
+    async def abort_upload(self, upload_id: str, owner: Any = None) -> bool:
+        """
+        取消续传并清理临时文件
+        :param upload_id: 上传ID
+        :param owner: 会话所有者, 不一致时视为会话不存在
+        :return: 是否存在该上传
+        """
+        part_path, meta_path = self._upload_paths(upload_id)
+        if owner is not None:
+            try:
+                self._load_upload(upload_id, owner)
+            except UploadNotFoundError:
+                return False
+        self._upload_hashers.pop(upload_id, None)
+        self._upload_locks.pop(upload_id, None)
+        existed = meta_path.exists()
+        for file_path in (part_path, meta_path):
+            if file_path.exists():
+                file_path.unlink()
+        return existed
+
+    async def cleanup_uploads(self, max_age: float = 86400) -> int:
+        """
+        清理超时未完成的续传
+        :param max_age: 最长保留秒数
+        :return: 清理数量
+        """
+        upload_dir = self.root_path / UPLOAD_DIR
+        if not upload_dir.exists():
+            return 0
+        removed = 0
+        deadline = time.time() - max_age
+        for meta_path in upload_dir.glob("*.json"):
+            part_path = meta_path.with_suffix(".part")
+            last_active = (part_path if part_path.exists() else meta_path).stat().st_mtime
+            if last_active < deadline and await self.abort_upload(meta_path.stem):
+                removed += 1
+        return removed
+
 
 class StorageManager:
     """文件存储管理器"""
@@ -220,7 +540,9 @@ class StorageManager:
             if self._backend:
                 return
 
-            # 根据配置创建存储后端
+            # 根据配置创建存储后端, 配置在初始化时才导入, 存储后端可以脱离配置单独使用
+            from core.config.manager import config_manager
+
             storage_type = config_manager.storage.TYPE
             if storage_type == "local":
                 self._backend = LocalStorageBackend(
@@ -231,7 +553,7 @@ class StorageManager:
 
     async def save_file(
         self,
-        file: Union[UploadFile, BinaryIO, bytes],
+        file: FileSource,
         path: str,
         content_type: Optional[str] = None,
         metadata: Optional[dict] = None,
@@ -365,6 +687,108 @@ class StorageManager:
 
         return await self._backend.exists(path)
 
+    @property
+    def backend(self) -> StorageBackend:
+        """当前存储后端"""
+        if not self._backend:
+            raise StorageError("Storage manager not initialized")
+        return self._backend
+
+    def iter_file(self, path: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """
+        分块读取文件, 用于流式下载和 Range 请求
+        :param path: 文件路径
+        :param start: 起始偏移(含)
+        :param end: 结束偏移(含), None 表示到文件末尾
+        :return: 字节块异步迭代器
+        """
+        return self.backend.iter_file(path, start, end)
+
+    async def calculate_hash(self, path: str, hash_type: str = "md5") -> str:
+        """
+        流式计算文件哈希
+        :param path: 文件路径
+        :param hash_type: 哈希算法
+        :return: 十六进制摘要
+        """
+        return await self.backend.calculate_hash(path, hash_type)
+
+    def _resumable_backend(self) -> LocalStorageBackend:
+        backend = self.backend
+        if not isinstance(backend, LocalStorageBackend):
+            raise StorageError(f"{type(backend).__name__} does not support resumable uploads")
+        return backend
+
+    async def create_upload(
+        self,
+        path: str,
+        content_type: Optional[str] = None,
+        total_size: Optional[int] = None,
+        owner: Any = None,
+        metadata: Optional[dict] = None,
+    ) -> str:
+        """
+        创建断点续传会话
+        :param path: 最终存储路径
+        :param content_type: 内容类型
+        :param total_size: 文件总大小
+        :param owner: 会话所有者
+        :param metadata: 元数据, 完成时写入文件信息
+        :return: 上传ID
+        """
+        return await self._resumable_backend().create_upload(path, content_type, total_size, owner, metadata)
+
+    async def get_upload_offset(self, upload_id: str, owner: Any = None) -> int:
+        """
+        获取续传已接收的字节数
+        :param upload_id: 上传ID
+        :param owner: 会话所有者
+        :return: 偏移量
+        """
+        return await self._resumable_backend().get_upload_offset(upload_id, owner)
+
+    async def upload_chunk(self, upload_id: str, data: FileSource, offset: int, owner: Any = None) -> int:
+        """
+        追加续传分块
+        :param upload_id: 上传ID
+        :param data: 分块数据
+        :param offset: 分块起始偏移
+        :param owner: 会话所有者
+        :return: 追加后的偏移量
+        """
+        return await self._resumable_backend().upload_chunk(upload_id, data, offset, owner)
+
+    async def complete_upload(
+        self,
+        upload_id: str,
+        checksum: Optional[str] = None,
+        metadata: Optional[dict] = None,
+        owner: Any = None,
+    ) -> FileInfo:
+        """
+        完成续传
+        :param upload_id: 上传ID
+        :param checksum: 客户端提供的内容哈希
+        :param metadata: 元数据
+        :param owner: 会话所有者
+        :return: 文件信息
+        """
+        file_info = await self._resumable_backend().complete_upload(upload_id, checksum, owner)
+        if metadata:
+            file_info.metadata.update(metadata)
+        metrics_collector.increment("storage_files_saved_total", 1)
+        await event_bus.publish(Event("file_saved", file_info.to_dict()))
+        return file_info
+
+    async def abort_upload(self, upload_id: str, owner: Any = None) -> bool:
+        """
+        取消续传
+        :param upload_id: 上传ID
+        :param owner: 会话所有者
+        :return: 是否存在该上传
+        """
+        return await self._resumable_backend().abort_upload(upload_id, owner)
+
     def generate_path(self, filename: str, category: Optional[str] = None, use_date: bool = True) -> str:
         """
         生成存储路径
@@ -395,7 +819,20 @@ class StorageManager:
 storage_manager = StorageManager()
 
 # 导出
-__all__ = ["storage_manager", "StorageManager", "StorageBackend", "LocalStorageBackend", "FileInfo", "StorageError"]
+__all__ = [
+    "storage_manager",
+    "StorageManager",
+    "StorageBackend",
+    "LocalStorageBackend",
+    "FileInfo",
+    "StorageError",
+    "FileTooLargeError",
+    "UploadNotFoundError",
+    "UploadOffsetError",
+    "CHUNK_SIZE",
+    "iter_chunks",
+    "hash_file",
+]
 
 
 # -*- coding:utf-8 -*-
@@ -410,11 +847,14 @@ __all__ = ["storage_manager", "StorageManager", "StorageBackend", "LocalStorageB
 import hashlib
 import mimetypes
 import os
+import tempfile
 from abc import ABC, abstractmethod
 from enum import Enum
 from pathlib import Path
 from typing import BinaryIO, Dict, List, Optional, Union
 
+from core.third.oss.batch import DEFAULT_CONCURRENCY, DEFAULT_RETRIES, BatchItemResult, run_batch
+
 
 class StorageType(str, Enum):
     """存储类型"""
@@ -429,6 +869,12 @@ class StorageType(str, Enum):
 class StorageProvider(ABC):
     """存储服务提供者接口"""
 
+    # 批量操作的并发数和临时性错误重试次数
+    batch_concurrency: int = DEFAULT_CONCURRENCY
+    batch_retries: int = DEFAULT_RETRIES
+    # 单次原生批量删除的最大对象数, 0 表示不支持
+    native_delete_limit: int = 0
+
     @abstractmethod
     async def upload_file(
         self,
@@ -551,38 +997,110 @@ class StorageProvider(ABC):
         return url
 
     async def calculate_file_hash(self, file_path: str, hash_type: str = "md5", **kwargs) -> str:
-        """计算文件哈希值"""
-        content = await self.download_file(file_path)
-        if isinstance(content, str):
-            content = content.encode()
-
-        hash_obj = hashlib.new(hash_type)
-        hash_obj.update(content)
-        return hash_obj.hexdigest()
+        """计算文件哈希值
+        先下载到临时文件再分块计算, 避免整个对象读入内存
+        """
+        fd, local_path = tempfile.mkstemp(prefix="oss-hash-")
+        os.close(fd)
+        try:
+            content = await self.download_file(file_path, local_path=local_path)
+            if isinstance(content, bytes):
+                # 不支持下载到本地文件的实现仍返回内容
+                return hashlib.new(hash_type, content).hexdigest()
+            return await hash_file(local_path, hash_type)
+        finally:
+            os.remove(local_path)
 
     async def get_file_size(self, file_path: str, **kwargs) -> int:
         """获取文件大小"""
         info = await self.get_file_info(file_path)
         return info.get("size") or info.get("content_length", 0)
 
-    async def batch_delete(self, file_paths: List[str], **kwargs) -> Dict[str, bool]:
-        """批量删除文件"""
+    async def delete_files(self, file_paths: List[str], **kwargs) -> Dict[str, Optional[str]]:
+        """删除一组文件, 支持原生批量删除的提供者覆盖此方法; 默认逐个并发调用 delete_file
+        :return: {路径: 错误信息}, 成功的路径对应 None
+        """
+        results = await run_batch(
+            file_paths, self.delete_file, concurrency=self.batch_concurrency, retries=self.batch_retries
+        )
+        return {
+            file_path: None if result.ok and result.value else (result.error or "File not deleted")
+            for file_path, result in results.items()
+        }
+
+    async def batch_delete(
+        self, file_paths: List[str], concurrency: Optional[int] = None, **kwargs
+    ) -> Dict[str, BatchItemResult]:
+        """批量删除文件
+        提供者支持原生批量删除(native_delete_limit > 0)时按上限分组调用, 否则逐个并发删除
+        """
+        concurrency = concurrency or self.batch_concurrency
+        if not self.native_delete_limit:
+            results = await run_batch(file_paths, self.delete_file, concurrency=concurrency, retries=self.batch_retries)
+            # delete_file 返回 False 表示删除失败
+            for result in results.values():
+                if result.ok and not result.value:
+                    result.ok, result.error = False, result.error or "delete_file returned False"
+            return results
+
+        limit = self.native_delete_limit
+        groups = [tuple(file_paths[i : i + limit]) for i in range(0, len(file_paths), limit)]
+        group_results = await run_batch(groups, self.delete_files, concurrency=concurrency, retries=self.batch_retries)
         results = {}
-        for file_path in file_paths:
-            try:
-                success = await self.delete_file(file_path)
-                results[file_path] = success
-            except Exception as e:
-                results[file_path] = False
+        for group, group_result in group_results.items():
+            for file_path in group:
+                if not group_result.ok:
+                    error = group_result.error
+                else:
+                    # 结果中缺失的路径视为未删除
+                    error = group_result.value.get(file_path, "missing from delete_files result")
+                deleted = error is None
+                results[file_path] = BatchItemResult(
+                    file_path, group_result.ok and deleted, deleted, error, attempts=group_result.attempts
+                )
         return results
 
-    async def batch_exists(self, file_paths: List[str], **kwargs) -> Dict[str, bool]:
+    async def batch_exists(
+        self, file_paths: List[str], concurrency: Optional[int] = None, **kwargs
+    ) -> Dict[str, BatchItemResult]:
         """批量检查文件是否存在"""
-        results = {}
-        for file_path in file_paths:
-            try:
-                exists = await self.exists(file_path)
-                results[file_path] = exists
-            except Exception as e:
-                results[file_path] = False
-        return results
+        return await run_batch(
+            file_paths, self.exists, concurrency=concurrency or self.batch_concurrency, retries=self.batch_retries
+        )
+
+    async def batch_copy(
+        self, pairs: Dict[str, str], concurrency: Optional[int] = None, **kwargs
+    ) -> Dict[str, BatchItemResult]:
+        """批量复制文件
+        :param pairs: {源路径: 目标路径}
+        :return: 以源路径为键的结果, 成功时 value 为目标 URL
+        """
+        return await run_batch(
+            pairs.items(),
+            lambda pair: self.copy_file(*pair),
+            concurrency=concurrency or self.batch_concurrency,
+            retries=self.batch_retries,
+            key=lambda pair: pair[0],
+        )
+
+    async def batch_get_size(
+        self, file_paths: List[str], concurrency: Optional[int] = None, **kwargs
+    ) -> Dict[str, BatchItemResult]:
+        """批量获取文件大小"""
+        return await run_batch(
+            file_paths,
+            self.get_file_size,
+            concurrency=concurrency or self.batch_concurrency,
+            retries=self.batch_retries,
+        )
+
+    async def batch_get_info(
+        self, file_paths: List[str], concurrency: Optional[int] = None, **kwargs
+    ) -> Dict[str, BatchItemResult]:
+        """批量获取文件元数据"""
+        return await run_batch(
+            file_paths,
+            self.get_file_info,
+            concurrency=concurrency or self.batch_concurrency,
+            retries=self.batch_retries,
+        )
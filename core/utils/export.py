@@ -1,20 +1,42 @@
+import asyncio
 import csv
+import inspect
+import io
 import json
+import os
+import tempfile
 from datetime import datetime
-from typing import List, Dict, Type
+from enum import Enum
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Type, Union
+from urllib.parse import quote
 
+import aiofiles
 import openpyxl
 from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 from sqlalchemy import DateTime
 from sqlalchemy.orm import Session
 
+# 每次从数据库游标读取的行数
+EXPORT_CHUNK_SIZE = 1000
+# 导出文件类型对应的内容类型
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "json": "application/json",
+}
+
+# 导出列: (表头, 属性名或取值函数)
+ExportColumns = Sequence[Tuple[str, Union[str, Callable[[Any], Any]]]]
+
 
 class DataExporter:
     """数据导出工具类"""
 
     @staticmethod
-    def export_to_csv(data: List[Dict], fields: List[str], filename: str) -> str:
+    def export_to_csv(data: Iterable[Dict], fields: List[str], filename: str) -> str:
         """导出数据到CSV文件"""
         try:
             with open(filename, "w", newline="", encoding="utf-8-sig") as f:
@@ -26,20 +48,19 @@ class DataExporter:
             raise HTTPException(status_code=500, detail=f"Failed to export CSV: {str(e)}")
 
     @staticmethod
-    def export_to_excel(data: List[Dict], fields: List[str], filename: str) -> str:
+    def export_to_excel(data: Iterable[Dict], fields: List[str], filename: str) -> str:
         """导出数据到Excel文件"""
         try:
-            wb = openpyxl.Workbook()
-            ws = wb.active
+            # 只写模式逐行写入, 不在内存中保留单元格对象
+            wb = openpyxl.Workbook(write_only=True)
+            ws = wb.create_sheet()
 
             # 写入表头
-            for col, field in enumerate(fields, 1):
-                ws.cell(row=1, column=col, value=field)
+            ws.append(fields)
 
             # 写入数据
-            for row, item in enumerate(data, 2):
-                for col, field in enumerate(fields, 1):
-                    ws.cell(row=row, column=col, value=item.get(field))
+            for item in data:
+                ws.append([item.get(field) for field in fields])
 
             wb.save(filename)
             return filename
@@ -57,6 +78,209 @@ class DataExporter:
             raise HTTPException(status_code=500, detail=f"Failed to export JSON: {str(e)}")
 
 
+async def stream_query(db: Any, statement, chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[List[Any]]:
+    """
+    通过服务端游标分块读取查询结果, 内存占用与总行数无关
+    :param db: Session 或 AsyncSession
+    :param statement: select 语句
+    :param chunk_size: 每块行数
+    :return: 每块一个对象列表
+    """
+    statement = statement.execution_options(yield_per=chunk_size)
+    if hasattr(db, "stream"):
+        result = await db.stream(statement)
+        async for partition in result.scalars().partitions(chunk_size):
+            yield partition
+        return
+
+    # 同步会话的查询和读取都在线程池中执行, 不阻塞事件循环
+    result = await run_in_threadpool(db.execute, statement)
+    try:
+        async for partition in iterate_in_threadpool(result.scalars().partitions(chunk_size)):
+            yield partition
+    finally:
+        await run_in_threadpool(result.close)
+
+
+async def stream_query_in_session(
+    statement, session_factory: Optional[Callable[[], Any]] = None, chunk_size: int = EXPORT_CHUNK_SIZE
+) -> AsyncIterator[List[Any]]:
+    """
+    在数据源内部创建会话并分块读取, 读取结束后关闭会话
+    流式响应的响应体在接口返回后才开始发送, 此时依赖注入的会话可能已经关闭, 流式导出应使用本函数
+    :param statement: select 语句
+    :param session_factory: 会话工厂, 默认为 AsyncSessionLocal
+    :param chunk_size: 每块行数
+    :return: 每块一个对象列表
+    """
+    if session_factory is None:
+        from core.db.core.engine import AsyncSessionLocal
+
+        session_factory = AsyncSessionLocal
+    session = session_factory()
+    try:
+        async for partition in stream_query(session, statement, chunk_size):
+            yield partition
+    finally:
+        closed = session.close()
+        if inspect.isawaitable(closed):
+            await closed
+
+
+class StreamingExporter:
+    """
+    流式导出
+    CSV/JSON 边查询边输出; Excel 使用 openpyxl 只写模式, 行数据直接写入临时文件
+    """
+
+    def __init__(self, columns: ExportColumns, file_type: str = "csv", sheet_name: str = "Sheet1"):
+        """
+        :param columns: 导出列, (表头, 属性名或取值函数) 列表
+        :param file_type: csv / xlsx / json
+        :param sheet_name: Excel 工作表名称
+        """
+        if file_type not in EXPORT_MEDIA_TYPES:
+            raise ValueError(f"Unsupported export type: {file_type}")
+        self.columns = list(columns)
+        self.file_type = file_type
+        self.sheet_name = sheet_name
+        self.rows = 0
+
+    @property
+    def media_type(self) -> str:
+        return EXPORT_MEDIA_TYPES[self.file_type]
+
+    @property
+    def headers(self) -> List[str]:
+        return [header for header, _ in self.columns]
+
+    def row(self, obj: Any) -> List[Any]:
+        """提取一行数据"""
+        values = []
+        for _, getter in self.columns:
+            if callable(getter):
+                value = getter(obj)
+            elif isinstance(obj, dict):
+                value = obj.get(getter)
+            else:
+                value = getattr(obj, getter, None)
+            if isinstance(value, Enum):
+                value = value.value
+            values.append(value)
+        return values
+
+    async def iter_bytes(self, chunks: AsyncIterator[Sequence[Any]]) -> AsyncIterator[bytes]:
+        """
+        生成导出文件内容
+        :param chunks: 分块的数据源, 如 stream_query(...)
+        :return: 字节块异步迭代器
+        """
+        self.rows = 0
+        if self.file_type == "xlsx":
+            async for data in self._iter_xlsx(chunks):
+                yield data
+            return
+
+        buffer = io.StringIO()
+        if self.file_type == "csv":
+            writer = csv.writer(buffer)
+            writer.writerow(self.headers)
+            yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+        else:
+            yield b"["
+
+        async for chunk in chunks:
+            buffer.seek(0)
+            buffer.truncate()
+            for obj in chunk:
+                values = self.row(obj)
+                if self.file_type == "csv":
+                    writer.writerow(values)
+                else:
+                    buffer.write("," if self.rows else "")
+                    buffer.write(json.dumps(dict(zip(self.headers, values)), ensure_ascii=False, default=str))
+                self.rows += 1
+            yield buffer.getvalue().encode("utf-8")
+
+        if self.file_type == "json":
+            yield b"]"
+
+    async def _iter_xlsx(self, chunks: AsyncIterator[Sequence[Any]]) -> AsyncIterator[bytes]:
+        fd, path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(fd)
+        try:
+            await self.write_file(chunks, path)
+            async with aiofiles.open(path, "rb") as f:
+                while data := await f.read(EXPORT_CHUNK_SIZE * 64):
+                    yield data
+        finally:
+            os.remove(path)
+
+    async def write_file(self, chunks: AsyncIterator[Sequence[Any]], path: str) -> int:
+        """
+        导出到文件
+        :param chunks: 分块的数据源
+        :param path: 文件路径
+        :return: 导出行数
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if self.file_type != "xlsx":
+            async with aiofiles.open(path, "wb") as f:
+                async for data in self.iter_bytes(chunks):
+                    await f.write(data)
+            return self.rows
+
+        self.rows = 0
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet(self.sheet_name)
+        ws.append(self.headers)
+        async for chunk in chunks:
+            rows = [self.row(obj) for obj in chunk]
+            await asyncio.to_thread(lambda: [ws.append(row) for row in rows])
+            self.rows += len(rows)
+        await asyncio.to_thread(wb.save, path)
+        return self.rows
+
+    def response(self, chunks: AsyncIterator[Sequence[Any]], filename: str) -> StreamingResponse:
+        """
+        以流式响应返回导出文件
+        :param chunks: 分块的数据源
+        :param filename: 下载文件名(不含扩展名)
+        :return: 流式响应
+        """
+        filename = f"{filename}.{self.file_type}"
+        return StreamingResponse(
+            self.iter_bytes(chunks),
+            media_type=self.media_type,
+            headers={"Content-Disposition": f"attachment; filename*=utf-8''{quote(filename)}"},
+        )
+
+
+async def submit_export_job(
+    exporter: StreamingExporter,
+    source: Callable[[], AsyncIterator[Sequence[Any]]],
+    path: str,
+    task_id: Optional[str] = None,
+    **options,
+):
+    """
+    将大数据量导出作为后台任务提交到任务队列
+    :param exporter: 导出器
+    :param source: 返回数据源的函数, 在任务执行时调用(需自行创建数据库会话)
+    :param path: 导出文件路径
+    :param task_id: 任务ID
+    :param options: 任务选项, 如 priority/queue/timeout
+    :return: 任务对象, 结果为导出行数
+    """
+    from core.tasks.task_queue import task_queue
+
+    async def run() -> int:
+        return await exporter.write_file(source(), path)
+
+    options.setdefault("retry_times", 0)
+    return await task_queue.submit_task(run, task_id=task_id or f"export:{os.path.basename(path)}", **options)
+
+
 class DataImporter:
     """数据导入工具类"""
 
@@ -5,21 +5,36 @@ from sqlalchemy import text
 from sqlalchemy.orm import Query, Session
 
 from core.cache.decorators import cache
+from core.db.utils.keyset import (
+    KeysetPage,
+    KeysetPaginator,
+    OffsetPage,
+    TotalMode,
+    fetch_offset_page_sync,
+    resolve_total_sync,
+)
 
 
 class QueryOptimizer:
     """查询优化工具类"""
 
     @staticmethod
-    def paginate(query: Query, page: int = 1, page_size: int = 10, max_page_size: int = 100) -> tuple:
+    def paginate(
+        query: Query,
+        page: int = 1,
+        page_size: int = 10,
+        max_page_size: int = 100,
+        total_mode: TotalMode = TotalMode.EXACT,
+    ) -> OffsetPage:
         """分页查询
         Args:
             query: 查询对象
             page: 页码
             page_size: 每页数量
             max_page_size: 最大每页数量
+            total_mode: 总数统计方式, NONE 时总数为 None
         Returns:
-            tuple: (数据列表, 总数)
+            OffsetPage: 分页结果, 可按 (数据列表, 总数) 解包; 多取一行给出 has_next
         """
         # 验证分页参数
         if page < 1:
@@ -29,13 +44,35 @@ class QueryOptimizer:
         if page_size > max_page_size:
             page_size = max_page_size
 
-        # 计算总数
-        total = query.count()
-
-        # 分页查询
-        items = query.offset((page - 1) * page_size).limit(page_size).all()
+        # 计算总数并分页查询
+        return fetch_offset_page_sync(query, page, page_size, total_mode)
 
-        return items, total
+    @staticmethod
+    def keyset_paginate(
+        query: Query,
+        model: Type[BaseModel],
+        order_by: Union[str, List[str], None] = None,
+        cursor: Optional[str] = None,
+        page_size: int = 10,
+        max_page_size: int = 100,
+        total_mode: TotalMode = TotalMode.NONE,
+    ) -> KeysetPage:
+        """键集(游标)分页查询
+        Args:
+            query: 查询对象, 已有的排序会被 order_by 替换
+            model: 模型类
+            order_by: 排序字段列表, 如: ["create_time desc", "name"], 自动以 id 作为决胜字段
+            cursor: 上一次返回的游标, 为空表示第一页
+            page_size: 每页数量
+            max_page_size: 最大每页数量
+            total_mode: 总数统计方式
+        Returns:
+            KeysetPage: 分页结果, 包含 next_cursor / prev_cursor
+        """
+        paginator = KeysetPaginator(model, sort=order_by, cursor=cursor, size=page_size, max_size=max_page_size)
+        total, estimated = resolve_total_sync(query, total_mode)
+        items = paginator.apply(query).all()
+        return paginator.build_page(items, total=total, total_estimated=estimated)
 
     @staticmethod
     def build_filters(query: Query, model: Type[BaseModel], filters: Dict[str, Any]) -> Query:
@@ -0,0 +1,34 @@
+# -*- coding:utf-8 -*-
+"""
+gunicorn 配置
+用法: gunicorn main:app -c deploy/config/gunicorn.conf.py
+
+多个 worker 通过 PROMETHEUS_MULTIPROC_DIR 共享指标文件, 由 /metrics 汇总;
+worker 退出时清理它的存活指标文件, 避免已退出进程的 Gauge 一直留在汇总结果中
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+# 必须在导入 prometheus_client 之前设置, 否则 worker 不会写入共享目录
+multiproc_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "speedy_prometheus")
+)
+
+from core.middlewares.prometheus import mark_process_dead  # noqa: E402
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+
+def on_starting(server):
+    """主进程启动时清空上一次运行残留的指标文件"""
+    shutil.rmtree(multiproc_dir, ignore_errors=True)
+    os.makedirs(multiproc_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """worker 退出后清理它的存活指标文件"""
+    mark_process_dead(worker.pid)
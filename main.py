@@ -11,18 +11,50 @@ from typing import AsyncGenerator
 
 from fastapi import FastAPI
 
-from api.v1.api import api_router
+from core.strong.startup import StartupGraph
+
+# 启动组件, 管理器模块在初始化时才导入, 导入和初始化耗时都记录在 startup.profiler 中
+startup = StartupGraph()
+
 from core.cache.config.config import CacheConfig
-from core.cache.manager import cache_manager
 from core.config.setting import settings
-from core.db.manager import db_manager
 from core.exceptions.manager import setup_exceptions
-from core.loge.manager import logic
 from core.middlewares.manager import setup_middlewares
-from core.security.manager import security_manager
-from core.monitor.manager import monitor_manager
-from core.tasks.manager import task_manager
-from models import *  # noqa
+from core.middlewares.monitor import resource_sampler
+
+with startup.profiler.measure("models", "import"):
+    from models import *  # noqa
+
+
+def _include_routers(app: FastAPI) -> None:
+    """导入并注册 API 路由, 路由模块导入了全部接口和服务, 放到启动组件初始化之后"""
+    if getattr(app.state, "routers_included", False):
+        return
+    with startup.profiler.measure("api", "import"):
+        from api.v1.api import api_router
+    app.include_router(api_router, prefix=settings.app.api_v1_str)
+    app.state.routers_included = True
+
+
+async def _close_cache(manager) -> None:
+    """关闭缓存管理器"""
+    if getattr(manager, "_backend", None):
+        await manager.close()
+
+
+# 日志最先初始化, 其余互不依赖的管理器并行初始化; 任务管理器不阻塞启动, 启动完成后在后台初始化
+startup.add("logic", "core.loge.manager:logic")
+startup.add("db", "core.db.manager:db_manager", depends_on=["logic"])
+startup.add(
+    "cache",
+    "core.cache.manager:cache_manager",
+    depends_on=["logic"],
+    init=lambda manager: manager.init(CacheConfig()),
+    close=_close_cache,
+)
+startup.add("security", "core.security.manager:security_manager", depends_on=["logic"])
+startup.add("monitor", "core.monitor.manager:monitor_manager", depends_on=["logic"])
+startup.add("tasks", "core.tasks.manager:task_manager", depends_on=["logic"], lazy=True)
 
 
 @asynccontextmanager
@@ -32,44 +64,27 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
     """
     print(" ♻️ Starting lifespan event")
     try:
-        # 初始化日志管理器
-        await logic.init()
-
-        # 初始化数据库管理器
-        await db_manager.init()
-
-        # 初始化缓存管理器
-        await cache_manager.init(CacheConfig())
-
-        # 初始化安全管理器
-        await security_manager.init()
-
-        # 初始化任务管理器
-        # await task_manager.init()
-
-        # 初始化监控管理器
-        await monitor_manager.init()
+        await startup.start()
+        _include_routers(app)
     except Exception as e:
         print(f" ❌ Failed to initialize: {str(e)}")
         raise e
 
+    # 任务管理器默认在首次使用时初始化(Depends(startup.dependency("tasks"))), 需要消息代理, 开启后在后台预加载
+    if settings.app.preload_tasks:
+        startup.preload("tasks")
+    print(startup.profiler.report())
+    startup.profiler.check_budget(settings.app.startup_budget)
+    app.state.startup = startup
+
     yield
 
     print(" ♻️ Closing lifespan event ")
     try:
-        # 关闭缓存管理器
-        if hasattr(cache_manager, "_backend") and cache_manager._backend:
-            await cache_manager.close()
-
-        # 关闭数据库管理器
-        await db_manager.close()
-
-        # 关闭其他管理器
-        await logic.close()
-        await security_manager.close()
-        await monitor_manager.close()
-        # await task_manager.close()
-
+        # 按初始化的逆序关闭
+        await startup.stop()
+        # 停止指标中间件启动的后台资源采样
+        await resource_sampler.stop()
     except Exception as e:
         print(f" ❌ Failed to shutdown: {str(e)}")
         raise e
@@ -79,5 +94,3 @@ app = FastAPI(title=settings.app.project_name, lifespan=lifespan)
 
 setup_exceptions(app)
 setup_middlewares(app)
-
-app.include_router(api_router, prefix=settings.app.api_v1_str)
@@ -6,7 +6,7 @@
 @Date    ：2024-12-24 21:41
 @Desc    ：Speedy files
 """
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel
 
@@ -26,3 +26,4 @@ class ExportResponse(BaseModel):
     url: str
     filename: str
     size: int
+    task_id: Optional[str] = None  # 后台导出时的任务ID, 文件在任务完成后可用
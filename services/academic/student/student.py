@@ -12,15 +12,27 @@
 8. 数据完整性检查
 """
 
+import asyncio
 from datetime import date, datetime
-from typing import List, Optional, Tuple
+from typing import List, Optional, Union
 
 from fastapi import HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
 from models import Classes, Department, Major
 from sqlalchemy import and_, delete, func, or_, select
 from sqlalchemy.orm import Session, joinedload
-from third.excel.read_write import read_excel, write_excel
-
+from third.excel.read_write import read_excel
+
+from core.db.core.loader import load_many, load_one
+from core.utils.export import StreamingExporter, stream_query, stream_query_in_session, submit_export_job
+from core.db.utils.keyset import (
+    KeysetPage,
+    KeysetPaginator,
+    OffsetPage,
+    TotalMode,
+    fetch_offset_page,
+    resolve_total,
+)
 from models.student import Student
 from schemas.responses.files import ExportResponse, ImportResponse
 from schemas.responses.stats import StatsResponse
@@ -32,6 +44,30 @@ from schemas.student import (
 )
 
 
+def _format_date(value: Optional[date]) -> str:
+    return value.strftime("%Y-%m-%d") if value else ""
+
+
+# 学生导出列: (表头, 属性名或取值函数)
+STUDENT_EXPORT_COLUMNS = [
+    ("姓名", "name"),
+    ("学号", "student_id"),
+    ("身份证号", "id_card"),
+    ("性别", "gender"),
+    ("出生日期", lambda s: _format_date(s.birth_date)),
+    ("电话", lambda s: s.phone or ""),
+    ("邮箱", lambda s: s.email or ""),
+    ("院系", lambda s: s.department.name if s.department else ""),
+    ("专业", lambda s: s.major.name if s.major else ""),
+    ("班级", lambda s: s.class_.name if s.class_ else ""),
+    ("入学日期", lambda s: _format_date(s.enrollment_date)),
+    ("学历层次", "education_level"),
+    ("学制", "study_length"),
+    ("状态", "status"),
+    ("是否注册", lambda s: "是" if s.is_registered else "否"),
+]
+
+
 class StudentService:
     """学生服务类
 
@@ -60,6 +96,41 @@ class StudentService:
             "nationality",
         ]
 
+    def _build_query(self, query: Optional[str] = None, filter_data: Optional[StudentFilter] = None):
+        """构建带关联加载、搜索和过滤条件的学生查询"""
+        # 构建基础查询
+        stmt = select(Student).options(
+            joinedload(Student.department),
+            joinedload(Student.major),
+            joinedload(Student.class_),
+        )
+
+        # 添加搜索条件
+        if query:
+            search_conditions = []
+            for field in self.searchable_fields:
+                search_conditions.append(getattr(Student, field).ilike(f"%{query}%"))
+            stmt = stmt.filter(or_(*search_conditions))
+
+        # 添加过滤条件
+        if filter_data:
+            filter_conditions = []
+            for field in self.filterable_fields:
+                value = getattr(filter_data, field, None)
+                if value is not None:
+                    filter_conditions.append(getattr(Student, field) == value)
+
+            # 日期范围过滤
+            if filter_data.enrollment_date_start:
+                filter_conditions.append(Student.enrollment_date >= filter_data.enrollment_date_start)
+            if filter_data.enrollment_date_end:
+                filter_conditions.append(Student.enrollment_date <= filter_data.enrollment_date_end)
+
+            if filter_conditions:
+                stmt = stmt.filter(and_(*filter_conditions))
+
+        return stmt
+
     async def get_list(
         self,
         db: Session,
@@ -68,7 +139,9 @@ class StudentService:
         size: int = 20,
         sort: Optional[str] = None,
         filter_data: Optional[StudentFilter] = None,
-    ) -> Tuple[int, List[StudentResponse]]:
+        cursor: Optional[str] = None,
+        total_mode: TotalMode = TotalMode.EXACT,
+    ) -> Union[OffsetPage[StudentResponse], KeysetPage[StudentResponse]]:
         """获取学生列表
 
         Args:
@@ -76,46 +149,28 @@ class StudentService:
             query: 搜索关键词
             page: 页码
             size: 每页数量
-            sort: 排序字段
+            sort: 排序字段, 多个字段用逗号分隔
             filter_data: 过滤条件
+            cursor: 键集分页游标, 不为 None 时忽略 page 并按游标翻页(空串表示第一页)
+            total_mode: 总数统计方式
 
         Returns:
-            总数和学生列表
+            页码分页时返回 OffsetPage, 键集分页时返回 KeysetPage
 
         Raises:
             HTTPException: 参数错误时抛出
         """
         try:
-            # 构建基础查询
-            stmt = select(Student).options(
-                joinedload(Student.department),
-                joinedload(Student.major),
-                joinedload(Student.class_),
-            )
-
-            # 添加搜索条件
-            if query:
-                search_conditions = []
-                for field in self.searchable_fields:
-                    search_conditions.append(getattr(Student, field).ilike(f"%{query}%"))
-                stmt = stmt.filter(or_(*search_conditions))
-
-            # 添加过滤条件
-            if filter_data:
-                filter_conditions = []
-                for field in self.filterable_fields:
-                    value = getattr(filter_data, field, None)
-                    if value is not None:
-                        filter_conditions.append(getattr(Student, field) == value)
+            stmt = self._build_query(query, filter_data)
 
-                # 日期范围过滤
-                if filter_data.enrollment_date_start:
-                    filter_conditions.append(Student.enrollment_date >= filter_data.enrollment_date_start)
-                if filter_data.enrollment_date_end:
-                    filter_conditions.append(Student.enrollment_date <= filter_data.enrollment_date_end)
-
-                if filter_conditions:
-                    stmt = stmt.filter(and_(*filter_conditions))
+            # 键集分页: 按排序键定位, 不使用 OFFSET
+            if cursor is not None:
+                paginator = KeysetPaginator(Student, sort=sort, cursor=cursor, size=size)
+                total, estimated = await resolve_total(db, stmt, total_mode)
+                students = (await db.scalars(paginator.apply(stmt))).unique().all()
+                page_result = paginator.build_page(students, total=total, total_estimated=estimated)
+                page_result.items = [StudentResponse.model_validate(s) for s in page_result.items]
+                return page_result
 
             # 添加排序
             if sort:
@@ -126,16 +181,10 @@ class StudentService:
             else:
                 stmt = stmt.order_by(Student.id.desc())
 
-            # 获取总数
-            total = await db.scalar(select(func.count()).select_from(stmt.subquery()))
-
-            # 分页
-            stmt = stmt.offset((page - 1) * size).limit(size)
-
-            # 执行查询
-            students = (await db.scalars(stmt)).unique().all()
-
-            return total, [StudentResponse.model_validate(s) for s in students]
+            # 获取总数并分页, 多取一行判断是否有下一页
+            page_result = await fetch_offset_page(db, stmt, page, size, total_mode, unique=True)
+            page_result.items = [StudentResponse.model_validate(s) for s in page_result.items]
+            return page_result
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"查询学生列表失败: {str(e)}")
 
@@ -354,8 +403,9 @@ class StudentService:
         """
         try:
             updated = []
-            for item in items:
-                student = await db.get(Student, item.id)
+            # 一次查询取回全部待更新学生
+            students = await load_many(db, Student, [item.id for item in items])
+            for item, student in zip(items, students):
                 if student:
                     # 检查学号唯一性
                     if (
@@ -480,62 +530,51 @@ class StudentService:
         db: Session,
         query: Optional[str] = None,
         filter_data: Optional[StudentFilter] = None,
-    ) -> ExportResponse:
+        file_type: str = "xlsx",
+        stream: bool = False,
+        background: bool = False,
+    ) -> Union[ExportResponse, StreamingResponse]:
         """导出学生数据
 
+        通过服务端游标分块读取全部匹配的学生, 内存占用不随行数增长
+
         Args:
             db: 数据库会话
             query: 搜索关键词
             filter_data: 过滤条件
+            file_type: 导出格式, xlsx / csv / json
+            stream: 是否直接以流式响应返回文件
+            background: 是否作为后台任务导出, 立即返回任务ID和文件地址
 
         Returns:
-            导出结果
+            导出结果, stream 为 True 时返回流式响应
 
         Raises:
             HTTPException: 导出失败时抛出
         """
         try:
-            # 获取数据
-            total, students = await self.get_list(
-                db,
-                query=query,
-                filter_data=filter_data,
-                page=1,
-                size=10000,  # 限制导出数量
-            )
+            exporter = StreamingExporter(STUDENT_EXPORT_COLUMNS, file_type=file_type, sheet_name="学生信息")
+            stmt = self._build_query(query, filter_data).order_by(Student.id)
+            name = f"学生信息_{datetime.now().strftime('%Y%m%d%H%M%S')}"
 
-            # 转换为Excel格式
-            data = []
-            for student in students:
-                data.append(
-                    {
-                        "姓名": student.name,
-                        "学号": student.student_id,
-                        "身份证号": student.id_card,
-                        "性别": student.gender.value,
-                        "出生日期": student.birth_date.strftime("%Y-%m-%d"),
-                        "电话": student.phone or "",
-                        "邮箱": student.email or "",
-                        "院系": student.department.name if student.department else "",
-                        "专业": student.major.name if student.major else "",
-                        "班级": student.class_.name if student.class_ else "",
-                        "入学日期": student.enrollment_date.strftime("%Y-%m-%d"),
-                        "学历层次": student.education_level,
-                        "学制": student.study_length,
-                        "状态": student.status.value,
-                        "是否注册": "是" if student.is_registered else "否",
-                    }
-                )
+            if stream:
+                # 响应体在接口返回后才发送, 此时请求的会话可能已关闭, 在数据源内部创建会话
+                return exporter.response(stream_query_in_session(stmt), name)
 
-            # 生成Excel文件
-            filename = f"学生信息_{datetime.now().strftime('%Y%m%d%H%M%S')}.xlsx"
+            filename = f"{name}.{file_type}"
             filepath = f"static/exports/{filename}"
-            await write_excel(data, filepath, sheet_name="学生信息")
+            if background:
+                # 后台任务在请求结束后执行, 使用独立的会话
+                task = await submit_export_job(exporter, lambda: stream_query_in_session(stmt), filepath)
+                return ExportResponse(
+                    url=f"/static/exports/{filename}", filename=filename, size=0, task_id=task.task_id
+                )
 
+            size = await exporter.write_file(stream_query(db, stmt), filepath)
             return ExportResponse(
                 url=f"/static/exports/{filename}",
                 filename=filename,
-                size=len(data),
+                size=size,
             )
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"导出学生数据失败: {str(e)}")
@@ -652,23 +691,15 @@ class StudentService:
         major_id: Optional[int] = None,
         class_id: Optional[int] = None,
     ) -> bool:
-        """验证关联数据是否存在"""
-        if department_id:
-            dept = await db.get(Department, department_id)
-            if not dept:
-                return False
-
-        if major_id:
-            major = await db.get(Major, major_id)
-            if not major:
-                return False
-
-        if class_id:
-            class_ = db.get(Classes, class_id)
-            if not class_:
-                return False
-
-        return True
+        """验证关联数据是否存在
+
+        通过会话级批量加载器查询, 批量操作中重复的关联ID只查询一次;
+        三个加载器的查询经会话锁依次执行, 不会在同一会话上并发
+        """
+        relations = [(Department, department_id), (Major, major_id), (Classes, class_id)]
+        checks = [(model, key) for model, key in relations if key]
+        found = await asyncio.gather(*(load_one(db, model, key) for model, key in checks))
+        return all(obj is not None for obj in found)
 
     async def has_related_records(self, db: Session, student_id: int) -> bool:
         """检查是否存在关联数据"""
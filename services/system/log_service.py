@@ -1,20 +1,30 @@
 """
 日志服务模块
 """
-from typing import List, Optional, Tuple
+from typing import Any, List, Optional, Union
 
 from sqlalchemy.orm import Session
 
 from api.v1.endpoints.system.logs import Log, LogCreate, LogUpdate
+from core.db.utils.keyset import KeysetPage, OffsetPage, TotalMode, fetch_offset_page_sync
+from core.utils.query import QueryOptimizer
 
 
 class LogService:
     """日志服务类"""
 
     async def get_list(
-        self, db: Session, query: Optional[str] = None, page: int = 1, size: int = 20, sort: Optional[str] = None
-    ) -> Tuple[int, List[Log]]:
-        """获取日志列表"""
+        self,
+        db: Session,
+        query: Optional[str] = None,
+        page: int = 1,
+        size: int = 20,
+        sort: Optional[str] = None,
+        filter_data: Any = None,
+        cursor: Optional[str] = None,
+        total_mode: TotalMode = TotalMode.EXACT,
+    ) -> Union[OffsetPage[Log], KeysetPage[Log]]:
+        """获取日志列表, cursor 不为 None 时使用键集分页"""
         # 构建查询
         stmt = db.query(Log).filter(Log.is_delete == False)
 
@@ -24,8 +34,11 @@ class LogService:
                 Log.title.ilike(f"%{query}%") | Log.content.ilike(f"%{query}%") | Log.module.ilike(f"%{query}%")
             )
 
-        # 获取总数
-        total = stmt.count()
+        # 键集分页, 日志表数据量大时深页也不退化
+        if cursor is not None:
+            return QueryOptimizer.keyset_paginate(
+                stmt, Log, order_by=sort or "-create_time", cursor=cursor, page_size=size, total_mode=total_mode
+            )
 
         # 排序
         if sort:
@@ -36,13 +49,8 @@ class LogService:
         else:
             stmt = stmt.order_by(Log.create_time.desc())
 
-        # 分页
-        stmt = stmt.offset((page - 1) * size).limit(size)
-
-        # 执行查询
-        items = stmt.all()
-
-        return total, items
+        # 获取总数并分页, 多取一行判断是否有下一页
+        return fetch_offset_page_sync(stmt, page, size, total_mode)
 
     async def create(self, db: Session, log: LogCreate) -> Log:
         """创建日志"""
@@ -0,0 +1,264 @@
+"""
+流式增量备份测试
+"""
+
+import random
+import sqlite3
+import sys
+import threading
+import zlib
+
+import pytest
+
+from core.strong.backup_stream import (
+    BackupEngine,
+    BackupError,
+    BackupMode,
+    BackupVerificationError,
+    Chunker,
+    LocalBackupStorage,
+    StreamEntry,
+    TokenBucket,
+    chunk_key,
+    command_sink,
+    command_source,
+    sqlite_restore,
+    sqlite_source,
+)
+from core.strong.breaker import ManualClock
+
+
+def create_database(path, rows=3000):
+    connection = sqlite3.connect(str(path))
+    connection.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, bio TEXT)")
+    connection.executemany(
+        "INSERT INTO users (name, bio) VALUES (?, ?)",
+        [(f"user-{i}", f"bio line for user {i}\nwith a newline and 'quotes'") for i in range(rows)],
+    )
+    connection.commit()
+    connection.close()
+
+
+def dump(path):
+    connection = sqlite3.connect(str(path))
+    try:
+        return list(connection.iterdump())
+    finally:
+        connection.close()
+
+
+@pytest.fixture
+def engine(tmp_path):
+    storage = LocalBackupStorage(tmp_path / "backups")
+    return BackupEngine(storage, chunker=Chunker(min_size=4096, max_size=32768, mask_bits=4), workers=4)
+
+
+def test_sqlite_backup_restores_identical_database(tmp_path, engine):
+    source = tmp_path / "app.db"
+    create_database(source)
+    manifest = engine.backup("b1", {"database.sql": lambda: sqlite_source(source)}, mode=BackupMode.FULL)
+
+    assert manifest.chunks > 5 and manifest.reused_chunks == 0
+    assert manifest.stored_size < manifest.size
+    # 存储中只有块和清单, 没有完整的导出文件
+    assert {key.split("/")[0] for key in engine.storage.keys()} == {"chunks", "manifests"}
+    assert engine.verify("b1").name == "b1"
+
+    target = tmp_path / "restored.db"
+    sqlite_restore(target, engine.read("b1", "database.sql"))
+    assert dump(target) == dump(source)
+
+
+def test_incremental_and_differential_backups_skip_unchanged_chunks(tmp_path, engine):
+    source = tmp_path / "app.db"
+    create_database(source)
+    full = engine.backup("full", {"database.sql": lambda: sqlite_source(source)}, mode=BackupMode.FULL)
+
+    connection = sqlite3.connect(str(source))
+    connection.execute("UPDATE users SET name = 'changed' WHERE id = 1500")
+    connection.commit()
+    connection.close()
+    incremental = engine.backup("inc", {"database.sql": lambda: sqlite_source(source)})
+    assert incremental.parent == "full" and incremental.mode is BackupMode.INCREMENTAL
+    assert incremental.chunks - incremental.reused_chunks <= 3
+    assert incremental.stored_size * 10 < full.stored_size
+
+    connection = sqlite3.connect(str(source))
+    connection.execute("INSERT INTO users (name, bio) VALUES ('new', 'appended')")
+    connection.commit()
+    connection.close()
+    differential = engine.backup("diff", {"database.sql": lambda: sqlite_source(source)}, mode="differential")
+    # 差异备份以全量备份为基准, 包含自全量以来的全部变化
+    assert differential.parent == "full"
+    assert differential.chunks - differential.reused_chunks <= 5
+
+    for name in ("full", "inc", "diff"):
+        engine.verify(name)
+    target = tmp_path / "restored.db"
+    sqlite_restore(target, engine.read("inc", "database.sql"))
+    assert sqlite3.connect(str(target)).execute("SELECT name FROM users WHERE id = 1500").fetchone() == ("changed",)
+
+
+def test_backups_with_different_compression_share_chunks(tmp_path):
+    storage = LocalBackupStorage(tmp_path / "backups")
+    chunker = Chunker(min_size=4096, max_size=32768, mask_bits=4)
+    data = [b"".join(f"line {i}\n".encode() for i in range(20000))]
+    compressed = BackupEngine(storage, chunker=chunker, compression_level=6)
+    plain = BackupEngine(storage, chunker=chunker, compression_level=None)
+
+    compressed.backup("a", {"data": lambda: data}, mode=BackupMode.FULL)
+    # 切换压缩设置后增量备份复用压缩的块, 每块按写入时的压缩方式读取
+    changed = [data[0] + b"appended\n"]
+    incremental = plain.backup("b", {"data": lambda: changed})
+    assert incremental.compression == "none" and incremental.reused_chunks > 0
+    assert {chunk[2] for chunk in incremental.streams["data"].chunks} == {"zlib", "none"}
+    plain.verify("b")
+    assert b"".join(plain.read("b", "data")) == changed[0]
+
+    compressed.backup("c", {"data": lambda: changed})
+    assert b"".join(compressed.read("c", "data")) == changed[0]
+
+    # 旧版清单的块没有记录压缩方式, 沿用清单的压缩方式
+    legacy = StreamEntry.from_dict({"chunks": [["abc", 3]], "size": 3, "sha256": ""}, "none")
+    assert legacy.chunks == [("abc", 3, "none")]
+
+
+def test_chunk_boundaries_follow_content():
+    chunker = Chunker(min_size=1024, max_size=8192, mask_bits=3)
+    lines = [f"INSERT INTO t VALUES ({i}, 'row {i}');\n".encode() for i in range(5000)]
+    original = list(chunker.split(iter(lines)))
+    edited_lines = lines[:2500] + [b"INSERT INTO t VALUES (-1, 'inserted');\n"] + lines[2500:]
+    joined = b"".join(edited_lines)
+    # 输入的分块方式不影响切分结果
+    edited = list(chunker.split(joined[i : i + 777] for i in range(0, len(joined), 777)))
+
+    assert b"".join(original) == b"".join(lines) and b"".join(edited) == b"".join(edited_lines)
+    assert all(1024 <= len(chunk) <= 8192 for chunk in original[:-1])
+    assert len(set(original) - set(edited)) <= 2
+
+    # 没有换行的数据按 max_size 切分
+    binary = b"x" * 25600
+    assert [len(chunk) for chunk in chunker.split([binary])] == [8192, 8192, 8192, 1024]
+
+
+def test_corrupted_or_missing_chunks_fail_verification(tmp_path, engine):
+    data = b"".join(f"line {i}\n".encode() for i in range(20000))
+    manifest = engine.backup("b1", {"data": lambda: [data]})
+    first, second = manifest.streams["data"].chunks[:2]
+
+    engine.storage.put(chunk_key(first[0]), zlib.compress(b"tampered"))
+    with pytest.raises(BackupVerificationError, match="Checksum mismatch"):
+        engine.verify("b1")
+
+    engine.storage.delete(chunk_key(second[0]))
+    with pytest.raises(BackupVerificationError):
+        list(engine.read("b1", "data"))
+    with pytest.raises(BackupError, match="not found"):
+        engine.verify("missing")
+
+
+def test_bandwidth_throttle_and_progress(tmp_path):
+    clock = ManualClock()
+    throttle = TokenBucket(rate=100_000, burst=10_000, clock=clock, sleep=clock.advance)
+    engine = BackupEngine(
+        LocalBackupStorage(tmp_path),
+        chunker=Chunker(min_size=4096, max_size=16384),
+        compression_level=None,
+        throttle=throttle,
+    )
+    events = []
+    data = random.Random(1).randbytes(512_000)  # 随机数据, 没有重复的块
+    manifest = engine.backup("b1", {"data": lambda: [data]}, progress=lambda p: events.append(p.bytes_read))
+
+    assert manifest.stored_size == len(data)
+    # 写入 512000 字节, 扣除初始的 10000 字节突发额度, 按 100000 字节/秒需要约 5.02 秒
+    assert clock() == pytest.approx((len(data) - 10_000) / 100_000)
+    assert events == sorted(events) and events[-1] == len(data) and len(events) == manifest.chunks
+    assert b"".join(engine.read("b1", "data")) == data
+
+
+def test_garbage_collection_keeps_referenced_chunks(tmp_path, engine):
+    old = b"".join(f"old {i}\n".encode() for i in range(20000))
+    new = b"".join(f"new {i}\n".encode() for i in range(20000))
+    engine.backup("old", {"data": lambda: [old], "shared": lambda: [new]})
+    engine.backup("new", {"data": lambda: [new]})
+
+    engine.delete("old")
+    removed = engine.collect_garbage()
+    assert removed and all(key.startswith("chunks/") for key in removed)
+    assert [manifest.name for manifest in engine.manifests()] == ["new"]
+    assert b"".join(engine.read("new", "data")) == new
+    assert engine.collect_garbage() == []
+
+
+def test_size_limit_aborts_without_manifest(tmp_path):
+    engine = BackupEngine(
+        LocalBackupStorage(tmp_path), chunker=Chunker(4096, 4096), compression_level=None, max_size=10_000
+    )
+    with pytest.raises(BackupError, match="exceeds limit"):
+        engine.backup("big", {"data": lambda: [random.Random(2).randbytes(50_000)]})
+    assert engine.manifests() == []
+    assert engine.collect_garbage() and list(engine.storage.keys()) == []
+
+
+def test_command_source_streams_stdout_and_reports_failures():
+    script = "import sys\nfor i in range(1000): sys.stdout.write(f'row {i}\\n')"
+    output = b"".join(command_source([sys.executable, "-c", script], read_size=1024))
+    assert output.splitlines()[-1] == b"row 999"
+
+    with pytest.raises(BackupError, match="exited with 3: boom"):
+        list(command_source([sys.executable, "-c", "import sys; sys.stderr.write('boom'); sys.exit(3)"]))
+
+
+def run_with_timeout(fn, timeout=10):
+    result = {}
+
+    def target():
+        try:
+            result["value"] = fn()
+        except Exception as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "command blocked"
+    if "error" in result:
+        raise result["error"]
+    return result.get("value")
+
+
+def test_commands_with_large_stderr_do_not_block():
+    # 标准错误超过管道缓冲区大小, 只读标准输出或只写标准输入时不能互相等待
+    noisy = "import sys\nsys.stderr.write('w' * 1_000_000)\nsys.stderr.flush()\n"
+    script = noisy + "for i in range(1000): sys.stdout.write(f'row {i}\\n')"
+    output = run_with_timeout(lambda: b"".join(command_source([sys.executable, "-c", script])))
+    assert output.splitlines()[-1] == b"row 999"
+
+    script = noisy + "data = sys.stdin.buffer.read()\nsys.exit(0 if len(data) == 1_000_000 else 1)"
+    run_with_timeout(lambda: command_sink([sys.executable, "-c", script], [b"x" * 100_000] * 10))
+
+    script = noisy + "sys.stderr.write('failed')\nsys.exit(2)"
+    with pytest.raises(BackupError, match=r"exited with 2: w+failed$"):
+        run_with_timeout(lambda: command_sink([sys.executable, "-c", script], [b"x" * 100_000] * 10))
+
+
+def test_sqlite_restore_replaces_database_only_after_success(tmp_path, engine):
+    source = tmp_path / "app.db"
+    create_database(source, rows=100)
+    engine.backup("b1", {"database.sql": lambda: sqlite_source(source)})
+
+    # 恢复到已有的数据库: 整体替换, 不与旧表冲突
+    target = tmp_path / "target.db"
+    create_database(target, rows=5)
+    sqlite_restore(target, engine.read("b1", "database.sql"))
+    assert dump(target) == dump(source)
+
+    def broken():
+        yield from engine.read("b1", "database.sql")
+        yield b"INSERT INTO missing VALUES (1);\n"
+
+    with pytest.raises(sqlite3.OperationalError):
+        sqlite_restore(target, broken())
+    assert dump(target) == dump(source)
+    assert not (tmp_path / "target.db.restore").exists()
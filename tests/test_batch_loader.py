@@ -0,0 +1,203 @@
+"""
+批量加载器与查询计数测试
+"""
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, create_engine, insert, select
+from sqlalchemy.orm import Session, declarative_base
+from sqlalchemy.pool import StaticPool
+
+from core.db.core.loader import DataLoader, load_many, load_one, loader_stats, model_loader
+from core.db.utils.query_counter import count_queries
+from core.middlewares.query_counter import QueryCounterMiddleware
+
+Base = declarative_base()
+
+
+class Department(Base):
+    __tablename__ = "departments"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+    is_deleted = Column(Boolean, default=False)
+
+
+class Teacher(Base):
+    __tablename__ = "teachers"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+    department_id = Column(Integer, ForeignKey("departments.id"))
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Department), [{"id": i, "name": f"d{i}", "is_deleted": i == 5} for i in range(1, 11)])
+        conn.execute(insert(Teacher), [{"id": i, "name": f"t{i}", "department_id": i % 10 + 1} for i in range(1, 201)])
+    return engine
+
+
+@pytest.fixture
+def db(engine):
+    with Session(engine) as session:
+        yield session
+
+
+async def test_loads_in_same_tick_are_coalesced(db):
+    teachers = db.scalars(select(Teacher)).all()
+
+    async def resolve(teacher):
+        return await load_one(db, Department, teacher.department_id)
+
+    with count_queries() as counter:
+        departments = await asyncio.gather(*(resolve(t) for t in teachers))
+
+    assert counter.total == 1
+    assert [d.id for d in departments] == [t.department_id for t in teachers]
+    stats = loader_stats(db)["Department.id"]
+    assert stats == {"loads": 200, "cache_hits": 190, "batches": 1, "keys": 10}
+
+
+async def test_cache_and_dedup_within_session(db):
+    with count_queries() as counter:
+        first = await load_many(db, Department, [1, 2, 2, 3])
+        second = await load_one(db, Department, 2)
+        missing = await load_many(db, Department, [999])
+    assert counter.total == 2
+    assert first[1] is first[2] is second
+    assert missing == [None]
+
+
+async def test_only_active_excludes_soft_deleted(db):
+    assert (await load_one(db, Department, 5)).id == 5
+    assert await model_loader(db, Department, only_active=True).load(5) is None
+
+
+async def test_one_to_many_loader(db):
+    loader = model_loader(db, Teacher, column="department_id", many=True)
+    with count_queries() as counter:
+        groups = await loader.load_many([1, 2, 42])
+    assert counter.total == 1
+    assert len(groups[0]) == 20 and all(t.department_id == 1 for t in groups[0])
+    assert groups[2] == []
+
+
+async def test_nested_levels_batch_per_level(db):
+    # 部门 -> 教师 -> 教师所在部门: 每一层一次查询
+    with count_queries() as counter:
+        departments = await load_many(db, Department, list(range(1, 11)))
+        teacher_groups = await asyncio.gather(
+            *(model_loader(db, Teacher, column="department_id", many=True).load(d.id) for d in departments)
+        )
+        await asyncio.gather(*(load_one(db, Department, t.department_id) for ts in teacher_groups for t in ts))
+    assert counter.total == 2  # 最后一层全部命中缓存
+
+
+async def test_max_batch_size_splits_queries():
+    calls = []
+
+    async def batch(keys):
+        calls.append(list(keys))
+        return [key * 2 for key in keys]
+
+    loader = DataLoader(batch, max_batch_size=4)
+    results = await loader.load_many(list(range(10)))
+    assert results == [key * 2 for key in range(10)]
+    assert [len(c) for c in calls] == [4, 4, 2]
+
+
+async def test_errors_propagate_and_are_not_cached():
+    attempts = []
+
+    async def batch(keys):
+        attempts.append(keys)
+        if len(attempts) == 1:
+            raise RuntimeError("db down")
+        return {key: key for key in keys}
+
+    loader = DataLoader(batch)
+    with pytest.raises(RuntimeError):
+        await asyncio.gather(loader.load(1), loader.load(2))
+    assert await loader.load(1) == 1
+    assert len(attempts) == 2
+
+
+async def test_counter_flags_n_plus_one(db):
+    teachers = db.scalars(select(Teacher).limit(30)).all()
+    with count_queries(threshold=10) as counter:
+        for teacher in teachers:
+            db.execute(select(Department).where(Department.id == teacher.department_id)).scalar_one()
+    assert counter.has_n_plus_one
+    assert counter.suspects[0]["count"] == 30
+
+
+def test_middleware_reports_query_count(engine):
+    app = FastAPI()
+    app.add_middleware(QueryCounterMiddleware, threshold=5)
+
+    @app.get("/teachers")
+    async def list_teachers():
+        with Session(engine) as session:
+            teachers = session.scalars(select(Teacher).limit(20)).all()
+            departments = await asyncio.gather(*(load_one(session, Department, t.department_id) for t in teachers))
+            return [{"teacher": t.name, "department": d.name} for t, d in zip(teachers, departments)]
+
+    @app.get("/teachers/naive")
+    async def list_teachers_naive():
+        with Session(engine) as session:
+            teachers = session.scalars(select(Teacher).limit(20)).all()
+            return [session.get(Department, t.department_id).name for t in teachers]
+
+    client = TestClient(app)
+    assert client.get("/teachers").headers["x-query-count"] == "2"
+    # 逐个 get: 1 次列表查询 + 每个教师一次部门查询
+    assert client.get("/teachers/naive").headers["x-query-count"] == "21"
+
+
+@pytest.fixture
+async def async_db(tmp_path):
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'loader.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(Department), [{"id": i, "name": f"d{i}"} for i in range(1, 11)])
+        await conn.execute(insert(Teacher), [{"id": i, "name": f"t{i}", "department_id": i} for i in range(1, 11)])
+    async with AsyncSession(engine) as session:
+        yield session
+    await engine.dispose()
+
+
+async def test_async_session_batches_run_one_at_a_time(async_db):
+    # 不同模型的加载器和拆分出的批次在同一轮次派发, 在同一个 AsyncSession 上依次执行
+    execute = async_db.execute
+    state = {"running": 0, "peak": 0}
+
+    async def tracked(*args, **kwargs):
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        try:
+            await asyncio.sleep(0.01)
+            return await execute(*args, **kwargs)
+        finally:
+            state["running"] -= 1
+
+    async_db.execute = tracked
+    departments = model_loader(async_db, Department, max_batch_size=3)
+    found = await asyncio.gather(
+        departments.load_many(list(range(1, 11))),
+        load_one(async_db, Teacher, 4),
+        model_loader(async_db, Teacher, column="department_id", many=True).load(7),
+    )
+    assert [d.id for d in found[0]] == list(range(1, 11))
+    assert found[1].name == "t4" and [t.id for t in found[2]] == [7]
+    assert departments.stats["batches"] == 4
+    assert state["peak"] == 1
@@ -0,0 +1,190 @@
+"""
+批量写入测试
+"""
+
+import time
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import JSON, Column, DateTime, Integer, String, create_engine, func, select
+from sqlalchemy.orm import Session, declarative_base
+
+from core.db.core import cache as model_cache
+from core.db.utils.bulk import bulk_insert, bulk_update, bulk_upsert, supports_returning
+
+Base = declarative_base()
+
+
+class Course(Base):
+    __tablename__ = "courses"
+
+    id = Column(Integer, primary_key=True)
+    code = Column(String(16), unique=True, nullable=False)
+    name = Column(String(64))
+    credit = Column(Integer, default=2)
+    created_at = Column(DateTime, default=datetime.now)
+
+
+class Note(Base):
+    """带时间戳、扩展字段并启用模型缓存的模型"""
+
+    __tablename__ = "notes"
+    _cache_enabled = True
+    _cache_prefix = "note"
+
+    id = Column(Integer, primary_key=True)
+    code = Column(String(16), unique=True, nullable=False)
+    body = Column(String(64))
+    ext_json = Column(JSON)
+    create_time = Column(DateTime)
+    update_time = Column(DateTime)
+
+
+class FakeCache:
+    def __init__(self):
+        self.deleted = []
+
+    async def delete(self, key):
+        self.deleted.append(key)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def db(engine):
+    with Session(engine, expire_on_commit=False) as session:
+        yield session
+
+
+@pytest.fixture(params=[True, False], ids=["returning", "fallback"])
+def any_db(request, engine):
+    if not request.param:
+        # 模拟不支持 RETURNING 的方言
+        engine.dialect.insert_returning = False
+        engine.dialect.insert_executemany_returning = False
+        engine.dialect.update_returning = False
+    with Session(engine, expire_on_commit=False) as session:
+        yield session
+
+
+def rows(n, start=0):
+    return [{"code": f"C{i:05d}", "name": f"course {i}"} for i in range(start, start + n)]
+
+
+async def test_insert_returns_generated_values_in_order(any_db):
+    created = await bulk_insert(any_db, Course, rows(2500), chunk_size=1000)
+    any_db.commit()
+    assert [c.code for c in created] == [f"C{i:05d}" for i in range(2500)]
+    assert all(c.id is not None and c.credit == 2 and c.created_at is not None for c in created)
+    assert any_db.scalar(select(func.count()).select_from(Course)) == 2500
+
+
+async def test_update_only_touches_given_columns(any_db):
+    created = await bulk_insert(any_db, Course, rows(5))
+    any_db.commit()
+    updated = await bulk_update(
+        any_db,
+        Course,
+        [
+            {"id": created[0].id, "name": "renamed"},
+            {"id": created[1].id, "credit": 4},
+            {"id": created[2].id, "name": "both", "credit": 5},
+            {"id": 999, "name": "missing"},
+        ],
+    )
+    any_db.commit()
+    assert [c.id for c in updated] == [c.id for c in created[:3]]
+    # 会话中的对象同步刷新
+    assert (created[0].name, created[0].credit) == ("renamed", 2)
+    assert (created[1].name, created[1].credit) == ("course 1", 4)
+    assert (created[2].name, created[2].credit) == ("both", 5)
+    any_db.expire_all()
+    assert any_db.get(Course, created[3].id).name == "course 3"
+
+
+async def test_upsert_updates_conflicts_and_inserts_new(any_db):
+    await bulk_insert(any_db, Course, rows(3))
+    any_db.commit()
+    results = await bulk_upsert(
+        any_db,
+        Course,
+        [{"code": "C00001", "name": "updated"}, {"code": "C00009", "name": "new"}],
+        conflict_keys=["code"],
+    )
+    any_db.commit()
+    assert sorted((c.code, c.name) for c in results) == [("C00001", "updated"), ("C00009", "new")]
+    assert any_db.scalar(select(func.count()).select_from(Course)) == 4
+
+
+async def test_upsert_ignore_conflicts(db):
+    await bulk_insert(db, Course, rows(2))
+    results = await bulk_upsert(
+        db,
+        Course,
+        [{"code": "C00000", "name": "ignored"}, {"code": "C00005", "name": "x"}],
+        conflict_keys=["code"],
+        update_fields=[],
+    )
+    db.commit()
+    assert [c.code for c in results] == ["C00005"]
+    assert db.scalar(select(Course.name).where(Course.code == "C00000")) == "course 0"
+
+
+async def test_bulk_writes_apply_event_fields_and_invalidate_cache(any_db, monkeypatch):
+    cache = FakeCache()
+    monkeypatch.setattr(model_cache, "cache_manager", cache)
+    before = datetime.now()
+    created = await bulk_insert(any_db, Note, [{"code": "a", "ext_json": {"day": date(2024, 1, 2)}}, {"code": "b"}])
+    any_db.commit()
+    # Core 层语句不触发 ORM 事件, 时间戳和 ext_json 规范化直接写入行数据
+    assert created[0].ext_json == {"day": "2024-01-02"}
+    assert all(note.create_time >= before and note.update_time >= before for note in created)
+    assert cache.deleted == []
+
+    old = datetime.now() - timedelta(days=1)
+    any_db.query(Note).update({Note.create_time: old, Note.update_time: old})
+    any_db.commit()
+    await bulk_update(any_db, Note, [{"id": created[0].id, "body": "x"}])
+    await bulk_upsert(any_db, Note, [{"code": "b", "body": "y"}, {"code": "c", "body": "z"}], conflict_keys=["code"])
+    any_db.commit()
+    any_db.expire_all()
+    a, b = any_db.get(Note, created[0].id), any_db.get(Note, created[1].id)
+    assert a.create_time == b.create_time == old and a.update_time > old and b.update_time > old
+    assert cache.deleted[0] == f"note:id:{created[0].id}" and f"note:id:{created[1].id}" in cache.deleted
+
+
+async def test_update_respects_parameter_limit(engine, db):
+    engine.dialect.insertmanyvalues_max_parameters = 30
+    created = await bulk_insert(db, Course, rows(40))
+    updated = await bulk_update(db, Course, [{"id": c.id, "name": "n", "credit": 3} for c in created])
+    db.commit()
+    assert len(updated) == 40 and all(c.credit == 3 for c in created)
+
+
+async def test_bulk_insert_faster_than_per_row_refresh(engine):
+    assert supports_returning(Session(engine), "insert")
+    n = 5000
+
+    with Session(engine) as session:
+        start = time.perf_counter()
+        objs = [Course(**row) for row in rows(n)]
+        session.add_all(objs)
+        session.commit()
+        for obj in objs:
+            session.refresh(obj)
+        per_row = time.perf_counter() - start
+
+    with Session(engine, expire_on_commit=False) as session:
+        start = time.perf_counter()
+        created = await bulk_insert(session, Course, rows(n, start=n))
+        session.commit()
+        bulk = time.perf_counter() - start
+
+    print(f"\nper-row refresh: {n / per_row:,.0f} rows/s, bulk RETURNING: {n / bulk:,.0f} rows/s")
+    assert len(created) == n and created[-1].id == 2 * n
+    assert bulk < per_row
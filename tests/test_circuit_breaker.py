@@ -0,0 +1,210 @@
+"""
+滑动窗口断路器测试
+"""
+
+import random
+import time
+
+from core.strong.breaker import (
+    BreakerConfig,
+    BreakerRegistry,
+    BreakerState,
+    CountWindow,
+    ManualClock,
+    SlidingWindowBreaker,
+    TimeWindow,
+)
+
+
+def breaker(clock=None, **options):
+    options.setdefault("minimum_calls", 4)
+    options.setdefault("window_size", 10)
+    return SlidingWindowBreaker("test", BreakerConfig(**options), clock=clock or ManualClock())
+
+
+def call(target, failed=False, duration=0.01):
+    allowed = target.allow()
+    if allowed:
+        target.record(duration, failed)
+    return allowed
+
+
+def test_count_window_keeps_running_totals():
+    window = CountWindow(3)
+    for failed in (True, False, True, False):
+        stats = window.record(failed, slow=False)
+    assert (stats.calls, stats.failures) == (3, 1)
+    stats = window.record(False, slow=True)
+    assert (stats.calls, stats.failures, stats.slow_calls) == (3, 1, 1)
+
+
+def test_time_window_forgets_old_calls():
+    clock = ManualClock(100)
+    window = TimeWindow(10, clock)
+    window.record(True, False)
+    clock.advance(5)
+    window.record(False, False)
+    assert window.snapshot().calls == 2
+    clock.advance(5)
+    assert window.snapshot().calls == 1
+    clock.advance(1000)
+    assert window.snapshot().calls == 0
+
+
+def test_trips_on_failure_rate_only_after_minimum_calls():
+    target = breaker(failure_rate_threshold=0.5)
+    for _ in range(3):
+        call(target, failed=True)
+    assert target.state is BreakerState.CLOSED
+    call(target, failed=True)
+    assert target.state is BreakerState.OPEN
+    assert not target.allow() and target.rejected == 1
+
+
+def test_low_failure_rate_does_not_trip():
+    """偶发失败(含连续失败)在失败率阈值以下不会熔断"""
+    rng = random.Random(1)
+    target = breaker(window_size=50, minimum_calls=20, failure_rate_threshold=0.5)
+    for _ in range(5000):
+        call(target, failed=rng.random() < 0.2)
+    assert target.state is BreakerState.CLOSED and target.transitions == 0
+
+
+def test_trips_on_slow_call_rate():
+    target = breaker(slow_call_duration=1.0, slow_call_rate_threshold=0.5)
+    for duration in (0.1, 2.0, 0.1, 3.0):
+        call(target, duration=duration)
+    assert target.state is BreakerState.OPEN
+
+
+def test_half_open_allows_bounded_concurrent_probes():
+    clock = ManualClock()
+    target = breaker(clock, open_duration=30, half_open_calls=3, half_open_max_concurrent=2)
+    target.force_open()
+    clock.advance(29)
+    assert not target.allow()
+    clock.advance(1)
+    assert target.allow() and target.allow()
+    assert target.state is BreakerState.HALF_OPEN
+    # 并发探测已满
+    assert not target.allow()
+    target.record(0.01, failed=False)
+    assert target.allow()
+    assert not target.allow()  # 探测总数已满
+    target.record(0.01, failed=False)
+    target.record(0.01, failed=False)
+    assert target.state is BreakerState.CLOSED
+
+
+def test_failed_probe_reopens():
+    clock = ManualClock()
+    target = breaker(clock, open_duration=10, half_open_calls=4)
+    target.force_open()
+    clock.advance(10)
+    assert target.allow()
+    target.record(0.01, failed=True)
+    assert target.state is BreakerState.OPEN
+    assert not target.allow()
+    clock.advance(10)
+    assert target.allow()
+
+
+def test_cancelled_probe_returns_slot():
+    clock = ManualClock()
+    target = breaker(clock, open_duration=1, half_open_max_concurrent=1)
+    target.force_open()
+    clock.advance(1)
+    assert target.allow()
+    target.cancel()
+    assert target.allow()
+
+
+def test_per_key_breakers_isolate_slow_host():
+    clock = ManualClock()
+    config = BreakerConfig(minimum_calls=5, window_size=20, slow_call_duration=1.0, slow_call_rate_threshold=0.5)
+    hosts = BreakerRegistry(lambda host: SlidingWindowBreaker(host, config, clock=clock))
+    shared = SlidingWindowBreaker("shared", config, clock=clock)
+    for i in range(300):
+        host = f"host-{i % 3}"
+        duration = 2.0 if host == "host-0" else 0.05
+        call(hosts.get(host), duration=duration)
+        call(shared, duration=duration)
+    # 共享断路器: 三分之一慢调用, 从不熔断; 按主机: 只有慢主机被熔断
+    assert shared.state is BreakerState.CLOSED
+    assert hosts.get("host-0").state is BreakerState.OPEN
+    assert hosts.get("host-1").state is BreakerState.CLOSED
+    assert hosts.get("host-2").state is BreakerState.CLOSED
+
+
+def test_registry_is_bounded_and_keeps_open_breakers():
+    clock = ManualClock()
+    registry = BreakerRegistry(lambda key: breaker(clock), max_size=3)
+    registry.get("a").force_open()
+    registry.get("b")
+    registry.get("c")
+    registry.get("d")
+    assert len(registry) == 3 and "a" in registry and "b" not in registry
+    registry.get("c")  # c 变为最近使用
+    registry.get("e")
+    assert set(dict(registry.items())) == {"a", "c", "e"}
+    assert registry.evictions == 2
+
+
+def test_registry_tracks_state_changes():
+    clock = ManualClock()
+    registry = BreakerRegistry(lambda key: breaker(clock), max_size=3)
+    a, b = registry.get("a"), registry.get("b")
+    registry.get("c")
+    b.force_open()
+    registry.get("d")  # 淘汰最久未使用的已关闭断路器 a
+    assert set(dict(registry.items())) == {"b", "c", "d"}
+
+    b.reset()  # b 关闭后成为最近使用的已关闭断路器
+    registry.get("e")
+    assert set(dict(registry.items())) == {"b", "d", "e"}
+
+    # 已淘汰的断路器状态切换后不会回到注册表
+    a.force_open()
+    a.reset()
+    assert "a" not in registry and len(registry) == 3
+
+    # 全部熔断时淘汰最久未使用的
+    for key in ("b", "d", "e"):
+        registry.get(key).force_open()
+    registry.get("f")
+    assert set(dict(registry.items())) == {"d", "e", "f"} and registry.evictions == 3
+
+
+def test_results_from_an_earlier_state_are_ignored():
+    clock = ManualClock()
+    target = breaker(clock, open_duration=10, half_open_calls=2, half_open_max_concurrent=1)
+    assert target.allow()
+    closed_generation = target.generation
+
+    target.force_open()
+    clock.advance(10)
+    assert target.allow() and target.state is BreakerState.HALF_OPEN
+    probe_generation = target.generation
+
+    # 关闭时放行、半开时才结束的调用不算作探测, 也不占用或归还探测名额
+    target.record(0.01, failed=True, generation=closed_generation)
+    target.cancel(closed_generation)
+    assert target.state is BreakerState.HALF_OPEN and target.get_stats()["probes_in_flight"] == 1
+    assert not target.allow()
+
+    target.record(0.01, failed=False, generation=probe_generation)
+    assert target.allow()
+    target.record(0.01, failed=False, generation=target.generation)
+    assert target.state is BreakerState.CLOSED
+
+
+def test_closed_path_is_cheap():
+    target = SlidingWindowBreaker("hot", BreakerConfig(window_type="time", window_size=60))
+    n = 200_000
+    start = time.perf_counter()
+    for _ in range(n):
+        if target.allow():
+            target.record(0.001, False)
+    per_call = (time.perf_counter() - start) / n
+    print(f"\nallow + record: {per_call * 1e9:.0f}ns")
+    assert per_call < 5e-6
@@ -0,0 +1,151 @@
+"""
+死锁检测测试
+"""
+
+import asyncio
+import random
+import time
+
+from core.db.transaction.concurrency import ConcurrencyManager
+from core.db.utils.waitgraph import WaitForGraph
+
+
+def reaches(edges, start, goal):
+    """参考实现: 每次都遍历整张图"""
+    stack, seen = [start], {start}
+    while stack:
+        node = stack.pop()
+        if node == goal:
+            return True
+        for nxt in edges.get(node, ()):
+            if nxt not in seen:
+                seen.add(nxt)
+                stack.append(nxt)
+    return False
+
+
+def test_cycle_is_reported_and_edge_rejected():
+    graph = WaitForGraph()
+    assert graph.add_wait("t1", ["t2"]) is None
+    assert graph.add_wait("t2", ["t3"]) is None
+    deadlock = graph.add_wait("t3", ["t1"])
+    assert deadlock.cycle == ["t3", "t1", "t2"]
+    assert graph.waits_for("t3") == set()
+    assert graph.is_consistent()
+
+
+def test_victim_holds_fewest_locks_then_is_youngest():
+    graph = WaitForGraph()
+    for tx, started, held in (("old", 1.0, 1), ("busy", 3.0, 5), ("young", 2.0, 1)):
+        graph.register(tx, started_at=started)
+        graph.acquired(tx, held)
+    graph.add_wait("old", ["busy"])
+    graph.add_wait("busy", ["young"])
+    assert graph.add_wait("young", ["old"]).victim == "young"
+    graph.released("young")
+    graph.acquired("old", 4)
+    assert graph.add_wait("young", ["old"]).victim == "young"
+
+
+def test_removing_transactions_breaks_waits():
+    graph = WaitForGraph()
+    graph.add_wait("t1", ["t2", "t3"])
+    graph.add_wait("t2", ["t3"])
+    graph.remove("t3")
+    assert graph.waits_for("t1") == {"t2"} and graph.metrics()["wait_edges"] == 1
+    assert graph.add_wait("t3", ["t1"]) is None
+    assert graph.add_wait("t2", ["t3"]).cycle == ["t2", "t3", "t1"]
+
+
+def test_stress_matches_full_traversal_with_bounded_latency():
+    """数千个事务随机等待, 检测结果与全图遍历一致, 单次检测延迟有上界"""
+    rng = random.Random(42)
+    graph = WaitForGraph()
+    edges = {}
+    latencies = []
+    deadlocks = 0
+    n = 2000
+    for _ in range(20000):
+        waiter, holder = rng.randrange(n), rng.randrange(n)
+        if waiter == holder:
+            continue
+        if rng.random() < 0.3:
+            graph.remove_wait(waiter)
+            edges.pop(waiter, None)
+            continue
+        expected = reaches(edges, holder, waiter)
+        start = time.perf_counter()
+        deadlock = graph.add_wait(waiter, [holder])
+        latencies.append(time.perf_counter() - start)
+        assert (deadlock is not None) == expected
+        if deadlock is None:
+            edges[waiter] = {holder}
+        else:
+            deadlocks += 1
+            edges.pop(waiter, None)
+            cycle = deadlock.cycle
+            assert cycle[0] == waiter and cycle[1] == holder
+            assert all(reaches(edges, a, b) for a, b in zip(cycle[1:], cycle[2:]))
+    assert graph.is_consistent()
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f"\n{len(latencies)} waits, {deadlocks} deadlocks, p99 {p99 * 1e6:.0f}us, max {latencies[-1] * 1e6:.0f}us")
+    assert deadlocks > 0
+    assert p99 < 0.002
+
+
+def test_detection_does_not_grow_with_unrelated_waiters():
+    """已有大量互不相关的等待链时, 新增等待边只访问受影响的节点"""
+    graph = WaitForGraph()
+    for chain in range(2000):
+        for i in range(4):
+            graph.add_wait((chain, i), [(chain, i + 1)])
+    before = graph.visited
+    start = time.perf_counter()
+    assert graph.add_wait("new", [(0, 0)]) is None
+    assert graph.add_wait((0, 4), ["new"]).cycle[0] == (0, 4)
+    elapsed = time.perf_counter() - start
+    assert graph.visited - before <= 15
+    assert elapsed < 0.001
+
+
+async def test_manager_aborts_victim_and_lets_other_proceed():
+    manager = ConcurrencyManager()
+    assert await manager.acquire("t1", {"a"})
+    assert await manager.acquire("t2", {"b", "c"})
+
+    t1_waits = asyncio.create_task(manager.acquire("t1", {"b"}, wait_timeout=5))
+    await asyncio.sleep(0.01)
+    # t1 只持有一个锁, 代价最低, 被选为牺牲者
+    t2_waits = asyncio.create_task(manager.acquire("t2", {"a"}, wait_timeout=5))
+    assert await t1_waits is False
+    assert manager.is_victim("t1")
+    await manager.release("t1")
+    assert await t2_waits is True
+
+    metrics = manager.get_metrics()
+    assert metrics["stats"]["deadlocks_detected"] == 1
+    assert metrics["current_state"]["active_locks"] == 3
+    await manager.release("t2")
+    assert manager.get_metrics()["wait_graph"]["transactions"] == 0
+
+
+async def test_manager_without_wait_fails_fast_on_conflict():
+    manager = ConcurrencyManager(max_concurrent_transactions=2)
+    assert await manager.acquire("t1", {"a"})
+    assert not await manager.acquire("t2", {"a"})
+    assert not await manager.acquire("t3", {"a"})
+    # 失败的事务不占用并发名额
+    assert await manager.acquire("t4", {"b"})
+    assert manager.get_metrics()["stats"]["lock_conflicts"] == 2
+
+
+async def test_waiter_is_woken_on_release():
+    manager = ConcurrencyManager()
+    await manager.acquire("t1", {"a"})
+    waiting = asyncio.create_task(manager.acquire("t2", {"a"}, wait_timeout=5))
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    await manager.release("t1")
+    assert await waiting
+    assert time.perf_counter() - start < 0.1
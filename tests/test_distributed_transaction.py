@@ -0,0 +1,343 @@
+"""
+分布式事务测试
+多个 SQLite 文件作为参与者, 通过子类注入故障
+"""
+
+import asyncio
+import os
+import time
+
+import pytest
+from sqlalchemy import Column, Integer, String, create_engine, func, select
+from sqlalchemy.orm import Session, declarative_base
+
+from core.db.transaction.coordinator import TransactionCoordinator, prepared_resolver
+from core.db.transaction.distributed import (
+    DistributedTransactionManager,
+    TransactionParticipant,
+    TransactionState,
+)
+from core.db.transaction.log import TransactionLog
+
+Base = declarative_base()
+
+
+class Account(Base):
+    __tablename__ = "accounts"
+
+    id = Column(Integer, primary_key=True)
+    owner = Column(String(32), unique=True)
+
+
+class SlowParticipant(TransactionParticipant):
+    def __init__(self, name, session, delay, timeout=10):
+        super().__init__(name, session, timeout)
+        self.delay = delay
+        self.cancelled = False
+
+    async def _prepare(self):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        await super()._prepare()
+
+
+class FailingCommit(TransactionParticipant):
+    async def _commit(self):
+        raise ConnectionError("lost connection during commit")
+
+
+@pytest.fixture
+def engines(tmp_path):
+    engines = {}
+    for name in ("a", "b", "c"):
+        engine = create_engine(f"sqlite:///{tmp_path / f'{name}.db'}")
+        Base.metadata.create_all(engine)
+        engines[name] = engine
+    yield engines
+    for engine in engines.values():
+        engine.dispose()
+
+
+@pytest.fixture
+def log(tmp_path):
+    return TransactionLog(log_dir=str(tmp_path / "txlog"))
+
+
+def count(engine):
+    with Session(engine) as session:
+        return session.scalar(select(func.count()).select_from(Account))
+
+
+def session_with(engine, *owners):
+    session = Session(engine)
+    session.add_all(Account(owner=owner) for owner in owners)
+    return session
+
+
+async def test_commit_across_sqlite_participants(engines, log):
+    manager = DistributedTransactionManager(log=log)
+    async with manager.transaction() as tx:
+        for name, engine in engines.items():
+            tx.add_participant(name, session_with(engine, f"{name}-1", f"{name}-2"))
+    assert tx.state == TransactionState.COMMITTED
+    assert [count(engine) for engine in engines.values()] == [2, 2, 2]
+    assert log.get_in_doubt() == {}
+    states = log.get_participant_states(tx.transaction_id)
+    assert states == {"a": "committed", "b": "committed", "c": "committed"}
+
+
+async def test_prepare_runs_concurrently(engines):
+    tx = DistributedTransactionManager().create_transaction()
+    for name, engine in engines.items():
+        tx.join(SlowParticipant(name, session_with(engine, name), delay=0.2))
+    start = time.perf_counter()
+    assert await tx.prepare()
+    assert time.perf_counter() - start < 0.4
+    assert await tx.commit()
+
+
+async def test_first_no_vote_aborts_early(engines, log):
+    with Session(engines["b"]) as session:
+        session.add(Account(owner="taken"))
+        session.commit()
+
+    tx = DistributedTransactionManager(log=log).create_transaction()
+    slow = tx.join(SlowParticipant("a", session_with(engines["a"], "x"), delay=5))
+    tx.add_participant("b", session_with(engines["b"], "taken"))  # 唯一约束冲突, 投否决票
+    tx.add_participant("c", session_with(engines["c"], "y"))
+
+    start = time.perf_counter()
+    assert not await tx.prepare()
+    assert time.perf_counter() - start < 1
+    assert slow.cancelled
+    assert tx.state == TransactionState.ROLLED_BACK and "UNIQUE" in str(tx.error)
+    assert [count(engine) for engine in engines.values()] == [0, 1, 0]
+    assert log.get_in_doubt() == {}
+
+
+async def test_participant_timeout_is_a_no_vote(engines):
+    tx = DistributedTransactionManager().create_transaction()
+    tx.join(SlowParticipant("a", session_with(engines["a"], "x"), delay=1, timeout=0.05))
+    tx.add_participant("b", session_with(engines["b"], "y"))
+    assert not await tx.prepare()
+    assert "timed out" in str(tx.participants[0].error)
+    assert count(engines["b"]) == 0
+
+
+async def test_commit_failure_is_recovered_not_rolled_back(engines, log):
+    manager = DistributedTransactionManager(log=log)
+    coordinator = TransactionCoordinator(manager, retry_interval=0, max_retries=1)
+    tx = manager.create_transaction()
+    tx.add_participant("a", session_with(engines["a"], "x"))
+    tx.join(FailingCommit("b", session_with(engines["b"], "y")))
+
+    assert await coordinator.prepare(tx)
+    assert not await coordinator.commit(tx)
+    # 提交决定已落盘, 已提交的参与者不会被回滚
+    assert not await tx.rollback()
+    assert count(engines["a"]) == 1
+    assert log.get_in_doubt() == {tx.transaction_id: "commit"}
+    manager.remove_transaction(tx.transaction_id)
+
+    resolved = []
+
+    async def resolver(transaction_id, participant, commit):
+        resolved.append((participant, commit))
+        return True
+
+    assert await coordinator.recover(resolver) == {tx.transaction_id: "committed"}
+    assert resolved == [("b", True)]
+    assert log.get_in_doubt() == {}
+
+
+async def test_recovery_after_restart_reads_only_open_transactions(tmp_path, engines, monkeypatch):
+    log_dir = str(tmp_path / "restart")
+    log = TransactionLog(log_dir=log_dir)
+    manager = DistributedTransactionManager(log=log)
+
+    # 大量已完成的历史事务
+    for i in range(300):
+        async with manager.transaction() as tx:
+            tx.add_participant("a", session_with(engines["a"], f"h{i}"))
+
+    # 崩溃前: 一个已决定提交, 一个仍在准备
+    decided = manager.create_transaction()
+    decided.add_participant("a", session_with(engines["b"], "d1"))
+    decided.add_participant("b", session_with(engines["c"], "d2"))
+    assert await decided.prepare()
+    log.log_transaction_commit(decided)
+    undecided = manager.create_transaction()
+    undecided.add_participant("a", Session(engines["a"]))
+    log.log_transaction_prepare(undecided)
+
+    # 重启
+    restarted = TransactionLog(log_dir=log_dir)
+    assert restarted.get_in_doubt() == {decided.transaction_id: "commit", undecided.transaction_id: None}
+    index_lines = (tmp_path / "restart" / "open_transactions.idx").read_text().count("\n")
+    assert index_lines < 2 * 300 * 2
+
+    reads = []
+    original_read = restarted._store.read
+    monkeypatch.setattr(restarted._store, "read", lambda entries: reads.append(1) or original_read(entries))
+
+    calls = []
+
+    async def resolver(transaction_id, participant, commit):
+        calls.append((transaction_id, participant, commit))
+        return True
+
+    coordinator = TransactionCoordinator(DistributedTransactionManager(log=restarted))
+    results = await coordinator.recover(resolver)
+    assert results == {decided.transaction_id: "committed", undecided.transaction_id: "rolled_back"}
+    assert sorted(calls) == sorted(
+        [
+            (decided.transaction_id, "a", True),
+            (decided.transaction_id, "b", True),
+            (undecided.transaction_id, "a", False),
+        ]
+    )
+    # 只读取了两个未完成事务的记录
+    assert len(reads) == 2
+    assert TransactionLog(log_dir=log_dir).get_in_doubt() == {}
+
+
+async def test_rotation_keeps_records_of_open_transactions(tmp_path, engines):
+    log_dir = str(tmp_path / "rotate")
+    log = TransactionLog(log_dir=log_dir, max_file_size=2048, max_files=2)
+    manager = DistributedTransactionManager(log=log)
+
+    pending = manager.create_transaction()
+    pending.add_participant("a", session_with(engines["a"], "p1"))
+    assert await pending.prepare()
+    log.log_transaction_commit(pending)
+
+    # 之后的大量事务使日志轮转多次
+    for i in range(100):
+        async with manager.transaction() as tx:
+            tx.add_participant("a", session_with(engines["b"], f"h{i}"))
+
+    restarted = TransactionLog(log_dir=log_dir, max_file_size=2048, max_files=2)
+    entries = [entry.entry_type for entry in restarted.get_transaction_log(pending.transaction_id)]
+    assert entries[0].value == "transaction_start" and entries[-1].value == "transaction_commit"
+    assert restarted.get_participant_states(pending.transaction_id) == {"a": "prepared"}
+    assert len(list((tmp_path / "rotate").glob("transaction_*.log"))) == 3
+
+
+async def test_open_index_is_compacted(tmp_path, monkeypatch):
+    monkeypatch.setattr("core.db.transaction.log.OPEN_INDEX_COMPACT_THRESHOLD", 10)
+    log = TransactionLog(log_dir=str(tmp_path))
+    manager = DistributedTransactionManager(log=log)
+    pending = manager.create_transaction()
+    for _ in range(50):
+        await manager.create_transaction().rollback()
+
+    lines = (tmp_path / "open_transactions.idx").read_text().splitlines()
+    assert len(lines) <= 2 * 10 + 3
+    assert TransactionLog(log_dir=str(tmp_path)).get_in_doubt() == {pending.transaction_id: None}
+
+
+async def test_decisions_are_fsynced_before_returning(tmp_path, engines, monkeypatch):
+    log = TransactionLog(log_dir=str(tmp_path / "txlog"))
+    synced = []
+    fsync = os.fsync
+
+    def record(fd):
+        synced.append(os.path.basename(os.readlink(f"/proc/self/fd/{fd}")))
+        fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", record)
+    tx = DistributedTransactionManager(log=log).create_transaction()
+    assert synced[-2:] == [log.current_file.name, "open_transactions.idx"]
+
+    tx.add_participant("a", session_with(engines["a"], "x"))
+    assert await tx.prepare()
+    synced.clear()
+    log.log_transaction_commit(tx)
+    # 提交决定的记录和未完成事务索引都已落盘
+    assert synced == [log.current_file.name, "open_transactions.idx"]
+
+
+def two_phase_engine(path, prepared):
+    """在 SQLite 上模拟数据库原生两阶段提交: PREPARE 只登记 xid, COMMIT PREPARED 时真正提交"""
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    dialect = engine.dialect
+
+    def begin(conn, xid):
+        dialect.do_begin(conn.connection)
+
+    def prepare(conn, xid):
+        prepared.append(xid)
+
+    def finish(conn, xid, is_prepared=True, recover=False):
+        if xid in prepared:
+            prepared.remove(xid)
+        if not recover:
+            dialect.do_commit(conn.connection)
+
+    def rollback(conn, xid, is_prepared=True, recover=False):
+        if xid in prepared:
+            prepared.remove(xid)
+        if not recover:
+            dialect.do_rollback(conn.connection)
+
+    dialect.do_begin_twophase = begin
+    dialect.do_prepare_twophase = prepare
+    dialect.do_commit_twophase = finish
+    dialect.do_rollback_twophase = rollback
+    dialect.do_recover_twophase = lambda conn: list(prepared)
+    return engine
+
+
+async def test_two_phase_sessions_prepare_natively(tmp_path, log):
+    prepared = {"a": [], "b": []}
+    engines = {name: two_phase_engine(tmp_path / f"2pc_{name}.db", prepared[name]) for name in prepared}
+    manager = DistributedTransactionManager(log=log)
+    tx = manager.create_transaction()
+    for name, engine in engines.items():
+        session = Session(engine, twophase=True)
+        session.add(Account(owner=name))
+        tx.add_participant(name, session)
+
+    assert await tx.prepare()
+    xids = log.get_participant_xids(tx.transaction_id)
+    # xid 在 PREPARE 前写入日志, 准备后数据库中处于已准备状态
+    assert all(participant.two_phase for participant in tx.participants)
+    assert {name: [xid] for name, xid in xids.items()} == prepared
+
+    # 提交决定落盘后崩溃: 恢复按 xid 执行 COMMIT PREPARED
+    log.log_transaction_commit(tx)
+    manager.remove_transaction(tx.transaction_id)
+    coordinator = TransactionCoordinator(DistributedTransactionManager(log=log), retry_interval=0)
+    results = await coordinator.recover(prepared_resolver(engines, log))
+    assert results == {tx.transaction_id: "committed"}
+    assert prepared == {"a": [], "b": []}
+    for engine in engines.values():
+        engine.dispose()
+
+
+async def test_two_phase_commit_and_veto(tmp_path, engines, log):
+    prepared = []
+    engine = two_phase_engine(tmp_path / "2pc.db", prepared)
+    manager = DistributedTransactionManager(log=log)
+
+    async with manager.transaction() as tx:
+        session = Session(engine, twophase=True)
+        session.add(Account(owner="x"))
+        tx.add_participant("a", session)
+    assert tx.state == TransactionState.COMMITTED and prepared == []
+    assert count(engine) == 1
+
+    # 否决时已准备的参与者执行 ROLLBACK PREPARED
+    tx = manager.create_transaction()
+    session = Session(engine, twophase=True)
+    session.add(Account(owner="y"))
+    tx.add_participant("a", session)
+    tx.add_participant("b", session_with(engines["b"], "dup", "dup"))  # 唯一约束冲突
+    assert not await tx.prepare()
+    assert tx.state == TransactionState.ROLLED_BACK and prepared == []
+    assert count(engine) == 1
+    engine.dispose()
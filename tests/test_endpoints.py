@@ -0,0 +1,197 @@
+"""
+服务端点缓存与负载均衡测试
+"""
+
+import asyncio
+import heapq
+import random
+from collections import Counter
+
+import pytest
+
+from core.strong.breaker import ManualClock
+from core.strong.endpoints import (
+    EndpointCache,
+    InMemoryRegistry,
+    NoAvailableEndpoint,
+    OutlierDetector,
+)
+
+
+def make_registry(service="orders", count=3):
+    registry = InMemoryRegistry()
+    for i in range(count):
+        registry.register(service, f"10.0.0.{i}", 8000)
+    return registry
+
+
+async def test_lookups_are_cached_and_single_flight():
+    registry = make_registry()
+    clock = ManualClock()
+    cache = EndpointCache(registry, ttl=30, clock=clock)
+
+    await asyncio.gather(*(cache.choose("orders") for _ in range(50)))
+    for _ in range(1000):
+        assert await cache.choose("orders") is not None
+    assert registry.lookups == 1
+
+    # 过期后后台刷新, 调用方不等待且只触发一次解析
+    clock.advance(30)
+    await asyncio.gather(*(cache.choose("orders") for _ in range(10)))
+    await asyncio.sleep(0)
+    assert registry.lookups == 2
+    assert cache.get_stats()["misses"] == 50
+
+
+async def test_stale_endpoints_are_served_when_refresh_fails():
+    registry = make_registry()
+    clock = ManualClock()
+    cache = EndpointCache(registry, ttl=10, clock=clock)
+    await cache.choose("orders")
+
+    async def broken(service):
+        raise ConnectionError("registry down")
+
+    cache.resolver = broken
+    clock.advance(10)
+    await cache.choose("orders")
+    await asyncio.sleep(0)
+    assert cache.lookup_errors == 1
+    assert len((await cache.get("orders")).available()) == 3
+
+    with pytest.raises(ConnectionError):
+        await cache.choose("payments")
+
+
+async def test_pushed_changes_apply_without_lookup_and_keep_stats():
+    registry = make_registry(count=2)
+    cache = EndpointCache(registry, ttl=30)
+    registry.watch(cache)
+    changes = []
+    cache.subscribe(lambda service, added, removed: changes.append((service, added, removed)))
+
+    async with cache.endpoint("orders") as first:
+        pass
+    assert [e.address for e in changes.pop()[1]] == ["10.0.0.0:8000", "10.0.0.1:8000"]
+    registry.register("orders", "10.0.0.9", 8000)
+    registry.deregister("orders", "10.0.0.1", 8000)
+
+    entry = await cache.get("orders")
+    assert sorted(entry.endpoints) == ["10.0.0.0:8000", "10.0.0.9:8000"]
+    assert entry.endpoints["10.0.0.0:8000"].calls == 1 and first.address == "10.0.0.0:8000"
+    assert [([e.address for e in added], [e.address for e in removed]) for _, added, removed in changes] == [
+        (["10.0.0.9:8000"], []),
+        ([], ["10.0.0.1:8000"]),
+    ]
+    assert registry.lookups == 1
+
+
+async def test_round_robin_spreads_evenly():
+    cache = EndpointCache(make_registry(count=4))
+    picks = Counter([(await cache.choose("orders")).address for _ in range(400)])
+    assert set(picks.values()) == {100}
+
+
+async def test_least_outstanding_prefers_idle_endpoint():
+    cache = EndpointCache(make_registry(count=3))
+    async with cache.endpoint("orders", "least_request") as a:
+        async with cache.endpoint("orders", "least_request") as b:
+            async with cache.endpoint("orders", "least_request") as c:
+                assert len({a.address, b.address, c.address}) == 3
+                assert (a.outstanding, b.outstanding, c.outstanding) == (1, 1, 1)
+    assert a.outstanding == 0
+
+
+async def test_choose_without_tracking_falls_back_to_round_robin():
+    cache = EndpointCache(make_registry(count=3))
+    # choose() 不跟踪未完成请求, 最少请求策略不能一直选中同一个实例
+    for strategy in ("least_conn", "least_request", "power_of_two"):
+        picks = Counter([(await cache.choose("orders", strategy)).address for _ in range(30)])
+        assert set(picks.values()) == {10}
+
+
+def simulate(entry, strategy, requests=5000, arrivals_per_tick=4, slow_address="10.0.0.0:8000"):
+    """离散时间模拟: 慢实例每个请求 40 个时间单位, 其他 2 个; 返回平均延迟和慢实例承担的比例"""
+    in_flight = []
+    latencies = []
+    slow = 0
+    for tick in range(requests // arrivals_per_tick):
+        while in_flight and in_flight[0][0] <= tick:
+            _, _, endpoint, latency = heapq.heappop(in_flight)
+            endpoint.outstanding -= 1
+            entry.report(endpoint, latency, False, 0.2)
+        for i in range(arrivals_per_tick):
+            endpoint = entry.pick(strategy)
+            cost = 40 if endpoint.address == slow_address else 2
+            # 排队: 未完成请求越多越慢
+            latency = cost * (1 + endpoint.outstanding)
+            endpoint.outstanding += 1
+            slow += endpoint.address == slow_address
+            latencies.append(latency)
+            heapq.heappush(in_flight, (tick + latency, id(endpoint) + i, endpoint, latency))
+    return sum(latencies) / len(latencies), slow / len(latencies)
+
+
+async def test_power_of_two_avoids_slow_endpoint():
+    results = {}
+    for strategy in ("round_robin", "power_of_two", "least_request"):
+        cache = EndpointCache(make_registry(count=5), rng=random.Random(7))
+        results[strategy] = simulate(await cache.get("orders"), strategy)
+    rr_latency, rr_slow = results["round_robin"]
+    p2c_latency, p2c_slow = results["power_of_two"]
+    print(f"\n{results}")
+    assert rr_slow == pytest.approx(0.2)
+    assert p2c_slow < rr_slow * 0.6 and p2c_latency < rr_latency / 2
+    assert results["least_request"][1] < rr_slow * 0.6 and results["least_request"][0] < rr_latency / 2
+
+
+async def test_failing_endpoint_is_ejected_and_returns():
+    clock = ManualClock()
+    detector = OutlierDetector(consecutive_failures=3, base_ejection_time=10, max_ejection_percent=0.5)
+    cache = EndpointCache(make_registry(count=2), outlier_detector=detector, clock=clock)
+    entry = await cache.get("orders")
+    bad = entry.endpoints["10.0.0.0:8000"]
+
+    with pytest.raises(ConnectionError):
+        async with cache.endpoint("orders") as endpoint:
+            raise ConnectionError()
+    assert endpoint is bad and bad.failures == 1 and bad.ejections == 0
+    entry.report(bad, 0.01, True, 0.2)
+    entry.report(bad, 0.01, True, 0.2)
+    assert bad.ejections == 1
+    assert {(await cache.choose("orders")).address for _ in range(10)} == {"10.0.0.1:8000"}
+
+    # 最多摘除一半实例
+    good = entry.endpoints["10.0.0.1:8000"]
+    for _ in range(5):
+        entry.report(good, 0.01, True, 0.2)
+    assert good.ejections == 0
+
+    clock.advance(10)
+    picks = {(await cache.choose("orders")).address for _ in range(4)}
+    assert picks == {"10.0.0.0:8000", "10.0.0.1:8000"}
+
+
+async def test_cancelled_calls_are_not_failures():
+    cache = EndpointCache(make_registry(count=1))
+
+    async def slow_call():
+        async with cache.endpoint("orders") as endpoint:
+            await asyncio.sleep(10)
+        return endpoint
+
+    task = asyncio.create_task(slow_call())
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    endpoint = (await cache.get("orders")).endpoints["10.0.0.0:8000"]
+    assert (endpoint.outstanding, endpoint.calls, endpoint.failures) == (0, 0, 0)
+
+
+async def test_unknown_service_has_no_endpoint():
+    cache = EndpointCache(InMemoryRegistry())
+    assert await cache.choose("missing") is None
+    with pytest.raises(NoAvailableEndpoint):
+        async with cache.endpoint("missing"):
+            pass
@@ -0,0 +1,152 @@
+"""
+事件总线测试
+"""
+import asyncio
+import time
+import types
+
+import pytest
+
+from core.strong.event_bus import BackpressurePolicy, Event, EventBus
+
+
+@pytest.fixture
+async def bus():
+    """事件总线fixture"""
+    bus = EventBus()
+    yield bus
+    await bus.close(drain=False)
+    bus.clear()
+
+
+class TestEventBus:
+    """事件总线测试"""
+
+    async def test_publish_wait(self, bus):
+        """测试同步等待发布"""
+        received = []
+        bus.subscribe("created", lambda e: received.append(e.data))
+        assert await bus.publish(Event("created", 1))
+        assert received == [1]
+
+    async def test_publish_without_handlers(self, bus):
+        """测试无处理器时发布"""
+        assert not await bus.publish(Event("nothing", 1))
+
+    async def test_fire_and_forget(self, bus):
+        """测试投递即返回模式"""
+        received = []
+
+        async def handler(event):
+            await asyncio.sleep(0.01)
+            received.append(event.data)
+
+        bus.subscribe("created", handler)
+        await bus.publish(Event("created", 1), wait=False)
+        assert received == []
+        await bus.drain()
+        assert received == [1]
+
+    async def test_batch_handler(self, bus):
+        """测试批量处理器"""
+        batches = []
+        bus.configure("tick", batch_size=10, batch_timeout=0.05)
+        bus.subscribe("tick", lambda events: batches.append([e.data for e in events]), batch=True)
+
+        for i in range(25):
+            await bus.publish(Event("tick", i), wait=False)
+        await bus.drain()
+
+        assert [i for batch in batches for i in batch] == list(range(25))
+        assert max(len(batch) for batch in batches) == 10
+
+    async def test_drop_newest_policy(self, bus):
+        """测试丢弃新事件的背压策略"""
+        gate = asyncio.Event()
+        received = []
+
+        async def handler(event):
+            await gate.wait()
+            received.append(event.data)
+
+        bus.configure("busy", max_queue_size=2, policy=BackpressurePolicy.DROP_NEWEST)
+        bus.subscribe("busy", handler)
+
+        accepted = [await bus.publish(Event("busy", i), wait=False) for i in range(10)]
+        await asyncio.sleep(0)
+        gate.set()
+        await bus.drain()
+
+        assert not all(accepted)
+        assert bus.get_queue_stats()["busy"]["dropped"] == accepted.count(False)
+        assert len(received) == accepted.count(True)
+
+    async def test_handler_stats(self, bus):
+        """测试处理器耗时统计"""
+
+        def failing(event):
+            raise ValueError("boom")
+
+        bus.subscribe("created", failing)
+        await bus.publish(Event("created"))
+        stats = bus.get_handler_stats()
+        name = f"{__name__}:{failing.__qualname__}"
+        assert stats[name]["calls"] == 1
+        assert stats[name]["errors"] == 1
+
+    async def test_same_qualname_in_different_modules(self, bus):
+        """测试不同模块中同名处理器的统计互不干扰"""
+
+        def handler(event):
+            pass
+
+        other = types.FunctionType(handler.__code__, {"__name__": "other.module"}, "handler")
+        other.__qualname__ = handler.__qualname__
+        bus.subscribe("created", handler)
+        bus.subscribe("created", other)
+        await bus.publish(Event("created"))
+        stats = bus.get_handler_stats()
+        assert stats[f"{__name__}:{handler.__qualname__}"]["calls"] == 1
+        assert stats[f"other.module:{handler.__qualname__}"]["calls"] == 1
+
+    async def test_batch_registration_is_per_event(self, bus):
+        """测试批量处理器只对订阅时指定的事件生效"""
+        received = []
+        handler = received.append
+        bus.subscribe("batched", handler, batch=True)
+        bus.subscribe("single", handler)
+        await bus.publish(Event("batched", 1))
+        await bus.publish(Event("single", 2))
+        assert isinstance(received[0], list) and received[1].data == 2
+
+        # 另一个事件总线实例不共享注册
+        other_bus = EventBus()
+        other_bus.subscribe("batched", handler)
+        await other_bus.publish(Event("batched", 3))
+        assert received[2].data == 3
+
+    @pytest.mark.slow
+    async def test_publish_throughput_with_slow_handler(self, bus):
+        """测试存在慢处理器时的发布吞吐量"""
+
+        async def slow_handler(event):
+            await asyncio.sleep(0.5)
+
+        fast_received = []
+        bus.subscribe("slow", slow_handler)
+        bus.subscribe("fast", lambda e: fast_received.append(e.data))
+        bus.configure("slow", max_queue_size=10000)
+
+        # 慢处理器的事件不应阻塞其他事件类型的发布
+        slow_publisher = asyncio.create_task(bus.publish(Event("slow", 0)))
+        start = time.perf_counter()
+        count = 10000
+        for i in range(count):
+            await bus.publish(Event("fast", i))
+            await bus.publish(Event("slow", i), wait=False)
+        elapsed = time.perf_counter() - start
+        print(f"\nPublish throughput: {count * 2 / elapsed:.0f} events/s")
+
+        assert len(fast_received) == count
+        assert elapsed < 0.5
+        slow_publisher.cancel()
@@ -0,0 +1,173 @@
+"""
+流式导出测试
+"""
+
+import asyncio
+import csv
+import io
+import json
+import threading
+import tracemalloc
+from enum import Enum
+
+import openpyxl
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import Column, Integer, String, create_engine, func, insert, select
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from core.tasks.task_queue import task_queue
+from core.utils.export import StreamingExporter, stream_query, stream_query_in_session, submit_export_job
+
+Base = declarative_base()
+ROWS = 30000
+
+
+class Level(Enum):
+    UNDERGRADUATE = "本科"
+
+
+class Pupil(Base):
+    __tablename__ = "pupils"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32))
+    grade = Column(Integer)
+
+
+COLUMNS = [
+    ("学号", "id"),
+    ("姓名", "name"),
+    ("年级", lambda p: f"{p.grade}级"),
+    ("层次", lambda p: Level.UNDERGRADUATE),
+]
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Pupil), [{"id": i, "name": f"学生{i}", "grade": 2020 + i % 4} for i in range(1, ROWS + 1)])
+    return engine
+
+
+@pytest.fixture
+def db(engine):
+    with Session(engine) as session:
+        yield session
+
+
+def query():
+    return select(Pupil).order_by(Pupil.id)
+
+
+async def collect(exporter, db, chunk_size=1000):
+    return b"".join([data async for data in exporter.iter_bytes(stream_query(db, query(), chunk_size))])
+
+
+async def test_csv_export_contains_every_row(db):
+    exporter = StreamingExporter(COLUMNS, "csv")
+    content = await collect(exporter, db)
+    rows = list(csv.reader(io.StringIO(content.decode("utf-8-sig"))))
+    assert rows[0] == ["学号", "姓名", "年级", "层次"]
+    assert rows[1] == ["1", "学生1", "2021级", "本科"]
+    assert len(rows) == ROWS + 1 and exporter.rows == ROWS
+
+
+async def test_json_export_is_valid(db):
+    content = await collect(StreamingExporter(COLUMNS[:2], "json"), db)
+    data = json.loads(content)
+    assert len(data) == ROWS and data[-1] == {"学号": ROWS, "姓名": f"学生{ROWS}"}
+
+
+async def test_xlsx_export_uses_write_only_workbook(db, tmp_path):
+    path = tmp_path / "pupils.xlsx"
+    exporter = StreamingExporter(COLUMNS, "xlsx", sheet_name="学生")
+    assert await exporter.write_file(stream_query(db, query()), str(path)) == ROWS
+    wb = openpyxl.load_workbook(path, read_only=True)
+    rows = list(wb["学生"].iter_rows(values_only=True))
+    assert rows[0] == ("学号", "姓名", "年级", "层次") and rows[-1][0] == ROWS
+    assert len(rows) == ROWS + 1
+
+
+async def peak_memory(db, limit):
+    exporter = StreamingExporter(COLUMNS, "csv")
+    tracemalloc.start()
+    try:
+        async for _ in exporter.iter_bytes(stream_query(db, query().limit(limit), 500)):
+            pass
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+async def test_memory_stays_flat_while_streaming(db):
+    await peak_memory(db, 1000)  # 预热
+    small = await peak_memory(db, ROWS // 10)
+    large = await peak_memory(db, ROWS)
+    # 行数增加 10 倍, 峰值内存基本不变
+    assert large < small * 1.5
+
+
+def test_streaming_response(engine):
+    app = FastAPI()
+    sessions = []
+
+    def session_factory():
+        sessions.append(TrackedSession(engine))
+        return sessions[-1]
+
+    @app.get("/export")
+    async def export():
+        # 会话在数据源内部创建, 发送完响应体后关闭
+        return StreamingExporter(COLUMNS, "csv").response(stream_query_in_session(query(), session_factory), "学生")
+
+    response = TestClient(app).get("/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert "filename*=utf-8''%E5%AD%A6%E7%94%9F.csv" in response.headers["content-disposition"]
+    assert response.text.count("\n") == ROWS + 1
+    assert len(sessions) == 1 and sessions[0].closed
+
+
+class TrackedSession(Session):
+    closed = False
+
+    def close(self):
+        super().close()
+        self.closed = True
+
+
+async def test_sync_session_is_read_off_the_event_loop(db):
+    threads = set()
+
+    def record(value):
+        threads.add(threading.get_ident())
+        return value
+
+    # 每读取一行调用一次, 记录读取所在的线程
+    db.connection().connection.driver_connection.create_function("record", 1, record)
+    stmt = select(func.record(Pupil.id)).order_by(Pupil.id).limit(2000)
+    ids = [value async for chunk in stream_query(db, stmt, 500) for value in chunk]
+    assert ids == list(range(1, 2001))
+    assert threads and threading.get_ident() not in threads
+
+
+async def test_background_export_job(engine, tmp_path):
+    path = tmp_path / "exports" / "pupils.csv"
+
+    def source():
+        return stream_query_in_session(query(), sessionmaker(engine))
+
+    await task_queue.start()
+    try:
+        task = await submit_export_job(StreamingExporter(COLUMNS, "csv"), source, str(path))
+        while task.status.value not in ("completed", "failed"):
+            await asyncio.sleep(0.01)
+        assert task.result.result == ROWS
+    finally:
+        await task_queue.stop()
+    assert path.read_text(encoding="utf-8-sig").count("\n") == ROWS + 1
@@ -0,0 +1,207 @@
+"""
+本地存储流式写入与断点续传测试
+"""
+
+import hashlib
+import os
+import tracemalloc
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from core.third.oss.ranges import range_response
+from core.third.oss.storage import (
+    FileTooLargeError,
+    LocalStorageBackend,
+    StorageProvider,
+    UploadNotFoundError,
+    UploadOffsetError,
+)
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return LocalStorageBackend(str(tmp_path), "http://files.local/")
+
+
+async def stream(count, size=MB):
+    for i in range(count):
+        yield bytes([i % 256]) * size
+
+
+async def test_save_streams_with_bounded_memory(backend):
+    tracemalloc.start()
+    try:
+        info = await backend.save(stream(64), "big/data.bin")
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    expected = hashlib.md5()
+    for i in range(64):
+        expected.update(bytes([i % 256]) * MB)
+    assert info.size == 64 * MB
+    assert info.checksum == expected.hexdigest() == await backend.calculate_hash("big/data.bin")
+    assert peak < 8 * MB
+
+
+async def test_save_rejects_oversized_file_without_leaving_partial(tmp_path):
+    backend = LocalStorageBackend(str(tmp_path), "http://files.local/", max_size=3 * MB)
+    with pytest.raises(FileTooLargeError):
+        await backend.save(stream(4), "a.bin")
+    assert os.listdir(tmp_path) == []
+
+
+async def test_iter_file_range(backend):
+    data = os.urandom(3 * MB + 7)
+    await backend.save(data, "r.bin")
+    chunks = [chunk async for chunk in backend.iter_file("r.bin", MB - 3, 2 * MB + 5)]
+    assert b"".join(chunks) == data[MB - 3 : 2 * MB + 6]
+
+
+async def test_resumable_upload(backend):
+    data = os.urandom(5 * MB)
+    upload_id = await backend.create_upload("u/video.bin", total_size=len(data))
+
+    offset = await backend.upload_chunk(upload_id, data[: 2 * MB], 0)
+    with pytest.raises(UploadOffsetError) as exc:
+        await backend.upload_chunk(upload_id, data[MB : 2 * MB], MB)
+    assert exc.value.expected == offset == 2 * MB
+
+    # 模拟进程重启: 哈希状态丢失后仍能从分块文件恢复
+    backend._upload_hashers.clear()
+    offset = await backend.upload_chunk(upload_id, stream_bytes(data[offset:]), offset)
+    assert await backend.get_upload_offset(upload_id) == len(data)
+
+    info = await backend.complete_upload(upload_id, checksum=hashlib.md5(data).hexdigest())
+    assert info.size == len(data)
+    assert b"".join([chunk async for chunk in backend.iter_file("u/video.bin")]) == data
+    assert os.listdir(backend.root_path / ".uploads") == []
+
+
+async def test_upload_session_belongs_to_its_owner(backend):
+    upload_id = await backend.create_upload("u/doc.txt", total_size=4, owner=1, metadata={"name": "doc.txt"})
+
+    # 其他用户看不到也不能追加、完成或取消该会话
+    for operation in (
+        backend.get_upload_offset(upload_id, owner=2),
+        backend.upload_chunk(upload_id, b"data", 0, owner=2),
+        backend.complete_upload(upload_id, owner=2),
+    ):
+        with pytest.raises(UploadNotFoundError):
+            await operation
+    assert await backend.abort_upload(upload_id, owner=2) is False
+    assert await backend.get_upload_offset(upload_id, owner=1) == 0
+
+    await backend.upload_chunk(upload_id, b"data", 0, owner=1)
+    info = await backend.complete_upload(upload_id, owner=1)
+    assert info.metadata == {"name": "doc.txt"} and info.size == 4
+
+
+async def test_upload_beyond_declared_size_is_discarded(backend):
+    upload_id = await backend.create_upload("u/a.bin", total_size=10)
+    await backend.upload_chunk(upload_id, b"12345", 0)
+    with pytest.raises(FileTooLargeError):
+        await backend.upload_chunk(upload_id, b"6789012", 5)
+    assert await backend.get_upload_offset(upload_id) == 5
+
+
+async def stream_bytes(data, size=MB):
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+def test_range_download(backend, tmp_path):
+    data = os.urandom(2 * MB)
+    (tmp_path / "d.bin").write_bytes(data)
+    app = FastAPI()
+
+    @app.get("/files/{path}")
+    async def download(path: str, request: Request):
+        return await range_response(request, backend, path, filename="报告.bin")
+
+    client = TestClient(app)
+    full = client.get("/files/d.bin")
+    assert full.status_code == 200 and full.content == data
+    assert full.headers["accept-ranges"] == "bytes"
+
+    part = client.get("/files/d.bin", headers={"Range": "bytes=100-199"})
+    assert part.status_code == 206
+    assert part.headers["content-range"] == f"bytes 100-199/{len(data)}"
+    assert part.content == data[100:200]
+
+    etag = full.headers["etag"]
+    assert client.get("/files/d.bin", headers={"Range": "bytes=0-9", "If-Range": etag}).status_code == 206
+    assert client.get("/files/d.bin", headers={"Range": "bytes=0-9", "If-Range": '"stale"'}).status_code == 200
+    assert client.get("/files/d.bin", headers={"Range": f"bytes={len(data)}-"}).status_code == 416
+    assert client.get("/files/missing.bin").status_code == 404
+
+
+class MemoryProvider(StorageProvider):
+    """内存对象存储, 支持原生批量删除"""
+
+    native_delete_limit = 3
+
+    def __init__(self, keys):
+        self.objects = {key: b"data" for key in keys}
+        self.delete_calls = []
+
+    async def upload_file(self, file_path, data, content_type=None, **kwargs):
+        self.objects[file_path] = data
+        return f"mem://{file_path}"
+
+    async def download_file(self, file_path, local_path=None, **kwargs):
+        return self.objects[file_path]
+
+    async def delete_file(self, file_path, **kwargs):
+        return self.objects.pop(file_path, None) is not None
+
+    async def delete_files(self, file_paths, **kwargs):
+        self.delete_calls.append(list(file_paths))
+        return {path: None if self.objects.pop(path, None) else "NoSuchKey" for path in file_paths}
+
+    async def get_file_url(self, file_path, expires=None, **kwargs):
+        return f"mem://{file_path}"
+
+    async def get_file_info(self, file_path, **kwargs):
+        return {"size": len(self.objects[file_path])}
+
+    async def list_files(self, prefix=None, limit=None, **kwargs):
+        return [{"key": key} for key in self.objects]
+
+    async def exists(self, file_path, **kwargs):
+        return file_path in self.objects
+
+
+async def test_provider_batch_operations():
+    provider = MemoryProvider([f"k{i}" for i in range(7)])
+
+    copied = await provider.batch_copy({"k0": "c0", "missing": "c1"})
+    assert copied["k0"].value == "mem://c0" and not copied["missing"].ok
+
+    sizes = await provider.batch_get_size(["k1", "missing"])
+    assert sizes["k1"].value == 4 and "KeyError" in sizes["missing"].error
+
+    exists = await provider.batch_exists(["k1", "missing"])
+    assert exists["k1"].value is True and exists["missing"].value is False
+
+    deleted = await provider.batch_delete([f"k{i}" for i in range(7)] + ["missing"])
+    assert [len(call) for call in provider.delete_calls] == [3, 3, 2]
+    assert all(deleted[f"k{i}"].ok for i in range(7))
+    assert not deleted["missing"].ok and deleted["missing"].error == "NoSuchKey"
+
+
+class SingleDeleteProvider(MemoryProvider):
+    """不支持原生批量删除, 使用默认的 delete_files"""
+
+    native_delete_limit = 0
+    delete_files = StorageProvider.delete_files
+
+
+async def test_default_delete_files_deletes_each_key():
+    provider = SingleDeleteProvider(["a", "b"])
+    assert await provider.delete_files(["a", "b", "missing"]) == {"a": None, "b": None, "missing": "File not deleted"}
+    assert provider.objects == {} and provider.delete_calls == []
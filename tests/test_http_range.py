@@ -0,0 +1,45 @@
+"""
+HTTP Range 解析测试
+"""
+
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from core.third.oss.ranges import RangeNotSatisfiable, if_range_matches, parse_range
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, None),
+        ("bytes=0-99", (0, 99)),
+        ("bytes=100-", (100, 999)),
+        ("bytes=-100", (900, 999)),
+        ("bytes=-5000", (0, 999)),
+        ("bytes=900-5000", (900, 999)),
+        ("bytes=0-1,5-9", None),
+        ("items=0-1", None),
+        ("bytes=abc", None),
+        ("bytes=-", None),
+    ],
+)
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=10-5", "bytes=-0"])
+def test_unsatisfiable_range(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, 1000)
+
+
+def test_if_range():
+    modified = datetime(2025, 1, 1, 8, 30, tzinfo=timezone.utc)
+    assert if_range_matches(None, '"abc"', modified)
+    assert if_range_matches('"abc"', '"abc"', modified)
+    assert not if_range_matches('"old"', '"abc"', modified)
+    assert not if_range_matches('W/"abc"', '"abc"', modified)
+    assert if_range_matches(format_datetime(modified, usegmt=True), None, modified)
+    assert not if_range_matches("Wed, 01 Jan 2020 00:00:00 GMT", None, modified)
@@ -0,0 +1,235 @@
+"""
+预编译翻译目录测试
+"""
+
+import itertools
+import random
+import time
+
+import pytest
+
+from core.I18n import i18n
+from core.I18n.catalog import CompiledCatalog, flatten
+from core.I18n.i18n import I18nManager, TranslationError
+
+
+class Locale:
+    def __init__(self, code, fallback=None, translations=None):
+        self.code = code
+        self.fallback = fallback
+        self.translations = translations or {}
+
+
+def legacy_translate(locales, default_locale, key, locale_code=None, **params):
+    """原 I18nManager.get_locale + translate 的实现, 作为行为基准"""
+    locale = None
+    if locale_code:
+        locale = locales.get(locale_code)
+        if not locale:
+            locale = next((l for l in locales.values() if l.fallback == locale_code), None)
+    if not locale:
+        locale = locales[default_locale]
+
+    translation = locale.translations.get(key)
+    if not translation and locale.fallback:
+        fallback_locale = locales.get(locale.fallback)
+        if fallback_locale:
+            translation = fallback_locale.translations.get(key)
+    if not translation:
+        if locale.code != default_locale:
+            translation = locales[default_locale].translations.get(key)
+    if not translation:
+        return key
+    if params:
+        try:
+            return translation.format(**params)
+        except Exception:
+            return translation
+    return translation
+
+
+def make_locales():
+    return {
+        "en": Locale(
+            "en",
+            translations={
+                "greeting": "Hello, {name}!",
+                "items": "{count:d} items",
+                "price": "{amount:.2f} {currency!r}",
+                "braces": "Use {{braces}} for {name}",
+                "broken": "Hello {name",
+                "positional": "Hello {}",
+                "attribute": "Hello {user.name}",
+                "only_en": "English only",
+                "empty_de": "Fallback from English",
+                "plain": "Plain text",
+            },
+        ),
+        "de": Locale(
+            "de",
+            fallback="en",
+            translations={"greeting": "Hallo, {name}!", "empty_de": "", "plain": "Einfacher Text"},
+        ),
+        "de-AT": Locale("de-AT", fallback="de", translations={"greeting": "Servus, {name}!"}),
+        "zh": Locale("zh", fallback="zh-Hans", translations={"plain": "纯文本"}),
+    }
+
+
+class User:
+    name = "Ada"
+
+
+PARAMS = [
+    {},
+    {"name": "Ada"},
+    {"count": 3},
+    {"count": "x"},
+    {"amount": 9.5, "currency": "EUR"},
+    {"user": User()},
+    {"other": 1},
+]
+
+
+def test_matches_legacy_behaviour():
+    locales = make_locales()
+    catalog = CompiledCatalog(locales, "en")
+    keys = list(locales["en"].translations) + ["missing"]
+    locale_codes = [None, "", "en", "de", "de-AT", "zh", "zh-Hans", "fr"]
+    for key, locale_code, params in itertools.product(keys, locale_codes, PARAMS):
+        expected = legacy_translate(locales, "en", key, locale_code, **params)
+        assert catalog.translate(key, locale_code, **params) == expected, (key, locale_code, params)
+
+
+def test_nested_catalogs_are_flattened():
+    assert flatten({"errors": {"required": "Required", "length": {"max": "Too long"}}, "ok": "OK"}) == {
+        "errors.required": "Required",
+        "errors.length.max": "Too long",
+        "ok": "OK",
+    }
+    catalog = CompiledCatalog(
+        {
+            "en": Locale("en", translations={"errors": {"required": "{field} is required", "min": "Too small"}}),
+            "de": Locale("de", fallback="en", translations={"errors": {"required": "{field} ist erforderlich"}}),
+        },
+        "en",
+    )
+    assert catalog.translate("errors.required", "de", field="Name") == "Name ist erforderlich"
+    assert catalog.translate("errors.min", "de") == "Too small"
+
+
+def test_rebuilt_catalog_does_not_affect_previous_one():
+    locales = make_locales()
+    catalog = CompiledCatalog(locales, "en")
+    locales["de"].translations["plain"] = "Neu"
+    reloaded = CompiledCatalog(locales, "en")
+    assert catalog.translate("plain", "de") == "Einfacher Text"
+    assert reloaded.translate("plain", "de") == "Neu"
+
+
+@pytest.mark.slow
+def test_translation_throughput():
+    locales = make_locales()
+    # 模拟较大的目录: 默认区域 2000 个键, 其他区域只翻译了一部分
+    for i in range(2000):
+        locales["en"].translations[f"field.{i}"] = f"Field {i} must be at least {{min}}"
+        if i % 3 == 0:
+            locales["de"].translations[f"field.{i}"] = f"Feld {i} muss mindestens {{min}} sein"
+    catalog = CompiledCatalog(locales, "en")
+    rng = random.Random(3)
+    calls = [
+        (f"field.{rng.randrange(2000)}", rng.choice(["en", "de", "de-AT", "fr"]), {"min": 1} if i % 2 else {})
+        for i in range(20000)
+    ]
+
+    def run(translate):
+        start = time.perf_counter()
+        for key, locale_code, params in calls:
+            translate(key, locale_code, **params)
+        return len(calls) / (time.perf_counter() - start)
+
+    legacy = run(lambda key, locale_code, **params: legacy_translate(locales, "en", key, locale_code, **params))
+    compiled = run(catalog.translate)
+    print(f"\nlegacy: {legacy:,.0f}/s, compiled: {compiled:,.0f}/s")
+
+
+def load_locales(translations):
+    """按 {语言代码: (回退语言, 翻译)} 构造 I18nManager 的区域设置"""
+    locales = {}
+    for code, (fallback, values) in translations.items():
+        locale = i18n.Locale(code, code, fallback)
+        locale.translations = dict(values)
+        locales[code] = locale
+    return locales
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    published = []
+
+    async def publish(event):
+        published.append(event.name)
+
+    monkeypatch.setattr(i18n.event_bus, "publish", publish)
+    manager = I18nManager()
+    manager._install(load_locales({"en": (None, {"plain": "Plain"}), "de": ("en", {"plain": "Einfach"})}), "en")
+    manager._initialized = True
+    manager.published = published
+    return manager
+
+
+async def test_manager_updates_replace_the_catalog(manager):
+    catalog, locale = manager._catalog, manager.get_locale("de")
+
+    await manager.add_translation("de", "greeting", "Hallo, {name}!", persist=False)
+    assert manager.translate("greeting", "de", name="Ada") == "Hallo, Ada!"
+    await manager.remove_translation("de", "plain", persist=False)
+    assert manager.translate("plain", "de") == "Plain"
+
+    # 修改生成新的目录和区域设置, 之前取得的目录和区域设置保持不变
+    assert manager._catalog is not catalog
+    assert catalog.translate("greeting", "de") == "greeting" and catalog.translate("plain", "de") == "Einfach"
+    assert locale.translations == {"plain": "Einfach"}
+    assert manager.published == ["translation_updated", "translation_removed"]
+
+
+async def test_failed_save_keeps_the_catalog(manager, monkeypatch):
+    catalog = manager._catalog
+
+    def fail(locale_code, translations):
+        raise TranslationError("disk full")
+
+    monkeypatch.setattr(manager, "_save_translations", fail)
+    with pytest.raises(TranslationError):
+        await manager.add_translation("de", "greeting", "Hallo", persist=True)
+    with pytest.raises(TranslationError):
+        await manager.remove_translation("de", "plain", persist=True)
+    assert manager._catalog is catalog and manager.translate("plain", "de") == "Einfach"
+    assert manager.translate("greeting", "de") == "greeting" and manager.published == []
+
+
+async def test_reload_swaps_the_catalog_and_keeps_it_on_failure(manager, monkeypatch):
+    catalog = manager._catalog
+
+    async def load():
+        return load_locales({"en": (None, {"plain": "Plain v2"}), "de": ("en", {})})
+
+    monkeypatch.setattr(manager, "_load_locales", load)
+    await manager.reload()
+    assert manager.translate("plain", "de") == "Plain v2" and manager.get_available_locales() == ["en", "de"]
+    assert catalog.translate("plain", "de") == "Einfach"
+
+    # 加载失败或缺少默认区域时保留当前目录
+    reloaded = manager._catalog
+
+    async def broken():
+        raise TranslationError("Failed to load locales")
+
+    async def missing_default():
+        return load_locales({"de": (None, {"plain": "Kaputt"})})
+
+    for loader in (broken, missing_default):
+        monkeypatch.setattr(manager, "_load_locales", loader)
+        with pytest.raises(TranslationError):
+            await manager.reload()
+        assert manager._catalog is reloaded and manager.translate("plain", "de") == "Plain v2"
+    assert manager.get_available_locales() == ["en", "de"]
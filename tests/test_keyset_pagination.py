@@ -0,0 +1,254 @@
+"""
+键集分页测试
+多列排序的前后翻页、游标校验、总数统计方式, 以及深页与首页耗时对比
+"""
+
+import time
+
+import pytest
+from sqlalchemy import Column, Integer, String, create_engine, insert, select
+from sqlalchemy.orm import Session, declarative_base
+
+from core.db.metrics.pagination import PageResponse
+from core.db.utils.keyset import (
+    CursorError,
+    KeysetPaginator,
+    OffsetPage,
+    SortKey,
+    TotalMode,
+    decode_cursor,
+    encode_cursor,
+    fetch_offset_page_sync,
+    parse_sort,
+    resolve_total_sync,
+)
+
+Base = declarative_base()
+
+
+class Item(Base):
+    __tablename__ = "items"
+
+    id = Column(Integer, primary_key=True)
+    group = Column(Integer, nullable=False, index=True)
+    name = Column(String(32), nullable=False)
+
+    @property
+    def label(self):
+        return f"{self.group}:{self.name}"
+
+
+class Task(Base):
+    __tablename__ = "tasks"
+
+    id = Column(Integer, primary_key=True)
+    priority = Column(Integer, nullable=True)
+
+
+@pytest.fixture(scope="module")
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.execute(insert(Item), [{"id": i, "group": i % 7, "name": f"item-{i % 13:02d}"} for i in range(1, 1001)])
+        db.commit()
+        yield db
+
+
+def _walk(db, sort, size=37):
+    """沿 next_cursor 翻完全部页, 返回所有 id 和每页结果"""
+    pages, cursor = [], ""
+    while cursor is not None:
+        paginator = KeysetPaginator(Item, sort=sort, cursor=cursor, size=size)
+        page = paginator.build_page(db.scalars(paginator.apply(select(Item))).all())
+        pages.append(page)
+        cursor = page.next_cursor
+    return [item.id for page in pages for item in page.items], pages
+
+
+def test_parse_sort_forms():
+    assert parse_sort("group,-name") == (SortKey("group"), SortKey("name", True), SortKey("id"))
+    assert parse_sort(["group desc", "name asc"])[-1] == SortKey("id", True)
+    assert parse_sort(None) == (SortKey("id", True),)
+    assert parse_sort("-id") == (SortKey("id", True),)
+
+
+@pytest.mark.parametrize("sort", ["id", "-id", "group,name", "-group,-name", "group,-name", "-name,group"])
+def test_forward_walk_matches_full_ordering(session, sort):
+    keys = parse_sort(sort)
+    expected = sorted(
+        session.scalars(select(Item)).all(),
+        key=lambda item: tuple((-1 if k.descending else 1) * _rank(item, k.name) for k in keys),
+    )
+    ids, pages = _walk(session, sort)
+    assert ids == [item.id for item in expected]
+    assert pages[0].has_prev is False and pages[-1].has_next is False
+    assert all(page.has_prev for page in pages[1:])
+
+
+def _rank(item, name):
+    value = getattr(item, name)
+    # 字符串按字典序映射为可取负的整数, 便于混合方向排序
+    return int.from_bytes(value.encode(), "big") if isinstance(value, str) else value
+
+
+def test_backward_walk_returns_previous_pages(session):
+    _, pages = _walk(session, "group,-name", size=50)
+    page = pages[-1]
+    for expected in reversed(pages[:-1]):
+        paginator = KeysetPaginator(Item, sort="group,-name", cursor=page.prev_cursor, size=50)
+        page = paginator.build_page(session.scalars(paginator.apply(select(Item))).all())
+        assert [item.id for item in page.items] == [item.id for item in expected.items]
+        assert page.has_next is True
+    assert page.has_prev is False and page.prev_cursor is None
+
+
+def test_filtered_query_and_existing_order_is_replaced(session):
+    query = select(Item).where(Item.group == 3).order_by(Item.name)
+    paginator = KeysetPaginator(Item, sort="-id", size=10)
+    page = paginator.build_page(session.scalars(paginator.apply(query)).all())
+    assert [item.id for item in page.items] == sorted((i for i in range(1, 1001) if i % 7 == 3), reverse=True)[:10]
+
+
+def test_cursor_validation():
+    keys = parse_sort("group,-name")
+    cursor = encode_cursor(keys, [1, "item-01", 5])
+    assert decode_cursor(cursor, keys) == ([1, "item-01", 5], False)
+    with pytest.raises(CursorError):
+        decode_cursor(cursor, parse_sort("group"))
+    with pytest.raises(CursorError):
+        decode_cursor("not-a-cursor!", keys)
+    with pytest.raises(CursorError):
+        KeysetPaginator(Item, sort="missing")
+    # 只接受映射的列
+    for name in ("label", "metadata", "__table__"):
+        with pytest.raises(CursorError, match="Unknown sort field"):
+            KeysetPaginator(Item, sort=name)
+
+
+@pytest.mark.parametrize("sort", ["priority", "-priority", "priority,-id", "-priority,id"])
+def test_nullable_sort_keys_walk_every_row(sort):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.execute(insert(Task), [{"id": i, "priority": None if i % 3 == 0 else i % 4} for i in range(1, 101)])
+        db.commit()
+
+        pages, cursor = [], ""
+        while cursor is not None:
+            paginator = KeysetPaginator(Task, sort=sort, cursor=cursor, size=7)
+            page = paginator.build_page(db.scalars(paginator.apply(select(Task))).all())
+            pages.append(page)
+            cursor = page.next_cursor
+        ids = [task.id for page in pages for task in page.items]
+
+        # NULL 视为大于任何值
+        keys = parse_sort(sort)
+        expected = [task.id for task in db.scalars(select(Task)).all()]
+        for key in reversed(keys):
+            expected.sort(
+                key=lambda i: (db.get(Task, i).priority is None, db.get(Task, i).priority or 0)
+                if key.name == "priority"
+                else i,
+                reverse=key.descending,
+            )
+        assert ids == expected
+
+        # 从最后一页向前翻页回到第一页
+        back, cursor = [], pages[-1].prev_cursor
+        back.extend(reversed([task.id for task in pages[-1].items]))
+        while cursor is not None:
+            paginator = KeysetPaginator(Task, sort=sort, cursor=cursor, size=7)
+            page = paginator.build_page(db.scalars(paginator.apply(select(Task))).all())
+            back.extend(reversed([task.id for task in page.items]))
+            cursor = page.prev_cursor
+        assert back == expected[::-1]
+
+
+def test_total_modes(session):
+    query = session.query(Item).filter(Item.group == 1)
+    assert resolve_total_sync(query, TotalMode.NONE) == (None, False)
+    assert resolve_total_sync(query, TotalMode.EXACT) == (143, False)
+    assert resolve_total_sync(query, TotalMode.ESTIMATE, cap=100) == (100, True)
+    assert resolve_total_sync(query, "estimate", cap=500) == (143, False)
+
+
+def test_legacy_query_support(session):
+    paginator = KeysetPaginator(Item, sort=["name desc"], size=5)
+    first = paginator.build_page(paginator.apply(session.query(Item)).all())
+    paginator = KeysetPaginator(Item, sort=["name desc"], cursor=first.next_cursor, size=5)
+    second = paginator.build_page(paginator.apply(session.query(Item)).all())
+    assert [(i.name, i.id) for i in first.items + second.items] == sorted(
+        ((i.name, i.id) for i in session.query(Item).all()), key=lambda t: (t[0], t[1]), reverse=True
+    )[:10]
+
+
+def test_offset_page_has_next_without_total(session):
+    query = session.query(Item).order_by(Item.id)
+    # 1000 行, 每页 100 行: 第 10 页是最后一页
+    middle = fetch_offset_page_sync(query, page=3, size=100, mode=TotalMode.NONE)
+    last = fetch_offset_page_sync(query, page=10, size=100, mode=TotalMode.NONE)
+    assert len(middle.items) == 100 and middle.has_next and middle.total is None
+    assert len(last.items) == 100 and not last.has_next and last.has_prev
+
+    response = PageResponse.from_offset(middle)
+    assert response.has_next and response.total is None and response.pages is None
+
+    # 兼容 (数据列表, 总数) 解包
+    items, total = fetch_offset_page_sync(query, page=1, size=10)
+    assert len(items) == 10 and total == 1000
+
+
+def test_estimated_total_is_flagged_in_response(session):
+    query = session.query(Item).order_by(Item.id)
+    total, estimated = resolve_total_sync(query, TotalMode.ESTIMATE, cap=500)
+    rows = query.offset(600).limit(11).all()
+    page = OffsetPage.from_rows(rows, page=61, size=10, total=total, total_estimated=estimated)
+    response = PageResponse.from_offset(page)
+
+    # 估算的总数(500)小于实际行数, 是否有下一页以多取的一行为准, 不计算总页数
+    assert response.total == 500 and response.total_estimated
+    assert response.has_next and response.pages is None
+
+    exact = PageResponse.create(items=[], total=1000, page=100, size=10)
+    assert exact.pages == 100 and not exact.has_next and not exact.total_estimated
+
+
+def test_benchmark_deep_page_is_constant_time():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    rows = 200_000
+    with Session(engine) as db:
+        db.execute(insert(Item), [{"id": i, "group": i % 7, "name": "x"} for i in range(1, rows + 1)])
+        db.commit()
+
+        def timed(fn, repeat=20):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                fn()
+            return (time.perf_counter() - start) / repeat
+
+        size = 20
+        keys = parse_sort("id")
+        deep_cursor = encode_cursor(keys, [rows - 1000])
+
+        def keyset(cursor):
+            paginator = KeysetPaginator(Item, sort="id", cursor=cursor, size=size)
+            return db.scalars(paginator.apply(select(Item))).all()
+
+        def offset(page):
+            return db.scalars(select(Item).order_by(Item.id).offset((page - 1) * size).limit(size)).all()
+
+        keyset_first = timed(lambda: keyset(None))
+        keyset_deep = timed(lambda: keyset(deep_cursor))
+        offset_first = timed(lambda: offset(1))
+        offset_deep = timed(lambda: offset((rows - 1000) // size))
+        print(
+            f"\nkeyset first={keyset_first * 1e3:.3f}ms deep={keyset_deep * 1e3:.3f}ms | "
+            f"offset first={offset_first * 1e3:.3f}ms deep={offset_deep * 1e3:.3f}ms"
+        )
+
+        assert keyset(deep_cursor)[0].id == rows - 999
+        # 键集深页与首页同量级, 而 OFFSET 深页需要逐行跳过
+        assert keyset_deep < keyset_first * 5
+        assert keyset_deep < offset_deep
@@ -0,0 +1,143 @@
+"""
+索引日志存储测试
+"""
+import time
+
+import pytest
+
+from core.db.utils.fingerprint import fingerprint_sql, normalize_sql
+from core.db.utils.log_store import IndexedLogStore
+
+
+def index_record(record):
+    """测试用索引函数"""
+    return record["ts"], {"txn": record["txn"], "duration": record["duration"]}
+
+
+@pytest.fixture
+def store(tmp_path):
+    """日志存储fixture"""
+    return IndexedLogStore(str(tmp_path), "test", index_record, key_fields=("txn",), max_segment_size=4096)
+
+
+class TestFingerprint:
+    """SQL指纹测试"""
+
+    def test_strip_literals(self):
+        """测试去除字面量"""
+        a = "SELECT * FROM users WHERE id = 1 AND name = 'bob'"
+        b = "select *  from users where id = 42 and name = 'it''s'"
+        assert normalize_sql(a) == "select * from users where id = ? and name = ?"
+        assert fingerprint_sql(a) == fingerprint_sql(b)
+
+    def test_collapse_in_list(self):
+        """测试折叠IN列表"""
+        assert fingerprint_sql("SELECT 1 FROM t WHERE id IN (1, 2, 3)") == fingerprint_sql(
+            "SELECT 1 FROM t WHERE id IN (4)"
+        )
+
+    def test_keep_identifiers(self):
+        """测试保留标识符中的数字"""
+        assert normalize_sql("SELECT col1 FROM t2") == "select col1 from t2"
+
+
+class TestIndexedLogStore:
+    """索引日志存储测试"""
+
+    def test_lookup_by_key_and_time(self, store):
+        """测试按键和时间查询"""
+        for i in range(200):
+            store.append({"ts": 1000 + i, "txn": f"t{i % 10}", "duration": i / 100})
+
+        records = store.query(where={"txn": "t3"})
+        assert [r["ts"] for r in records] == list(range(1003, 1200, 10))
+
+        records = store.query(start=1050, end=1059)
+        assert len(records) == 10
+
+        slowest = store.query(order_by=lambda e: e.attrs["duration"], reverse=True, limit=3)
+        assert [r["ts"] for r in slowest] == [1199, 1198, 1197]
+
+    def test_rotation_drops_oldest(self, tmp_path):
+        """测试分段轮转"""
+        store = IndexedLogStore(
+            str(tmp_path), "test", index_record, key_fields=("txn",), max_segment_size=512, max_segments=3
+        )
+        for i in range(200):
+            store.append({"ts": i, "txn": "same", "duration": 0})
+
+        metrics = store.get_metrics()
+        assert metrics["total_files"] <= 3
+        assert len(store.query(where={"txn": "same"})) == len(store)
+
+    def test_rotation_keeps_pinned_segments(self, tmp_path):
+        """测试轮转和归档不删除包含仍在使用的键的分段"""
+        live = {"open"}
+        store = IndexedLogStore(
+            str(tmp_path),
+            "test",
+            index_record,
+            key_fields=("txn",),
+            max_segment_size=512,
+            max_segments=3,
+            pinned=lambda: live,
+        )
+        store.append({"ts": 0, "txn": "open", "duration": 0})
+        for i in range(1, 200):
+            store.append({"ts": i, "txn": f"done{i}", "duration": 0})
+
+        # 最旧的分段因包含未结束的 open 被保留, 其余分段照常轮转
+        assert [r["ts"] for r in store.query(where={"txn": "open"})] == [0]
+        assert store.get_metrics()["total_files"] == 3
+        kept = [r["ts"] for r in store.query()]
+        assert kept[0] == 0 and kept[-1] == 199 and len(kept) < 100
+
+        store.compact_to_sqlite(str(tmp_path / "archive.db"), drop=True)
+        assert store.query(where={"txn": "open"}) and len(list(tmp_path.glob("*.log"))) == 2
+
+        # 不再使用后, 下一次轮转删除该分段
+        live.clear()
+        for i in range(200, 260):
+            store.append({"ts": i, "txn": f"done{i}", "duration": 0})
+        assert not store.query(where={"txn": "open"}) and store.get_metrics()["total_files"] <= 3
+
+    def test_reopen_and_rebuild_index(self, tmp_path):
+        """测试重新打开以及索引缺失时重建"""
+        store = IndexedLogStore(str(tmp_path), "test", index_record, key_fields=("txn",))
+        for i in range(50):
+            store.append({"ts": i, "txn": f"t{i % 5}", "duration": 0})
+
+        reopened = IndexedLogStore(str(tmp_path), "test", index_record, key_fields=("txn",))
+        assert len(reopened.query(where={"txn": "t1"})) == 10
+
+        for idx in tmp_path.glob("*.idx"):
+            idx.unlink()
+        rebuilt = IndexedLogStore(str(tmp_path), "test", index_record, key_fields=("txn",))
+        assert len(rebuilt.query(where={"txn": "t1"})) == 10
+
+    def test_compact_to_sqlite(self, store, tmp_path):
+        """测试归档到SQLite"""
+        import sqlite3
+
+        for i in range(200):
+            store.append({"ts": i, "txn": f"t{i % 10}", "duration": 0})
+        archived = store.compact_to_sqlite(str(tmp_path / "archive.db"))
+
+        conn = sqlite3.connect(str(tmp_path / "archive.db"))
+        assert conn.execute("SELECT COUNT(*) FROM test").fetchone()[0] == archived
+        assert archived > 0
+
+    @pytest.mark.slow
+    def test_lookup_time_independent_of_log_size(self, tmp_path):
+        """测试按键查询耗时与日志总量无关"""
+        store = IndexedLogStore(str(tmp_path), "bench", index_record, key_fields=("txn",), max_segments=100)
+        for i in range(100000):
+            store.append({"ts": i, "txn": f"t{i}", "duration": 0})
+
+        start = time.perf_counter()
+        for i in range(0, 100000, 100):
+            assert len(store.query(where={"txn": f"t{i}"})) == 1
+        elapsed = time.perf_counter() - start
+        print(f"\n1000 lookups over 100k entries: {elapsed:.3f}s")
+
+        assert elapsed < 1.0
@@ -0,0 +1,186 @@
+"""
+请求指标测试
+路由模板标签、预建子指标、后台资源采样, 以及多进程汇总
+"""
+
+import os
+import runpy
+import subprocess
+import sys
+import textwrap
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+
+import core
+from core.middlewares.metrics import MetricsMiddleware, metrics_endpoint
+from core.middlewares.monitor import ResourceSampler
+from core.middlewares.prometheus import UNMATCHED_ROUTE, RouteMetrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(core.__file__)))
+
+
+@pytest.fixture
+def registry():
+    return CollectorRegistry()
+
+
+@pytest.fixture
+def metrics(registry):
+    return RouteMetrics(
+        request_count=Counter("t_requests_total", "", ["method", "endpoint", "status"], registry=registry),
+        request_latency=Histogram("t_request_duration_seconds", "", ["method", "endpoint"], registry=registry),
+        in_progress=Gauge("t_requests_in_progress", "", ["method"], registry=registry),
+    )
+
+
+@pytest.fixture
+def sampler():
+    return ResourceSampler(interval=0.05)
+
+
+@pytest.fixture
+def client(metrics, sampler):
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, sampler=sampler, metrics=metrics)
+
+    @app.get("/students/{student_id}")
+    async def get_student(student_id: int):
+        return {"id": student_id}
+
+    @app.post("/students/{student_id}/courses/{course_id}")
+    async def enroll(student_id: int, course_id: int):
+        return {}
+
+    app.add_route("/metrics", metrics_endpoint)
+
+    with TestClient(app) as c:
+        yield c
+
+
+def _value(registry, name, **labels):
+    return registry.get_sample_value(name, labels) or 0
+
+
+def test_labels_use_route_template(client, registry, metrics):
+    for student_id in range(50):
+        assert client.get(f"/students/{student_id}").status_code == 200
+    client.post("/students/1/courses/2")
+    client.get("/students/not-a-number")
+    client.get("/random/scanner/path")
+    client.get("/another/path")
+
+    template = "/students/{student_id}"
+    assert _value(registry, "t_requests_total", method="GET", endpoint=template, status="200") == 50
+    assert _value(registry, "t_requests_total", method="GET", endpoint=template, status="422") == 1
+    assert _value(registry, "t_request_duration_seconds_count", method="GET", endpoint=template) == 51
+    assert (
+        _value(registry, "t_requests_total", method="POST", endpoint="/students/{student_id}/courses/{course_id}", status="200")
+        == 1
+    )
+    assert _value(registry, "t_requests_total", method="GET", endpoint=UNMATCHED_ROUTE, status="404") == 2
+    assert _value(registry, "t_requests_in_progress", method="GET") == 0
+
+    # 原始路径不会出现在任何标签中
+    endpoints = {s.labels["endpoint"] for m in registry.collect() for s in m.samples if "endpoint" in s.labels}
+    assert all("/students/1" != e and "/students/7" != e for e in endpoints)
+
+
+def test_routes_are_preallocated_on_first_request(client, registry, metrics):
+    client.get("/students/1")
+    assert metrics.prepared
+    # 未访问过的路由也已经有零值序列
+    assert (
+        registry.get_sample_value(
+            "t_request_duration_seconds_count", {"method": "POST", "endpoint": "/students/{student_id}/courses/{course_id}"}
+        )
+        == 0
+    )
+
+
+def test_sampler_runs_in_background(client, sampler):
+    client.get("/students/1")
+    assert sampler.running
+    deadline = time.time() + 2
+    while sampler.samples < 2 and time.time() < deadline:
+        client.get("/students/1")
+        time.sleep(0.05)
+    assert sampler.samples >= 2
+    assert sampler.snapshot["rss"] > 0 and sampler.snapshot["fds"] > 0 and sampler.snapshot["threads"] >= 1
+
+
+def test_metrics_endpoint(client):
+    client.get("/students/3")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "http_request_duration_seconds" in response.text
+
+
+@pytest.mark.slow
+def test_per_request_overhead(metrics):
+    # 已缓存子指标时记录一次请求的开销
+    metrics.observe("GET", "/students/{student_id}", 200, 0.01)
+    n = 20000
+    start = time.perf_counter()
+    for _ in range(n):
+        metrics.observe("GET", "/students/{student_id}", 200, 0.01)
+    per_call = (time.perf_counter() - start) / n
+    print(f"\nobserve: {per_call * 1e6:.2f}us")
+
+
+_WORKER = textwrap.dedent(
+    """
+    import sys
+    from core.middlewares.prometheus import route_metrics
+    for _ in range(int(sys.argv[1])):
+        route_metrics.observe("GET", "/students/{student_id}", 200, 0.02)
+    """
+)
+
+_READER = textwrap.dedent(
+    """
+    from core.middlewares.prometheus import render_latest
+    print(render_latest()[0].decode())
+    """
+)
+
+
+def test_multiprocess_aggregation(tmp_path):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path), PYTHONPATH=ROOT)
+
+    def run(code, *args):
+        return subprocess.run(
+            [sys.executable, "-c", code, *args], env=env, cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout
+
+    run(_WORKER, "3")
+    run(_WORKER, "4")
+    output = run(_READER)
+
+    assert 'http_requests_total{endpoint="/students/{student_id}",method="GET",status="200"} 7.0' in output
+    assert 'http_request_duration_seconds_count{endpoint="/students/{student_id}",method="GET"} 7.0' in output
+
+
+def test_gunicorn_child_exit_removes_live_gauges(tmp_path, monkeypatch):
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    config = runpy.run_path(os.path.join(ROOT, "deploy", "config", "gunicorn.conf.py"))
+    config["on_starting"](None)
+    live = tmp_path / "gauge_livesum_4321.db"
+    kept = tmp_path / "counter_4321.db"
+    live.touch()
+    kept.touch()
+
+    config["child_exit"](None, SimpleNamespace(pid=4321))
+    # 只清理存活类 Gauge, 计数器保留以继续参与汇总
+    assert not live.exists() and kept.exists()
+
+
+async def test_sampler_stops_on_shutdown(sampler):
+    sampler.start()
+    assert sampler.running
+    await sampler.stop()
+    assert not sampler.running and sampler._task is None
@@ -0,0 +1,191 @@
+"""
+连接池自动扩缩容测试
+"""
+
+import asyncio
+
+import pytest
+
+from core.db.pool.autoscale import (
+    AcquireTracker,
+    CapacityGate,
+    LatencyHistogram,
+    PoolSample,
+    QueueWaitPolicy,
+    UtilizationPolicy,
+    simulate,
+)
+
+
+def test_histogram_percentiles_and_snapshot():
+    histogram = LatencyHistogram(buckets=(0.01, 0.1, 1.0))
+    for value in [0.005] * 90 + [0.05] * 9 + [3.0]:
+        histogram.observe(value)
+    assert histogram.percentile(0.5) == 0.01
+    assert histogram.percentile(0.95) == 0.1
+    assert histogram.percentile(1.0) == 3.0
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"] == {"0.01": 90, "0.1": 99, "1.0": 99, "+Inf": 100}
+    assert snapshot["count"] == 100
+
+
+def test_tracker_window_statistics():
+    now = [0.0]
+    tracker = AcquireTracker(clock=lambda: now[0])
+    for _ in range(3):
+        tracker.start_wait()
+    tracker.acquired(0.2)
+    tracker.acquired(0.2)
+    now[0] = 1.0
+    tracker.released()
+    now[0] = 2.0
+    sample = tracker.sample(size=2)
+    # 两个连接占用 1 秒, 一个占用 2 秒: (1 + 2) / (2 * 2)
+    assert sample.utilization == 0.75
+    assert sample.queue_depth == 3 and sample.in_use == 1 and sample.wait_p95 == 0.25
+    # 新窗口从仍在排队的请求开始
+    assert tracker.sample(size=2).queue_depth == 1
+
+
+def sample(size, wait=0.0, queue=0, utilization=0.5, in_use=None):
+    return PoolSample(size, wait, queue, utilization, in_use if in_use is not None else int(size * utilization))
+
+
+def test_scales_up_by_queue_depth_within_bounds():
+    policy = QueueWaitPolicy(min_size=5, max_size=20, scale_up_cooldown=5)
+    assert policy.decide(sample(5, wait=0.2, queue=8, utilization=1.0), now=0) == 13
+    # 冷却期内不再扩容
+    assert policy.decide(sample(13, wait=0.2, queue=8, utilization=1.0), now=2) == 13
+    assert policy.decide(sample(13, wait=0.2, queue=30, utilization=1.0), now=6) == 20
+
+
+def test_momentary_queueing_does_not_scale_up():
+    policy = QueueWaitPolicy()
+    assert policy.decide(sample(5, wait=0.001, queue=3, utilization=0.9), now=0) == 5
+
+
+def test_scale_down_needs_sustained_idle_and_cooldown():
+    policy = QueueWaitPolicy(min_size=5, max_size=20, scale_down_samples=3, scale_down_cooldown=30)
+    policy.decide(sample(5, wait=0.3, queue=15, utilization=1.0), now=0)
+    idle = sample(20, utilization=0.1)
+    # 冷却期内的空闲窗口只累计, 不缩容
+    assert [policy.decide(idle, now=t) for t in (10, 20, 29)] == [20, 20, 20]
+    assert policy.decide(idle, now=31) == 18
+    # 缩容后重新累计连续空闲窗口
+    assert policy.decide(sample(18, utilization=0.1), now=62) == 18
+
+
+def test_hysteresis_prevents_oscillation():
+    """负载在扩容与缩容阈值之间波动时连接数保持不变"""
+    policy = QueueWaitPolicy(scale_down_cooldown=0, scale_up_cooldown=0)
+    sizes = set()
+    size = 10
+    for t in range(100):
+        utilization = 0.5 if t % 2 else 0.75
+        size = policy.decide(sample(size, wait=0.005, queue=1, utilization=utilization), now=t)
+        sizes.add(size)
+    assert sizes == {10}
+
+
+def burst_trace():
+    # 基线 40 req/s, 两次 300 req/s 的突发
+    return [40] * 10 + [300] * 5 + [40] * 40 + [300] * 5 + [40] * 60
+
+
+def test_simulation_is_deterministic():
+    first = simulate(QueueWaitPolicy(), burst_trace())
+    second = simulate(QueueWaitPolicy(), burst_trace())
+    assert first.waits == second.waits and first.sizes == second.sizes
+
+
+def test_queue_wait_policy_handles_bursts_better():
+    old = simulate(UtilizationPolicy(scale_cooldown=60), burst_trace(), interval=5)
+    new = simulate(QueueWaitPolicy(scale_up_cooldown=2, scale_down_cooldown=30), burst_trace(), interval=1)
+    print(
+        f"\nutilization policy: p95 wait {old.percentile(0.95):.3f}s, p99 {old.percentile(0.99):.3f}s"
+        f"\nqueue-wait policy:  p95 wait {new.percentile(0.95):.3f}s, p99 {new.percentile(0.99):.3f}s"
+    )
+    assert len(old.waits) == len(new.waits)
+    assert new.percentile(0.95) < old.percentile(0.95) / 5
+    assert max(new.waits) < max(old.waits)
+    # 突发结束后逐步缩容, 没有来回震荡
+    shrinking = new.sizes[new.sizes.index(max(new.sizes)) :]
+    assert shrinking == sorted(shrinking, reverse=True)
+    assert new.sizes[-1] < max(new.sizes)
+
+
+async def test_gate_caps_checkouts_at_size():
+    gate = CapacityGate(2)
+    state = {"running": 0, "peak": 0}
+
+    async def work():
+        await gate.acquire()
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        await asyncio.sleep(0.01)
+        state["running"] -= 1
+        gate.release()
+
+    await asyncio.gather(*(work() for _ in range(10)))
+    assert state["peak"] == 2 and gate.in_use == 0 and gate.waiting == 0
+
+
+async def test_gate_resizes_in_place():
+    gate = CapacityGate(1)
+    await gate.acquire()
+    order = []
+
+    async def waiter(name):
+        await gate.acquire()
+        order.append(name)
+
+    tasks = [asyncio.create_task(waiter(name)) for name in "abc"]
+    await asyncio.sleep(0)
+    assert gate.waiting == 3
+
+    # 扩容立即按排队顺序放行
+    gate.resize(3)
+    await asyncio.sleep(0)
+    assert order == ["a", "b"] and gate.in_use == 3
+
+    # 缩容不影响已借出的连接, 借出数降到上限以下后才放行
+    gate.resize(1)
+    gate.release()
+    gate.release()
+    await asyncio.sleep(0)
+    assert order == ["a", "b"] and gate.in_use == 1
+    gate.release()
+    await asyncio.sleep(0)
+    assert order == ["a", "b", "c"] and gate.in_use == 1
+    await asyncio.gather(*tasks)
+
+
+async def test_cancelled_waiter_gives_back_its_slot():
+    gate = CapacityGate(1)
+    await gate.acquire()
+    task = asyncio.create_task(gate.acquire())
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert gate.waiting == 0
+
+    # 已放行但尚未恢复执行时被取消, 名额归还
+    task = asyncio.create_task(gate.acquire())
+    await asyncio.sleep(0)
+    gate.release()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert gate.in_use == 0 and gate.try_acquire()
+
+
+def test_simulation_never_exceeds_the_pool_size():
+    # 固定上限: 每秒 300 个 50ms 的请求需要 15 个连接, 上限 5 时吞吐被限制在 100 req/s
+    class Fixed:
+        def decide(self, sample, now):
+            assert sample.in_use <= sample.size
+            return 5
+
+    result = simulate(Fixed(), [300] * 3, initial_size=5)
+    assert len(result.waits) <= 5 * 3 / 0.05 + 5
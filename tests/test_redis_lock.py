@@ -0,0 +1,207 @@
+"""
+Redis 锁测试(fakeredis)
+"""
+
+import asyncio
+import time
+
+import fakeredis
+import pytest
+
+from core.cache.lock import redis_lock_core
+from core.cache.lock.redis_fair_lock import RedisFairLock
+from core.cache.lock.redis_lock import RedisLock
+from core.cache.lock.redis_lock_core import fenced_set, get_lock_metrics
+from core.cache.lock.redis_lock_downgrade import RedisLockDowngrade
+from core.cache.lock.redis_pessimistic_lock import RedisPessimisticLock
+
+
+@pytest.fixture
+def redis():
+    redis_lock_core._metrics.clear()
+    return fakeredis.FakeAsyncRedis()
+
+
+def count_commands(redis):
+    """统计发往 Redis 的命令数"""
+    calls = []
+    original = redis.execute_command
+
+    async def execute_command(*args, **kwargs):
+        calls.append(args[0])
+        return await original(*args, **kwargs)
+
+    redis.execute_command = execute_command
+    return calls
+
+
+async def test_mutual_exclusion_with_monotonic_fencing_tokens(redis):
+    state = {"value": 0, "inside": 0}
+    tokens = []
+
+    async def worker():
+        async with RedisLock(redis, "counter", expire=5) as lock:
+            state["inside"] += 1
+            assert state["inside"] == 1
+            tokens.append(lock.fencing_token)
+            value = state["value"]
+            await asyncio.sleep(0.005)
+            state["value"] = value + 1
+            state["inside"] -= 1
+
+    await asyncio.gather(*(worker() for _ in range(20)))
+    assert state["value"] == 20
+    assert tokens == sorted(tokens) and len(set(tokens)) == 20
+    metrics = get_lock_metrics()["lock"]
+    assert metrics["acquired"] == 20 and metrics["released"] == 20
+    assert metrics["contended"] == 19 and metrics["wait_max"] > 0
+
+
+async def test_waiter_is_woken_by_release_without_polling(redis):
+    holder = RedisLock(redis, "job", expire=30)
+    assert await holder.acquire()
+    calls = count_commands(redis)
+
+    waiter = RedisLock(redis, "job", expire=30)
+    task = asyncio.create_task(waiter.acquire(timeout=5))
+    await asyncio.sleep(0.3)
+    released_at = time.perf_counter()
+    await holder.release()
+    assert await task
+    latency = time.perf_counter() - released_at
+
+    # 等待 0.3 秒期间只有: 一次尝试、一次阻塞等待、释放、被唤醒后的一次尝试
+    assert latency < 0.05
+    assert calls.count("BLPOP") == 1
+    assert len(calls) <= 6
+    assert get_lock_metrics()["lock"]["wakeups"] == 1
+    await waiter.release()
+
+
+async def test_timeout(redis):
+    holder = RedisLock(redis, "busy", expire=30)
+    await holder.acquire()
+    start = time.perf_counter()
+    assert not await RedisLock(redis, "busy").acquire(timeout=0.1)
+    assert 0.1 <= time.perf_counter() - start < 0.3
+    assert get_lock_metrics()["lock"]["timeouts"] == 1
+    await holder.release()
+
+
+async def test_lease_is_renewed_while_held(redis):
+    lock = RedisLock(redis, "long", expire=0.3)
+    assert await lock.acquire()
+    # 持有时间远超租约, 其他客户端仍无法获得
+    assert not await RedisLock(redis, "long", expire=0.3).acquire(timeout=1)
+    assert lock.is_held
+    assert get_lock_metrics()["lock"]["renewals"] >= 3
+    await lock.release()
+    assert await RedisLock(redis, "long", expire=0.3).acquire(timeout=0.1)
+
+
+async def test_stale_holder_is_fenced_off(redis):
+    stale = RedisLock(redis, "resource", expire=0.1, auto_renewal=False)
+    assert await stale.acquire()
+    # 旧持有者停顿超过租约, 新持有者获得锁并写入
+    await asyncio.sleep(0.15)
+    fresh = RedisLock(redis, "resource", expire=5)
+    assert await fresh.acquire(timeout=0.1)
+    assert fresh.fencing_token > stale.fencing_token
+    assert await fenced_set(redis, "balance", "100", fresh.fencing_token)
+    # 旧持有者醒来后的写入被拒绝, 释放也不会删除新持有者的锁
+    assert not await fenced_set(redis, "balance", "0", stale.fencing_token)
+    assert await redis.get("balance") == b"100"
+    assert not await stale.release()
+    assert await fresh.is_locked()
+    await fresh.release()
+
+
+async def test_lost_lease_is_reported(redis):
+    lock = RedisLock(redis, "fragile", expire=0.15)
+    await lock.acquire()
+    await redis.delete("lock:fragile")
+    await asyncio.sleep(0.2)
+    assert not lock.is_held
+    assert get_lock_metrics()["lock"]["leases_lost"] == 1
+    await lock.release()
+
+
+async def test_fair_lock_grants_in_arrival_order(redis):
+    holder = RedisFairLock(redis, "queue", expire=5)
+    await holder.acquire()
+    order = []
+
+    async def waiter(i):
+        lock = RedisFairLock(redis, "queue", expire=5)
+        assert await lock.acquire()
+        order.append(i)
+        await asyncio.sleep(0.01)
+        await lock.release()
+
+    tasks = []
+    for i in range(5):
+        tasks.append(asyncio.create_task(waiter(i)))
+        await asyncio.sleep(0.02)
+    assert await holder.get_queue_length() == 5
+    await holder.release()
+    await asyncio.gather(*tasks)
+    assert order == [0, 1, 2, 3, 4]
+    assert await holder.get_queue_length() == 0
+
+
+async def test_fair_lock_skips_abandoned_waiters(redis):
+    holder = RedisFairLock(redis, "crash", expire=5)
+    await holder.acquire()
+    # 崩溃的客户端留在队首, 没有心跳
+    await redis.rpush("fair_lock:crash:queue", "crashed-client")
+    waiter = RedisFairLock(redis, "crash", expire=5)
+    task = asyncio.create_task(waiter.acquire())
+    await asyncio.sleep(0.05)
+    await holder.release()
+    assert await asyncio.wait_for(task, 1)
+    await waiter.release()
+
+
+async def test_fair_lock_timeout_leaves_queue(redis):
+    holder = RedisFairLock(redis, "slow", expire=5)
+    await holder.acquire()
+    waiter = RedisFairLock(redis, "slow", expire=5, timeout=0.1)
+    assert not await waiter.acquire()
+    assert await waiter.get_queue_position() is None
+    await holder.release()
+
+
+async def test_downgrade_admits_readers_and_blocks_writers(redis):
+    writer = RedisLockDowngrade(redis, "doc", expire=5, timeout=2)
+    assert await writer.acquire_exclusive()
+
+    reader = RedisLockDowngrade(redis, "doc", expire=5, timeout=2)
+    read_task = asyncio.create_task(reader.acquire_shared())
+    await asyncio.sleep(0.05)
+    assert not read_task.done()
+    assert await writer.downgrade()
+    assert await asyncio.wait_for(read_task, 0.5)
+
+    other_writer = RedisLockDowngrade(redis, "doc", expire=5, timeout=2)
+    write_task = asyncio.create_task(other_writer.acquire_exclusive())
+    await asyncio.sleep(0.05)
+    await writer.release()
+    assert not write_task.done()
+    await reader.release()
+    assert await asyncio.wait_for(write_task, 0.5)
+    assert other_writer.fencing_token > reader.fencing_token
+    await other_writer.release()
+
+
+async def test_pessimistic_lock(redis):
+    lock = RedisPessimisticLock(redis, "order:1", expire=5)
+    assert await lock.acquire()
+    assert await lock.extend(10)
+    assert not await RedisPessimisticLock(redis, "order:1", timeout=0.05).acquire()
+    waiter = RedisPessimisticLock(redis, "order:1", timeout=2)
+    task = asyncio.create_task(waiter.acquire())
+    await asyncio.sleep(0.02)
+    assert await lock.force_unlock()
+    assert await asyncio.wait_for(task, 0.5)
+    await waiter.release()
+    assert not await waiter.is_locked()
@@ -0,0 +1,134 @@
+"""
+读写路由测试
+"""
+
+import random
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+from core.db.pool.routing import ReadYourWrites, ReplicaState, choose_replica, classify_sql
+
+
+@pytest.mark.parametrize(
+    "sql, is_write",
+    [
+        ("SELECT id, updated_at FROM users", False),
+        ("select * from logs where action = 'DELETE'", False),
+        ("/* INSERT */ SELECT 1 -- UPDATE", False),
+        ('SELECT "insert" FROM t', False),
+        ("  (SELECT 1) UNION (SELECT 2)", False),
+        ("WITH t AS (SELECT 1) SELECT * FROM t", False),
+        ("EXPLAIN SELECT * FROM users", False),
+        ("SHOW TABLES", False),
+        ("insert into users values (1)", True),
+        ("UPDATE users SET name = 'x'", True),
+        ("WITH moved AS (DELETE FROM a RETURNING *) INSERT INTO b SELECT * FROM moved", True),
+        ("SELECT * FROM accounts WHERE id = 1 FOR UPDATE", True),
+        ("SELECT * FROM accounts LOCK IN SHARE MODE", True),
+        ("SELECT * INTO backup FROM users", True),
+        ("EXPLAIN ANALYZE DELETE FROM users", True),
+        ("SET search_path TO app", True),
+    ],
+)
+def test_classify_sql(sql, is_write):
+    assert classify_sql(sql).is_write is is_write
+
+
+def test_classification_is_cached():
+    classify_sql.cache_clear()
+    classify_sql("SELECT 1")
+    classify_sql("SELECT 1")
+    assert classify_sql.cache_info().hits == 1
+
+
+def test_identifiers_for_table_matching():
+    info = classify_sql('SELECT * FROM "Orders" o JOIN audit.log l ON o.id = l.order_id')
+    assert {"orders", "audit", "log"} <= info.identifiers
+    assert "orders_archive" not in classify_sql("SELECT * FROM orders").identifiers
+
+
+def replicas(*states):
+    return [SimpleNamespace(name=f"r{i}", state=state) for i, state in enumerate(states)]
+
+
+def share(nodes, n=20000):
+    rng = random.Random(7)
+    counts = Counter(choose_replica(nodes, rng=rng).name for _ in range(n))
+    return {name: count / n for name, count in counts.items()}
+
+
+def test_lagging_replica_gets_less_traffic():
+    nodes = replicas(ReplicaState(lag=0, max_lag=5), ReplicaState(lag=4, max_lag=5))
+    result = share(nodes)
+    assert result["r0"] > 0.75
+
+
+def test_busy_replica_gets_less_traffic():
+    nodes = replicas(ReplicaState(inflight=0), ReplicaState(inflight=9))
+    result = share(nodes)
+    assert 0.85 < result["r0"] < 0.95
+
+
+def test_unavailable_replicas_are_never_chosen():
+    nodes = replicas(ReplicaState(lag=10, max_lag=5), ReplicaState(available=False))
+    assert choose_replica(nodes) is None
+    nodes = replicas(ReplicaState(lag=10, max_lag=5), ReplicaState())
+    assert {choose_replica(nodes).name for _ in range(100)} == {"r1"}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_read_your_writes_until_replica_catches_up():
+    clock = Clock()
+    tokens = ReadYourWrites(window=30, clock=clock)
+    replica = ReplicaState(lag=2, max_lag=5)
+
+    tokens.record_write("user-1")
+    # 1 秒后测得延迟 2 秒: 从库只同步到写入前 1 秒
+    clock.now += 1
+    replica.observe(2, at=clock.now)
+    assert not tokens.is_fresh(replica, "user-1")
+    # 其他用户不受影响
+    assert tokens.is_fresh(replica, "user-2")
+
+    clock.now += 2
+    replica.observe(1, at=clock.now)
+    assert tokens.is_fresh(replica, "user-1")
+
+
+def test_tokens_expire_and_are_bounded():
+    clock = Clock()
+    tokens = ReadYourWrites(window=5, max_keys=2, clock=clock)
+    tokens.record_write("a")
+    tokens.record_write("b")
+    tokens.record_write("c")
+    assert len(tokens) == 2 and tokens.token("a") is None
+    clock.now += 6
+    assert tokens.token("b") is None
+
+
+def test_tokens_pin_less_traffic_than_sticky_master():
+    """模拟: 每个用户写一次后读 20 次, 从库延迟 0.5 秒, 每次读间隔 0.1 秒"""
+    clock = Clock()
+    tokens = ReadYourWrites(clock=clock)
+    replica = ReplicaState(lag=0.5)
+    primary_reads = 0
+    for user in range(100):
+        tokens.record_write(user)
+        for _ in range(20):
+            clock.now += 0.1
+            replica.observe(0.5, at=clock.now)
+            if not tokens.is_fresh(replica, user):
+                primary_reads += 1
+    sticky_primary_reads = 100 * 20
+    # 只有写后 0.5 秒内的读走主库
+    assert primary_reads <= 100 * 5
+    assert primary_reads < sticky_primary_reads / 4
@@ -0,0 +1,97 @@
+"""
+路由解析缓存测试
+"""
+
+import re
+import time
+
+from core.db.pool.routing import RouteClassifier, compile_table_matcher
+
+TABLES = {f"table_{i}" for i in range(200)}
+
+
+def test_literals_share_one_cache_entry():
+    classifier = RouteClassifier()
+    for user_id in range(1000):
+        assert classifier.is_write(f"SELECT * FROM users WHERE id = {user_id} AND name = 'u{user_id}'") is False
+    metrics = classifier.metrics()
+    assert metrics["cache_size"] == 1
+    assert metrics["cache_hits"] == 999 and metrics["cache_hit_rate"] == 0.999
+
+
+def test_cache_is_bounded_lru():
+    classifier = RouteClassifier(cache_size=3)
+    for table in ("a", "b", "c"):
+        classifier.is_write(f"SELECT * FROM {table}")
+    classifier.is_write("SELECT * FROM a")  # a 变为最近使用
+    classifier.is_write("SELECT * FROM d")
+    assert classifier.metrics()["cache_size"] == 3 and classifier.evictions == 1
+    classifier.is_write("SELECT * FROM a")
+    assert classifier.hits == 2
+    classifier.is_write("SELECT * FROM b")  # b 已被淘汰
+    assert classifier.misses == 5
+
+
+def test_force_master_rules():
+    classifier = RouteClassifier(force_master_keywords={"nextval"}, force_master_tables={"orders", "audit.log"})
+    assert classifier.is_write("SELECT * FROM Orders WHERE id = 1")
+    assert classifier.is_write('SELECT * FROM "orders"')
+    assert classifier.is_write("SELECT nextval('seq')")
+    assert classifier.is_write("SELECT * FROM audit.log")
+    assert not classifier.is_write("SELECT * FROM orders_archive")
+    assert not classifier.is_write("SELECT * FROM users WHERE note = 'orders'")
+    assert classifier.is_write("UPDATE users SET name = 'x' WHERE id = 1")
+    assert classifier.metrics()["cache_memory_bytes"] > 0
+
+
+def test_table_matcher_prefers_whole_names():
+    matcher = compile_table_matcher({"user", "user_role"})
+    assert matcher.search("select * from user_role").group(0) == "user_role"
+    assert matcher.search("select * from users") is None
+    assert compile_table_matcher([]) is None
+
+
+class LegacyRouter:
+    """原实现: 按原始SQL的无界缓存, 每个表一次正则"""
+
+    WRITE_KEYWORDS = {"INSERT", "UPDATE", "DELETE", "CREATE", "DROP", "ALTER"}
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.cache = {}
+
+    def is_write(self, sql):
+        if sql in self.cache:
+            return self.cache[sql]
+        upper = sql.upper()
+        result = any(keyword in upper for keyword in self.WRITE_KEYWORDS)
+        for table in self.tables:
+            if re.search(rf"\b{table}\b", sql, re.IGNORECASE):
+                result = True
+                break
+        self.cache[sql] = result
+        return result
+
+
+def test_routing_throughput():
+    queries = [f"SELECT * FROM users WHERE id = {i} AND status = 'active'" for i in range(5000)]
+
+    legacy = LegacyRouter(TABLES)
+    start = time.perf_counter()
+    for sql in queries:
+        legacy.is_write(sql)
+    legacy_rate = len(queries) / (time.perf_counter() - start)
+
+    classifier = RouteClassifier(force_master_tables=TABLES, cache_size=1024)
+    start = time.perf_counter()
+    for sql in queries:
+        classifier.is_write(sql)
+    rate = len(queries) / (time.perf_counter() - start)
+
+    print(
+        f"\nlegacy: {legacy_rate:,.0f} decisions/s, cache entries {len(legacy.cache)}"
+        f"\nfingerprint LRU: {rate:,.0f} decisions/s, cache entries {classifier.metrics()['cache_size']}"
+    )
+    assert len(legacy.cache) == len(queries)
+    assert classifier.metrics()["cache_size"] == 1
+    assert rate > legacy_rate
@@ -0,0 +1,137 @@
+"""
+定时任务调度器测试
+"""
+
+import asyncio
+import logging
+import subprocess
+import sys
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+import pytest
+
+from core.strong.scheduler import JOB_TIMER_PREFIX, Scheduler
+from core.strong.timer import TimerQueue
+from core.tasks.task_queue import TaskQueue
+
+
+@asynccontextmanager
+async def local_lock(name):
+    yield
+
+
+@asynccontextmanager
+async def unavailable_lock(name):
+    raise RuntimeError(f"{name} is held")
+    yield
+
+
+@pytest.fixture
+async def timer():
+    timer = TimerQueue()
+    yield timer
+    timer.clear()
+
+
+async def test_interval_job_is_rescheduled_after_each_run(timer):
+    scheduler = Scheduler(timer=timer, lock_factory=local_lock)
+    runs = []
+    job = await scheduler.add_job(lambda: runs.append(datetime.now()), timedelta(seconds=0.05), job_id="tick")
+    await scheduler.start()
+    await asyncio.sleep(0.18)
+
+    assert len(runs) >= 2
+    # 每次运行后按上次运行时间登记下一次
+    assert f"{JOB_TIMER_PREFIX}tick" in timer
+    assert job.next_run_time == job.last_run_time + timedelta(seconds=0.05)
+
+    await scheduler.remove_job("tick")
+    assert f"{JOB_TIMER_PREFIX}tick" not in timer
+    count = len(runs)
+    await asyncio.sleep(0.1)
+    assert len(runs) == count
+    await scheduler.stop()
+
+
+async def test_one_off_job_in_the_past_is_not_scheduled(timer):
+    scheduler = Scheduler(timer=timer, lock_factory=local_lock)
+    await scheduler.add_job(lambda: None, datetime.now() - timedelta(seconds=1), job_id="past")
+    await scheduler.start()
+    assert len(timer) == 0
+    await scheduler.stop()
+
+
+async def test_running_job_skips_overlapping_triggers(timer):
+    scheduler = Scheduler(timer=timer, lock_factory=local_lock)
+    state = {"running": 0, "peak": 0, "runs": 0}
+
+    async def slow():
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        state["runs"] += 1
+        await asyncio.sleep(0.15)
+        state["running"] -= 1
+
+    job = await scheduler.add_job(slow, timedelta(seconds=0.02), job_id="slow", max_instances=1)
+    await scheduler.start()
+    await asyncio.sleep(0.1)
+    # 第一次运行尚未结束, 期间的触发全部跳过
+    assert state == {"running": 1, "peak": 1, "runs": 1}
+    # 运行中不登记定时器, 结束后才登记下一次
+    assert f"{JOB_TIMER_PREFIX}slow" not in timer and job.running_instances == 1
+    await asyncio.sleep(0.1)
+    assert state["peak"] == 1 and state["runs"] == 2
+    await scheduler.stop()
+
+
+async def test_lock_failures_and_job_failures_are_logged_separately(timer, caplog):
+    caplog.set_level(logging.WARNING, logger="core.strong.scheduler")
+    runs = []
+    locked = Scheduler(timer=timer, lock_factory=unavailable_lock)
+    await locked.add_job(lambda: runs.append(1), timedelta(seconds=0.02), job_id="locked")
+    await locked.start()
+    await asyncio.sleep(0.05)
+    await locked.stop()
+    assert runs == []
+    assert "Failed to acquire lock for job locked" in caplog.text
+
+    caplog.clear()
+    failing = Scheduler(timer=timer, lock_factory=local_lock)
+
+    def boom():
+        raise ValueError("boom")
+
+    job = await failing.add_job(boom, timedelta(seconds=0.02), job_id="failing")
+    await failing.start()
+    await asyncio.sleep(0.05)
+    await failing.stop()
+    assert "Failed to acquire lock" not in caplog.text
+    assert "Job failing failed" in caplog.text and job.status == "failed"
+
+
+async def test_scheduler_and_task_queue_share_one_timer(timer):
+    scheduler = Scheduler(timer=timer, lock_factory=local_lock)
+    queue = TaskQueue(max_workers=1, timer=timer)
+    runs = []
+    await scheduler.add_job(lambda: runs.append("job"), timedelta(seconds=0.03), job_id="shared")
+    await scheduler.start()
+    await queue.start()
+    await queue.schedule(lambda: runs.append("task"), datetime.now() + timedelta(seconds=0.5), task_id="later")
+    assert {f"{JOB_TIMER_PREFIX}shared", "task:later"} <= set(timer._timers)
+
+    # 停止任务队列只清除它自己的定时器, 调度器继续运行
+    await queue.stop()
+    assert "task:later" not in timer and f"{JOB_TIMER_PREFIX}shared" in timer
+    count = runs.count("job")
+    await asyncio.sleep(0.1)
+    assert runs.count("job") > count and "task" not in runs
+    await scheduler.stop()
+    assert timer._task is None and len(timer) == 0
+
+
+def test_scheduler_import_does_not_load_lock_manager():
+    # 锁管理器在首次加锁时才导入, 导入调度器不需要 Redis
+    code = "import sys, core.strong.scheduler; print('core.strong.locks' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
@@ -0,0 +1,170 @@
+"""
+只读配置快照测试
+"""
+
+import threading
+import time
+from copy import deepcopy
+
+import pytest
+from pydantic import BaseModel
+
+from core.config.settings.snapshot import FrozenSettingsError, SettingsSnapshot, SettingsStore
+
+CONFIG = {
+    "app": {"name": "speedy", "port": 8000, "hosts": ["a", "b"], "cors": {"origins": ["*"]}},
+    "db": {"host": "localhost", "pool": {"size": 10}},
+}
+
+
+def deep_merge(a, b):
+    result = a.copy()
+    for key, value in b.items():
+        if key in result and isinstance(result[key], dict) and isinstance(value, dict):
+            result[key] = deep_merge(result[key], value)
+        else:
+            result[key] = value
+    return result
+
+
+def test_snapshot_is_read_only_and_fully_resolved():
+    snapshot = SettingsSnapshot(CONFIG)
+    assert snapshot.app.port == 8000 and snapshot.db.pool.size == 10
+    assert snapshot.get("db.pool.size") == 10 and snapshot.get("db.missing", 1) == 1
+    assert snapshot.app.hosts == ("a", "b") and snapshot["app"]["cors"].origins == ("*",)
+
+    with pytest.raises(FrozenSettingsError):
+        snapshot.app.port = 1
+    with pytest.raises(FrozenSettingsError):
+        del snapshot.db
+    with pytest.raises(AttributeError):
+        snapshot.app.missing
+    assert snapshot.to_dict() == {**CONFIG, "app": {**CONFIG["app"], "hosts": ["a", "b"]}}
+
+
+def test_diff_reports_changed_leaves():
+    old = SettingsSnapshot(CONFIG)
+    changed = deepcopy(CONFIG)
+    changed["db"]["pool"]["size"] = 20
+    changed["app"]["debug"] = True
+    del changed["app"]["hosts"]
+    assert SettingsSnapshot(changed).diff(old) == {"db.pool.size", "app.debug", "app.hosts"}
+
+
+def test_invalid_reload_keeps_current_snapshot():
+    data = {"db": {"pool": {"size": 10}}}
+
+    def validate(config):
+        if config["db"]["pool"]["size"] <= 0:
+            raise ValueError("pool size must be positive")
+        return config
+
+    store = SettingsStore(lambda: deepcopy(data), validator=validate)
+    assert store.current.db.pool.size == 10
+    data["db"]["pool"]["size"] = 0
+    with pytest.raises(ValueError):
+        store.reload()
+    assert store.current.db.pool.size == 10 and store.version == 1 and store.failed_reloads == 1
+
+
+def test_subscribers_receive_relevant_changes():
+    data = deepcopy(CONFIG)
+    store = SettingsStore(lambda: deepcopy(data), initial=CONFIG)
+    all_changes, db_changes = [], []
+    store.subscribe(lambda old, new, changed: all_changes.append(changed))
+    unsubscribe = store.subscribe(lambda old, new, changed: db_changes.append((old.db.host, new.db.host)), "db.")
+
+    data["db"]["host"] = "db-1"
+    store.reload()
+    data["app"]["port"] = 9000
+    store.reload()
+    store.reload()  # 没有变化, 不通知
+    unsubscribe()
+    data["db"]["host"] = "db-2"
+    store.reload()
+
+    assert all_changes == [{"db.host"}, {"app.port"}, {"db.host"}]
+    assert db_changes == [("localhost", "db-1")]
+
+
+class PoolConfig(BaseModel):
+    host: str = "localhost"
+    size: int = 10
+
+    @property
+    def url(self):
+        return f"mysql://{self.host}"
+
+
+class AppSettings(BaseModel):
+    db: PoolConfig = PoolConfig()
+
+
+def test_store_keeps_the_validated_settings_object():
+    hosts = ["db-1"]
+    store = SettingsStore(lambda: AppSettings(db=PoolConfig(host=hosts[-1])), initial=AppSettings())
+    assert store.current.db.host == "localhost" and store.current.model().db.url == "mysql://localhost"
+
+    hosts.append("db-2")
+    snapshot = store.reload()
+    # 重新加载后交给管理器的是配置对象, 配置类的属性(如 url)仍然可用
+    assert isinstance(snapshot.model().db, PoolConfig) and snapshot.model().db.url == "mysql://db-2"
+    assert snapshot.db.host == "db-2" and getattr(snapshot.model(), "missing", None) is None
+    assert SettingsSnapshot(CONFIG).model() is None
+
+
+def test_concurrent_readers_see_consistent_snapshots():
+    counter = {"value": 0}
+
+    def source():
+        n = counter["value"]
+        # 同一版本中的所有值相同, 读到混合版本说明替换不是原子的
+        return {"a": {"x": n, "y": n}, "b": {"nested": {"z": n}}, "n": n}
+
+    store = SettingsStore(source)
+    stop = threading.Event()
+    errors = []
+
+    def reader():
+        last = 0
+        while not stop.is_set():
+            snapshot = store.current
+            values = {snapshot.a.x, snapshot.a.y, snapshot.b.nested.z, snapshot.get("n")}
+            if len(values) != 1 or snapshot._version < last:
+                errors.append((values, snapshot._version, last))
+            last = snapshot._version
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for i in range(1, 300):
+        counter["value"] = i
+        store.reload()
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert store.current.a.x == 299 and store.reloads == 300
+
+
+@pytest.mark.slow
+def test_access_benchmark():
+    """热路径读取配置: 快照属性访问与每次合并配置来源的对比"""
+    base = {"app": {"port": 8000, "name": "speedy"}, "db": {"pool": {"size": 10}}}
+    env = {"db": {"pool": {"size": 20}}}
+    snapshot = SettingsSnapshot(deep_merge(base, env))
+    n = 100_000
+
+    start = time.perf_counter()
+    for _ in range(n):
+        snapshot.db.pool.size
+    frozen = (time.perf_counter() - start) / n
+
+    start = time.perf_counter()
+    for _ in range(n):
+        deep_merge(base, env)["db"]["pool"]["size"]
+    merged = (time.perf_counter() - start) / n
+
+    print(f"\nsnapshot: {frozen * 1e9:.0f}ns, merge per access: {merged * 1e9:.0f}ns")
+    assert snapshot.db.pool.size == 20
@@ -0,0 +1,191 @@
+"""
+跨分片分发与归并测试
+多个 SQLite 文件模拟分片
+"""
+
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import Column, Integer, String, create_engine, func, insert, select
+from sqlalchemy.orm import Session, declarative_base
+
+from core.db.utils.scatter import (
+    ShardTimeoutError,
+    _hash,
+    merge_aggregates,
+    merge_ordered,
+    scatter,
+    shard_hash,
+    with_timeout,
+)
+
+Base = declarative_base()
+SHARDS = 4
+ROWS_PER_SHARD = 500
+
+
+class Order(Base):
+    __tablename__ = "orders"
+
+    id = Column(Integer, primary_key=True)
+    user = Column(String(16))
+    amount = Column(Integer)
+
+
+@pytest.fixture(scope="module")
+def engines(tmp_path_factory):
+    root = tmp_path_factory.mktemp("shards")
+    engines = {}
+    for index in range(SHARDS):
+        engine = create_engine(f"sqlite:///{root / f'shard_{index}.db'}")
+        Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(
+                insert(Order),
+                [
+                    {"id": i, "user": f"u{i % 7}", "amount": (i * 37) % 1000}
+                    for i in range(index, SHARDS * ROWS_PER_SHARD, SHARDS)
+                ],
+            )
+        engines[f"shard_{index}"] = engine
+    yield engines
+    for engine in engines.values():
+        engine.dispose()
+
+
+async def test_scatter_runs_shards_concurrently():
+    async def slow(delay):
+        await asyncio.sleep(delay)
+        return delay
+
+    start = time.perf_counter()
+    results = await scatter({f"shard_{i}": 0.1 for i in range(SHARDS)}, slow)
+    elapsed = time.perf_counter() - start
+    assert all(result.ok and result.value == 0.1 for result in results.values())
+    # 串行需要 0.4 秒
+    assert elapsed < 0.25
+
+
+async def test_sync_callbacks_run_in_threads(engines):
+    def count(engine):
+        time.sleep(0.1)
+        with Session(engine) as session:
+            return session.scalar(select(func.count()).select_from(Order))
+
+    start = time.perf_counter()
+    results = await scatter(engines, count)
+    assert time.perf_counter() - start < 0.25
+    assert [result.value for result in results.values()] == [ROWS_PER_SHARD] * SHARDS
+
+
+async def test_slow_or_failing_shard_does_not_affect_others():
+    async def work(target):
+        if target == "slow":
+            await asyncio.sleep(1)
+        if target == "broken":
+            raise ConnectionError("shard down")
+        return target
+
+    results = await scatter({"a": "ok", "b": "slow", "c": "broken"}, work, timeout=0.1)
+    assert results["a"].ok and results["a"].value == "ok"
+    assert not results["b"].ok and "timed out" in results["b"].error
+    assert not results["c"].ok and "shard down" in results["c"].error
+
+
+def shard_stream(engine, statement):
+    """以同步游标逐行读取, 模拟分片的有序结果流"""
+
+    async def rows():
+        with engine.connect() as conn:
+            for row in conn.execute(statement):
+                yield row
+
+    return rows()
+
+
+@pytest.mark.parametrize("reverse", [False, True])
+async def test_ordered_merge_matches_global_sort(engines, reverse):
+    order = Order.amount.desc() if reverse else Order.amount
+    limit, offset = 25, 10
+    statement = select(Order.id, Order.amount).order_by(order, Order.id).limit(limit + offset)
+    streams = [shard_stream(engine, statement) for engine in engines.values()]
+    merged = merge_ordered(streams, key=lambda r: r.amount, reverse=reverse, limit=limit, offset=offset)
+    merged = [row async for row in merged]
+
+    everything = []
+    for engine in engines.values():
+        with engine.connect() as conn:
+            everything.extend(conn.execute(select(Order.id, Order.amount)))
+    expected = sorted((row.amount for row in everything), reverse=reverse)[offset : offset + limit]
+    assert [row.amount for row in merged] == expected
+
+
+async def test_ordered_merge_stops_pulling_after_limit():
+    pulled = []
+
+    async def stream(name):
+        for i in range(1000):
+            pulled.append(name)
+            yield i
+
+    merged = [row async for row in merge_ordered([stream("a"), stream("b")], key=lambda r: r, limit=4)]
+    assert merged == [0, 0, 1, 1]
+    assert len(pulled) <= 6
+
+
+async def test_stalled_shard_times_out_during_merge():
+    closed = []
+
+    async def stream(name, stall_after):
+        try:
+            for i in range(10):
+                if i == stall_after:
+                    await asyncio.sleep(10)
+                yield i
+        finally:
+            closed.append(name)
+
+    streams = [with_timeout(stream("a", None), 0.05, "a"), with_timeout(stream("b", 3), 0.05, "b")]
+    start = time.perf_counter()
+    with pytest.raises(ShardTimeoutError, match="Shard b timed out"):
+        [row async for row in merge_ordered(streams, key=lambda r: r)]
+    assert time.perf_counter() - start < 1
+    # 超时后各分片的行流都被关闭
+    assert sorted(closed) == ["a", "b"]
+
+
+async def test_partial_aggregates_merge(engines):
+    statement = select(
+        func.count().label("total"),
+        func.sum(Order.amount).label("amount"),
+        func.min(Order.amount).label("lowest"),
+        func.max(Order.amount).label("highest"),
+    )
+
+    def partial(engine):
+        with engine.connect() as conn:
+            return dict(conn.execute(statement).mappings().one())
+
+    results = await scatter(engines, partial)
+    merged = merge_aggregates(
+        [result.value for result in results.values()],
+        {"total": "count", "amount": "sum", "lowest": "min", "highest": "max"},
+    )
+    amounts = [(i * 37) % 1000 for i in range(SHARDS * ROWS_PER_SHARD)]
+    assert merged == {"total": len(amounts), "amount": sum(amounts), "lowest": min(amounts), "highest": max(amounts)}
+
+
+def test_aggregates_over_empty_shards():
+    merged = merge_aggregates([{"n": 0, "s": None}, {"n": 0, "s": None}], {"n": "count", "s": "sum"})
+    assert merged == {"n": 0, "s": None}
+    with pytest.raises(ValueError):
+        merge_aggregates([], {"x": "avg"})
+
+
+def test_shard_hash_is_cached():
+    _hash.cache_clear()
+    assert shard_hash(42) == shard_hash("42")
+    shard_hash(42)
+    info = _hash.cache_info()
+    assert info.misses == 1 and info.hits == 2
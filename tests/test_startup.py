@@ -0,0 +1,303 @@
+"""
+启动编排、启动耗时与插件延迟加载测试
+"""
+
+import asyncio
+import json
+import subprocess
+import sys
+import textwrap
+import time
+
+import pytest
+
+from core.strong.plugin import PluginManager, PluginMetadata, PluginState
+from core.strong.startup import StartupError, StartupGraph, StartupProfiler
+
+# 模拟启动的耗时预算(秒): 顺序初始化需要约 0.55 秒
+STARTUP_BUDGET = 0.3
+
+
+class FakeManager:
+    def __init__(self, name, log, delay=0.1, fail=False):
+        self.name = name
+        self.log = log
+        self.delay = delay
+        self.fail = fail
+        self.inits = 0
+
+    async def init(self):
+        self.inits += 1
+        self.log.append(("start", self.name))
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.name} failed")
+        self.log.append(("ready", self.name))
+
+    async def close(self):
+        self.log.append(("close", self.name))
+
+
+def build(log, **overrides):
+    startup = StartupGraph()
+    names = ("logic", "db", "cache", "security", "monitor", "tasks")
+    managers = {name: FakeManager(name, log, **overrides.get(name, {})) for name in names}
+    startup.add("logic", managers["logic"])
+    for name in ("db", "cache", "security", "monitor"):
+        startup.add(name, managers[name], depends_on=["logic"])
+    startup.add("tasks", managers["tasks"], depends_on=["db"], lazy=True)
+    return startup, managers
+
+
+async def test_independent_components_start_in_parallel_within_budget():
+    log = []
+    startup, managers = build(log, logic={"delay": 0.05})
+    await startup.start()
+    elapsed = startup.profiler.elapsed
+    print("\n" + startup.profiler.report())
+
+    assert elapsed < STARTUP_BUDGET and startup.profiler.check_budget(STARTUP_BUDGET)
+    # 日志先完成, 其余组件在日志完成后才开始
+    assert log[:2] == [("start", "logic"), ("ready", "logic")]
+    assert {name for event, name in log[2:6]} == {"db", "cache", "security", "monitor"}
+    totals = startup.profiler.totals()
+    assert set(totals) == {"logic", "db", "cache", "security", "monitor"}
+    assert all(0.04 < phases["init"] < 0.2 for phases in totals.values())
+
+    await startup.stop()
+    closes = [name for event, name in log if event == "close"]
+    assert closes[-1] == "logic" and len(closes) == 5
+
+
+async def test_lazy_component_initializes_once_on_first_use():
+    log = []
+    startup, managers = build(log, logic={"delay": 0}, db={"delay": 0})
+    await startup.start()
+    assert not startup.is_started("tasks") and startup.get("tasks") is None
+
+    provide = startup.dependency("tasks")
+    results = await asyncio.gather(*(provide() for _ in range(10)))
+    assert all(result is managers["tasks"] for result in results)
+    assert managers["tasks"].inits == 1
+    await startup.stop()
+    assert ("close", "tasks") == next(event for event in reversed(log) if event[1] == "tasks")
+
+
+async def test_preload_initializes_lazy_component_in_background(caplog):
+    log = []
+    startup, managers = build(log, logic={"delay": 0}, db={"delay": 0}, tasks={"delay": 0.05, "fail": True})
+    await startup.start()
+    # 预加载不阻塞, 失败只记录日志, 下一次使用时重试
+    (task,) = startup.preload("tasks")
+    assert not startup.is_started("tasks")
+    await asyncio.gather(task, return_exceptions=True)
+    assert "Failed to preload component tasks" in caplog.text and not startup.is_started("tasks")
+
+    managers["tasks"].fail = False
+    startup.preload("tasks")
+    assert await startup.ensure("tasks") is managers["tasks"] and managers["tasks"].inits == 2
+
+    await startup.stop()
+
+    # 关闭时取消尚未完成的预加载
+    slow = FakeManager("slow", log, delay=1)
+    startup.add("slow", slow, lazy=True)
+    (task,) = startup.preload("slow")
+    await asyncio.sleep(0)
+    await startup.stop()
+    assert task.cancelled() and ("ready", "slow") not in log
+
+
+async def test_failed_start_closes_started_components():
+    log = []
+    startup, managers = build(log, cache={"fail": True, "delay": 0.01})
+    with pytest.raises(RuntimeError, match="cache failed"):
+        await startup.start()
+    closed = {name for event, name in log if event == "close"}
+    assert "cache" not in closed and {"logic", "db", "security", "monitor"} <= closed
+
+    # 修复后可以重新启动
+    managers["cache"].fail = False
+    await startup.start()
+    assert startup.is_started("cache")
+    await startup.stop()
+
+
+async def test_invalid_dependencies_are_rejected():
+    startup = StartupGraph()
+    startup.add("a", object(), depends_on=["b"])
+    startup.add("b", object(), depends_on=["a"])
+    with pytest.raises(StartupError, match="Circular"):
+        await startup.start()
+
+    startup = StartupGraph()
+    startup.add("a", object(), depends_on=["missing"])
+    with pytest.raises(StartupError, match="unknown"):
+        await startup.start()
+
+
+def write_module(directory, name, body):
+    (directory / f"{name}.py").write_text(textwrap.dedent(body), encoding="utf-8")
+
+
+async def test_string_targets_are_imported_on_init(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    write_module(
+        tmp_path,
+        "heavy_manager",
+        """
+        import time
+
+        time.sleep(0.05)
+
+
+        class Manager:
+            async def init(self):
+                self.ready = True
+
+
+        manager = Manager()
+        """,
+    )
+    startup = StartupGraph()
+    startup.add("heavy", "heavy_manager:manager", lazy=True)
+    await startup.start()
+    assert "heavy_manager" not in sys.modules
+
+    manager = await startup.ensure("heavy")
+    assert manager.ready
+    assert startup.profiler.totals()["heavy"]["import"] >= 0.05
+    sys.modules.pop("heavy_manager", None)
+
+
+PLUGIN_TEMPLATE = """
+import time
+
+from core.strong.plugin import Plugin
+
+# 模拟导入较慢的插件
+time.sleep(0.05)
+
+PLUGIN_METADATA = {{
+    "name": "{name}",
+    "version": "1.0",
+    "description": "",
+    "author": "",
+    "dependencies": {dependencies},
+    "lazy": {lazy},
+}}
+
+
+class {cls}(Plugin):
+    async def load(self):
+        await super().load()
+
+    async def unload(self):
+        await super().unload()
+
+    async def enable(self):
+        await super().enable()
+
+    async def disable(self):
+        await super().disable()
+"""
+
+
+@pytest.fixture
+def plugin_dir(tmp_path, monkeypatch):
+    package = tmp_path / "lazy_plugins"
+    package.mkdir()
+    (package / "__init__.py").write_text("", encoding="utf-8")
+    plugins = {f"plugin_{i}": [] for i in range(20)}
+    plugins["reporting"] = ["plugin_0"]
+    plugins["audit"] = []
+    for name, dependencies in plugins.items():
+        write_module(
+            package,
+            name,
+            PLUGIN_TEMPLATE.format(
+                name=name, dependencies=dependencies, lazy=name != "audit", cls=name.title().replace("_", "")
+            ),
+        )
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield "lazy_plugins"
+    for module in [module for module in sys.modules if module.startswith("lazy_plugins")]:
+        del sys.modules[module]
+
+
+async def test_plugins_are_discovered_without_importing(plugin_dir):
+    manager = PluginManager(plugin_dir, profiler=StartupProfiler())
+    start = time.perf_counter()
+    await manager.load_all()
+    elapsed = time.perf_counter() - start
+
+    # 22 个插件各需 0.05 秒导入, 只有非延迟的 audit 被导入
+    assert elapsed < STARTUP_BUDGET
+    assert len(manager.get_available_plugins()) == 22
+    assert [plugin.metadata.name for plugin in manager.get_plugins()] == ["audit"]
+    assert [name for name in sys.modules if name.startswith(f"{plugin_dir}.")] == [f"{plugin_dir}.audit"]
+
+
+async def test_lazy_plugin_loads_with_dependencies_on_first_use(plugin_dir):
+    manager = PluginManager(plugin_dir)
+    await manager.load_all()
+
+    plugins = await asyncio.gather(*(manager.require("reporting") for _ in range(5)))
+    assert len({id(plugin) for plugin in plugins}) == 1
+    assert plugins[0].state is PluginState.LOADED
+    assert manager._load_order == ["audit", "plugin_0", "reporting"]
+    assert manager.profiler.totals()["plugin:reporting"]["import"] >= 0.05
+
+    await manager.unload_all()
+    assert manager.get_plugins() == []
+
+
+def test_plugins_load_eagerly_unless_marked_lazy():
+    metadata = PluginMetadata(name="audit", version="1.0", description="", author="")
+    assert metadata.lazy is False
+
+
+def test_plugin_module_import_budget():
+    """插件和启动模块的冷启动导入耗时"""
+    code = "import time; t = time.perf_counter(); import core.strong.plugin; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert float(result.stdout) < 1.0
+
+
+APP_STARTUP = """
+import asyncio
+import json
+
+import main
+from core.config.setting import settings
+
+
+async def run():
+    async with main.lifespan(main.app):
+        state = {
+            "elapsed": main.startup.profiler.elapsed,
+            "within_budget": main.startup.profiler.check_budget(settings.app.startup_budget),
+            "budget": settings.app.startup_budget,
+            "routers": main.app.state.routers_included,
+            "tasks": main.startup.is_started("tasks") or "tasks" in main.startup._ready,
+            "preload_tasks": settings.app.preload_tasks,
+        }
+    print(json.dumps(state))
+
+
+asyncio.run(run())
+"""
+
+
+def test_application_starts_within_budget():
+    """在新进程中冷启动应用: 导入 main 并执行 lifespan, 从导入开始到启动完成的耗时不超过配置的预算"""
+    result = subprocess.run([sys.executable, "-c", APP_STARTUP], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    state = json.loads(result.stdout.strip().splitlines()[-1])
+    print(f"\nstartup {state['elapsed']:.2f}s / budget {state['budget']:.2f}s")
+
+    assert state["within_budget"] and state["elapsed"] <= state["budget"]
+    assert state["routers"]
+    # 任务管理器需要消息代理, 默认不在启动时初始化
+    assert state["tasks"] is state["preload_tasks"]
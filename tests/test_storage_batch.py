@@ -0,0 +1,145 @@
+"""
+存储批量操作测试
+"""
+
+import asyncio
+import os
+import time
+
+import pytest
+
+from core.third.oss.batch import is_transient_error, run_batch
+from core.third.oss.storage import StorageProvider
+
+# 模拟对象存储一次请求的网络往返
+ROUND_TRIP = 0.005
+
+
+class FlakyError(Exception):
+    def __init__(self, status):
+        super().__init__(f"status {status}")
+        self.status = status
+
+
+async def test_results_are_per_item_and_ordered():
+    async def square(x):
+        if x == 3:
+            raise ValueError("bad item")
+        return x * x
+
+    results = await run_batch(range(6), square, concurrency=2)
+    assert list(results) == list(range(6))
+    assert [r.value for r in results.values() if r.ok] == [0, 1, 4, 16, 25]
+    assert not results[3].ok and results[3].error == "ValueError: bad item" and results[3].attempts == 1
+
+
+async def test_transient_errors_are_retried():
+    calls = {}
+
+    async def flaky(key):
+        calls[key] = calls.get(key, 0) + 1
+        if key == "slow" and calls[key] < 3:
+            raise FlakyError(503)
+        if key == "down":
+            raise ConnectionError("reset")
+        return key
+
+    results = await run_batch(["ok", "slow", "down"], flaky, retries=2, backoff=0.001)
+    assert results["ok"].attempts == 1
+    assert results["slow"].ok and results["slow"].attempts == 3
+    assert not results["down"].ok and results["down"].attempts == 3
+    assert is_transient_error(FlakyError(429)) and not is_transient_error(FlakyError(404))
+
+
+async def test_concurrency_is_bounded():
+    running = peak = 0
+
+    async def work(_):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.001)
+        running -= 1
+
+    await run_batch(range(50), work, concurrency=7)
+    assert peak == 7
+
+
+def make_files(directory, count):
+    paths = []
+    for i in range(count):
+        path = directory / f"{i}.bin"
+        path.write_bytes(b"x")
+        paths.append(str(path))
+    return paths
+
+
+async def test_local_filesystem_operations_run_concurrently(tmp_path):
+    paths = make_files(tmp_path, 100)
+    state = {"running": 0, "peak": 0}
+
+    async def round_trip(operation, path):
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        try:
+            await asyncio.sleep(ROUND_TRIP)
+            return await asyncio.to_thread(operation, path)
+        finally:
+            state["running"] -= 1
+
+    existing = await run_batch(paths, lambda path: round_trip(os.path.exists, path), concurrency=16)
+    assert all(r.value for r in existing.values()) and state["peak"] == 16
+
+    state["peak"] = 0
+    deleted = await run_batch(paths, lambda path: round_trip(os.remove, path), concurrency=8)
+    assert all(r.ok for r in deleted.values()) and not os.listdir(tmp_path)
+    assert state["peak"] == 8
+
+
+@pytest.mark.slow
+async def test_local_filesystem_throughput(tmp_path):
+    paths = make_files(tmp_path, 200)
+
+    async def exists(path):
+        await asyncio.sleep(ROUND_TRIP)
+        return await asyncio.to_thread(os.path.exists, path)
+
+    start = time.perf_counter()
+    await run_batch(paths, exists, concurrency=1)
+    sequential_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await run_batch(paths, exists, concurrency=32)
+    concurrent_time = time.perf_counter() - start
+
+    print(
+        f"\nexists x{len(paths)}: sequential {len(paths) / sequential_time:,.0f}/s, "
+        f"concurrency=32 {len(paths) / concurrent_time:,.0f}/s"
+    )
+
+
+class FakeProvider(StorageProvider):
+    """只实现删除的存储提供者, deleted 中的路径删除成功"""
+
+    def __init__(self, deleted, native_delete_limit=0):
+        self.deleted = set(deleted)
+        self.native_delete_limit = native_delete_limit
+
+    async def delete_file(self, file_path, **kwargs):
+        return file_path in self.deleted
+
+    async def delete_files(self, file_paths, **kwargs):
+        # 原生批量删除只返回处理过的路径
+        return {path: None if path in self.deleted else "AccessDenied" for path in file_paths if path != "lost"}
+
+    upload_file = download_file = get_file_url = get_file_info = list_files = exists = None
+
+
+@pytest.mark.parametrize("native_delete_limit", [0, 2])
+async def test_batch_delete_reports_failed_deletes(native_delete_limit):
+    provider = FakeProvider(["a", "c"], native_delete_limit=native_delete_limit)
+    results = await provider.batch_delete(["a", "b", "c", "lost"])
+
+    assert [path for path, result in results.items() if result.ok] == ["a", "c"]
+    assert all(result.ok == bool(result.value) for result in results.values())
+    assert all(results[path].error for path in ("b", "lost"))
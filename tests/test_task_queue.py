@@ -0,0 +1,126 @@
+"""
+任务队列测试
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.tasks.executor import PoolExecutor
+from core.tasks.task_queue import TaskPriority, TaskQueue, TaskStatus
+
+
+def cpu_heavy(n: int) -> int:
+    """CPU密集型任务(模块级函数, 可被pickle)"""
+    return sum(i * i for i in range(n))
+
+
+class TestTaskQueue:
+    """任务队列测试"""
+
+    async def test_priority_order(self):
+        """测试同一通道内按优先级执行"""
+        queue = TaskQueue(max_workers=1)
+        await queue.start()
+        order = []
+        gate = asyncio.Event()
+
+        async def blocker():
+            await gate.wait()
+
+        await queue.submit_task(blocker, task_id="blocker")
+        await asyncio.sleep(0)
+        await queue.submit_task(order.append, ("low",), task_id="low", priority=TaskPriority.LOW)
+        await queue.submit_task(order.append, ("high",), task_id="high", priority=TaskPriority.HIGH)
+        await queue.submit_task(order.append, ("normal",), task_id="normal")
+        gate.set()
+        await asyncio.sleep(0.05)
+
+        assert order == ["high", "normal", "low"]
+        await queue.stop()
+
+    async def test_queue_concurrency_limit(self):
+        """测试通道并发上限"""
+        queue = TaskQueue(queues={"report": 2})
+        await queue.start()
+        running, peak = 0, 0
+
+        async def job():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.02)
+            running -= 1
+
+        for i in range(6):
+            await queue.submit_task(job, task_id=f"job{i}", queue="report")
+        await asyncio.sleep(0.2)
+
+        assert peak == 2
+        assert queue.get_stats()["queues"]["report"]["completed"] == 6
+        await queue.stop()
+
+    async def test_retry_with_backoff_then_dead_letter(self):
+        """测试退避重试后进入死信队列"""
+        queue = TaskQueue()
+        await queue.start()
+        attempts = []
+
+        def flaky():
+            attempts.append(time.time())
+            raise ValueError("boom")
+
+        task = await queue.submit_task(flaky, task_id="flaky", retry_times=2, retry_delay=0.02, retry_jitter=False)
+        await asyncio.sleep(0.3)
+
+        assert len(attempts) == 3
+        assert attempts[2] - attempts[1] > attempts[1] - attempts[0]
+        assert task.status == TaskStatus.FAILED
+        assert queue.get_dead_letters() == [task]
+        stats = queue.get_stats()["queues"]["default"]
+        assert stats["retried"] == 2
+        assert stats["dead_lettered"] == 1
+        await queue.stop()
+
+    async def test_cpu_bound_runs_in_process_pool(self):
+        """测试CPU密集型任务在进程池中执行且不阻塞事件循环"""
+        queue = TaskQueue()
+        await queue.start()
+        task = await queue.submit_task(cpu_heavy, (200000,), task_id="cpu", cpu_bound=True)
+
+        ticks = 0
+        while task.status != TaskStatus.COMPLETED and ticks < 1000:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+        assert task.result.result == cpu_heavy(200000)
+        await queue.stop()
+
+    async def test_restart_after_stop_and_shared_executor(self):
+        """测试停止后可以重新启动, 且不关闭调用方传入的执行器"""
+        shared = ThreadPoolExecutor(max_workers=1)
+        queue = TaskQueue(max_workers=1, executors={"shared": PoolExecutor(shared)})
+        gate = asyncio.Event()
+
+        async def blocker():
+            await gate.wait()
+
+        await queue.start()
+        await queue.submit_task(blocker, task_id="blocker")
+        await asyncio.sleep(0)
+        pending = await queue.submit_task(time.sleep, (0,), task_id="pending", executor="thread")
+        # 工作者被阻塞、队列中还有任务时停止不能挂起
+        await asyncio.wait_for(queue.stop(), timeout=1)
+        assert pending.status == TaskStatus.CANCELLED
+
+        await queue.start()
+        threaded = await queue.submit_task(time.sleep, (0,), task_id="threaded", executor="thread")
+        own = await queue.submit_task(time.sleep, (0,), task_id="own", executor="shared")
+        for _ in range(100):
+            if threaded.status == own.status == TaskStatus.COMPLETED:
+                break
+            await asyncio.sleep(0.01)
+        assert threaded.status == own.status == TaskStatus.COMPLETED
+        await queue.stop()
+
+        assert shared.submit(int, "1").result() == 1
+        shared.shutdown()
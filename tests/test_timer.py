@@ -0,0 +1,107 @@
+"""
+定时器队列测试
+"""
+import asyncio
+import time
+
+import pytest
+
+from core.strong.timer import TimerQueue
+from core.tasks.task_queue import TaskQueue, TaskStatus
+
+
+class TestTimerQueue:
+    """定时器队列测试"""
+
+    def test_fire_in_deadline_order(self):
+        """测试按到期时间顺序触发"""
+        timer = TimerQueue()
+        fired = []
+        for key, deadline in (("c", 3), ("a", 1), ("b", 2)):
+            timer.schedule(key, deadline, fired.append)
+
+        assert timer.fire_due(now=2.5) == 2
+        assert fired == ["a", "b"]
+        assert timer.next_deadline() == 3
+
+    def test_cancel_and_reschedule(self):
+        """测试取消和重新登记"""
+        timer = TimerQueue()
+        fired = []
+        timer.schedule("a", 1, fired.append)
+        timer.schedule("b", 1, fired.append)
+        timer.schedule("a", 5, fired.append)
+        assert timer.cancel("b")
+        assert not timer.cancel("missing")
+
+        timer.fire_due(now=2)
+        assert fired == []
+        timer.fire_due(now=5)
+        assert fired == ["a"]
+        assert len(timer) == 0
+
+    async def test_sub_second_precision(self):
+        """测试亚秒级精度"""
+        timer = TimerQueue()
+        await timer.start()
+        fired_at = {}
+        start = time.time()
+        for delay in (0.05, 0.1, 0.15):
+            timer.schedule(str(delay), start + delay, lambda key: fired_at.setdefault(key, time.time()))
+        await asyncio.sleep(0.25)
+        await timer.stop()
+
+        for key, at in fired_at.items():
+            assert abs(at - start - float(key)) < 0.03
+        assert len(fired_at) == 3
+
+    @pytest.mark.slow
+    async def test_100k_timers_idle_cpu(self):
+        """测试10万个定时器等待期间的CPU占用"""
+        timer = TimerQueue()
+        now = time.time()
+        start = time.perf_counter()
+        for i in range(100000):
+            timer.schedule(f"t{i}", now + 3600 + i, lambda key: None)
+        schedule_time = time.perf_counter() - start
+
+        await timer.start()
+        cpu_start = time.process_time()
+        await asyncio.sleep(1)
+        idle_cpu = time.process_time() - cpu_start
+        await timer.stop()
+        print(f"\nSchedule 100k: {schedule_time:.3f}s, idle CPU over 1s: {idle_cpu:.4f}s")
+
+        assert idle_cpu < 0.05
+
+
+class TestTaskQueueScheduling:
+    """任务队列调度测试"""
+
+    async def test_scheduled_task_runs_and_is_evicted(self):
+        """测试定时任务按时执行且结束后被清理"""
+        queue = TaskQueue(max_workers=2, max_retained=1)
+        await queue.start()
+        results = []
+
+        task_a = await queue.schedule(results.append, time.time() + 0.05, "a", task_id="a")
+        task_b = await queue.schedule(results.append, time.time() + 0.1, "b", task_id="b")
+        assert task_a.status == TaskStatus.SCHEDULED
+        await asyncio.sleep(0.2)
+
+        assert results == ["a", "b"]
+        assert queue.get_task("a") is None
+        assert queue.get_task("b") is task_b
+        await queue.stop()
+
+    async def test_cancel_scheduled_task(self):
+        """测试取消定时任务"""
+        queue = TaskQueue()
+        await queue.start()
+        results = []
+        await queue.schedule(results.append, time.time() + 0.05, "a", task_id="a")
+        assert await queue.cancel_task("a")
+        await asyncio.sleep(0.1)
+
+        assert results == []
+        await queue.stop()
@@ -0,0 +1,135 @@
+"""
+WebSocket广播测试
+"""
+import asyncio
+import json
+import time
+
+import pytest
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeRedis
+
+from core.strong.websocket import SlowConsumerPolicy, WebSocketManager
+from core.strong.websocket_relay import RedisRelay
+
+
+class FakeWebSocket:
+    """模拟WebSocket连接"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.messages = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.messages.append(message)
+
+
+async def settle(manager: WebSocketManager):
+    """等待所有发送队列清空"""
+    while any(conn.queue_size for conn in manager.get_connections()):
+        await asyncio.sleep(0.001)
+    await asyncio.sleep(0)
+
+
+@pytest.fixture
+async def manager():
+    """WebSocket管理器fixture"""
+    manager = WebSocketManager()
+    yield manager
+    for client_id in [conn.client_id for conn in manager.get_connections()]:
+        await manager.disconnect(client_id)
+
+
+class TestWebSocketBroadcast:
+    """广播测试"""
+
+    async def test_room_broadcast(self, manager):
+        """测试房间广播与排除"""
+        sockets = {f"c{i}": FakeWebSocket() for i in range(3)}
+        for client_id, ws in sockets.items():
+            await manager.connect(ws, client_id)
+            await manager.join_room(client_id, "room")
+
+        delivered = await manager.broadcast({"type": "chat", "data": "hi"}, room="room", exclude="c0")
+        await settle(manager)
+
+        assert delivered == 2
+        assert sockets["c0"].messages == []
+        assert json.loads(sockets["c1"].messages[0])["data"] == "hi"
+
+    async def test_slow_consumer_does_not_stall(self, manager):
+        """测试慢消费者不阻塞广播"""
+        slow, fast = FakeWebSocket(delay=1), FakeWebSocket()
+        await manager.connect(slow, "slow")
+        await manager.connect(fast, "fast")
+
+        start = time.perf_counter()
+        for i in range(10):
+            await manager.broadcast({"type": "tick", "data": i})
+        await asyncio.sleep(0.01)
+
+        assert time.perf_counter() - start < 0.5
+        assert len(fast.messages) == 10
+
+    async def test_slow_consumer_disconnect_policy(self):
+        """测试发送队列满时断开慢消费者"""
+        manager = WebSocketManager(max_queue_size=2, policy=SlowConsumerPolicy.DISCONNECT)
+        await manager.connect(FakeWebSocket(delay=1), "slow")
+        for i in range(5):
+            await manager.broadcast({"type": "tick", "data": i})
+        await asyncio.sleep(0.01)
+
+        assert manager.get_connection("slow") is None
+        assert manager.get_stats()["evicted"] >= 1
+
+    async def test_relay_across_nodes(self):
+        """测试通过Redis跨节点转发"""
+        server = FakeServer()
+        node_a, node_b = WebSocketManager(), WebSocketManager()
+        relay_a = RedisRelay(FakeRedis(server=server), node_a)
+        relay_b = RedisRelay(FakeRedis(server=server), node_b)
+        await relay_a.start()
+        await relay_b.start()
+
+        ws_a, ws_b = FakeWebSocket(), FakeWebSocket()
+        await node_a.connect(ws_a, "a")
+        await node_b.connect(ws_b, "b")
+        await node_a.join_room("a", "room")
+        await node_b.join_room("b", "room")
+
+        await node_a.broadcast({"type": "chat", "data": "hello"}, room="room")
+        for _ in range(100):
+            if ws_b.messages:
+                break
+            await asyncio.sleep(0.01)
+
+        assert len(ws_a.messages) == 1
+        assert json.loads(ws_b.messages[0])["data"] == "hello"
+
+        await relay_a.stop()
+        await relay_b.stop()
+        await node_a.disconnect("a")
+        await node_b.disconnect("b")
+
+    @pytest.mark.slow
+    async def test_broadcast_10k_connections(self, manager):
+        """测试10k连接的广播性能"""
+        sockets = [FakeWebSocket() for _ in range(10000)]
+        for i, ws in enumerate(sockets):
+            await manager.connect(ws, f"c{i}")
+            await manager.join_room(f"c{i}", "room")
+
+        start = time.perf_counter()
+        for i in range(10):
+            await manager.broadcast({"type": "tick", "data": i}, room="room")
+        enqueue_time = time.perf_counter() - start
+        await settle(manager)
+        total_time = time.perf_counter() - start
+        print(f"\n10k broadcast x10: enqueue {enqueue_time:.3f}s, delivered {total_time:.3f}s")
+
+        assert all(len(ws.messages) == 10 for ws in sockets)
@@ -14,9 +14,8 @@ from jose import jwt
 from jose.exceptions import JWTError
 from passlib.context import CryptContext
 
-from core.config.setting import get_settings
+from core.config.setting import current_settings
 
-settings = get_settings()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=12)
 
 # 模拟的令牌黑名单
@@ -71,7 +70,8 @@ def is_token_revoked(token: str) -> bool:
 def revoke_token(token: str) -> None:
     """吊销令牌"""
     try:
-        payload = jwt.decode(token, settings.security.SECRET_KEY, algorithms=[settings.security.ALGORITHM])
+        security = current_settings().security
+        payload = jwt.decode(token, security.SECRET_KEY, algorithms=[security.ALGORITHM])
         revoked_tokens[token] = payload.get("exp", datetime.now())
     except JWTError:
         pass
@@ -96,13 +96,14 @@ def generate_totp_secret() -> str:
 # 在创建访问令牌时检查是否已吊销
 async def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """创建访问令牌"""
+    security = current_settings().security
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.now() + expires_delta
     else:
-        expire = datetime.now() + timedelta(minutes=settings.security.ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = datetime.now() + timedelta(minutes=security.ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.security.SECRET_KEY, algorithm=settings.security.ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, security.SECRET_KEY, algorithm=security.ALGORITHM)
     if is_token_revoked(encoded_jwt):
         raise ValueError("Token has been revoked")
     return encoded_jwt
@@ -111,10 +112,11 @@ async def create_access_token(data: dict, expires_delta: Optional[timedelta] = N
 # 在创建刷新令牌时检查是否已吊销
 async def create_refresh_token(data: dict) -> str:
     """创建刷新令牌"""
+    security = current_settings().security
     to_encode = data.copy()
-    expire = datetime.now() + timedelta(days=settings.security.REFRESH_TOKEN_EXPIRE_DAYS)
+    expire = datetime.now() + timedelta(days=security.REFRESH_TOKEN_EXPIRE_DAYS)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.security.SECRET_KEY, algorithm=settings.security.ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, security.SECRET_KEY, algorithm=security.ALGORITHM)
     if is_token_revoked(encoded_jwt):
         raise ValueError("Token has been revoked")
     return encoded_jwt